@@ -17,19 +17,11 @@ if sys.platform == 'win32':
     os.environ["PYTHONIOENCODING"] = "utf-8"
 
 # 尝试导入代理设置，但不阻止系统运行
+# （文件不存在时不再于导入阶段写入模板：导入配置不应修改源码目录，模板见 app/proxy_settings.py）
 try:
     from app.proxy_settings import PROXY_CONFIG
 except ImportError:
     PROXY_CONFIG = {}
-    # 如果文件不存在，创建一个简单的模板
-    os.makedirs("app", exist_ok=True)
-    proxy_template = {
-        "HTTP_PROXY": "",
-        "HTTPS_PROXY": "",
-        "NO_PROXY": "localhost,127.0.0.1"
-    }
-    with open("app/proxy_settings.py", "w") as f:
-        f.write(f"PROXY_CONFIG = {proxy_template}\n")
 
 # 获取当前项目根目录的绝对路径
 def get_project_root():
@@ -94,11 +86,19 @@ class Settings(BaseSettings):
         default="data/knowledge/txt",
         description="文本文件路径"
     )
+    ENHANCED_TXT_EXTRACT: bool = Field(
+        default=True,
+        description="增强型RAG为缺少TXT的PDF从文本层提取TXT写入TXT_PATH；只覆盖或删除自己提取并登记的TXT，预先整理的TXT不受影响"
+    )
     
     # API服务配置
     API_HOST: str = Field(default="0.0.0.0", description="API服务绑定地址")
     API_PORT: int = Field(default=53085, description="API服务端口")
     WORKERS: int = Field(default=1, description="工作进程数")
+    ADMIN_TOKEN: str = Field(default="", description="管理接口令牌（请求头X-Admin-Token），为空时管理接口不可用")
+    WATCH_ENABLED: bool = Field(default=False, description="是否在后台监听知识库目录，文档变化后自动增量重建索引")
+    WATCH_INTERVAL: float = Field(default=2.0, description="知识库目录扫描间隔（秒）")
+    WATCH_DEBOUNCE: float = Field(default=3.0, description="目录内容稳定多少秒后才触发重建（秒），避免拷贝中途触发")
     
     # RAG配置
     RAG_API_KEY: str = Field(
@@ -110,12 +110,19 @@ class Settings(BaseSettings):
         description="DashScope API密钥"
     )
     LLM_MODEL: str = Field(default="qwen-max", description="大语言模型名称")
+    LLM_BACKEND: str = Field(default="tongyi", description="大模型后端：tongyi(通义千问API)或stub(压测用模拟模型，不调用API、不消耗token)")
+    LLM_STUB_LATENCY_MS: float = Field(default=800.0, description="stub后端每次调用的平均耗时（毫秒）")
+    LLM_STUB_JITTER_MS: float = Field(default=200.0, description="stub后端耗时的随机波动幅度（毫秒，均匀分布）")
+    STARTUP_PARALLEL_INIT: bool = Field(default=True, description="启动时是否在后台线程中并行初始化各引擎组件（索引、结构化知识库、大模型客户端）")
+    STARTUP_BUDGET_SECONDS: float = Field(default=1.0, description="启动到开始接受连接的时间预算（秒），超出时记录警告")
     RAG_ENABLED: bool = Field(default=True, description="是否启用RAG")
     RAG_TOP_K: int = Field(default=20, description="RAG检索结果数量")
     RAG_RERANK_TOP_K: int = Field(default=10, description="RAG重排序结果数量")
     RAG_CHUNK_SIZE: int = Field(default=1500, description="RAG文本分块大小")
     RAG_CHUNK_OVERLAP: int = Field(default=400, description="RAG文本分块重叠大小")
     RAG_SCORE_THRESHOLD: float = Field(default=0.03, description="RAG相似度阈值")
+    RAG_BACKEND: str = Field(default="simple", description="标准引擎的检索后端：simple(内存倒排索引，JSON文件)或fts(SQLite FTS5磁盘索引，启动不加载、常驻内存小)")
+    FTS_DB_PATH: str = Field(default="data/knowledge/fts/chunks.db", description="fts检索后端的SQLite数据库文件（WAL模式，多个工作进程可共享同一文件）")
     
     # 新增的RAG微调参数
     MAX_KEYWORDS_PER_QUERY: int = Field(default=20, description="针对用户查询提取的最大关键词数量")
@@ -174,15 +181,41 @@ class Settings(BaseSettings):
     PROXY_CONFIG: Dict = Field(default=PROXY_CONFIG, description="代理配置")
     
     # 日志配置
-    LOG_LEVEL: str = Field(default="DEBUG", description="日志级别")
+    LOG_LEVEL: str = Field(default="INFO", description="日志级别")
     LOG_FORMAT: str = Field(
-        default="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        default="%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s",
         description="日志格式"
     )
     LOG_FILE: str = Field(
         default="logs/app.log",
         description="日志文件路径"
     )
+    LOG_TRACE_SAMPLE_RATE: float = Field(
+        default=0.05,
+        description="DEBUG级别下逐文档评分明细日志的采样比例(0-1)，避免热路径上为每个候选文档格式化日志"
+    )
+    
+    # 请求追踪配置
+    TRACING_ENABLED: bool = Field(default=False, description="是否记录问题的处理阶段追踪(trace)；trace中包含用户问题原文，默认关闭")
+    TRACE_SAMPLE_RATE: float = Field(default=0.05, description="追踪采样比例(0-1)，启用追踪后默认只采样5%；需要完整追踪时显式设为1.0")
+    TRACE_FILE: str = Field(default="logs/traces.jsonl", description="追踪导出文件（JSONL，按大小滚动）")
+    TRACE_MAX_BYTES: int = Field(default=10 * 1024 * 1024, description="追踪文件滚动大小（字节）")
+    TRACE_BACKUP_COUNT: int = Field(default=5, description="保留的历史追踪文件数")
+    
+    # 按需性能剖析配置（通过管理接口 /admin/profile 开启）
+    PROFILER_MAX_SECONDS: float = Field(default=300.0, description="单次剖析的最长持续时间（秒）")
+    PROFILER_SAMPLE_INTERVAL: float = Field(default=0.01, description="栈采样间隔（秒）")
+    
+    # 慢查询日志配置
+    SLOW_QUERY_LOG_ENABLED: bool = Field(default=True, description="是否记录慢查询的检索执行计划")
+    SLOW_QUERY_THRESHOLD_MS: float = Field(default=5000.0, description="慢查询阈值（毫秒，端到端耗时）")
+    SLOW_QUERY_FILE: str = Field(default="logs/slow_queries.jsonl", description="慢查询日志文件（JSONL，按大小滚动）")
+    SLOW_QUERY_MAX_BYTES: int = Field(default=10 * 1024 * 1024, description="慢查询日志滚动大小（字节）")
+    SLOW_QUERY_BACKUP_COUNT: int = Field(default=5, description="保留的历史慢查询日志文件数")
+    SLOW_QUERY_TOP_SCORES: int = Field(default=5, description="慢查询日志中记录得分明细的文档数")
+    
+    # 运行看板配置
+    DASHBOARD_WINDOW_SECONDS: int = Field(default=60, description="看板滑动窗口长度（秒），QPS和分位数按此窗口计算")
     
     # 会话配置
     SESSION_EXPIRE_DAYS: int = Field(default=7, description="会话过期天数")
@@ -190,6 +223,27 @@ class Settings(BaseSettings):
     
     # 系统性能配置
     MAX_WORKERS: int = Field(default=4, description="最大工作进程数")
+    INGEST_PAGES_PER_TASK: int = Field(default=8, description="并行摄取时每个任务包含的PDF页数")
+    
+    # OCR配置（扫描版PDF页面）
+    OCR_ENABLED: bool = Field(default=True, description="摄取时是否对纯图像页面进行OCR")
+    TESSERACT_CMD: str = Field(default="tesseract", description="本地tesseract可执行文件")
+    OCR_LANG: str = Field(default="chi_sim+eng", description="OCR识别语言")
+    OCR_DPI: int = Field(default=200, description="OCR前渲染页面的分辨率")
+    OCR_MIN_TEXT_CHARS: int = Field(default=20, description="文本层少于该字符数且含图像的页面视为纯图像页面")
+    OCR_MAX_WORKERS: int = Field(default=2, description="OCR进程池大小上限")
+    OCR_TIMEOUT: int = Field(default=120, description="单页OCR超时时间(秒)")
+    OCR_CACHE_PATH: str = Field(default="data/ocr_cache", description="OCR结果缓存目录（按图像内容哈希）")
+    TOKEN_CACHE_PATH: str = Field(default="data/token_cache", description="分词结果缓存目录（按页面文本哈希和jieba词典版本）")
+    QUERY_SEG_CACHE_SIZE: int = Field(default=4096, description="查询侧分词LRU缓存条数，0表示不缓存")
+    JIEBA_USER_DICT: str = Field(default="", description="合并进jieba主词典的用户词典（每行：词 [词频] [词性]），为空表示不使用")
+    QUERY_TOKENIZER_MODE: str = Field(default="exact", description="查询分词模式：exact(posseg词性标注)或fast(jieba.lcut+词性查表)")
+    JIEBA_WARMUP: bool = Field(default=True, description="启动时是否在后台线程预热jieba")
+    DEDUP_ENABLED: bool = Field(default=True, description="构建索引时是否合并近重复文本块")
+    DEDUP_THRESHOLD: float = Field(default=0.85, description="近重复判定的Jaccard相似度阈值（MinHash估计）")
+    DEDUP_NUM_PERM: int = Field(default=64, description="MinHash签名长度")
+    DEDUP_BANDS: int = Field(default=16, description="LSH分段数，须整除DEDUP_NUM_PERM")
+    DEDUP_SHINGLE_SIZE: int = Field(default=5, description="计算MinHash时的字符shingle长度")
     TIMEOUT: int = Field(default=30, description="请求超时时间(秒)")
     MAX_REQUEST_SIZE: int = Field(default=1024*1024, description="最大请求大小(字节)")
     
@@ -230,7 +284,8 @@ class Settings(BaseSettings):
     
     # 规范化所有路径字段
     @validator("BASE_DIR", "KNOWLEDGE_BASE_PATH", "VECTOR_STORE_PATH", 
-              "SESSION_STORAGE_PATH", "INDEX_PATH", "TXT_PATH", "LOG_FILE")
+              "SESSION_STORAGE_PATH", "INDEX_PATH", "TXT_PATH", "LOG_FILE", "OCR_CACHE_PATH",
+              "TOKEN_CACHE_PATH", "TRACE_FILE", "SLOW_QUERY_FILE", "FTS_DB_PATH")
     def normalize_paths(cls, v):
         """规范化路径，转换为项目根目录下的绝对路径"""
         return normalize_path(v)
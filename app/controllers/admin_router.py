@@ -0,0 +1,160 @@
+"""
+竞赛智能客服系统 - 管理接口路由
+提供索引后台重建、状态查询和回滚、知识库目录监听状态以及按需性能剖析，需在请求头 X-Admin-Token 中携带 ADMIN_TOKEN
+"""
+import asyncio
+import secrets
+import logging
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.utils import profiler
+from app.utils.jieba_helper import jieba_status
+from app.utils.tokenizer import tokenizer_cache_stats
+
+logger = logging.getLogger(__name__)
+
+# 已注册的可热替换索引引擎：名称 -> 引擎（需实现 start_background_rebuild/rollback_index/index_status）
+index_registry: Dict[str, Any] = {}
+
+
+# 已注册的目录监听器：名称 -> 监听器（需实现 status）
+watcher_registry: Dict[str, Any] = {}
+
+
+def register_index(name: str, engine: Any):
+    """注册一个支持后台重建和原子替换的索引引擎"""
+    index_registry[name] = engine
+    logger.info(f"管理接口已注册索引引擎: {name} ({engine.__class__.__name__})")
+
+
+def register_watcher(name: str, watcher: Any):
+    """注册一个目录监听器，其状态通过管理接口查询"""
+    watcher_registry[name] = watcher
+    logger.info(f"管理接口已注册目录监听器: {name}")
+
+
+def refresh_indexes(full: bool = False) -> bool:
+    """
+    在后台增量重建所有已注册的索引
+    
+    Returns:
+        全部成功启动时返回True；有索引正在重建时返回False，由调用方稍后重试
+    """
+    started = True
+    for name, engine in index_registry.items():
+        if not engine.start_background_rebuild(full=full):
+            logger.info(f"索引 {name} 正在重建，本次跳过")
+            started = False
+    return started
+
+
+async def verify_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """校验管理令牌；未配置ADMIN_TOKEN时管理接口整体关闭"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="管理接口未启用，请配置ADMIN_TOKEN")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="管理令牌无效")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(verify_admin_token)])
+
+
+def _get_engine(name: str) -> Any:
+    engine = index_registry.get(name)
+    if engine is None:
+        raise HTTPException(status_code=404, detail=f"未知的索引: {name}")
+    return engine
+
+
+@router.get("/index")
+async def get_index_status():
+    """所有已注册索引的当前代、上一代和后台重建状态"""
+    return {name: engine.index_status() for name, engine in index_registry.items()}
+
+
+@router.post("/index/{name}/rebuild")
+async def rebuild_index(name: str, full: bool = False):
+    """在后台构建新一代索引，完成后原子替换；重建期间检索继续使用当前代"""
+    engine = _get_engine(name)
+    if not engine.start_background_rebuild(full=full):
+        raise HTTPException(status_code=409, detail="已有重建任务正在运行")
+    logger.info(f"管理接口触发索引重建: {name}, full={full}")
+    return {"index": name, "started": True, "full": full, "status": engine.index_status()}
+
+
+@router.post("/index/{name}/rollback")
+async def rollback_index(name: str):
+    """回滚到上一代索引（内存引用即时切换，重新落盘放到线程中执行）"""
+    engine = _get_engine(name)
+    if not await asyncio.to_thread(engine.rollback_index):
+        raise HTTPException(status_code=409, detail="没有可回滚的上一代索引")
+    logger.info(f"管理接口回滚索引: {name}")
+    return {"index": name, "rolled_back": True, "status": engine.index_status()}
+
+
+@router.get("/watcher")
+async def get_watcher_status():
+    """知识库目录监听器状态：监听方式、最近一次扫描/触发时间、待处理变化和错误"""
+    return {name: watcher.status() for name, watcher in watcher_registry.items()}
+
+
+@router.get("/caches")
+async def get_cache_stats():
+    """查询内存缓存的命中情况"""
+    return {"query_segmentation": tokenizer_cache_stats(), "jieba": jieba_status()}
+
+
+@router.post("/profile/start")
+async def start_profile(mode: str = profiler.SAMPLE, seconds: Optional[float] = None, requests: int = 0,
+                        interval_ms: Optional[float] = None, include_idle: bool = False):
+    """
+    在本进程开启性能剖析，持续 seconds 秒或处理完 requests 个问题后自动停止
+    （多worker部署时只剖析处理本请求的worker）
+    """
+    try:
+        session = profiler.start_profiling(mode, seconds, requests,
+                                           interval_ms / 1000 if interval_ms else None, include_idle)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return session.status()
+
+
+@router.post("/profile/stop")
+async def stop_profile():
+    session = profiler.stop_profiling()
+    if session is None:
+        raise HTTPException(status_code=404, detail="尚未进行过性能剖析")
+    return session.status()
+
+
+@router.get("/profile")
+async def get_profile_status():
+    session = profiler.current_session()
+    return session.status() if session else {"running": False}
+
+
+@router.get("/profile/result")
+async def get_profile_result(format: str = "collapsed", sort: str = "cumulative", limit: int = 60):
+    """
+    最近一次剖析的结果：
+    collapsed（折叠栈文本）、speedscope（JSON，可直接拖入 speedscope.app）、pstats（cprofile 模式）
+    """
+    session = profiler.current_session()
+    if session is None:
+        raise HTTPException(status_code=404, detail="尚未进行过性能剖析")
+    try:
+        if format == "collapsed":
+            return PlainTextResponse(session.collapsed())
+        if format == "speedscope":
+            return session.speedscope()
+        if format == "pstats":
+            return PlainTextResponse(session.pstats_text(sort, limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    raise HTTPException(status_code=400, detail=f"未知的结果格式: {format}，可选 collapsed、speedscope、pstats")
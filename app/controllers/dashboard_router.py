@@ -0,0 +1,45 @@
+"""
+竞赛智能客服系统 - 运行看板路由
+/dashboard 看板页面，/api/dashboard 当前快照，/ws/dashboard 每秒推送一次快照
+"""
+import logging
+from typing import Any, Dict
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse
+
+from app.config import normalize_path
+from app.utils.dashboard import dashboard_collector
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["dashboard"])
+
+DASHBOARD_PAGE = normalize_path("app/views/static/templates/dashboard.html")
+
+
+@router.get("/dashboard")
+async def get_dashboard_page():
+    return FileResponse(DASHBOARD_PAGE, media_type="text/html; charset=utf-8")
+
+
+@router.get("/api/dashboard")
+async def get_dashboard_snapshot() -> Dict[str, Any]:
+    return dashboard_collector.latest()
+
+
+@router.websocket("/ws/dashboard")
+async def dashboard_websocket(websocket: WebSocket):
+    """看板推送通道：连接后立即发送当前快照，之后每次采样完成推送一次"""
+    await websocket.accept()
+    dashboard_collector.subscribers += 1
+    try:
+        await websocket.send_json(dashboard_collector.latest())
+        while True:
+            await websocket.send_json(await dashboard_collector.next_snapshot())
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.debug(f"看板推送中断: {e}")
+    finally:
+        dashboard_collector.subscribers -= 1
@@ -0,0 +1,23 @@
+"""
+竞赛智能客服系统 - 健康检查路由
+/healthz 存活探针：进程能处理请求即返回200；
+/readyz 就绪探针：全部组件初始化成功才返回200，加载中、降级（部分组件失败）或初始化失败返回503，响应体为启动报告
+"""
+from typing import Any, Dict
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.utils.startup import startup_state
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/healthz")
+async def healthz() -> Dict[str, Any]:
+    return {"status": "ok", "startup": startup_state.status, "uptime_seconds": round(startup_state.elapsed(), 1)}
+
+
+@router.get("/readyz")
+async def readyz():
+    return JSONResponse(startup_state.report(), status_code=200 if startup_state.ready else 503)
@@ -12,6 +12,7 @@ import json
 from ..api.session import SessionManager
 from ..models.mcp_engine import MCPEngine
 from ..services.data import DataProcessor
+from ..utils.dashboard import dashboard_collector
 
 # 初始化组件
 router = APIRouter()
@@ -89,17 +90,18 @@ async def get_stats():
             for session in session_manager.sessions.values()
         )
         
-        # 获取平均响应时间
-        avg_response_time = 100  # 示例值，实际应从性能监控中获取
-        
-        # 获取准确率
-        accuracy = 95  # 示例值，实际应从评估系统中获取
+        # 平均响应时间（毫秒）和高置信度回答占比，取自运行看板的滑动窗口；
+        # 系统没有人工评估的准确率，不再返回写死的示例值
+        snapshot = dashboard_collector.latest()
+        answered = snapshot["latency"]["request"].get("answered")
+        avg_response_time = round(answered["avg"] * 1000) if answered else None
         
         return {
             "active_sessions": active_sessions,
             "today_queries": today_queries,
             "avg_response_time": avg_response_time,
-            "accuracy": accuracy
+            "confident_answer_rate": snapshot["answers"]["confident_rate"],
+            "qps": snapshot["qps"]["window"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
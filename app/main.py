@@ -11,27 +11,17 @@ import asyncio
 from typing import Dict, List, Any, Optional
 import uuid
 from datetime import datetime
-import sys
 
 # --- 日志配置（在所有其他应用代码之前） ---
 from app.config import settings as config, normalize_path
+from app.utils.logging import setup_queue_logging, stop_queue_logging
+from app.utils.startup import startup_state, FAILED
 
-# 确保日志目录存在
-log_dir = os.path.dirname(config.LOG_FILE)
-os.makedirs(log_dir, exist_ok=True)
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format=config.LOG_FORMAT,
-    handlers=[
-        logging.FileHandler(config.LOG_FILE, encoding='utf-8'),
-        logging.StreamHandler(sys.stdout) 
-    ],
-    force=True
-)
+# 日志级别取自 settings.LOG_LEVEL；请求线程只把日志放入队列，写文件和控制台由后台线程完成
+setup_queue_logging(config.LOG_LEVEL, config.LOG_FILE, config.LOG_FORMAT)
 
 logger = logging.getLogger(__name__)
-logger.debug(f"app/main.py 模块加载：日志系统已配置为 DEBUG 级别。LOG_FILE: {config.LOG_FILE}")
+logger.debug(f"app/main.py 模块加载：日志系统已配置为 {config.LOG_LEVEL} 级别。LOG_FILE: {config.LOG_FILE}")
 # --- 日志配置结束 ---
 
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
@@ -40,13 +30,19 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 
-# 导入核心模型
-from app.models.SimpleMCPWithRAG import SimpleMCPWithRAG
-from app.models.structured_kb import StructuredCompetitionKB
-from app.models.query_router import QueryRouter
+# 核心模型（引擎及其依赖）在后台初始化时才导入，见 initialize_engines
+from app.controllers.admin_router import router as admin_router, register_index, register_watcher, refresh_indexes
+from app.controllers.metrics_router import router as metrics_router
+from app.controllers.dashboard_router import router as dashboard_router
+from app.controllers.health_router import router as health_router
 
 # 导入工具函数
-from app.utils.question_enhancer import enhance_question
+from app.utils.question_enhancer import analyze_question
+from app.utils.jieba_helper import warm_up_jieba
+from app.utils.metrics import ACTIVE_SESSIONS, ANSWERS_TOTAL, REQUEST_SECONDS, stage_timer
+from app.utils.dashboard import dashboard_collector
+from app.utils.tracing import begin_trace, end_trace
+from app.utils.slow_query import begin_explain, finish_explain
 from app.utils.response_formatter import standardize_response, format_error_response
 
 # 创建FastAPI应用
@@ -65,6 +61,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 管理接口（索引后台重建/回滚、目录监听状态）
+app.include_router(admin_router)
+
+# 运行指标（Prometheus文本格式 /metrics 与JSON快照 /metrics/json）
+app.include_router(metrics_router)
+
+# 运行看板（页面 /dashboard，1Hz推送通道 /ws/dashboard）
+app.include_router(dashboard_router)
+
+# 健康检查（存活 /healthz，就绪 /readyz）
+app.include_router(health_router)
+
 # 挂载静态文件
 app.mount("/static", StaticFiles(directory=normalize_path("app/static")), name="static")
 
@@ -74,6 +82,9 @@ templates = Jinja2Templates(directory=normalize_path("app/templates"))
 # 全局变量
 qa_engine = None
 active_sessions = {}
+knowledge_watcher = None
+
+ACTIVE_SESSIONS.set_function(lambda: len(active_sessions))
 
 @app.get("/", response_class=HTMLResponse)
 async def get_home(request: Request):
@@ -107,12 +118,15 @@ async def websocket_endpoint(websocket: WebSocket):
         }
         
         while True:
+            start_time = None
+            trace = None
+            query_explain = None
             try:
                 # 接收消息
                 data = await websocket.receive_json()
                 start_time = time.time()
                 
-                logger.debug(f"[WebSocket问答] 收到数据: {data}")
+                logger.debug("[WebSocket问答] 收到数据: %s", data)
                 
                 # 处理初始化消息
                 if data.get("action") == "init" and "session_id" in data:
@@ -147,13 +161,29 @@ async def websocket_endpoint(websocket: WebSocket):
                     })
                     continue
                 
+                # 引擎在后台初始化，还没有任何引擎可用时不处理问题（部分引擎可用时由已加载的引擎回答）
+                if qa_engine is None or not qa_engine.available():
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": "系统初始化失败，请联系管理员" if startup_state.status == FAILED else "系统正在启动，请稍后再试",
+                        "session_id": session_id,
+                        "timestamp": time.time()
+                    })
+                    continue
+                
+                # 每个问题一条trace，各处理阶段的span经contextvars关联到它
+                trace = begin_trace("ws_question", session_id=session_id, question=question)
+                # 检索执行计划，超过慢查询阈值时写入慢查询日志
+                query_explain = begin_explain(question, session_id)
+                
                 # 更新会话统计
                 if session_id in active_sessions:
                     active_sessions[session_id]["last_activity"] = time.time()
                     active_sessions[session_id]["questions_count"] += 1
                 
                 logger.info(f"[WebSocket问答] 📝 收到问题: '{question}' (会话: {session_id})")
-                logger.debug(f"[WebSocket问答] 请求时间戳: {datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"[WebSocket问答] 请求时间戳: {datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}")
                 
                 # 发送处理中状态
                 await websocket.send_json({
@@ -163,12 +193,14 @@ async def websocket_endpoint(websocket: WebSocket):
                     "timestamp": time.time()
                 })
                 
-                # 问题增强处理
+                # 问题增强处理（同时完成分词，分析结果随问题传给QA引擎，不再重复分词）
                 logger.debug(f"[WebSocket问答] 🔧 开始问题增强处理...")
+                analysis = None
                 try:
-                    enhanced_question = enhance_question(question)
-                    logger.debug(f"[WebSocket问答] 增强后问题: {enhanced_question}")
-                    question = enhanced_question
+                    with stage_timer("enhance_question"):
+                        analysis = analyze_question(question)
+                    logger.debug(f"[WebSocket问答] 增强后问题: {analysis.text}")
+                    question = analysis.text
                 except Exception as e:
                     logger.error(f"[WebSocket问答] 问题增强失败: {str(e)}")
                     logger.debug(f"[WebSocket问答] 使用原始问题继续处理")
@@ -177,10 +209,10 @@ async def websocket_endpoint(websocket: WebSocket):
                 logger.debug(f"[WebSocket问答] 🤖 开始调用QA引擎处理问题...")
                 try:
                     result = await asyncio.wait_for(
-                        qa_engine.route_query(question=question, session_id=session_id),
+                        qa_engine.route_query(question=question, session_id=session_id, analysis=analysis),
                         timeout=15.0
                     )
-                    logger.debug(f"[WebSocket问答] QA引擎返回结果: {result}")
+                    logger.debug("[WebSocket问答] QA引擎返回结果: %s", result)
                 except asyncio.TimeoutError:
                     logger.error(f"[WebSocket问答] ⏰ 问题处理超时 (>15秒)，会话: {session_id}")
                     await websocket.send_json({
@@ -193,25 +225,39 @@ async def websocket_endpoint(websocket: WebSocket):
                         "source": "timeout",
                         "error": "处理超时"
                     })
+                    REQUEST_SECONDS.observe(time.time() - start_time, outcome="timeout")
+                    finish_explain(query_explain, time.time() - start_time, "timeout")
+                    end_trace(trace, status="timeout")
                     continue
                 
                 # 格式化响应
                 logger.debug(f"[WebSocket问答] 📝 开始响应格式化...")
-                response = standardize_response(result, session_id, start_time)
-                response["type"] = "answer"  # 标记为答案类型
+                with stage_timer("format"):
+                    response = standardize_response(result, session_id, start_time)
+                    response["type"] = "answer"  # 标记为答案类型
+                    if trace is not None:
+                        response["trace_id"] = trace.trace_id
                 
                 processing_time = response.get('processing_time', 'N/A')
                 confidence = response.get('confidence', 'N/A')
                 answer_length = len(str(response.get('answer', '')))
                 
                 logger.info(f"[WebSocket问答] ✅ 问题处理完成，置信度: {confidence}, 耗时: {processing_time}秒, 答案长度: {answer_length}字符")
-                logger.debug(f"[WebSocket问答] 完整响应数据: {response}")
+                logger.debug("[WebSocket问答] 完整响应数据: %s", response)
                 
                 # 发送答案
-                await websocket.send_json(response)
+                with stage_timer("ws_send"):
+                    await websocket.send_json(response)
+                REQUEST_SECONDS.observe(time.time() - start_time, outcome="answered")
+                finish_explain(query_explain, time.time() - start_time, "answered",
+                               confidence=confidence, answer_chars=answer_length)
+                confident = isinstance(confidence, (int, float)) and confidence >= config.MCP_CONFIDENCE_THRESHOLD
+                ANSWERS_TOTAL.inc(confident="yes" if confident else "no")
+                end_trace(trace, confidence=confidence, answer_chars=answer_length)
                 
             except WebSocketDisconnect:
                 logger.info(f"[WebSocket问答] 🔌 客户端断开连接: {session_id}")
+                end_trace(trace, status="disconnected")
                 break
             except json.JSONDecodeError as json_err:
                 logger.error(f"[WebSocket问答] JSON解析错误: {str(json_err)}")
@@ -226,6 +272,10 @@ async def websocket_endpoint(websocket: WebSocket):
                     break
             except Exception as e:
                 logger.error(f"[WebSocket问答] 处理消息时出错: {str(e)}", exc_info=True)
+                if start_time is not None:
+                    REQUEST_SECONDS.observe(time.time() - start_time, outcome="error")
+                    finish_explain(query_explain, time.time() - start_time, "error", error=str(e))
+                end_trace(trace, status="error", error=type(e).__name__)
                 try:
                     await websocket.send_json({
                         "type": "error",
@@ -292,11 +342,75 @@ async def websocket_test(websocket: WebSocket):
     finally:
         logger.info(f"🧪 WebSocket测试连接已关闭: {test_session_id}")
 
+def on_knowledge_change(changes) -> bool:
+    """知识库目录变化：增量更新结构化知识库，并在后台重建所有已注册索引"""
+    structured_kb = getattr(qa_engine, "structured_kb", None)
+    if structured_kb is not None:
+        structured_kb.refresh()
+    return refresh_indexes()
+
+def _import_engines():
+    """导入引擎模块（连带 langchain、PyMuPDF、numpy 等依赖），在工作线程中执行"""
+    from app.models.query_router import QueryRouter
+    from app.models.mcp_engine import preload_llm_client
+    from app.services.ingestion import FolderWatcher
+    return QueryRouter, preload_llm_client, FolderWatcher
+
+async def initialize_engines():
+    """
+    后台初始化引擎：标准引擎、增强引擎、结构化知识库和大模型客户端互不依赖，在工作线程中并行构造
+    （STARTUP_PARALLEL_INIT=false 时依次构造）。每个组件加载完成后立即在查询路由器中启用，
+    问题先由已加载的引擎回答（如结构化知识库先于两个索引加载完成）。全部组件都成功才标记就绪，
+    增强引擎、结构化知识库或大模型客户端失败时标记为降级，/readyz 保持503
+    """
+    global qa_engine, knowledge_watcher
+    
+    try:
+        start = time.perf_counter()
+        QueryRouter, preload_llm_client, FolderWatcher = await asyncio.to_thread(_import_engines)
+        startup_state.record_phase("engine_imports", time.perf_counter() - start)
+        
+        router = QueryRouter(components={})
+        qa_engine = router
+        
+        def on_component(name: str, component: Any):
+            if component is None or name not in router.component_factories():
+                return
+            router.install(name, component)
+            if name in ("standard_engine", "enhanced_engine"):
+                # 注册可在后台重建并原子替换的索引，知识库变化时一并刷新
+                for index_name, engine in component.index_engines().items():
+                    register_index(index_name, engine)
+            startup_state.mark_serving()
+        
+        factories = QueryRouter.component_factories()
+        factories["llm_client"] = preload_llm_client
+        instances = await startup_state.initialize_components(factories, parallel=config.STARTUP_PARALLEL_INIT,
+                                                              on_component=on_component)
+        
+        if router.standard_engine is None:
+            startup_state.mark_failed("标准引擎初始化失败")
+            return
+        if router.enhanced_engine is None:
+            logger.warning("⚠️ 增强引擎初始化失败，竞赛相关问题由标准引擎回答")
+        else:
+            logger.info("✅ 使用双引擎问答系统(结构化知识库 + 语义搜索)")
+        
+        # 监听知识库目录，新文档放入后自动增量摄取并热替换索引，无需手动重建和重启
+        if config.WATCH_ENABLED:
+            knowledge_watcher = FolderWatcher(config.KNOWLEDGE_BASE_PATH, on_knowledge_change)
+            knowledge_watcher.start()
+            register_watcher("knowledge_base", knowledge_watcher)
+        
+        startup_state.mark_initialized(instances)
+    except Exception as e:
+        logger.error(f"❌ 引擎初始化失败: {str(e)}", exc_info=True)
+        startup_state.mark_failed(str(e))
+
 @app.on_event("startup")
 async def startup_event():
-    """应用启动事件"""
-    global qa_engine
-    
+    """应用启动事件：只做轻量准备，引擎在后台初始化，服务立即开始接受连接"""
+    startup_state.record_phase("imports")
     try:
         logger.info("🚀 FastAPI startup_event: 尝试进行应用初始化...")
         
@@ -304,19 +418,22 @@ async def startup_event():
         os.makedirs(normalize_path("logs"), exist_ok=True)
         os.makedirs(normalize_path("data/sessions"), exist_ok=True)
         
-        # 根据配置选择QA引擎
-        try:
-            # 尝试使用双引擎系统
-            logger.info("🔄 尝试初始化双引擎查询系统...")
-            qa_engine = QueryRouter()
-            logger.info("✅ 使用双引擎问答系统(结构化知识库 + 语义搜索)")
-        except Exception as e:
-            logger.warning(f"⚠️ 双引擎初始化失败: {e}")
-            logger.info("🔄 降级到SimpleMCPWithRAG引擎...")
-            qa_engine = SimpleMCPWithRAG()
-            logger.info("✅ 使用SimpleMCPWithRAG引擎")
+        if config.LLM_BACKEND == "stub":
+            logger.warning(f"⚠️ 大模型后端为stub（模拟模型，{config.LLM_STUB_LATENCY_MS}±{config.LLM_STUB_JITTER_MS}ms），"
+                           f"回答不是真实生成的，仅用于压测")
+        
+        # 在后台加载jieba前缀词典，与索引加载并行
+        if config.JIEBA_WARMUP:
+            warm_up_jieba()
+        
+        # 运行看板每秒采样一次指标
+        dashboard_collector.start()
         
-        logger.info(f"🎯 系统启动完成 - 版本: {config.VERSION}")
+        # 引擎在后台并行初始化，完成前 /ws 对问题返回"正在启动"
+        app.state.engine_init_task = asyncio.create_task(initialize_engines())
+        startup_state.record_phase("accepting_connections")
+        
+        logger.info(f"🎯 系统启动完成，引擎后台初始化中 - 版本: {config.VERSION}")
         logger.info(f"🌐 WebSocket服务运行在: ws://localhost:{config.API_PORT}/ws")
         logger.info(f"🏠 Web界面访问: http://localhost:{config.API_PORT}")
         logger.info(f"📚 知识库路径: {config.KNOWLEDGE_BASE_PATH}")
@@ -330,11 +447,27 @@ async def shutdown_event():
     """应用关闭事件"""
     logger.info("🛑 系统正在关闭...")
     
+    # 引擎仍在后台初始化时取消（工作线程中正在进行的构造会自行结束），先于目录监听停止，避免关闭后再启动监听
+    engine_init_task = getattr(app.state, "engine_init_task", None)
+    if engine_init_task is not None:
+        engine_init_task.cancel()
+        try:
+            await engine_init_task
+        except asyncio.CancelledError:
+            pass
+        app.state.engine_init_task = None
+    
+    if knowledge_watcher is not None:
+        knowledge_watcher.stop()
+    
+    await dashboard_collector.stop()
+    
     # 通知所有活跃的WebSocket连接
     logger.info(f"📊 当前活跃会话数: {len(active_sessions)}")
     active_sessions.clear()
     
     logger.info("✅ 系统关闭完成")
+    stop_queue_logging()
 
 if __name__ == "__main__":
     import uvicorn
@@ -11,6 +11,8 @@ from typing import Dict, List, Any, Optional, Union, Tuple
 
 from app.models.mcp_engine import generate_response
 from app.config import settings
+from app.utils.metrics import stage_timer
+from app.utils.slow_query import explain
 
 logger = logging.getLogger(__name__)
 
@@ -53,26 +55,28 @@ class MCPWithContext:
         logger.info(f"MCPWithContext接收问题: {question}")
         
         try:
-            # 处理上下文
-            if isinstance(context, list):
-                # 如果是文档列表，提取内容
-                context_texts = []
-                for doc in context:
-                    if isinstance(doc, dict) and "content" in doc:
-                        context_texts.append(doc["content"])
-                context_text = "\n\n".join(context_texts)
-            else:
-                # 直接使用上下文文本
-                context_text = context
-            
-            # 记录上下文长度
-            logger.info(f"上下文长度: {len(context_text)} 字符")
-            
-            # 构建提示
-            prompt = self.prompt_template.format(
-                context=context_text,
-                question=question
-            )
+            with stage_timer("context_build"):
+                # 处理上下文
+                if isinstance(context, list):
+                    # 如果是文档列表，提取内容
+                    context_texts = []
+                    for doc in context:
+                        if isinstance(doc, dict) and "content" in doc:
+                            context_texts.append(doc["content"])
+                    context_text = "\n\n".join(context_texts)
+                else:
+                    # 直接使用上下文文本
+                    context_text = context
+                
+                # 记录上下文长度
+                logger.info(f"上下文长度: {len(context_text)} 字符")
+                explain(context_chars=len(context_text))
+                
+                # 构建提示
+                prompt = self.prompt_template.format(
+                    context=context_text,
+                    question=question
+                )
             
             # 调用模型生成回答
             raw_response = await generate_response(
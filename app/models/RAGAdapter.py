@@ -3,6 +3,7 @@
 统一不同RAG实现的接口，解决组件间接口不一致问题
 """
 
+import asyncio
 import logging
 import inspect
 from typing import Dict, List, Any, Optional, Callable
@@ -117,11 +118,11 @@ class RAGAdapter:
             重建是否成功
         """
         try:
-            if hasattr(self.rag, 'rebuild_index'):
+            if hasattr(self.rag, 'rebuild_index') and inspect.iscoroutinefunction(self.rag.rebuild_index):
                 return await self.rag.rebuild_index()
-            elif hasattr(self.rag, 'rebuild_index') and not inspect.iscoroutinefunction(self.rag.rebuild_index):
-                # 处理同步rebuild_index方法
-                return self.rag.rebuild_index()
+            elif hasattr(self.rag, 'rebuild_index'):
+                # 同步rebuild_index方法放到线程中执行，避免阻塞事件循环
+                return await asyncio.to_thread(self.rag.rebuild_index)
             else:
                 logger.warning("RAGAdapter: 底层RAG实现没有rebuild_index方法")
                 return False
@@ -12,6 +12,8 @@ from typing import Dict, List, Any, Optional
 from app.models.MCPWithContext import MCPWithContext
 from app.models.SimpleRAG import SimpleRAG
 from app.models.RAGAdapter import RAGAdapter
+from app.utils.query_analysis import QueryAnalysis
+from app.utils.metrics import retrieval_timer
 from app.config import settings
 
 # 导入问题增强工具
@@ -25,17 +27,25 @@ class SimpleMCPWithRAG:
     def __init__(self):
         """初始化简化版MCP+RAG引擎"""
         self.mcp = MCPWithContext()
-        # 使用RAGAdapter适配SimpleRAG，避免接口不一致问题
-        self.rag = RAGAdapter(SimpleRAG(rebuild_index=False))
+        # 使用RAGAdapter适配检索后端（SimpleRAG 或 SQLite FTS5），避免接口不一致问题
+        if settings.RAG_BACKEND == "fts":
+            from app.models.fts_rag import FtsRAG
+            self.rag_name = "fts_rag"
+            self.rag = RAGAdapter(FtsRAG(rebuild_index=False))
+        else:
+            self.rag_name = "simple_rag"
+            self.rag = RAGAdapter(SimpleRAG(rebuild_index=False))
         logger.info("极简化版MCP+RAG引擎初始化完成")
         
-    async def query(self, question: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+    async def query(self, question: str, session_id: Optional[str] = None,
+                    analysis: Optional[QueryAnalysis] = None) -> Dict[str, Any]:
         """
         处理用户问题并返回回答
         
         Args:
             question: 用户问题
             session_id: 会话ID
+            analysis: 查询分析结果，检索时复用其分词
         
         Returns:
             包含回答和元数据的字典
@@ -48,7 +58,8 @@ class SimpleMCPWithRAG:
             original_question = question
             
             # 1. 直接搜索文档 - 通过适配器调用
-            docs = await self.rag.search(question)
+            with retrieval_timer(self.rag_name):
+                docs = await self.rag.search(question, analysis=analysis)
             
             # 构建标准响应格式
             response = {
@@ -193,20 +204,22 @@ class SimpleMCPWithRAG:
                 "error_message": str(e)
             }
     
-    async def route_query(self, question: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+    async def route_query(self, question: str, session_id: Optional[str] = None,
+                          analysis: Optional[QueryAnalysis] = None) -> Dict[str, Any]:
         """
         统一的查询路由方法，提供标准化响应
         
         Args:
             question: 用户问题
             session_id: 会话ID
+            analysis: 查询分析结果
             
         Returns:
             标准化响应字典
         """
         try:
             # 调用查询方法处理问题
-            result = await self.query(question, session_id)
+            result = await self.query(question, session_id, analysis=analysis)
             
             # 确保结果是字典类型
             if not isinstance(result, dict):
@@ -241,6 +254,10 @@ class SimpleMCPWithRAG:
                 "session_id": session_id or f"session_{int(time.time())}"
             }
             
+    def index_engines(self) -> Dict[str, Any]:
+        """支持后台重建和原子替换的索引引擎（供管理接口使用）"""
+        return {self.rag_name: self.rag.rag}
+    
     async def diagnose(self) -> Dict[str, Any]:
         """系统诊断"""
         try:
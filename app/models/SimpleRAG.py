@@ -5,17 +5,30 @@
 
 import os
 import re
+import hashlib
 import logging
 # 使用自定义jieba帮助模块
-from app.utils.jieba_helper import jieba, pseg
+from app.utils.jieba_helper import jieba, pseg, dictionary_version
+from app.utils.tokenizer import tokenize_query
+from app.utils.logging import trace_enabled
+from app.utils.tracing import set_attributes
+from app.utils.slow_query import explain_lazy, explain_section
 import math
 import json
 from collections import defaultdict
 from typing import List, Dict, Any, Tuple, Optional, Set
-import fitz  # PyMuPDF
 import time
+import threading
+from dataclasses import dataclass, field
 
 from app.config import settings
+from app.utils.query_analysis import QueryAnalysis
+from app.services.ingestion import (
+    IngestionPipeline, IngestionTask, StageTimer, SourceManifest, extract_pages, ocr_params,
+    GenerationSlot, GenerationStore, BackgroundRebuilder, atomic_write_json,
+    TokenCache, split_by_whitespace,
+    NearDuplicateIndex, DedupStats, duplicate_sources_to_reingest, without_stale_duplicates, merged_competitions
+)
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +70,66 @@ COMPETITION_TERMS = {
     ]
 }
 
+@dataclass(frozen=True)
+class IndexGeneration:
+    """一代不可变的检索索引：发布后不再修改，增量构建在副本上进行"""
+    generation_id: int
+    index: Dict[str, List[str]]  # 词 -> 文档ID列表
+    documents: Dict[str, Dict[str, Any]]  # 文档ID -> 文档内容
+    competition_docs: Dict[str, List[str]]  # 竞赛类型 -> 文档ID列表
+    sources: Dict[str, Dict[str, Any]]  # 源文件清单条目（与本代索引一致，回滚时一并恢复）
+    created_at: float = field(default_factory=time.time)
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "generation_id": self.generation_id,
+            "created_at": self.created_at,
+            "documents": len(self.documents),
+            "keywords": len(self.index),
+            "sources": len(self.sources)
+        }
+
+def _ingest_pdf_pages(task: IngestionTask, options: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """
+    并行摄取工作函数：提取任务页段文本、分块并提取每块关键词
+    
+    每页只做一次词性标注，结果按页面文本哈希缓存；文本块的分词结果由整页结果按空白片段拼出，
+    因此只调整分块或关键词参数时重建不会重新运行pseg
+    :param task: 摄取任务（PDF文件的一段页面）
+    :param options: SimpleRAG._ingestion_options() 返回的参数
+    :return: (文本块记录列表, 各阶段耗时)
+    """
+    engine = SimpleRAG._from_ingestion_options(options)
+    token_cache = TokenCache(options["token_cache_version"], options.get("token_cache_dir"))
+    timer = StageTimer()
+    records = []
+    
+    pages = extract_pages(task, options.get("ocr_pages", {}).get(task.path))
+    while True:
+        with timer.stage("extract"):
+            page = next(pages, None)
+        if page is None:
+            break
+        page_num, text = page
+        if not text.strip():
+            continue
+        
+        with timer.stage("segment"):
+            pieces = split_by_whitespace(token_cache.tokenize(text, pseg.lcut))
+        
+        with timer.stage("chunk"):
+            chunks = [chunk for chunk in engine._split_text(text) if chunk.strip()]
+        
+        with timer.stage("keywords"):
+            for chunk in chunks:
+                words_with_pos = [token for piece in chunk.split()
+                                  for token in (pieces.get(piece) or pseg.lcut(piece))]
+                keywords = engine._extract_keywords(chunk, max_count=engine.max_keywords_per_chunk, for_query=False,
+                                                    words_with_pos=words_with_pos)
+                records.append({"content": chunk, "page": page_num + 1, "keywords": keywords})
+    
+    return records, timer.totals
+
 class SimpleRAG:
     """简化版RAG引擎，使用文本索引代替向量存储"""
     
@@ -76,10 +149,15 @@ class SimpleRAG:
         # 整合术语库
         self.competition_terms = COMPETITION_TERMS
         
-        # 文档索引结构
-        self.index = {}  # 词 -> 文档ID列表
-        self.documents = {}  # 文档ID -> 文档内容
-        self.competition_docs = defaultdict(list)  # 竞赛类型 -> 文档ID列表
+        # 最近一次索引构建的各阶段耗时
+        self.last_build_report: Dict[str, Any] = {}
+        
+        # 文档索引结构：当前代/上一代索引，重建在后台生成新一代后原子替换
+        self._generations = GenerationSlot(IndexGeneration(0, {}, {}, {}, {}))
+        self._store = GenerationStore(self.index_path, "simple")  # 每代索引文件落在独立目录，经指针原子切换
+        self._rebuilder = BackgroundRebuilder("simple_rag")
+        self._build_lock = threading.Lock()  # 同一时间只允许一个构建
+        self._publish_lock = threading.Lock()  # 落盘与发布/回滚互斥，保证磁盘与内存一致
         
         # 检索参数设置 - 从新的配置项中加载
         self.score_threshold = settings.RAG_SCORE_THRESHOLD
@@ -155,129 +233,349 @@ class SimpleRAG:
         
         logger.info(f"简化版RAG引擎初始化完成，索引包含 {len(self.documents)} 个文档片段，阈值设置为 {self.score_threshold}")
     
+    @property
+    def index(self) -> Dict[str, List[str]]:
+        """当前代索引：词 -> 文档ID列表"""
+        return self._generations.current.index
+    
+    @property
+    def documents(self) -> Dict[str, Dict[str, Any]]:
+        """当前代索引：文档ID -> 文档内容"""
+        return self._generations.current.documents
+    
+    @property
+    def competition_docs(self) -> Dict[str, List[str]]:
+        """当前代索引：竞赛类型 -> 文档ID列表"""
+        return self._generations.current.competition_docs
+    
     def _index_exists(self) -> bool:
-        """检查索引文件是否存在"""
-        index_file = os.path.join(self.index_path, "index.json")
-        docs_file = os.path.join(self.index_path, "documents.json")
-        comp_file = os.path.join(self.index_path, "competition_docs.json")
-        return os.path.exists(index_file) and os.path.exists(docs_file) and os.path.exists(comp_file)
-    
-    def _build_index(self):
-        """构建文本索引"""
-        logger.info("开始构建文本索引...")
-        
-        # 检查知识库路径
-        if not os.path.exists(self.knowledge_base_path):
-            logger.error(f"知识库路径不存在: {self.knowledge_base_path}")
-            return
-        
-        # 清空现有索引
-        self.index = {}
-        self.documents = {}
-        self.competition_docs = defaultdict(list)
-        
-        # 处理所有PDF文件
-        pdf_files = []
-        for root, _, files in os.walk(self.knowledge_base_path):
-            for file in files:
-                if file.lower().endswith('.pdf'):
-                    pdf_files.append(os.path.join(root, file))
-        
-        logger.info(f"发现 {len(pdf_files)} 个PDF文件")
-        
-        doc_id = 0
-        for pdf_path in pdf_files:
-            try:
-                # 提取竞赛类型
-                file_name = os.path.basename(pdf_path)
-                competition_type = self._detect_competition_type(file_name)
+        """检查当前代的索引文件是否存在"""
+        directory = self._store.current_dir()
+        return all(os.path.exists(os.path.join(directory, name))
+                   for name in ("index.json", "documents.json", "competition_docs.json"))
+    
+    def _build_index(self, full: bool = False) -> Dict[str, Any]:
+        """
+        构建新一代文本索引并原子替换当前代
+        
+        当前代带有源文件清单且构建参数未变化时做增量重建：在当前代的副本上只重新摄取新增或变更的PDF，
+        并移除已删除/变更文件的文档片段和倒排项；否则全量重建。构建期间检索继续使用当前代
+        
+        合并时用MinHash/LSH把近重复文本块合并到先出现的规范文本块上，其余来源记录在规范文本块的
+        "duplicates" 中，不再单独建倒排项；重复来源属于其他竞赛类型时，规范文本块同时加入该竞赛类型的文档列表
+        :param full: 是否强制全量重建
+        :return: 构建报告
+        """
+        with self._build_lock:
+            logger.info("开始构建文本索引...")
+            
+            # 检查知识库路径
+            if not os.path.exists(self.knowledge_base_path):
+                logger.error(f"知识库路径不存在: {self.knowledge_base_path}")
+                return self.last_build_report
+            
+            # 处理所有PDF文件
+            pdf_files = []
+            for root, _, files in os.walk(self.knowledge_base_path):
+                for file in files:
+                    if file.lower().endswith('.pdf'):
+                        pdf_files.append(os.path.join(root, file))
+            
+            logger.info(f"发现 {len(pdf_files)} 个PDF文件")
+            
+            base = self._generations.current
+            manifest = self._source_manifest()
+            # 磁盘上的清单记录了当前代的构建参数（含jieba词典版本），参数变化时 load() 返回False，改为全量重建
+            incremental = not full and bool(base.documents) and bool(base.sources) and manifest.load()
+            diff = None
+            if incremental:
+                manifest.entries = {path: dict(entry) for path, entry in base.sources.items()}
+                diff = manifest.diff(pdf_files)
+                logger.info(f"增量重建: {diff.summary()}")
+                if not diff.has_changes:
+                    manifest.save()
+                    self.last_build_report = {"mode": "incremental", "manifest": diff.summary()}
+                    logger.info("源文件未变化，沿用现有索引")
+                    return self.last_build_report
                 
-                # 处理PDF文件
-                doc = fitz.open(pdf_path)
-                for page_num in range(len(doc)):
-                    # 按页面分割，每页作为一个文档片段
-                    page = doc[page_num]
-                    text = page.get_text()
-                    
-                    if not text.strip():
-                        continue
+                # 在当前代的副本上移除变更和已删除文件的旧内容（新增文件也清理一次，覆盖上次部分页段失败残留的片段）
+                stale_sources = {os.path.basename(path) for path in diff.to_process + diff.removed}
+                to_process = list(diff.to_process)
+                
+                # 规范文本块被移除时，合并到它上面的重复来源也要重新摄取
+                reingest = duplicate_sources_to_reingest(base.documents.values(), stale_sources)
+                if reingest:
+                    to_process += [path for path in pdf_files if os.path.basename(path) in reingest]
+                    stale_sources |= reingest
+                    logger.info(f"因规范文本块被移除，重新摄取 {len(reingest)} 个重复来源文件")
+                
+                index = {keyword: list(doc_keys) for keyword, doc_keys in base.index.items()}
+                documents = dict(base.documents)
+                competition_docs = {comp_type: list(doc_keys) for comp_type, doc_keys in base.competition_docs.items()}
+                removed = self._remove_sources(index, documents, competition_docs, stale_sources)
+                self._prune_stale_duplicates(documents, competition_docs, stale_sources)
+                for path in diff.removed:
+                    manifest.forget(path)
+                logger.info(f"已移除 {removed} 个过期文档片段")
+                pdf_files = to_process
+                doc_id = max((int(key.split("_")[1]) for key in documents), default=0)
+            else:
+                index = {}
+                documents = {}
+                competition_docs = {}
+                manifest.reset()
+                doc_id = 0
+            
+            # 按文件和页段并行提取、分块、分词，父进程按原始顺序合并
+            pipeline = IngestionPipeline()
+            results = pipeline.run(pdf_files, _ingest_pdf_pages, self._ingestion_options(), ocr=True)
+            
+            added = 0
+            competition_docs = defaultdict(list, competition_docs)
+            dedup = self._dedup_index(documents) if settings.DEDUP_ENABLED else None
+            dedup_stats = DedupStats(dedup) if dedup is not None else None
+            with pipeline.timer.stage("merge"):
+                for result in results:
+                    file_name = os.path.basename(result.task.path)
+                    competition_type = self._detect_competition_type(file_name)
                     
-                    # 以设置的块大小为单位进一步分割长文本
-                    chunks = self._split_text(text)
-                    for chunk in chunks:
-                        if not chunk.strip():
-                            continue
+                    for record in result.records:
+                        doc_key = f"doc_{doc_id + 1}"
+                        
+                        # 近重复文本块只在规范文本块上记录来源
+                        if dedup is not None:
+                            canonical = dedup.check_and_add(doc_key, record["content"])
+                            if canonical is not None:
+                                canonical_doc = dict(documents[canonical])  # 规范文本块可能属于当前代，复制后修改
+                                if competition_type and competition_type not in merged_competitions(canonical_doc):
+                                    competition_docs[competition_type].append(canonical)
+                                canonical_doc["duplicates"] = canonical_doc.get("duplicates", []) + [
+                                    {"source": file_name, "page": record["page"], "competition": competition_type}]
+                                documents[canonical] = canonical_doc
+                                dedup_stats.record(len(record["keywords"]))
+                                continue
                         
                         # 为每个文本块分配ID
                         doc_id += 1
-                        doc_key = f"doc_{doc_id}"
+                        added += 1
                         
                         # 存储文档内容
-                        self.documents[doc_key] = {
-                            "content": chunk,
+                        documents[doc_key] = {
+                            "content": record["content"],
                             "source": file_name,
-                            "page": page_num + 1,
+                            "page": record["page"],
                             "competition": competition_type
                         }
                         
-                        # 分词并创建索引 - 使用新的参数
-                        keywords = self._extract_keywords(chunk, max_count=self.max_keywords_per_chunk, for_query=False)
-                        for keyword in keywords:
-                            if keyword not in self.index:
-                                self.index[keyword] = []
-                            self.index[keyword].append(doc_key)
+                        for keyword in record["keywords"]:
+                            if keyword not in index:
+                                index[keyword] = []
+                            index[keyword].append(doc_key)
                         
                         # 按竞赛类型索引
                         if competition_type:
-                            self.competition_docs[competition_type].append(doc_key)
-                
-                logger.info(f"索引文件: {file_name}, 竞赛类型: {competition_type or '未知'}")
-            
-            except Exception as e:
-                logger.error(f"处理文件 {pdf_path} 时出错: {str(e)}")
-        
-        # 保存索引
-        self._save_index()
-        logger.info(f"索引构建完成，包含 {doc_id} 个文档片段，{len(self.index)} 个关键词")
-    
-    def _save_index(self):
-        """保存索引到文件"""
-        try:
-            # 保存索引文件
-            with open(os.path.join(self.index_path, "index.json"), "w", encoding="utf-8") as f:
-                json.dump(self.index, f, ensure_ascii=False)
+                            competition_docs[competition_type].append(doc_key)
+                    
+                    if result.task.start_page == 0:
+                        logger.info(f"索引文件: {file_name}, 竞赛类型: {competition_type or '未知'}")
             
-            # 保存文档内容
-            with open(os.path.join(self.index_path, "documents.json"), "w", encoding="utf-8") as f:
-                json.dump(self.documents, f, ensure_ascii=False)
+            # 只登记完整摄取成功（含纯图像页面OCR成功）的文件，失败的文件下次重建时会再次处理
+            failed_paths = {failed.task.path for failed in pipeline.failed}
+            for path in pdf_files:
+                if path in failed_paths:
+                    manifest.forget(path)
+                else:
+                    manifest.record(path)
             
-            # 保存竞赛文档映射
-            with open(os.path.join(self.index_path, "competition_docs.json"), "w", encoding="utf-8") as f:
-                json.dump(dict(self.competition_docs), f, ensure_ascii=False)
+            generation = IndexGeneration(
+                generation_id=self._generations.next_generation_id(),
+                index=index,
+                documents=documents,
+                competition_docs=dict(competition_docs),
+                sources=manifest.entries
+            )
             
-            logger.info("索引文件保存成功")
-        except Exception as e:
-            logger.error(f"保存索引失败: {str(e)}")
+            # 原子落盘后替换当前代
+            with pipeline.timer.stage("save"):
+                self._publish(generation)
+            self.last_build_report = pipeline.report()
+            self.last_build_report["mode"] = "incremental" if incremental else "full"
+            self.last_build_report["generation_id"] = generation.generation_id
+            if diff is not None:
+                self.last_build_report["manifest"] = diff.summary()
+            if dedup_stats is not None:
+                self.last_build_report["dedup"] = dedup_stats.report()
+                logger.info(f"近重复文本块去重: {self.last_build_report['dedup']}")
+            logger.info(f"索引构建完成(第 {generation.generation_id} 代)，新增 {added} 个文档片段，共 {len(documents)} 个文档片段，{len(index)} 个关键词")
+            logger.info(f"索引构建各阶段耗时: {self.last_build_report['stages']}")
+            return self.last_build_report
     
-    def _load_index(self):
-        """从文件加载索引"""
+    def _source_manifest(self, directory: Optional[str] = None) -> SourceManifest:
+        """
+        索引对应的源文件清单，分块、关键词参数、停用词、jieba词典或OCR启用状态变化时清单失效
+        :param directory: 清单所在的代目录，默认为当前代
+        """
+        return SourceManifest(
+            os.path.join(directory or self._store.current_dir(), "manifest.json"),
+            params={
+                "chunk_size": self.chunk_size,
+                "chunk_overlap": self.chunk_overlap,
+                "max_keywords_per_chunk": self.max_keywords_per_chunk,
+                "stopwords": hashlib.sha256("\n".join(sorted(self.stopwords)).encode("utf-8")).hexdigest()[:16],
+                "dictionary": dictionary_version(),
+                "dedup": self._dedup_params(),
+                "ocr": ocr_params()
+            }
+        )
+    
+    @staticmethod
+    def _dedup_params() -> Optional[Dict[str, Any]]:
+        """影响去重结果的参数，未启用去重时为None"""
+        if not settings.DEDUP_ENABLED:
+            return None
+        return {
+            "threshold": settings.DEDUP_THRESHOLD,
+            "num_perm": settings.DEDUP_NUM_PERM,
+            "bands": settings.DEDUP_BANDS,
+            "shingle_size": settings.DEDUP_SHINGLE_SIZE
+        }
+    
+    @staticmethod
+    def _dedup_index(documents: Dict[str, Dict[str, Any]]) -> NearDuplicateIndex:
+        """创建近重复索引，并预先加入已有的规范文本块（增量重建时新文本块也与它们比较）"""
+        dedup = NearDuplicateIndex()
+        for doc_key, doc in documents.items():
+            dedup.add(doc_key, dedup.hasher.signature(doc["content"]))
+        return dedup
+    
+    @staticmethod
+    def _remove_sources(index: Dict[str, List[str]], documents: Dict[str, Dict[str, Any]],
+                        competition_docs: Dict[str, List[str]], file_names: Set[str]) -> int:
+        """
+        从（尚未发布的）索引结构中移除指定来源文件的文档片段及其倒排项
+        :param file_names: 来源文件名集合
+        :return: 移除的文档片段数
+        """
+        stale = {key for key, doc in documents.items() if doc.get("source") in file_names}
+        if not stale:
+            return 0
+        
+        for key in stale:
+            del documents[key]
+        
+        for keyword in list(index):
+            postings = [key for key in index[keyword] if key not in stale]
+            if postings:
+                index[keyword] = postings
+            else:
+                del index[keyword]
+        
+        for comp_type in list(competition_docs):
+            docs = [key for key in competition_docs[comp_type] if key not in stale]
+            if docs:
+                competition_docs[comp_type] = docs
+            else:
+                del competition_docs[comp_type]
+        
+        return len(stale)
+    
+    @staticmethod
+    def _prune_stale_duplicates(documents: Dict[str, Dict[str, Any]], competition_docs: Dict[str, List[str]],
+                                file_names: Set[str]):
+        """
+        从（尚未发布的）索引结构中去掉指向指定来源文件的重复来源引用；
+        某竞赛类型只由这些引用带来时，规范文本块同时退出该竞赛类型的文档列表
+        :param file_names: 来源文件名集合
+        """
+        for key, doc in list(documents.items()):
+            pruned = without_stale_duplicates(doc, file_names)
+            if pruned is doc:
+                continue
+            documents[key] = pruned
+            for comp_type in merged_competitions(doc) - merged_competitions(pruned):
+                docs = [doc_key for doc_key in competition_docs.get(comp_type, []) if doc_key != key]
+                if docs:
+                    competition_docs[comp_type] = docs
+                else:
+                    competition_docs.pop(comp_type, None)
+    
+    def _ingestion_options(self) -> Dict[str, Any]:
+        """传递给摄取工作进程的分块与关键词参数"""
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "max_keywords_per_query": self.max_keywords_per_query,
+            "max_keywords_per_chunk": self.max_keywords_per_chunk,
+            "competition_types": list(self.competition_types),
+            "competition_terms": self.competition_terms,
+            "stopwords": self.stopwords,
+            "token_cache_version": dictionary_version(),
+            "token_cache_dir": settings.TOKEN_CACHE_PATH
+        }
+    
+    @classmethod
+    def _from_ingestion_options(cls, options: Dict[str, Any]) -> "SimpleRAG":
+        """在工作进程中构建只具备分块和关键词提取能力的轻量实例（不加载索引）"""
+        engine = cls.__new__(cls)
+        engine.__dict__.update(options)
+        return engine
+    
+    def _publish(self, generation: IndexGeneration):
+        """将新一代索引落盘并原子切换磁盘上的当前代，然后替换内存中的当前代；原当前代保留为上一代"""
+        with self._publish_lock:
+            self._save_generation(generation)
+            self._generations.publish(generation)
+    
+    def _save_generation(self, generation: IndexGeneration):
+        """保存一代索引：索引文件和源文件清单全部写入新的代目录后，再原子切换当前代指针"""
+        with self._store.new_generation(generation.generation_id) as directory:
+            atomic_write_json(os.path.join(directory, "index.json"), generation.index, ensure_ascii=False)
+            atomic_write_json(os.path.join(directory, "documents.json"), generation.documents, ensure_ascii=False)
+            atomic_write_json(os.path.join(directory, "competition_docs.json"), generation.competition_docs, ensure_ascii=False)
+            manifest = self._source_manifest(directory)
+            manifest.entries = generation.sources
+            manifest.save()
+        logger.info(f"索引文件保存成功: {directory}")
+    
+    def _read_index_files(self) -> Optional[IndexGeneration]:
+        """从当前代目录读取索引，失败时返回None"""
+        directory = self._store.current_dir()
         try:
             # 加载索引文件
-            with open(os.path.join(self.index_path, "index.json"), "r", encoding="utf-8") as f:
-                self.index = json.load(f)
+            with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as f:
+                index = json.load(f)
             
             # 加载文档内容
-            with open(os.path.join(self.index_path, "documents.json"), "r", encoding="utf-8") as f:
-                self.documents = json.load(f)
+            with open(os.path.join(directory, "documents.json"), "r", encoding="utf-8") as f:
+                documents = json.load(f)
             
             # 加载竞赛文档映射
-            with open(os.path.join(self.index_path, "competition_docs.json"), "r", encoding="utf-8") as f:
-                self.competition_docs = defaultdict(list, json.load(f))
-            
-            logger.info(f"成功加载索引，包含 {len(self.documents)} 个文档，{len(self.index)} 个关键词")
+            with open(os.path.join(directory, "competition_docs.json"), "r", encoding="utf-8") as f:
+                competition_docs = json.load(f)
         except Exception as e:
-            logger.error(f"加载索引失败: {str(e)}，将重建索引")
-            self._build_index()
+            logger.error(f"加载索引失败: {str(e)}")
+            return None
+        
+        # 源文件清单缺失或构建参数已变化时sources为空，下次重建将全量进行
+        manifest = self._source_manifest(directory)
+        manifest.load()
+        return IndexGeneration(
+            generation_id=self._generations.next_generation_id(),
+            index=index,
+            documents=documents,
+            competition_docs=competition_docs,
+            sources=manifest.entries
+        )
+    
+    def _load_index(self):
+        """从文件加载索引"""
+        generation = self._read_index_files()
+        if generation is not None:
+            self._generations.publish(generation)
+            logger.info(f"成功加载索引，包含 {len(self.documents)} 个文档，{len(self.index)} 个关键词")
+        else:
+            logger.info("将重建索引")
+            self._build_index(full=True)
     
     def _detect_competition_type(self, text: str) -> Optional[str]:
         """
@@ -328,12 +626,16 @@ class SimpleRAG:
             
         return best_match, best_score
     
-    def _extract_keywords(self, text: str, max_count: Optional[int] = None, for_query: bool = False) -> List[str]:
+    def _extract_keywords(self, text: str, max_count: Optional[int] = None, for_query: bool = False,
+                          words_with_pos: Optional[List[Tuple[str, str]]] = None,
+                          tokenizer_mode: Optional[str] = None) -> List[str]:
         """
         从文本中提取关键词，使用词性标注提高质量
         :param text: 输入文本
         :param max_count: 返回关键词的最大数量，默认根据for_query参数决定
         :param for_query: 是否为查询提取关键词（影响默认max_count）
+        :param words_with_pos: 已有的 (词, 词性) 分词结果（如分词缓存），为None时现场分词（查询走LRU缓存）
+        :param tokenizer_mode: 查询现场分词的模式（exact/fast），默认 QUERY_TOKENIZER_MODE；文档始终使用精确模式
         :return: 关键词列表
         """
         if not text:
@@ -355,7 +657,8 @@ class SimpleRAG:
         allowed_pos = {'n', 'v', 'a', 'nr', 'ns', 'nt', 'nz', 'vn', 'an', 'j', 'i', 'l', 'eng', 'nrt'}
         
         # 使用jieba进行分词和词性标注
-        words_with_pos = pseg.lcut(text)
+        if words_with_pos is None:
+            words_with_pos = tokenize_query(text, tokenizer_mode) if for_query else pseg.lcut(text)
         
         # 扩展对竞赛术语的识别
         competition_terms_set = set()
@@ -452,7 +755,8 @@ class SimpleRAG:
         
         return chunks
     
-    def search(self, query: str, competition_type: Optional[str] = None, top_n: int = 5, score_threshold: Optional[float] = None, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+    def search(self, query: str, competition_type: Optional[str] = None, top_n: int = 5, score_threshold: Optional[float] = None, top_k: Optional[int] = None,
+               analysis: Optional[QueryAnalysis] = None) -> List[Dict[str, Any]]:
         """
         搜索相关文档
         :param query: 用户查询
@@ -460,15 +764,20 @@ class SimpleRAG:
         :param top_n: 返回结果数量
         :param score_threshold: 相似度阈值，可选
         :param top_k: 搜索前K个结果
+        :param analysis: 查询分析结果，与查询文本一致时复用其分词
         :return: 相关文档列表，按相似度降序排列
         """
         # 使用配置值或默认值
         score_threshold = score_threshold if score_threshold is not None else self.score_threshold
         top_k = top_k if top_k is not None else settings.RAG_TOP_K
         
+        # 整个检索过程使用同一代索引，不受后台重建替换的影响
+        generation = self._generations.current
+        
         try:
             # 提取关键词，使用参数来限制关键词数量
-            keywords = self._extract_keywords(query, max_count=self.max_keywords_per_query, for_query=True)
+            keywords = self._extract_keywords(query, max_count=self.max_keywords_per_query, for_query=True,
+                                              words_with_pos=analysis.tokens_for(query) if analysis else None)
             
             # 如果没有找到关键词，使用整个查询语句切分
             if not keywords:
@@ -493,9 +802,9 @@ class SimpleRAG:
             
             # 首先，查找与检测到的竞赛类型匹配的文档
             comp_docs = []
-            if competition_type and competition_type in self.competition_docs:
+            if competition_type and competition_type in generation.competition_docs:
                 # 获取该竞赛类型下的所有文档
-                comp_docs = self.competition_docs[competition_type]
+                comp_docs = generation.competition_docs[competition_type]
                 logger.info(f"找到{len(comp_docs)}个与竞赛类型'{competition_type}'相关的文档")
             
             # 优先评分竞赛类型相关文档
@@ -503,7 +812,7 @@ class SimpleRAG:
                 if doc_id in processed_doc_ids:
                     continue
                 
-                doc = self.documents.get(doc_id)
+                doc = generation.documents.get(doc_id)
                 if not doc:
                     continue
                 
@@ -516,16 +825,17 @@ class SimpleRAG:
                 
                 doc_scores[doc_id] = score
                 processed_doc_ids.add(doc_id)
+            comp_scored = len(doc_scores)
             
             # 然后，对所有关键词搜索所有文档
             for keyword in keywords:
-                if keyword in self.index:
-                    matching_docs = self.index[keyword]
+                if keyword in generation.index:
+                    matching_docs = generation.index[keyword]
                     for doc_id in matching_docs:
                         if doc_id in processed_doc_ids:
                             continue
                         
-                        doc = self.documents.get(doc_id)
+                        doc = generation.documents.get(doc_id)
                         if not doc:
                             continue
                         
@@ -546,12 +856,15 @@ class SimpleRAG:
             sorted_docs = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)
             
             # 使用两阶段策略：首先收集高于阈值的结果
+            # （文档内容里没有id字段，已选文档按 sorted_docs 中的 doc_id 记录，后续放宽阈值时不重复加入）
             above_threshold = []
+            selected_doc_ids = set()
             for doc_id, score in sorted_docs:
                 if score >= score_threshold:
-                    doc = self.documents.get(doc_id).copy()  # 复制文档以避免修改原始数据
+                    doc = generation.documents.get(doc_id).copy()  # 复制文档以避免修改原始数据
                     doc["score"] = score
                     above_threshold.append(doc)
+                    selected_doc_ids.add(doc_id)
             
             logger.info(f"找到{len(above_threshold)}个相似度大于阈值({score_threshold})的文档")
             
@@ -564,10 +877,11 @@ class SimpleRAG:
                 relaxed_results = []
                 
                 for doc_id, score in sorted_docs:
-                    if score >= relaxed_threshold and doc_id not in [d.get("id") for d in above_threshold]:
-                        doc = self.documents.get(doc_id).copy()
+                    if score >= relaxed_threshold and doc_id not in selected_doc_ids:
+                        doc = generation.documents.get(doc_id).copy()
                         doc["score"] = score
                         relaxed_results.append(doc)
+                        selected_doc_ids.add(doc_id)
                         if len(above_threshold) + len(relaxed_results) >= top_n:
                             break
                 
@@ -580,12 +894,12 @@ class SimpleRAG:
                     logger.info(f"仍需{remaining_count}个文档，将添加相似度较低的文档")
                     
                     # 从剩余的排序文档中添加
-                    existing_doc_ids = set(d.get("id") for d in results)
                     for doc_id, score in sorted_docs:
-                        if doc_id not in existing_doc_ids:
-                            doc = self.documents.get(doc_id).copy()
+                        if doc_id not in selected_doc_ids:
+                            doc = generation.documents.get(doc_id).copy()
                             doc["score"] = max(score, 0.01)  # 确保分数至少为正
                             results.append(doc)
+                            selected_doc_ids.add(doc_id)
                             if len(results) >= top_n:
                                 break
             else:
@@ -607,11 +921,11 @@ class SimpleRAG:
             if not results:
                 logger.warning("未找到相关文档，将返回随机文档作为后备")
                 import random
-                all_docs = list(self.documents.keys())
+                all_docs = list(generation.documents.keys())
                 # 随机选择文档
                 for _ in range(min(top_n, len(all_docs))):
                     random_doc_id = random.choice(all_docs)
-                    doc = self.documents.get(random_doc_id).copy()
+                    doc = generation.documents.get(random_doc_id).copy()
                     doc["score"] = 0.01  # 最低分数
                     doc["is_fallback"] = True  # 标记为后备文档
                     results.append(doc)
@@ -622,6 +936,13 @@ class SimpleRAG:
                 logger.error("搜索结果是None，返回空列表")
             
             logger.info(f"最终返回{len(results)}个相关文档")
+            set_attributes(keywords=len(keywords), candidates=len(doc_scores), results=len(results))
+            explain_section("simple_rag", keywords=keywords, competition_type=competition_type,
+                            detected_type=detected_type, threshold=score_threshold,
+                            candidates={"comp_docs": comp_scored, "postings": len(doc_scores) - comp_scored},
+                            above_threshold=len(above_threshold), results=len(results))
+            explain_lazy("simple_rag.top_scores", lambda: self._explain_scores(
+                generation, query, keywords, competition_type, sorted_docs, set(comp_docs)))
             return results
             
         except Exception as e:
@@ -632,7 +953,8 @@ class SimpleRAG:
             # 出错时返回空列表而不是抛出异常
             return []
     
-    def _calculate_score(self, query: str, doc_text: str, keywords: List[str], doc_competition: str, competition_type: Optional[str]) -> float:
+    def _calculate_score(self, query: str, doc_text: str, keywords: List[str], doc_competition: str, competition_type: Optional[str],
+                         details: Optional[List[str]] = None) -> float:
         """
         计算文档与查询的相关性得分
         :param query: 查询文本
@@ -640,6 +962,7 @@ class SimpleRAG:
         :param keywords: 查询关键词列表
         :param doc_competition: 文档竞赛类型
         :param competition_type: 指定竞赛类型，如果为None则搜索全部文档
+        :param details: 传入列表时把各项得分明细追加到其中（慢查询日志用）
         :return: 相关性得分
         """
         if not doc_text or not (keywords or query):
@@ -650,7 +973,9 @@ class SimpleRAG:
         query_lower = query.lower()
         
         total_score = 0.0
-        score_details = []  # 用于记录得分明细
+        # 得分明细只在启用DEBUG且命中采样时构造，生产环境不为每个候选文本块格式化字符串
+        trace = details is not None or trace_enabled(logger, settings.LOG_TRACE_SAMPLE_RATE)
+        score_details = details if details is not None else []  # 用于记录得分明细
         
         # 1. 关键词匹配得分 - 增强版：考虑词长，位置，频率
         keyword_score = 0.0
@@ -688,7 +1013,8 @@ class SimpleRAG:
                 keyword_score += kw_weight
                 matched_keywords.add(kw)
                 
-                score_details.append(f"关键词 '{kw}' (长度={len(kw)}, 频率={kw_count}, 位置因子={position_factor:.2f}, 术语加成={term_bonus:.1f}) 得分: +{kw_weight:.2f}")
+                if trace:
+                    score_details.append(f"关键词 '{kw}' (长度={len(kw)}, 频率={kw_count}, 位置因子={position_factor:.2f}, 术语加成={term_bonus:.1f}) 得分: +{kw_weight:.2f}")
         
         total_score += keyword_score
         
@@ -701,8 +1027,9 @@ class SimpleRAG:
             if total_score > 0:  # 只有存在基础分时才应用覆盖率
                 old_score = total_score
                 total_score *= coverage_factor
-                score_details.append(f"关键词覆盖率: {coverage:.2f} ({len(matched_keywords)}/{len(keywords)}), "
-                                   f"调整系数: {coverage_factor:.2f}, 得分调整: {old_score:.2f} -> {total_score:.2f}")
+                if trace:
+                    score_details.append(f"关键词覆盖率: {coverage:.2f} ({len(matched_keywords)}/{len(keywords)}), "
+                                       f"调整系数: {coverage_factor:.2f}, 得分调整: {old_score:.2f} -> {total_score:.2f}")
         
         # 3. 直接查询匹配奖励 - 增强版
         # 检查原始查询的各种部分是否存在于文档中
@@ -711,7 +1038,8 @@ class SimpleRAG:
             if query_lower in doc_lower:
                 direct_match_bonus = self.direct_query_match_bonus * 2.0  # 完整匹配奖励加倍
                 total_score += direct_match_bonus
-                score_details.append(f"完整查询匹配奖励: +{direct_match_bonus:.2f}")
+                if trace:
+                    score_details.append(f"完整查询匹配奖励: +{direct_match_bonus:.2f}")
             else:
                 # 查询子句匹配（按照标点和连词分割）
                 query_parts = re.split(r'[,，.。;；?？!！、\s]', query_lower)
@@ -721,7 +1049,8 @@ class SimpleRAG:
                     if part in doc_lower:
                         part_match_bonus = self.direct_query_match_bonus * (0.5 + 0.5 * len(part) / len(query_lower))
                         total_score += part_match_bonus
-                        score_details.append(f"查询子句 '{part}' 匹配奖励: +{part_match_bonus:.2f}")
+                        if trace:
+                            score_details.append(f"查询子句 '{part}' 匹配奖励: +{part_match_bonus:.2f}")
         
         # 4. 关键短语奖励
         for phrase, bonus in self.critical_phrases_scoring.items():
@@ -729,8 +1058,9 @@ class SimpleRAG:
                 phrase_bonus = bonus
                 if phrase.lower() in query_lower:  # 如果短语同时出现在查询和文档中
                     phrase_bonus *= 2.0  # 提高奖励
-                    score_details.append(f"关键短语(同时出现) '{phrase}': +{phrase_bonus:.2f}")
-                else:
+                    if trace:
+                        score_details.append(f"关键短语(同时出现) '{phrase}': +{phrase_bonus:.2f}")
+                elif trace:
                     score_details.append(f"关键短语 '{phrase}': +{phrase_bonus:.2f}")
                 total_score += phrase_bonus
         
@@ -747,8 +1077,9 @@ class SimpleRAG:
                     boost_factor *= 1.5
                 
                 total_score *= boost_factor
-                score_details.append(f"特定竞赛类型加成: x{boost_factor:.2f}, "
-                                   f"得分调整: {old_score:.2f} -> {total_score:.2f}")
+                if trace:
+                    score_details.append(f"特定竞赛类型加成: x{boost_factor:.2f}, "
+                                       f"得分调整: {old_score:.2f} -> {total_score:.2f}")
         
         # 6. 段落长度调整 - 偏好中等长度的文本块
         word_count = len(doc_lower.split())
@@ -761,22 +1092,46 @@ class SimpleRAG:
         if length_factor != 1.0 and total_score > 0:
             old_score = total_score
             total_score *= length_factor
-            score_details.append(f"段落长度调整 (词数={word_count}): x{length_factor:.2f}, "
-                              f"得分调整: {old_score:.2f} -> {total_score:.2f}")
+            if trace:
+                score_details.append(f"段落长度调整 (词数={word_count}): x{length_factor:.2f}, "
+                                  f"得分调整: {old_score:.2f} -> {total_score:.2f}")
         
         # 日志记录得分详情
-        log_message = f"文档得分详情: 查询='{query[:30]}...', 关键词={keywords}, " + \
-                     ", ".join(score_details) + f", 最终得分: {total_score:.4f}"
-        logger.debug(log_message)
+        if trace and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"文档得分详情: 查询='{query[:30]}...', 关键词={keywords}, "
+                         + ", ".join(score_details) + f", 最终得分: {total_score:.4f}")
         
         return total_score
     
-    def rebuild_index(self) -> bool:
-        """重建索引"""
+    def _explain_scores(self, generation, query: str, keywords: List[str], competition_type: Optional[str],
+                        ranked: List[Tuple[str, float]], comp_doc_ids: Set[str]) -> List[Dict[str, Any]]:
+        """慢查询日志：得分最高的若干文本块及其逐项得分明细（检索结束后重新计算）"""
+        rows = []
+        for doc_id, score in ranked[:settings.SLOW_QUERY_TOP_SCORES]:
+            doc = generation.documents.get(doc_id) or {}
+            details: List[str] = []
+            base_score = self._calculate_score(query, doc.get("content", ""), keywords, doc.get("competition"),
+                                               competition_type, details=details)
+            rows.append({
+                "id": doc_id,
+                "source": doc.get("source"),
+                "page": doc.get("page"),
+                "path": "comp_docs" if doc_id in comp_doc_ids else "postings",
+                "score": round(score, 4),
+                "base_score": round(base_score, 4),
+                "factors": details,
+            })
+        return rows
+    
+    def rebuild_index(self, full: bool = False) -> bool:
+        """
+        重建索引
+        :param full: 是否强制全量重建（默认按源文件清单增量重建）
+        """
         try:
             logger.info("开始重建索引...")
             start_time = time.time()
-            self._build_index()
+            self._build_index(full=full)
             elapsed_time = time.time() - start_time
             logger.info(f"索引重建完成，耗时 {elapsed_time:.2f}秒，包含 {len(self.documents)} 个文档片段，{len(self.index)} 个关键词")
             return True
@@ -784,6 +1139,32 @@ class SimpleRAG:
             logger.error(f"重建索引失败: {str(e)}")
             return False
     
+    def start_background_rebuild(self, full: bool = False) -> bool:
+        """
+        在后台线程中重建索引，完成后原子替换当前代，期间检索不受影响
+        :param full: 是否强制全量重建
+        :return: 已有重建任务在运行时返回False
+        """
+        return self._rebuilder.start(self._build_index, full=full)
+    
+    def rollback_index(self) -> bool:
+        """
+        回滚到上一代索引：内存中的引用即时切换，并将该代重新落盘
+        :return: 没有上一代可回滚时返回False
+        """
+        with self._publish_lock:
+            if not self._generations.rollback():
+                return False
+            self._save_generation(self._generations.current)
+        logger.info(f"索引已回滚到第 {self._generations.current.generation_id} 代")
+        return True
+    
+    def index_status(self) -> Dict[str, Any]:
+        """当前代/上一代索引及后台重建状态"""
+        status = self._generations.info()
+        status["rebuild"] = dict(self._rebuilder.status)
+        return status
+    
     def diagnose_knowledge_base(self) -> Dict[str, Any]:
         """
         诊断知识库状态，返回统计信息
@@ -811,7 +1192,8 @@ class SimpleRAG:
 
     # 添加特定竞赛过滤的搜索方法
     def search_with_filter(self, query: str, filter_by_comp_type: Optional[str] = None, 
-                          score_threshold: Optional[float] = None, max_results: int = 5) -> List[Dict[str, Any]]:
+                          score_threshold: Optional[float] = None, max_results: int = 5,
+                          analysis: Optional[QueryAnalysis] = None) -> List[Dict[str, Any]]:
         """
         执行带有竞赛类型过滤的文档搜索
         
@@ -820,11 +1202,13 @@ class SimpleRAG:
             filter_by_comp_type: 过滤的竞赛类型
             score_threshold: 相似度阈值，如果为None使用默认阈值
             max_results: 返回结果的最大数量
+            analysis: 查询分析结果，与查询文本一致时复用其分词
             
         Returns:
             相关文档列表
         """
         logger.info(f"执行过滤搜索: 查询='{query}', 竞赛类型='{filter_by_comp_type}'")
+        generation = self._generations.current
         
         try:
             # 使用默认阈值
@@ -832,7 +1216,8 @@ class SimpleRAG:
                 score_threshold = self.score_threshold
             
             # 提取关键词
-            keywords = self._extract_keywords(query, max_count=self.max_keywords_per_query, for_query=True)
+            keywords = self._extract_keywords(query, max_count=self.max_keywords_per_query, for_query=True,
+                                              words_with_pos=analysis.tokens_for(query) if analysis else None)
             if not keywords:
                 logger.warning(f"未能从查询中提取关键词: {query}")
                 return []
@@ -845,13 +1230,13 @@ class SimpleRAG:
             # 收集匹配的文档ID
             doc_ids = set()
             for keyword in keywords:
-                if keyword in self.index:
-                    doc_ids.update(self.index[keyword])
+                if keyword in generation.index:
+                    doc_ids.update(generation.index[keyword])
             
             # 按竞赛类型过滤文档
             filtered_doc_ids = set()
-            if is_filtered_search and filter_by_comp_type and filter_by_comp_type in self.competition_docs:
-                comp_doc_ids = set(self.competition_docs[filter_by_comp_type])
+            if is_filtered_search and filter_by_comp_type and filter_by_comp_type in generation.competition_docs:
+                comp_doc_ids = set(generation.competition_docs[filter_by_comp_type])
                 filtered_doc_ids = doc_ids.intersection(comp_doc_ids)
                 logger.info(f"按竞赛类型'{filter_by_comp_type}'过滤后剩余 {len(filtered_doc_ids)} 个文档")
             else:
@@ -865,10 +1250,10 @@ class SimpleRAG:
             # 计算文档分数
             results = []
             for doc_id in filtered_doc_ids:
-                if doc_id not in self.documents:
+                if doc_id not in generation.documents:
                     continue
                 
-                doc = self.documents[doc_id]
+                doc = generation.documents[doc_id]
                 doc_text = doc.get("content", "")
                 doc_comp_type = doc.get("competition", "")
                 
@@ -884,6 +1269,8 @@ class SimpleRAG:
                         "score": score,
                         "id": doc_id
                     }
+                    if doc.get("duplicates"):
+                        result["duplicates"] = doc["duplicates"]
                     results.append(result)
             
             # 按分数排序
@@ -897,4 +1284,4 @@ class SimpleRAG:
             return results
         except Exception as e:
             logger.error(f"过滤搜索时出错: {str(e)}", exc_info=True)
-            return [] 
\ No newline at end of file
+            return [] 
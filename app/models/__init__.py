@@ -1,22 +1,30 @@
 """
 竞赛智能客服系统 - 模型模块初始化
 定义模型组件导入
+
+组件按需导入（PEP 562 模块 __getattr__）：导入 app.models 的子模块时
+不会连带加载全部引擎及其依赖（langchain、PyMuPDF 等），缩短冷启动时间
 """
+import importlib
 
-# 导入核心组件
-from app.models.SimpleRAG import SimpleRAG
-from app.models.MCPWithContext import MCPWithContext
-from app.models.RAGAdapter import RAGAdapter
-from app.models.SimpleMCPWithRAG import SimpleMCPWithRAG
-from app.models.enhanced_rag import EnhancedRAG
-from app.models.enhanced_mcp import EnhancedMCP
+# 可导出组件 -> 所在模块
+_EXPORTS = {
+    'SimpleRAG': 'app.models.SimpleRAG',
+    'MCPWithContext': 'app.models.MCPWithContext',
+    'RAGAdapter': 'app.models.RAGAdapter',
+    'SimpleMCPWithRAG': 'app.models.SimpleMCPWithRAG',
+    'EnhancedRAG': 'app.models.enhanced_rag',
+    'EnhancedMCP': 'app.models.enhanced_mcp',
+    'FtsRAG': 'app.models.fts_rag',
+}
 
 # 设置可导出组件
-__all__ = [
-    'SimpleRAG',
-    'MCPWithContext',
-    'RAGAdapter',
-    'SimpleMCPWithRAG',
-    'EnhancedRAG',
-    'EnhancedMCP'
-]
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
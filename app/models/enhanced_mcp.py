@@ -14,6 +14,9 @@ from typing import Dict, List, Any, Tuple, Optional
 
 from app.models.enhanced_rag import EnhancedRAG
 from app.models.MCPWithContext import MCPWithContext
+from app.utils.query_analysis import QueryAnalysis
+from app.utils.question_enhancer import analyze_text
+from app.utils.metrics import retrieval_timer
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -42,13 +45,15 @@ class EnhancedMCP:
         
         logger.info(f"增强型MCP引擎初始化完成")
     
-    async def query(self, question: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+    async def query(self, question: str, session_id: Optional[str] = None,
+                    analysis: Optional[QueryAnalysis] = None) -> Dict[str, Any]:
         """
         处理用户问题并生成回答
         
         Args:
             question: 用户问题
             session_id: 会话ID
+            analysis: 查询分析结果，由QueryRouter计算一次后传入；缺省时在此计算一次
             
         Returns:
             包含回答和元数据的字典
@@ -59,12 +64,19 @@ class EnhancedMCP:
         try:
             logger.info(f"EnhancedMCP.query: 详细记录 - 原始问题: '{question}'")
             
+            # 分词和识别每个请求只做一次，检索与回答生成共用同一份结果
+            if analysis is None or analysis.text != question:
+                analysis = analyze_text(question)
+            if not analysis.detected:
+                analysis = self.rag_engine.analyze_query(analysis)
+            
             # 1. 使用RAG检索相关上下文
-            docs = await self.rag_engine.search(question, top_n=5)
+            with retrieval_timer("enhanced_rag"):
+                docs = await self.rag_engine.search(question, top_n=5, analysis=analysis)
             
             # 获取竞赛类型和问题类型识别结果
-            identified_comp_type, comp_confidence = self.rag_engine.identify_competition_type(question)
-            question_type_identified, _ = self.rag_engine.identify_question_type(question)
+            identified_comp_type, comp_confidence = analysis.competition_type, analysis.competition_confidence
+            question_type_identified = analysis.intent
 
             logger.info(f"EnhancedMCP.query: RAG识别到竞赛类型: '{identified_comp_type}', 置信度: {comp_confidence:.2f}")
             logger.info(f"EnhancedMCP.query: RAG识别到问题类型: '{question_type_identified}'")
@@ -298,6 +310,10 @@ class EnhancedMCP:
         
         return answer, confidence
     
+    def index_engines(self) -> Dict[str, Any]:
+        """支持后台重建的索引引擎（供管理接口使用）"""
+        return {"enhanced_rag": self.rag_engine}
+    
     async def diagnose(self) -> Dict[str, Any]:
         """返回引擎诊断信息"""
         # 获取RAG引擎诊断信息
@@ -11,16 +11,82 @@ import logging
 import json
 import math
 import time
+import threading
 from pathlib import Path
 from typing import List, Dict, Any, Tuple, Optional, Set
 from collections import defaultdict
+from dataclasses import dataclass, field
 
 # 导入jieba帮助模块
-from app.utils.jieba_helper import jieba, pseg
+from app.utils.jieba_helper import jieba, pseg, dictionary_version
+from app.utils.tokenizer import tokenize_query
+from app.utils.query_analysis import QueryAnalysis
+from app.utils.logging import trace_enabled
+from app.utils.tracing import set_attributes
+from app.utils.slow_query import explain_lazy, explain_section
+from app.utils.question_enhancer import analyze_text
 from app.config import settings
+from app.services.ingestion import (
+    IngestionPipeline, IngestionTask, StageTimer, SourceManifest, extract_pages, ocr_params,
+    GenerationSlot, GenerationStore, BackgroundRebuilder, atomic_write_json,
+    NearDuplicateIndex, DedupStats, duplicate_sources_to_reingest, without_stale_duplicates, merged_competitions
+)
 
 logger = logging.getLogger(__name__)
 
+
+def _ingest_txt_chunks(task: IngestionTask, options: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """
+    并行摄取工作函数：读取竞赛TXT文本，分块并提取每块关键词
+    
+    Args:
+        task: 摄取任务（整份TXT文件）
+        options: EnhancedRAG._ingestion_options() 返回的参数
+        
+    Returns:
+        (文本块记录列表, 各阶段耗时)
+    """
+    engine = EnhancedRAG._from_ingestion_options(options)
+    timer = StageTimer()
+    
+    with timer.stage("extract"):
+        content = "".join(text for _, text in extract_pages(task))
+    
+    with timer.stage("chunk"):
+        chunks = engine._split_text_into_chunks(content, engine.chunk_size, engine.chunk_overlap)
+    
+    records = []
+    with timer.stage("segment"):
+        for chunk in chunks:
+            records.append({"content": chunk, "keywords": engine._extract_keywords(chunk)})
+    
+    return records, timer.totals
+
+@dataclass(frozen=True)
+class EnhancedIndexGeneration:
+    """一代不可变的增强型检索索引：发布后不再修改，增量构建在副本上进行"""
+    generation_id: int
+    docs: List[Dict[str, Any]]  # 所有文档块，文档ID即其在列表中的位置
+    inverted_index: Dict[str, List[int]]  # 倒排索引：关键词 -> 文档ID列表
+    competition_docs: Dict[str, List[int]]  # 竞赛类型 -> 文档ID列表
+    competition_keywords: Dict[str, List[str]]  # 竞赛类型 -> 代表关键词
+    sources: Dict[str, Dict[str, Any]]  # 源文件清单条目（与本代索引一致，回滚时一并恢复）
+    created_at: float = field(default_factory=time.time)
+    
+    @property
+    def competition_types(self):
+        """所有竞赛类型"""
+        return self.competition_docs.keys()
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "generation_id": self.generation_id,
+            "created_at": self.created_at,
+            "documents": len(self.docs),
+            "keywords": len(self.inverted_index),
+            "sources": len(self.sources)
+        }
+
 class EnhancedRAG:
     """增强型RAG引擎，使用多级联合检索策略"""
     
@@ -42,7 +108,6 @@ class EnhancedRAG:
         
         # 竞赛信息表 - 建立竞赛标准名称与别名的映射
         self.competition_mapping = self._build_competition_mapping()
-        self.competition_keywords = {}  # 每个竞赛的关键词
         
         # 竞赛信息类型（用于问题分类）
         self.info_categories = {
@@ -54,21 +119,50 @@ class EnhancedRAG:
             "作品提交": ["提交", "作品", "要求", "格式", "材料", "上传", "提交方式"]
         }
         
-        # 文档索引
-        self.docs = []  # 所有文档块
-        self.inverted_index = defaultdict(list)  # 倒排索引：关键词 -> 文档ID列表
-        self.competition_docs = defaultdict(list)  # 竞赛类型 -> 文档ID列表
-        self.competition_types = set()  # 所有竞赛类型
+        # 文档索引：当前代/上一代索引，重建生成新一代后原子替换
+        self._generations = GenerationSlot(EnhancedIndexGeneration(0, [], {}, {}, {}, {}))
+        self._store = GenerationStore(os.path.dirname(self.index_file), "enhanced")  # 每代索引落在独立目录，经指针原子切换
+        self._rebuilder = BackgroundRebuilder("enhanced_rag")
+        self._build_lock = threading.Lock()  # 同一时间只允许一个构建
+        self._publish_lock = threading.Lock()  # 落盘与发布/回滚互斥，保证磁盘与内存一致
         
         # 停用词表
         self.stopwords = self._load_stopwords()
         
+        # 最近一次索引构建的各阶段耗时
+        self.last_build_report: Dict[str, Any] = {}
+        
         # 初始化索引
-        if not os.path.exists(self.index_file) or rebuild_index:
+        if not os.path.exists(self._current_index_file()) or rebuild_index:
             self._build_index()
         else:
             self._load_index()
     
+    @property
+    def docs(self) -> List[Dict[str, Any]]:
+        """当前代索引：所有文档块"""
+        return self._generations.current.docs
+    
+    @property
+    def inverted_index(self) -> Dict[str, List[int]]:
+        """当前代索引：关键词 -> 文档ID列表"""
+        return self._generations.current.inverted_index
+    
+    @property
+    def competition_docs(self) -> Dict[str, List[int]]:
+        """当前代索引：竞赛类型 -> 文档ID列表"""
+        return self._generations.current.competition_docs
+    
+    @property
+    def competition_types(self):
+        """当前代索引：所有竞赛类型"""
+        return self._generations.current.competition_types
+    
+    @property
+    def competition_keywords(self) -> Dict[str, List[str]]:
+        """当前代索引：每个竞赛的代表关键词"""
+        return self._generations.current.competition_keywords
+    
     def _build_competition_mapping(self) -> Dict[str, str]:
         """构建竞赛标准名称与别名的映射"""
         mapping = {
@@ -121,58 +215,130 @@ class EnhancedRAG:
         
         return stopwords
     
-    def _build_index(self):
-        """构建文档索引"""
-        logger.info("开始构建增强型文本索引...")
-        
-        # 确保索引目录存在
-        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+    def _build_index(self, full: bool = False) -> Dict[str, Any]:
+        """
+        构建新一代文档索引并原子替换当前代
         
-        # 1. 扫描所有PDF文件
-        pdf_files = []
-        for root, _, files in os.walk(self.knowledge_path):
-            for file in files:
-                if file.endswith(".pdf"):
-                    pdf_files.append(os.path.join(root, file))
+        先为缺少TXT的PDF从文本层提取TXT（见 _extract_txt_files），再按TXT建索引。
+        当前代带有源文件清单且构建参数未变化时做增量重建：在当前代的副本上只重新摄取新增或变更的TXT，
+        并移除已删除/变更文件的文档片段；否则全量重建。构建期间检索继续使用当前代
         
-        logger.info(f"发现 {len(pdf_files)} 个PDF文件")
+        近重复文本块合并到先出现的规范文本块上，其来源记录在 "duplicates" 中；
+        重复来源属于其他竞赛类型时，规范文本块同时加入该竞赛类型的文档列表
         
-        # 2. 预处理所有PDF文件，提取文本并分块
-        doc_id = 0
-        for pdf_file in pdf_files:
-            try:
-                # 解析文件名，提取竞赛类型
-                filename = os.path.basename(pdf_file)
-                competition_type = self._extract_competition_type(filename)
+        Args:
+            full: 是否强制全量重建
+            
+        Returns:
+            构建报告
+        """
+        with self._build_lock:
+            logger.info("开始构建增强型文本索引...")
+            
+            # 确保索引目录存在
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            
+            # 1. 扫描所有PDF文件
+            pdf_files = []
+            for root, _, files in os.walk(self.knowledge_path):
+                for file in files:
+                    if file.endswith(".pdf"):
+                        pdf_files.append(os.path.join(root, file))
+            
+            logger.info(f"发现 {len(pdf_files)} 个PDF文件")
+            
+            # 2. 准备所有PDF文件对应的TXT，之后并行分块并提取关键词
+            extract_start = time.perf_counter()
+            pdf_by_txt = self._extract_txt_files(pdf_files)
+            txt_files = list(pdf_by_txt)
+            extract_seconds = time.perf_counter() - extract_start
+            
+            base = self._generations.current
+            manifest = self._source_manifest()
+            # 磁盘上的清单记录了当前代的构建参数（含jieba词典版本），参数变化时 load() 返回False，改为全量重建
+            incremental = not full and bool(base.docs) and bool(base.sources) and manifest.load()
+            diff = None
+            if incremental:
+                manifest.entries = {path: dict(entry) for path, entry in base.sources.items()}
+                diff = manifest.diff(txt_files)
+                logger.info(f"增量重建: {diff.summary()}")
+                if not diff.has_changes:
+                    manifest.save()
+                    self.last_build_report = {"mode": "incremental", "manifest": diff.summary()}
+                    logger.info("源文件未变化，沿用现有索引")
+                    return self.last_build_report
                 
-                # 如果没有识别到竞赛类型，使用文件名作为备用
-                if not competition_type:
-                    # 移除数字和特殊字符
-                    clean_name = re.sub(r'^\d+_', '', filename)
-                    clean_name = re.sub(r'\.pdf$', '', clean_name)
-                    competition_type = clean_name
+                # 在当前代的副本上移除变更和已删除文件的旧文档片段
+                stale_sources = {os.path.basename(pdf_by_txt[path]) for path in diff.to_process}
+                stale_sources.update(manifest.get(path).get("source") for path in diff.removed)
+                to_process = list(diff.to_process)
                 
-                # 获取对应的TXT文件路径
-                txt_filename = os.path.splitext(os.path.basename(pdf_file))[0] + ".txt"
-                txt_file = os.path.join(self.txt_path, txt_filename)
+                # 规范文本块被移除时，合并到它上面的重复来源也要重新摄取
+                reingest = duplicate_sources_to_reingest(base.docs, stale_sources)
+                if reingest:
+                    to_process += [path for path in txt_files if os.path.basename(pdf_by_txt[path]) in reingest]
+                    stale_sources |= reingest
+                    logger.info(f"因规范文本块被移除，重新摄取 {len(reingest)} 个重复来源文件")
                 
-                # 如果TXT文件存在，则读取内容；否则尝试直接从PDF提取（未实现）
-                if os.path.exists(txt_file):
-                    with open(txt_file, "r", encoding="utf-8") as f:
-                        content = f.read()
+                docs, inverted_index, competition_docs = self._remove_sources(base, stale_sources)
+                self._prune_stale_duplicates(docs, competition_docs, stale_sources)
+                for path in diff.removed:
+                    manifest.forget(path)
+                logger.info(f"已移除 {len(base.docs) - len(docs)} 个过期文档片段")
+                txt_files = to_process
+            else:
+                docs = []
+                inverted_index = {}
+                competition_docs = {}
+                manifest.reset()
+            
+            pipeline = IngestionPipeline()
+            pipeline.timer.add("extract_txt", extract_seconds)
+            results = pipeline.run(txt_files, _ingest_txt_chunks, self._ingestion_options(), split_pages=False)
+            
+            doc_id = len(docs)
+            inverted_index = defaultdict(list, inverted_index)
+            competition_docs = defaultdict(list, competition_docs)
+            dedup = None
+            if settings.DEDUP_ENABLED:
+                dedup = NearDuplicateIndex()
+                for doc in docs:
+                    dedup.add(doc["id"], dedup.hasher.signature(doc["content"]))
+            dedup_stats = DedupStats(dedup) if dedup is not None else None
+            with pipeline.timer.stage("merge"):
+                for result in results:
+                    # 解析文件名，提取竞赛类型
+                    filename = os.path.basename(pdf_by_txt[result.task.path])
+                    competition_type = self._extract_competition_type(filename)
                     
-                    # 分块处理文本
-                    chunks = self._split_text_into_chunks(content, self.chunk_size, self.chunk_overlap)
+                    # 如果没有识别到竞赛类型，使用文件名作为备用
+                    if not competition_type:
+                        # 移除数字和特殊字符
+                        clean_name = re.sub(r'^\d+_', '', filename)
+                        clean_name = re.sub(r'\.pdf$', '', clean_name)
+                        competition_type = clean_name
                     
                     # 处理每个文本块
-                    for chunk in chunks:
-                        # 提取关键词
-                        keywords = self._extract_keywords(chunk)
+                    for record in result.records:
+                        keywords = record["keywords"]
+                        
+                        # 近重复文本块只在规范文本块上记录来源
+                        if dedup is not None:
+                            canonical = dedup.check_and_add(doc_id, record["content"])
+                            if canonical is not None:
+                                canonical_doc = dict(docs[canonical])  # 规范文本块可能属于当前代，复制后修改
+                                if competition_type not in merged_competitions(canonical_doc, "competition_type"):
+                                    competition_docs[competition_type].append(canonical)
+                                canonical_doc["duplicates"] = canonical_doc.get("duplicates", []) + [
+                                    {"source": filename, "competition": competition_type}]
+                                docs[canonical] = canonical_doc
+                                dedup_stats.record(len(keywords))
+                                continue
                         
                         # 添加到文档集合
-                        self.docs.append({
+                        docs.append({
                             "id": doc_id,
-                            "content": chunk,
+                            "content": record["content"],
                             "source": filename,
                             "competition_type": competition_type,
                             "keywords": keywords
@@ -180,28 +346,52 @@ class EnhancedRAG:
                         
                         # 更新倒排索引
                         for keyword in keywords:
-                            self.inverted_index[keyword].append(doc_id)
+                            inverted_index[keyword].append(doc_id)
                         
                         # 更新竞赛类型索引
-                        self.competition_docs[competition_type].append(doc_id)
-                        self.competition_types.add(competition_type)
+                        competition_docs[competition_type].append(doc_id)
                         
                         # 更新文档ID
                         doc_id += 1
-                else:
-                    logger.warning(f"未找到对应的TXT文件: {txt_file}")
-            except Exception as e:
-                logger.error(f"处理文件 {pdf_file} 时出错: {str(e)}")
-        
-        # 3. 为每个竞赛类型构建关键词集合
-        for comp_type in self.competition_types:
-            # 获取该竞赛类型的所有文档
-            doc_ids = self.competition_docs[comp_type]
+                    
+                    manifest.record(result.task.path, source=filename)
             
-            # 提取所有关键词
+            # 3. 为每个竞赛类型构建关键词集合
+            generation = EnhancedIndexGeneration(
+                generation_id=self._generations.next_generation_id(),
+                docs=docs,
+                inverted_index=dict(inverted_index),
+                competition_docs=dict(competition_docs),
+                competition_keywords=self._build_competition_keywords(docs, competition_docs),
+                sources=manifest.entries
+            )
+            
+            # 4. 原子落盘后替换当前代
+            with pipeline.timer.stage("save"):
+                self._publish(generation)
+            self.last_build_report = pipeline.report()
+            self.last_build_report["mode"] = "incremental" if incremental else "full"
+            self.last_build_report["generation_id"] = generation.generation_id
+            if diff is not None:
+                self.last_build_report["manifest"] = diff.summary()
+            if dedup_stats is not None:
+                self.last_build_report["dedup"] = dedup_stats.report()
+                logger.info(f"近重复文本块去重: {self.last_build_report['dedup']}")
+            
+            logger.info(f"索引构建完成(第 {generation.generation_id} 代)，包含 {len(docs)} 个文档片段，{len(generation.inverted_index)} 个关键词，{len(generation.competition_docs)} 种竞赛类型")
+            logger.info(f"索引构建各阶段耗时: {self.last_build_report['stages']}")
+            return self.last_build_report
+    
+    @staticmethod
+    def _build_competition_keywords(docs: List[Dict[str, Any]],
+                                    competition_docs: Dict[str, List[int]]) -> Dict[str, List[str]]:
+        """为每个竞赛类型统计频率最高的关键词作为代表关键词"""
+        competition_keywords = {}
+        for comp_type, doc_ids in competition_docs.items():
+            # 提取该竞赛类型所有文档的关键词
             all_keywords = []
             for doc_id in doc_ids:
-                all_keywords.extend(self.docs[doc_id]["keywords"])
+                all_keywords.extend(docs[doc_id]["keywords"])
             
             # 统计词频
             keyword_freq = defaultdict(int)
@@ -211,12 +401,175 @@ class EnhancedRAG:
             # 选择频率最高的关键词作为该竞赛的代表关键词
             sorted_keywords = sorted(keyword_freq.items(), key=lambda x: x[1], reverse=True)
             top_keywords = [k for k, v in sorted_keywords[:10]]
-            self.competition_keywords[comp_type] = top_keywords
+            competition_keywords[comp_type] = top_keywords
+        return competition_keywords
+    
+    def _txt_file(self, pdf_file: str) -> str:
+        """PDF对应的 TXT_PATH 下同名TXT文件路径"""
+        return os.path.join(self.txt_path, os.path.splitext(os.path.basename(pdf_file))[0] + ".txt")
+    
+    def _extract_txt_files(self, pdf_files: List[str]) -> Dict[str, str]:
+        """
+        为每个PDF准备 TXT_PATH 下的同名TXT，返回 TXT路径 -> PDF路径
+        
+        ENHANCED_TXT_EXTRACT 开启时，TXT缺失的PDF从文本层提取TXT并登记到提取清单；登记过的PDF变更后重新提取，
+        删除后一并删除其TXT。预先整理好的TXT（不在提取清单中）保持不变，没有文本层的PDF跳过。
+        关闭时只使用已有的TXT，不写入也不删除 TXT_PATH 下的文件
+        
+        Args:
+            pdf_files: 知识库中的PDF文件路径
+        """
+        pdf_by_txt = {}
+        if not settings.ENHANCED_TXT_EXTRACT:
+            for pdf_file in pdf_files:
+                txt_file = self._txt_file(pdf_file)
+                if os.path.exists(txt_file):
+                    pdf_by_txt[txt_file] = pdf_file
+                else:
+                    logger.warning(f"未找到对应的TXT文件: {txt_file}")
+            return pdf_by_txt
+        
+        manifest = SourceManifest(os.path.join(os.path.dirname(self.index_file), "enhanced_txt_manifest.json"))
+        manifest.load()
+        diff = manifest.diff(pdf_files)
+        changed = set(diff.changed)
+        
+        os.makedirs(self.txt_path, exist_ok=True)
+        for pdf_file in pdf_files:
+            txt_file = self._txt_file(pdf_file)
+            if os.path.exists(txt_file) and pdf_file not in changed:
+                pdf_by_txt[txt_file] = pdf_file
+                continue
+            
+            try:
+                text = "".join(text for _, text in extract_pages(IngestionTask(path=pdf_file)))
+            except Exception as e:
+                logger.error(f"从PDF提取TXT失败 {pdf_file}: {e}")
+                continue
+            if not text.strip():
+                logger.warning(f"PDF没有文本层，跳过: {pdf_file}")
+                continue
+            
+            tmp_file = f"{txt_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_file, txt_file)
+            manifest.record(pdf_file)
+            pdf_by_txt[txt_file] = pdf_file
+            logger.info(f"已从PDF提取TXT: {txt_file}")
+        
+        for pdf_file in diff.removed:
+            txt_file = self._txt_file(pdf_file)
+            if os.path.exists(txt_file):
+                os.remove(txt_file)
+                logger.info(f"PDF已删除，移除提取的TXT: {txt_file}")
+            manifest.forget(pdf_file)
+        
+        manifest.save()
+        return pdf_by_txt
+    
+    def _current_index_file(self) -> str:
+        """当前代目录中的索引文件路径"""
+        return os.path.join(self._store.current_dir(), os.path.basename(self.index_file))
+    
+    def _source_manifest(self, directory: Optional[str] = None) -> SourceManifest:
+        """
+        索引对应的源文件清单，分块、去重参数、jieba词典或OCR启用状态变化时清单失效
+        
+        Args:
+            directory: 清单所在的代目录，默认为当前代
+        """
+        return SourceManifest(
+            os.path.join(directory or self._store.current_dir(), "enhanced_manifest.json"),
+            params={
+                "chunk_size": self.chunk_size,
+                "chunk_overlap": self.chunk_overlap,
+                "dictionary": dictionary_version(),
+                "dedup": {
+                    "threshold": settings.DEDUP_THRESHOLD,
+                    "num_perm": settings.DEDUP_NUM_PERM,
+                    "bands": settings.DEDUP_BANDS,
+                    "shingle_size": settings.DEDUP_SHINGLE_SIZE
+                } if settings.DEDUP_ENABLED else None,
+                "ocr": ocr_params()
+            }
+        )
+    
+    @staticmethod
+    def _remove_sources(generation: "EnhancedIndexGeneration", sources: Set[str]
+                        ) -> Tuple[List[Dict[str, Any]], Dict[str, List[int]], Dict[str, List[int]]]:
+        """
+        在一代索引的副本上移除指定来源文件的文档片段（该代本身不修改）
+        
+        文档ID即其在docs列表中的位置，移除后对剩余文档重新编号（编号变化的文档先复制），
+        并同步重建倒排索引和竞赛类型索引
+        
+        Args:
+            generation: 作为基础的一代索引
+            sources: 来源PDF文件名集合
+            
+        Returns:
+            (文档列表, 倒排索引, 竞赛类型索引) 的新副本
+        """
+        docs = []
+        id_map = {}
+        for doc in generation.docs:
+            if doc["source"] in sources:
+                continue
+            new_id = len(docs)
+            id_map[doc["id"]] = new_id
+            docs.append(doc if doc["id"] == new_id else dict(doc, id=new_id))
         
-        # 4. 保存索引
-        self._save_index()
+        inverted_index = {}
+        for keyword, doc_ids in generation.inverted_index.items():
+            remapped = [id_map[doc_id] for doc_id in doc_ids if doc_id in id_map]
+            if remapped:
+                inverted_index[keyword] = remapped
         
-        logger.info(f"索引构建完成，包含 {len(self.docs)} 个文档片段，{len(self.inverted_index)} 个关键词，{len(self.competition_types)} 种竞赛类型")
+        competition_docs = {}
+        for comp_type, doc_ids in generation.competition_docs.items():
+            remapped = [id_map[doc_id] for doc_id in doc_ids if doc_id in id_map]
+            if remapped:
+                competition_docs[comp_type] = remapped
+        
+        return docs, inverted_index, competition_docs
+    
+    @staticmethod
+    def _prune_stale_duplicates(docs: List[Dict[str, Any]], competition_docs: Dict[str, List[int]],
+                                sources: Set[str]):
+        """
+        在（尚未发布的）索引结构中去掉指向指定来源文件的重复来源引用；
+        某竞赛类型只由这些引用带来时，规范文本块同时退出该竞赛类型的文档列表
+        
+        Args:
+            sources: 来源PDF文件名集合
+        """
+        for doc_id, doc in enumerate(docs):
+            pruned = without_stale_duplicates(doc, sources)
+            if pruned is doc:
+                continue
+            docs[doc_id] = pruned
+            for comp_type in merged_competitions(doc, "competition_type") - merged_competitions(pruned, "competition_type"):
+                remaining = [other for other in competition_docs.get(comp_type, []) if other != doc_id]
+                if remaining:
+                    competition_docs[comp_type] = remaining
+                else:
+                    competition_docs.pop(comp_type, None)
+    
+    def _ingestion_options(self) -> Dict[str, Any]:
+        """传递给摄取工作进程的分块与关键词参数"""
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "stopwords": self.stopwords
+        }
+    
+    @classmethod
+    def _from_ingestion_options(cls, options: Dict[str, Any]) -> "EnhancedRAG":
+        """在工作进程中构建只具备分块和关键词提取能力的轻量实例（不加载索引）"""
+        engine = cls.__new__(cls)
+        engine.__dict__.update(options)
+        return engine
     
     def _extract_competition_type(self, filename: str) -> Optional[str]:
         """从文件名中提取竞赛类型"""
@@ -315,10 +668,15 @@ class EnhancedRAG:
         
         return chunks
     
-    def _extract_keywords(self, text: str) -> List[str]:
-        """提取文本中的关键词"""
+    def _extract_keywords(self, text: str, words: Optional[List[Tuple[str, str]]] = None,
+                          for_query: bool = False, tokenizer_mode: Optional[str] = None) -> List[str]:
+        """
+        提取文本中的关键词；words 为已有的 (词, 词性) 分词结果，为None时现场分词，
+        for_query 为True时按 tokenizer_mode（默认 QUERY_TOKENIZER_MODE）分词并走查询分词LRU缓存（文档块不进入缓存）
+        """
         # 使用jieba进行分词
-        words = pseg.lcut(text)
+        if words is None:
+            words = tokenize_query(text, tokenizer_mode) if for_query else pseg.lcut(text)
         
         # 筛选关键词（保留名词、动词、形容词等，排除停用词）
         keywords = []
@@ -331,50 +689,122 @@ class EnhancedRAG:
         
         return keywords
     
-    def _save_index(self):
-        """保存索引到文件"""
+    def _publish(self, generation: "EnhancedIndexGeneration"):
+        """将新一代索引落盘并原子切换磁盘上的当前代，然后替换内存中的当前代；原当前代保留为上一代"""
+        with self._publish_lock:
+            self._save_generation(generation)
+            self._generations.publish(generation)
+    
+    def _save_generation(self, generation: "EnhancedIndexGeneration"):
+        """保存一代索引：索引文件和源文件清单全部写入新的代目录后，再原子切换当前代指针"""
+        index_data = {
+            "docs": generation.docs,
+            "inverted_index": generation.inverted_index,
+            "competition_docs": generation.competition_docs,
+            "competition_types": list(generation.competition_types),
+            "competition_keywords": generation.competition_keywords
+        }
+        with self._store.new_generation(generation.generation_id) as directory:
+            atomic_write_json(os.path.join(directory, os.path.basename(self.index_file)), index_data, ensure_ascii=False)
+            manifest = self._source_manifest(directory)
+            manifest.entries = generation.sources
+            manifest.save()
+        logger.info(f"索引文件保存成功: {directory}")
+    
+    def _read_index(self) -> Optional["EnhancedIndexGeneration"]:
+        """从当前代目录读取索引，失败时返回None"""
+        directory = self._store.current_dir()
         try:
-            index_data = {
-                "docs": self.docs,
-                "inverted_index": {k: v for k, v in self.inverted_index.items()},
-                "competition_docs": {k: v for k, v in self.competition_docs.items()},
-                "competition_types": list(self.competition_types),
-                "competition_keywords": self.competition_keywords
-            }
-            
-            with open(self.index_file, "w", encoding="utf-8") as f:
-                json.dump(index_data, f, ensure_ascii=False)
-            
-            logger.info(f"索引文件保存成功: {self.index_file}")
-            
+            with open(os.path.join(directory, os.path.basename(self.index_file)), "r", encoding="utf-8") as f:
+                index_data = json.load(f)
         except Exception as e:
-            logger.error(f"保存索引文件失败: {str(e)}")
+            logger.error(f"加载索引文件失败: {str(e)}")
+            return None
+        
+        # 源文件清单缺失或构建参数已变化时sources为空，下次重建将全量进行
+        manifest = self._source_manifest(directory)
+        manifest.load()
+        return EnhancedIndexGeneration(
+            generation_id=self._generations.next_generation_id(),
+            docs=index_data["docs"],
+            inverted_index=index_data["inverted_index"],
+            competition_docs=index_data["competition_docs"],
+            competition_keywords=index_data.get("competition_keywords", {}),
+            sources=manifest.entries
+        )
     
     def _load_index(self):
         """从文件加载索引"""
-        try:
-            with open(self.index_file, "r", encoding="utf-8") as f:
-                index_data = json.load(f)
-            
-            self.docs = index_data["docs"]
-            self.inverted_index = defaultdict(list, index_data["inverted_index"])
-            self.competition_docs = defaultdict(list, index_data["competition_docs"])
-            self.competition_types = set(index_data["competition_types"])
-            self.competition_keywords = index_data.get("competition_keywords", {})
-            
+        generation = self._read_index()
+        if generation is not None:
+            self._generations.publish(generation)
             logger.info(f"成功加载索引，包含 {len(self.docs)} 个文档，{len(self.inverted_index)} 个关键词")
-            
-        except Exception as e:
-            logger.error(f"加载索引文件失败: {str(e)}")
+        else:
             # 重建索引
-            self._build_index()
+            self._build_index(full=True)
+    
+    def start_background_rebuild(self, full: bool = False) -> bool:
+        """
+        在后台线程中重建索引，完成后原子替换当前代，期间检索不受影响
+        
+        Args:
+            full: 是否强制全量重建
+            
+        Returns:
+            已有重建任务在运行时返回False
+        """
+        return self._rebuilder.start(self._build_index, full=full)
     
-    def identify_competition_type(self, question: str) -> Tuple[Optional[str], float]:
+    def rollback_index(self) -> bool:
+        """
+        回滚到上一代索引：内存中的引用即时切换，并将该代重新落盘
+        
+        Returns:
+            没有上一代可回滚时返回False
+        """
+        with self._publish_lock:
+            if not self._generations.rollback():
+                return False
+            self._save_generation(self._generations.current)
+        logger.info(f"增强型索引已回滚到第 {self._generations.current.generation_id} 代")
+        return True
+    
+    def index_status(self) -> Dict[str, Any]:
+        """当前代/上一代索引及后台重建状态"""
+        status = self._generations.info()
+        status["rebuild"] = dict(self._rebuilder.status)
+        return status
+    
+    def analyze_query(self, analysis: QueryAnalysis, **detection: Any) -> QueryAnalysis:
+        """
+        在查询分析结果上补充竞赛类型和问题意图识别，复用分析结果中的分词
+        
+        Args:
+            analysis: 查询分析结果
+            **detection: 其他引擎的识别结果（如结构化知识库），一并写入
+            
+        Returns:
+            补充了识别结果的新分析对象
+        """
+        question_keywords = self._extract_keywords(analysis.text, analysis.tokens_for(analysis.text), for_query=True)
+        competition_type, comp_confidence = self.identify_competition_type(analysis.text, question_keywords)
+        intent, intent_confidence = self.identify_question_type(analysis.text)
+        return analysis.with_detection(
+            competition_type=competition_type,
+            competition_confidence=comp_confidence,
+            intent=intent,
+            intent_confidence=intent_confidence,
+            **detection
+        )
+    
+    def identify_competition_type(self, question: str,
+                                  question_keywords: Optional[List[str]] = None) -> Tuple[Optional[str], float]:
         """
         识别问题中的竞赛类型
         
         Args:
             question: 用户问题
+            question_keywords: 问题已提取的关键词，为None时现场提取
             
         Returns:
             (竞赛类型, 匹配置信度)
@@ -403,7 +833,8 @@ class EnhancedRAG:
         
         # 步骤3: 尝试关键词匹配
         # 提取问题中的关键词
-        question_keywords = self._extract_keywords(question)
+        if question_keywords is None:
+            question_keywords = self._extract_keywords(question, for_query=True)
         logger.debug(f"EnhancedRAG.identify_competition_type: 步骤3提取的问题关键词: {question_keywords}")
         
         # 计算每个竞赛类型的匹配分数
@@ -472,6 +903,7 @@ class EnhancedRAG:
                 - top_n: 返回的文档数量
                 - score_threshold: 相似度阈值
                 - competition_type: 指定竞赛类型
+                - analysis: 查询分析结果（QueryAnalysis），与问题文本一致时复用其分词和识别结果
         
         Returns:
             相关文档列表
@@ -482,15 +914,21 @@ class EnhancedRAG:
         top_n = kwargs.get("top_n", 10)
         score_threshold = kwargs.get("score_threshold", self.score_threshold)
         specified_competition = kwargs.get("competition_type", None)
+        analysis = kwargs.get("analysis")
+        if analysis is not None and analysis.text != question:
+            analysis = None
         
         logger.info(f"EnhancedRAG.search: 原始问题: '{question}', 参数: top_n={top_n}, threshold={score_threshold}, specified_competition='{specified_competition}'")
+        generation = self._generations.current  # 本次检索始终使用同一代索引
         
         try:
-            # 1. 识别竞赛类型和问题类型
-            competition_type, comp_confidence = self.identify_competition_type(question)
-            question_type, q_type_confidence = self.identify_question_type(question)
+            # 1. 识别竞赛类型和问题类型（已有分析结果时直接复用）
+            if analysis is None or not analysis.detected:
+                analysis = self.analyze_query(analysis or analyze_text(question))
+            competition_type, comp_confidence = analysis.competition_type, analysis.competition_confidence
+            question_type, q_type_confidence = analysis.intent, analysis.intent_confidence
             
-            if specified_competition and specified_competition in self.competition_types:
+            if specified_competition and specified_competition in generation.competition_types:
                 logger.info(f"EnhancedRAG.search: 使用了指定的竞赛类型 '{specified_competition}' 覆盖了识别结果 '{competition_type}'")
                 competition_type = specified_competition
                 comp_confidence = 1.0 # Assume 100% confidence if specified
@@ -498,10 +936,11 @@ class EnhancedRAG:
             logger.info(f"EnhancedRAG.search: 识别到竞赛类型: '{competition_type}', 置信度: {comp_confidence:.2f}")
             logger.info(f"EnhancedRAG.search: 识别到问题类型: '{question_type}', 置信度: {q_type_confidence:.2f}")
             
-            question_keywords = self._extract_keywords(question)
+            question_keywords = self._extract_keywords(question, analysis.tokens_for(question), for_query=True)
             logger.info(f"EnhancedRAG.search: 提取的问题关键词: {question_keywords}")
             
             candidate_docs = []
+            strategy_candidates = {}
             retrieval_strategy_log = f"Question: '{question}'. Keywords: {question_keywords}. Identified Comp: '{competition_type}' (Conf: {comp_confidence:.2f}). Q_Type: '{question_type}' (Conf: {q_type_confidence:.2f}). "
 
             # 步骤 3: 多级联合检索策略
@@ -509,15 +948,16 @@ class EnhancedRAG:
             if competition_type and comp_confidence > 0.85:
                 logger.info(f"EnhancedRAG.search: 高置信度识别到竞赛 '{competition_type}'. 进行聚焦检索.")
                 retrieval_strategy_log += f"Strategy: Focused on '{competition_type}'. "
-                doc_ids_for_competition = self.competition_docs.get(competition_type, [])
+                doc_ids_for_competition = generation.competition_docs.get(competition_type, [])
                 
                 if doc_ids_for_competition:
                     logger.debug(f"EnhancedRAG.search: '{competition_type}' 有 {len(doc_ids_for_competition)} 个关联文档ID. 将在这些文档中进行关键词匹配。")
                     for doc_id in doc_ids_for_competition:
                         # 此处可以进一步优化，例如只对这些文档进行关键词匹配打分，而不是直接全部加入
                         # 但为了先实现聚焦，我们将它们作为首要候选
-                        candidate_docs.append(self.docs[doc_id])
+                        candidate_docs.append(generation.docs[doc_id])
                     retrieval_strategy_log += f"Initial candidates from focused search: {len(candidate_docs)}. "
+                    strategy_candidates["focused"] = len(candidate_docs)
                 else:
                     logger.warning(f"EnhancedRAG.search: 高置信度识别到 '{competition_type}', 但该竞赛无索引文档.")
                     retrieval_strategy_log += f"No documents indexed for '{competition_type}'. "
@@ -533,16 +973,15 @@ class EnhancedRAG:
                 
                 potential_docs_by_keyword = defaultdict(list)
                 for keyword in question_keywords:
-                    doc_ids_for_keyword = self.inverted_index.get(keyword, [])
+                    doc_ids_for_keyword = generation.inverted_index.get(keyword, [])
                     for doc_id in doc_ids_for_keyword:
                         potential_docs_by_keyword[doc_id].append(keyword)
                 
                 logger.info(f"EnhancedRAG.search: 通用关键词检索发现 {len(potential_docs_by_keyword)} 个潜在文档ID.")
-                for doc_id in potential_docs_by_keyword:
-                    # 避免重复添加 (虽然在此逻辑分支candidate_docs应为空)
-                    if not any(cdoc["id"] == doc_id for cdoc in candidate_docs):
-                         candidate_docs.append(self.docs[doc_id])
+                # 此分支中candidate_docs为空，且字典的键本身不重复，无需逐个查重
+                candidate_docs.extend(generation.docs[doc_id] for doc_id in potential_docs_by_keyword)
                 retrieval_strategy_log += f"General search candidates: {len(candidate_docs)}. "
+                strategy_candidates["general"] = len(candidate_docs)
             
             # 确保候选文档列表中的文档是唯一的
             unique_candidate_docs = []
@@ -558,29 +997,11 @@ class EnhancedRAG:
             # 4. 计算文档相关性得分 (后续步骤与原先类似，但候选集可能更精确)
             scored_docs = []
             logger.info(f"EnhancedRAG.search: 步骤4 - 开始为 {len(candidate_docs)} 个候选文档计算得分")
+            trace = trace_enabled(logger, settings.LOG_TRACE_SAMPLE_RATE)
             for i, doc in enumerate(candidate_docs):
-                keyword_match_score = self._calculate_keyword_match(question_keywords, doc["keywords"])
-                type_match_bonus = 1.0
-                # 关键：如果原始识别的competition_type与文档的类型严格匹配，且信心高，那么这个加成应该更显著
-                if competition_type and doc["competition_type"] == competition_type:
-                    type_match_bonus = 1.8 if comp_confidence > 0.85 else (1.5 if comp_confidence > 0.7 else 1.2)
-                
-                question_type_relevance = 1.0
-                if question_type:
-                    content_lower = doc["content"].lower()
-                    for keyword in self.info_categories.get(question_type, []):
-                        if keyword in content_lower:
-                            question_type_relevance = 1.3
-                            break
-                
-                text_match_score_bonus = 0.0
-                # 避免对非常短的通用问题词语（如"是什么"）给予过高的直接匹配奖励
-                if len(question) > 5 and question.lower() in doc["content"].lower():
-                    text_match_score_bonus = 0.3
-                
-                position_bonus = 1.0 # 暂时简化，可以根据文档在竞赛内的排序等调整
-                # if doc["id"] < 5 and doc.get("competition_type") == competition_type :
-                #     position_bonus = 1.2
+                (keyword_match_score, type_match_bonus, question_type_relevance, position_bonus,
+                 text_match_score_bonus) = self._score_factors(question, question_keywords, doc, competition_type,
+                                                               comp_confidence, question_type)
                 
                 final_score = (keyword_match_score * type_match_bonus * 
                                question_type_relevance * position_bonus + text_match_score_bonus)
@@ -590,9 +1011,10 @@ class EnhancedRAG:
                     "source": doc["source"],
                     "competition_type": doc["competition_type"],
                     "score": final_score,
-                    "original_doc_id": doc["id"]
+                    "original_doc_id": doc["id"],
+                    "duplicates": doc.get("duplicates", [])
                 })
-                if i < 20: # Log score calculation for first 20 docs
+                if trace and i < 20: # Log score calculation for first 20 docs
                     logger.debug(f"EnhancedRAG.search:  DocID {doc['id']} ({doc['source']}) scoring details:")
                     logger.debug(f"    Scores: keyword_match={keyword_match_score:.2f}, type_bonus={type_match_bonus:.2f} (orig_comp_conf={comp_confidence:.2f}), q_type_relevance={question_type_relevance:.2f}, position_bonus={position_bonus:.2f}, text_match_bonus={text_match_score_bonus:.2f}")
                     logger.debug(f"    Final Score: {final_score:.4f} | Doc Comp: '{doc['competition_type']}' (Query Identified Comp: '{competition_type}')")
@@ -607,6 +1029,7 @@ class EnhancedRAG:
 
 
             filtered_docs = [doc for doc in scored_docs if doc["score"] > score_threshold]
+            above_threshold = len(filtered_docs)
             logger.info(f"EnhancedRAG.search: 应用阈值 {score_threshold} 后，剩余 {len(filtered_docs)} 个文档")
             
             if not filtered_docs and scored_docs:
@@ -618,11 +1041,22 @@ class EnhancedRAG:
             
             # 6. 返回结果
             result_docs = filtered_docs[:top_n]
+            set_attributes(keywords=len(question_keywords), candidates=len(candidate_docs), results=len(result_docs))
+            explain_section("enhanced_rag", keywords=question_keywords, competition_type=competition_type,
+                            competition_confidence=round(comp_confidence, 3), question_type=question_type,
+                            question_type_confidence=round(q_type_confidence, 3),
+                            strategy="focused" if "focused" in strategy_candidates else "general",
+                            candidates=strategy_candidates, threshold=score_threshold,
+                            above_threshold=above_threshold,
+                            results=len(result_docs))
+            explain_lazy("enhanced_rag.top_scores", lambda: self._explain_scores(
+                generation, question, question_keywords, competition_type, comp_confidence, question_type, result_docs))
             
             logger.info(f"EnhancedRAG.search: 步骤6 - 最终检索到 {len(result_docs)} 个相关文档返回给MCP (top_n={top_n})，耗时: {time.time() - start_time:.2f}秒")
             if result_docs:
-                for i, r_doc in enumerate(result_docs):
-                    logger.debug(f"EnhancedRAG.search:   ResultDoc[{i}]: ID={r_doc['original_doc_id']}, Score={r_doc['score']:.4f}, Source='{r_doc['source']}', CompType='{r_doc['competition_type']}'")
+                if logger.isEnabledFor(logging.DEBUG):
+                    for i, r_doc in enumerate(result_docs):
+                        logger.debug(f"EnhancedRAG.search:   ResultDoc[{i}]: ID={r_doc['original_doc_id']}, Score={r_doc['score']:.4f}, Source='{r_doc['source']}', CompType='{r_doc['competition_type']}'")
             else:
                 logger.warning(f"EnhancedRAG.search: 未检索到任何满足条件的文档。")
             
@@ -632,6 +1066,57 @@ class EnhancedRAG:
             logger.error(f"EnhancedRAG搜索出错: {str(e)}", exc_info=True)
             return []
     
+    def _score_factors(self, question: str, question_keywords: List[str], doc: Dict[str, Any],
+                       competition_type: Optional[str], comp_confidence: float,
+                       question_type: Optional[str]) -> Tuple[float, float, float, float, float]:
+        """
+        文档的各项得分因子：(关键词匹配, 竞赛类型加成, 问题类型相关度, 位置加成, 原文匹配奖励)
+        最终得分 = 关键词匹配 × 竞赛类型加成 × 问题类型相关度 × 位置加成 + 原文匹配奖励
+        """
+        keyword_match_score = self._calculate_keyword_match(question_keywords, doc["keywords"])
+        type_match_bonus = 1.0
+        # 关键：如果原始识别的competition_type与文档的类型严格匹配，且信心高，那么这个加成应该更显著
+        if competition_type and doc["competition_type"] == competition_type:
+            type_match_bonus = 1.8 if comp_confidence > 0.85 else (1.5 if comp_confidence > 0.7 else 1.2)
+        
+        question_type_relevance = 1.0
+        if question_type:
+            content_lower = doc["content"].lower()
+            for keyword in self.info_categories.get(question_type, []):
+                if keyword in content_lower:
+                    question_type_relevance = 1.3
+                    break
+        
+        text_match_score_bonus = 0.0
+        # 避免对非常短的通用问题词语（如"是什么"）给予过高的直接匹配奖励
+        if len(question) > 5 and question.lower() in doc["content"].lower():
+            text_match_score_bonus = 0.3
+        
+        position_bonus = 1.0 # 暂时简化，可以根据文档在竞赛内的排序等调整
+        # if doc["id"] < 5 and doc.get("competition_type") == competition_type :
+        #     position_bonus = 1.2
+        
+        return keyword_match_score, type_match_bonus, question_type_relevance, position_bonus, text_match_score_bonus
+    
+    def _explain_scores(self, generation: EnhancedIndexGeneration, question: str, question_keywords: List[str],
+                        competition_type: Optional[str], comp_confidence: float, question_type: Optional[str],
+                        result_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """慢查询日志：返回结果中得分最高的若干文档及其各项得分因子（检索结束后重新计算）"""
+        rows = []
+        for result in result_docs[:settings.SLOW_QUERY_TOP_SCORES]:
+            doc = generation.docs[result["original_doc_id"]]
+            factors = self._score_factors(question, question_keywords, doc, competition_type,
+                                          comp_confidence, question_type)
+            rows.append({
+                "id": result["original_doc_id"],
+                "source": result["source"],
+                "competition_type": result["competition_type"],
+                "score": round(result["score"], 4),
+                "factors": dict(zip(("keyword_match", "type_bonus", "question_type_relevance",
+                                     "position_bonus", "text_match_bonus"), (round(f, 4) for f in factors))),
+            })
+        return rows
+    
     def _calculate_keyword_match(self, query_keywords: List[str], doc_keywords: List[str]) -> float:
         """计算查询关键词与文档关键词的匹配度"""
         if not query_keywords or not doc_keywords:
@@ -657,11 +1142,12 @@ class EnhancedRAG:
     
     async def diagnose(self) -> Dict[str, Any]:
         """系统诊断，返回检索引擎状态"""
+        generation = self._generations.current
         result = {
-            "docs_count": len(self.docs),
-            "keywords_count": len(self.inverted_index),
-            "competition_types": list(self.competition_types),
-            "competition_docs_count": {k: len(v) for k, v in self.competition_docs.items()},
+            "docs_count": len(generation.docs),
+            "keywords_count": len(generation.inverted_index),
+            "competition_types": list(generation.competition_types),
+            "competition_docs_count": {k: len(v) for k, v in generation.competition_docs.items()},
             "parameters": {
                 "chunk_size": self.chunk_size,
                 "chunk_overlap": self.chunk_overlap,
@@ -669,4 +1155,4 @@ class EnhancedRAG:
             }
         }
         
-        return result 
\ No newline at end of file
+        return result 
\ No newline at end of file
@@ -0,0 +1,346 @@
+"""
+竞赛智能客服系统 - SQLite FTS5 检索引擎
+文本块存放在磁盘上的 SQLite FTS5 表中：terms 列为 jieba 预分词后以空格连接的词，
+competition、source 为索引列，检索用 bm25() 排序并可按竞赛类型过滤。
+索引不载入内存，启动时无需读取JSON；数据库使用WAL模式，多个工作进程可以并发读取，
+重建在单个事务中替换全部文本块，重建期间读者继续看到旧数据
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.jieba_helper import jieba, dictionary_version
+from app.utils.query_analysis import QueryAnalysis
+from app.utils.tokenizer import tokenize_query
+from app.utils.tracing import set_attributes
+from app.utils.slow_query import explain_section
+from app.services.ingestion import IngestionPipeline, IngestionTask, StageTimer, BackgroundRebuilder, extract_pages
+
+logger = logging.getLogger(__name__)
+
+# 只有含中文、字母或数字的词才写入索引（标点、空白由分词产生，FTS5 本身也会丢弃）
+_TERM = re.compile(r"[\u4e00-\u9fa5a-zA-Z0-9]")
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+    terms, competition, source, content UNINDEXED, page UNINDEXED, tokenize = 'unicode61'
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def segment_terms(text: str, stopwords: frozenset = frozenset()) -> List[str]:
+    """搜索引擎模式分词（长词同时给出其中的短词），去掉停用词和无意义的词"""
+    return [word for word in jieba.lcut_for_search(text)
+            if _TERM.search(word) and word not in stopwords]
+
+
+def _ingest_fts_pages(task: IngestionTask, options: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """
+    并行摄取工作函数：提取任务页段文本，按与 SimpleRAG 相同的规则分块，并把每块预分词为空格连接的词
+    :param task: 摄取任务（PDF文件的一段页面）
+    :param options: FtsRAG._ingestion_options() 返回的参数
+    :return: (文本块记录列表, 各阶段耗时)
+    """
+    from app.models.SimpleRAG import SimpleRAG
+
+    splitter = SimpleRAG._from_ingestion_options(
+        {"chunk_size": options["chunk_size"], "chunk_overlap": options["chunk_overlap"]})
+    stopwords = frozenset(options["stopwords"])
+    timer = StageTimer()
+    records = []
+
+    pages = extract_pages(task, options.get("ocr_pages", {}).get(task.path))
+    while True:
+        with timer.stage("extract"):
+            page = next(pages, None)
+        if page is None:
+            break
+        page_num, text = page
+        if not text.strip():
+            continue
+
+        with timer.stage("chunk"):
+            chunks = [chunk for chunk in splitter._split_text(text) if chunk.strip()]
+
+        with timer.stage("segment"):
+            for chunk in chunks:
+                records.append({"content": chunk, "page": page_num + 1,
+                                "terms": " ".join(segment_terms(chunk, stopwords))})
+
+    return records, timer.totals
+
+
+class FtsRAG:
+    """基于 SQLite FTS5 的磁盘检索引擎，检索接口与 SimpleRAG 一致，经 RAGAdapter 接入"""
+
+    def __init__(self, db_path: Optional[str] = None, rebuild_index: bool = False):
+        """
+        初始化FTS5检索引擎
+        :param db_path: 数据库文件路径，默认为 FTS_DB_PATH
+        :param rebuild_index: 是否重建索引
+        """
+        try:
+            sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE probe USING fts5(text)")
+        except sqlite3.OperationalError:
+            raise RuntimeError(f"当前SQLite({sqlite3.sqlite_version})不支持FTS5，无法使用FTS检索后端")
+
+        self.knowledge_base_path = settings.KNOWLEDGE_BASE_PATH
+        self.db_path = db_path or settings.FTS_DB_PATH
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+
+        self.competition_types = settings.COMPETITION_TYPES
+        self.competition_keywords = settings.COMPETITION_KEYWORDS
+        self.chunk_size = settings.RAG_CHUNK_SIZE
+        self.chunk_overlap = settings.RAG_CHUNK_OVERLAP
+        self.stopwords = self._load_stopwords()
+
+        self.last_build_report: Dict[str, Any] = {}
+        self._local = threading.local()  # sqlite3 连接不能跨线程共享，每个线程各用一个
+        self._rebuilder = BackgroundRebuilder("fts_rag")
+        self._build_lock = threading.Lock()  # 同一时间只允许一个构建
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+
+        if rebuild_index or not self._index_exists():
+            self._build_index()
+        else:
+            meta = self._meta()
+            if meta.get("dictionary") != dictionary_version():
+                logger.warning("FTS索引构建时的jieba词典与当前不一致，查询分词可能对不上，建议重建索引")
+
+        logger.info(f"FTS5检索引擎初始化完成，数据库 {self.db_path}，包含 {self._count()} 个文档片段")
+
+    @staticmethod
+    def _load_stopwords() -> frozenset:
+        """与 SimpleRAG 使用同一份停用词（以顿号分隔）"""
+        path = getattr(settings, "STOPWORDS_FILE_PATH", None)
+        if not path or not os.path.exists(path):
+            return frozenset()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return frozenset(word.strip() for word in f.read().split("、") if word.strip())
+        except Exception as e:
+            logger.error(f"加载停用词失败: {str(e)}")
+            return frozenset()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            self._local.connection = connection
+        return connection
+
+    def _meta(self) -> Dict[str, str]:
+        return dict(self._connection().execute("SELECT key, value FROM meta"))
+
+    def _count(self) -> int:
+        return self._connection().execute("SELECT count(*) FROM chunks").fetchone()[0]
+
+    def _index_exists(self) -> bool:
+        """构建完成时才写入 built_at，中途失败的构建视为不存在"""
+        return "built_at" in self._meta()
+
+    def _detect_competition_type(self, text: str) -> Optional[str]:
+        for comp_type in self.competition_types:
+            if comp_type in text:
+                return comp_type
+        for keyword in self.competition_keywords:
+            if keyword in text:
+                for comp_type in self.competition_types:
+                    if keyword in comp_type:
+                        return comp_type
+        return None
+
+    def _ingestion_options(self) -> Dict[str, Any]:
+        """传递给摄取工作进程的分块与分词参数"""
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "stopwords": set(self.stopwords),
+        }
+
+    def _build_index(self, full: bool = True) -> Dict[str, Any]:
+        """
+        摄取知识库中的全部PDF并在一个事务中替换所有文本块（FTS索引不做增量，full 参数仅为与 SimpleRAG 接口一致）
+        :return: 构建报告
+        """
+        with self._build_lock:
+            logger.info("开始构建FTS索引...")
+            if not os.path.exists(self.knowledge_base_path):
+                logger.error(f"知识库路径不存在: {self.knowledge_base_path}")
+                return self.last_build_report
+
+            pdf_files = sorted(os.path.join(root, file)
+                               for root, _, files in os.walk(self.knowledge_base_path)
+                               for file in files if file.lower().endswith(".pdf"))
+            logger.info(f"发现 {len(pdf_files)} 个PDF文件")
+
+            pipeline = IngestionPipeline()
+            results = pipeline.run(pdf_files, _ingest_fts_pages, self._ingestion_options(), ocr=True)
+
+            rows = []
+            for result in results:
+                file_name = os.path.basename(result.task.path)
+                competition_type = self._detect_competition_type(file_name) or ""
+                for record in result.records:
+                    rows.append((record["terms"], competition_type, file_name, record["content"], record["page"]))
+
+            meta = {
+                "built_at": str(time.time()),
+                "chunks": str(len(rows)),
+                "sources": json.dumps(sorted(os.path.basename(path) for path in pdf_files), ensure_ascii=False),
+                "dictionary": dictionary_version(),
+                "chunk_size": str(self.chunk_size),
+                "chunk_overlap": str(self.chunk_overlap),
+            }
+            with pipeline.timer.stage("save"):
+                connection = self._connection()
+                with connection:
+                    connection.execute("DELETE FROM chunks")
+                    connection.executemany(
+                        "INSERT INTO chunks (terms, competition, source, content, page) VALUES (?, ?, ?, ?, ?)", rows)
+                    connection.execute("DELETE FROM meta")
+                    connection.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", meta.items())
+                # 合并FTS5的段，减少查询时需要读取的b树
+                connection.execute("INSERT INTO chunks (chunks) VALUES ('optimize')")
+                connection.commit()
+
+            self.last_build_report = pipeline.report()
+            self.last_build_report["mode"] = "full"
+            self.last_build_report["chunks"] = len(rows)
+            logger.info(f"FTS索引构建完成，共 {len(rows)} 个文档片段，各阶段耗时: {self.last_build_report['stages']}")
+            return self.last_build_report
+
+    def _query_terms(self, query: str, analysis: Optional[QueryAnalysis] = None) -> List[str]:
+        """查询分词（复用查询分析的分词），每个词再按搜索引擎模式展开，与索引侧的分词方式对齐"""
+        tokens = analysis.tokens_for(query) if analysis else None
+        if tokens is None:
+            tokens = tokenize_query(query)
+        terms = []
+        for word, _ in tokens:
+            for term in segment_terms(word, self.stopwords):
+                if term not in terms:
+                    terms.append(term)
+        return terms
+
+    @staticmethod
+    def _match_expression(terms: List[str]) -> str:
+        """只在 terms 列中匹配任意一个词；每个词加双引号，避免被当作FTS5查询语法"""
+        quoted = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        return f"terms : ({quoted})"
+
+    def search(self, query: str, competition_type: Optional[str] = None, top_n: int = 5,
+               analysis: Optional[QueryAnalysis] = None) -> List[Dict[str, Any]]:
+        """
+        搜索相关文档
+        :param query: 用户查询
+        :param competition_type: 竞赛类型，指定时只在该竞赛的文本块中检索（没有结果时退回全部文本块）
+        :param top_n: 返回结果数量
+        :param analysis: 查询分析结果，与查询文本一致时复用其分词
+        :return: 相关文档列表，按bm25相关度降序排列
+        """
+        try:
+            terms = self._query_terms(query, analysis)
+            if not terms:
+                logger.warning(f"未能从查询中提取检索词: {query}")
+                return []
+            logger.info(f"FTS检索词: {terms}")
+
+            detected_type = competition_type or self._detect_competition_type(query)
+            rows = self._match(terms, detected_type, top_n) if detected_type else []
+            if not rows:
+                rows = self._match(terms, None, top_n)
+
+            # bm25() 越小越相关（为负数），换算为 0~1 之间、越大越相关的得分
+            results = []
+            for rowid, content, source, page, competition, rank in rows:
+                relevance = -rank
+                results.append({
+                    "id": f"fts_{rowid}",
+                    "content": content,
+                    "source": source,
+                    "page": page,
+                    "competition": competition or None,
+                    "score": relevance / (1 + relevance) if relevance > 0 else 0.0,
+                })
+
+            logger.info(f"FTS检索返回{len(results)}个相关文档")
+            set_attributes(keywords=len(terms), results=len(results))
+            explain_section("fts_rag", terms=terms, competition_type=competition_type, detected_type=detected_type,
+                            results=len(results), top_scores=[round(doc["score"], 4) for doc in results])
+            return results
+        except Exception as e:
+            logger.error(f"FTS检索出错: {str(e)}", exc_info=True)
+            return []
+
+    def _match(self, terms: List[str], competition_type: Optional[str], limit: int) -> List[Tuple]:
+        sql = ("SELECT rowid, content, source, page, competition, bm25(chunks) AS rank "
+               "FROM chunks WHERE chunks MATCH ?")
+        params: List[Any] = [self._match_expression(terms)]
+        if competition_type:
+            sql += " AND competition = ?"
+            params.append(competition_type)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return self._connection().execute(sql, params).fetchall()
+
+    def search_with_filter(self, query: str, filter_by_comp_type: Optional[str] = None, max_results: int = 5,
+                           analysis: Optional[QueryAnalysis] = None) -> List[Dict[str, Any]]:
+        """执行带有竞赛类型过滤的文档搜索"""
+        return self.search(query, competition_type=filter_by_comp_type, top_n=max_results, analysis=analysis)
+
+    def rebuild_index(self, full: bool = True) -> bool:
+        """重建索引"""
+        try:
+            self._build_index(full=full)
+            return True
+        except Exception as e:
+            logger.error(f"重建FTS索引失败: {str(e)}")
+            return False
+
+    def start_background_rebuild(self, full: bool = True) -> bool:
+        """
+        在后台线程中重建索引，期间检索继续读取旧数据（WAL读者看到事务开始前的快照）
+        :return: 已有重建任务在运行时返回False
+        """
+        return self._rebuilder.start(self._build_index, full=full)
+
+    def rollback_index(self) -> bool:
+        """FTS索引在原表中整体替换，不保留上一代"""
+        logger.warning("FTS索引不保留上一代，无法回滚")
+        return False
+
+    def index_status(self) -> Dict[str, Any]:
+        """索引概况及后台重建状态"""
+        meta = self._meta()
+        return {
+            "db_path": self.db_path,
+            "chunks": int(meta.get("chunks", 0)),
+            "built_at": float(meta["built_at"]) if "built_at" in meta else None,
+            "dictionary": meta.get("dictionary"),
+            "rebuild": dict(self._rebuilder.status),
+        }
+
+    def diagnose_knowledge_base(self) -> Dict[str, Any]:
+        """诊断知识库状态，返回统计信息"""
+        counts = self._connection().execute(
+            "SELECT competition, count(*) FROM chunks GROUP BY competition").fetchall()
+        return {
+            "total_documents": sum(count for _, count in counts),
+            "competition_document_counts": {competition or "未知竞赛": count for competition, count in counts},
+            "knowledge_base_path": self.knowledge_base_path,
+            "db_path": self.db_path,
+            "db_bytes": sum(os.path.getsize(path) for path in (self.db_path, self.db_path + "-wal") if os.path.exists(path)),
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+        }
@@ -10,13 +10,70 @@ import random
 import json
 from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
+from types import SimpleNamespace
 import asyncio
 
-from langchain_community.chat_models.tongyi import ChatTongyi
+from app.config import settings
+from app.utils.metrics import LLM_CALLS_TOTAL, LLM_INFLIGHT, stage_timer
+from app.utils.tracing import set_attributes
+from app.utils.slow_query import explain_section
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+def _token_usage(response: Any) -> Dict[str, Any]:
+    """从模型响应的元数据中取token用量（取不到时返回空字典）"""
+    metadata = getattr(response, "response_metadata", None) or {}
+    usage = metadata.get("token_usage") or getattr(response, "usage_metadata", None) or {}
+    return {key: usage[key] for key in ("input_tokens", "output_tokens", "total_tokens") if key in usage}
+
+class StubChatModel:
+    """
+    压测用的模拟大模型（LLM_BACKEND=stub）：不调用API，阻塞 LLM_STUB_LATENCY_MS±LLM_STUB_JITTER_MS 毫秒后
+    返回固定回答，与真实调用一样占用 to_thread 的工作线程，用于在不消耗token的情况下评估容量
+    """
+
+    ANSWER = "（模拟回答）根据参考资料，该竞赛的相关信息请以竞赛通知为准。"
+
+    def __init__(self, model: str, latency_ms: float, jitter_ms: float):
+        self.model = model
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def invoke(self, messages: List[Dict[str, str]]) -> Any:
+        delay_ms = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(delay_ms, 0.0) / 1000)
+        prompt_chars = sum(len(message["content"]) for message in messages)
+        return SimpleNamespace(content=self.ANSWER, response_metadata={"token_usage": {
+            "input_tokens": prompt_chars, "output_tokens": len(self.ANSWER),
+            "total_tokens": prompt_chars + len(self.ANSWER),
+        }})
+
+
+def _chat_tongyi():
+    """
+    按需导入 ChatTongyi：langchain_community 的导入约占冷启动导入时间的一半，
+    不在模块导入时加载，由 preload_llm_client 在启动后台初始化中预先导入
+    """
+    from langchain_community.chat_models.tongyi import ChatTongyi
+    return ChatTongyi
+
+
+def preload_llm_client() -> str:
+    """预先导入大模型客户端，返回使用的后端名称"""
+    if settings.LLM_BACKEND != "stub":
+        _chat_tongyi()
+    return settings.LLM_BACKEND
+
+
+def _create_llm(model: str, api_key: str):
+    if settings.LLM_BACKEND == "stub":
+        return StubChatModel(model, settings.LLM_STUB_LATENCY_MS, settings.LLM_STUB_JITTER_MS)
+    return _chat_tongyi()(
+        model=model,
+        dashscope_api_key=api_key
+    )
+
 # 添加generate_response函数
 async def generate_response(prompt: str, model: str, api_key: str) -> str:
     """
@@ -33,11 +90,8 @@ async def generate_response(prompt: str, model: str, api_key: str) -> str:
     try:
         logger.info(f"调用模型 {model} 生成回答，提示长度: {len(prompt)}")
         
-        # 初始化ChatTongyi模型
-        llm = ChatTongyi(
-            model=model,
-            dashscope_api_key=api_key
-        )
+        # 初始化ChatTongyi模型（LLM_BACKEND=stub 时为模拟模型）
+        llm = _create_llm(model, api_key)
         
         # 构建消息列表
         messages = [
@@ -50,12 +104,23 @@ async def generate_response(prompt: str, model: str, api_key: str) -> str:
         
         # 调用大模型生成回答
         try:
-            response = await asyncio.to_thread(
-                lambda: llm.invoke(messages)
-            )
+            with stage_timer("llm_call", model=model, prompt_chars=len(prompt)):
+                # 进行中的调用数（含在线程池中排队的），看板据此显示LLM排队深度
+                LLM_INFLIGHT.inc()
+                try:
+                    response = await asyncio.to_thread(
+                        lambda: llm.invoke(messages)
+                    )
+                finally:
+                    LLM_INFLIGHT.dec()
+                usage = _token_usage(response)
+                set_attributes(**usage)
+            explain_section("llm", model=model, prompt_chars=len(prompt),
+                            seconds=round(time.time() - start_time, 3), **usage)
+            LLM_CALLS_TOTAL.inc(outcome="ok")
             
             # 记录响应对象类型和属性
-            logger.info(f"模型响应类型: {type(response)}, 属性: {dir(response)}")
+            logger.debug("模型响应类型: %s", type(response).__name__)
             
             # 提取回答内容
             if hasattr(response, 'content'):
@@ -70,6 +135,9 @@ async def generate_response(prompt: str, model: str, api_key: str) -> str:
             return answer
             
         except Exception as api_error:
+            LLM_CALLS_TOTAL.inc(outcome="error")
+            explain_section("llm", model=model, prompt_chars=len(prompt),
+                            seconds=round(time.time() - start_time, 3), error=str(api_error))
             logger.error(f"调用模型API失败: {str(api_error)}")
             raise api_error
         
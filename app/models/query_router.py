@@ -7,43 +7,114 @@
 
 import time
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional
 
 from app.models.structured_kb import StructuredCompetitionKB
 from app.models.SimpleMCPWithRAG import SimpleMCPWithRAG
 from app.models.enhanced_mcp import EnhancedMCP
+from app.utils.query_analysis import QueryAnalysis
+from app.utils.question_enhancer import analyze_text
+from app.utils.metrics import ROUTE_TOTAL, stage_timer
+from app.utils.tracing import set_attributes
+from app.utils.slow_query import explain
 
 logger = logging.getLogger(__name__)
 
 class QueryRouter:
     """查询路由器，决定使用哪个引擎处理问题"""
     
-    def __init__(self):
-        """初始化查询路由器及其引擎组件"""
+    def __init__(self, components: Optional[Dict[str, Any]] = None):
+        """
+        初始化查询路由器及其引擎组件
+        
+        Args:
+            components: 已构造好的组件（见 component_factories，启动时由后台线程并行构造，
+                        尚未加载完成的组件可以缺省，之后用 install 启用）；为None时在此依次构造
+        """
+        if components is None:
+            components = {}
+            for name, factory in self.component_factories().items():
+                try:
+                    components[name] = factory()
+                except Exception as e:
+                    # 结构化知识库加载失败时由RAG引擎兜底
+                    if name != "structured_kb":
+                        raise
+                    logger.warning(f"结构化知识库加载失败: {str(e)}，将使用RAG引擎")
+        
         # 标准引擎 - 处理一般问题
-        self.standard_engine = SimpleMCPWithRAG()
+        self.standard_engine = components.get("standard_engine")
         
         # 增强引擎 - 处理特定竞赛问题
-        self.enhanced_engine = EnhancedMCP(rebuild_index=False)
+        self.enhanced_engine = components.get("enhanced_engine")
         
         # 结构化知识库 - 处理明确的竞赛信息查询
-        self.structured_kb = None
-        try:
-            from app.config import settings
-            self.structured_kb = StructuredCompetitionKB(settings.KNOWLEDGE_BASE_PATH)
-            logger.info("结构化知识库加载成功")
-        except Exception as e:
-            logger.warning(f"结构化知识库加载失败: {str(e)}，将使用RAG引擎")
+        self.structured_kb = components.get("structured_kb")
         
         logger.info("查询路由器初始化完成")
     
-    async def route_query(self, question: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+    @staticmethod
+    def component_factories() -> Dict[str, Callable[[], Any]]:
+        """各组件的构造函数，组件之间互不依赖，可以并行构造"""
+        return {
+            "standard_engine": SimpleMCPWithRAG,
+            "enhanced_engine": lambda: EnhancedMCP(rebuild_index=False),
+            "structured_kb": QueryRouter._load_structured_kb,
+        }
+    
+    def install(self, name: str, component: Any):
+        """启用一个后台加载完成的组件，之后的问题即可路由到它"""
+        if name not in self.component_factories():
+            raise ValueError(f"未知的查询路由器组件: {name}")
+        setattr(self, name, component)
+        logger.info(f"查询路由器已启用组件: {name}")
+    
+    def available(self) -> bool:
+        """是否已有可回答问题的引擎"""
+        return any(engine is not None for engine in (self.standard_engine, self.enhanced_engine, self.structured_kb))
+    
+    @staticmethod
+    def _load_structured_kb() -> StructuredCompetitionKB:
+        """加载结构化知识库；失败时抛出异常，由调用方记录组件失败并用RAG引擎兜底"""
+        from app.config import settings
+        structured_kb = StructuredCompetitionKB(settings.KNOWLEDGE_BASE_PATH)
+        logger.info("结构化知识库加载成功")
+        return structured_kb
+    
+    def analyze(self, question: str, analysis: Optional[QueryAnalysis] = None) -> QueryAnalysis:
+        """
+        完成问题的分词和全部识别（结构化知识库 + 增强引擎），结果沿调用链传给各引擎
+        
+        Args:
+            question: 检索用问题文本
+            analysis: 调用方已有的分析结果（如问题增强时得到的分词），与问题文本不一致时重新分析
+            
+        Returns:
+            已完成识别的查询分析结果
+        """
+        if analysis is None or analysis.text != question:
+            analysis = analyze_text(question)
+        if analysis.detected:
+            return analysis
+        
+        detection = {}
+        if self.structured_kb:
+            detection["kb_competition_type"] = self.structured_kb.get_competition_type(question)
+            detection["kb_info_type"] = self.structured_kb.get_info_type(question)
+        if self.enhanced_engine is None:
+            # 增强引擎尚未加载，只有结构化知识库的识别结果
+            return analysis.with_detection(**detection)
+        return self.enhanced_engine.rag_engine.analyze_query(analysis, **detection)
+    
+    async def route_query(self, question: str, session_id: Optional[str] = None,
+                          analysis: Optional[QueryAnalysis] = None) -> Dict[str, Any]:
         """
         路由并处理用户查询
         
         Args:
             question: 用户问题
             session_id: 会话ID
+            analysis: 问题增强阶段得到的查询分析结果，可选
             
         Returns:
             包含回答和元数据的字典
@@ -52,16 +123,26 @@ class QueryRouter:
         logger.info(f"开始路由问题: '{question}'")
         
         try:
+            # 0. 分词与识别只做一次
+            analysis = self.analyze(question, analysis)
+            explain(competition_type=analysis.competition_type, intent=analysis.intent,
+                    kb_competition_type=analysis.kb_competition_type, kb_info_type=analysis.kb_info_type,
+                    keywords=list(analysis.keywords))
+            
             # 1. 尝试结构化查询
             if self.structured_kb:
                 # 分析问题，识别竞赛类型和信息类型
-                competition_type = self.structured_kb.get_competition_type(question)
-                info_type = self.structured_kb.get_info_type(question)
+                competition_type = analysis.kb_competition_type
+                info_type = analysis.kb_info_type
                 
                 if competition_type and info_type:
                     # 尝试从结构化知识库获取精确答案
-                    result = self.structured_kb.query(competition_type, info_type)
+                    with stage_timer("structured_kb", competition_type=competition_type, info_type=info_type):
+                        result = self.structured_kb.query(competition_type, info_type)
                     if result:
+                        ROUTE_TOTAL.inc(route="structured_kb")
+                        set_attributes(route="structured_kb")
+                        explain(route="structured_kb")
                         logger.info(f"结构化知识库返回答案，竞赛: {competition_type}, 类型: {info_type}")
                         # 添加处理时间
                         result["processing_time"] = time.time() - start_time
@@ -81,15 +162,33 @@ class QueryRouter:
                     contains_competition_keyword = True
                     break
             
-            # 3. 路由到合适引擎
-            if contains_competition_keyword:
+            # 3. 路由到合适引擎（启动期间某个引擎尚未加载完成时，由已加载的引擎回答）
+            if self.standard_engine is None and self.enhanced_engine is None:
+                logger.info(f"检索引擎尚未加载完成，结构化知识库无法回答: '{question}'")
+                ROUTE_TOTAL.inc(route="warming_up")
+                set_attributes(route="warming_up")
+                explain(route="warming_up")
+                return {
+                    "answer": "系统正在加载竞赛资料，暂时只能回答各竞赛的报名时间、参赛要求等基本信息，请稍后再试。",
+                    "confidence": 0.2,
+                    "source": "warming_up",
+                    "processing_time": time.time() - start_time
+                }
+            
+            if self.enhanced_engine is not None and (contains_competition_keyword or self.standard_engine is None):
                 # 使用增强引擎处理特定竞赛问题
                 logger.info(f"路由至增强引擎: 问题包含竞赛关键词")
-                result = await self.enhanced_engine.query(question, session_id)
+                ROUTE_TOTAL.inc(route="enhanced")
+                set_attributes(route="enhanced")
+                explain(route="enhanced")
+                result = await self.enhanced_engine.query(question, session_id, analysis=analysis)
             else:
                 # 使用标准引擎处理一般问题
                 logger.info(f"路由至标准引擎: 一般问题")
-                result = await self.standard_engine.query(question=question, session_id=session_id)
+                ROUTE_TOTAL.inc(route="standard")
+                set_attributes(route="standard")
+                explain(route="standard")
+                result = await self.standard_engine.query(question=question, session_id=session_id, analysis=analysis)
             
             # 4. 标准化返回结果
             if not isinstance(result, dict):
@@ -124,6 +223,14 @@ class QueryRouter:
                 "processing_time": processing_time
             }
     
+    def index_engines(self) -> Dict[str, Any]:
+        """支持后台重建和原子替换的索引引擎（供管理接口使用）"""
+        engines = {}
+        for engine in (self.standard_engine, self.enhanced_engine):
+            if engine is not None:
+                engines.update(engine.index_engines())
+        return engines
+    
     def diagnose(self) -> Dict[str, Any]:
         """返回查询路由器诊断信息"""
         result = {
@@ -18,6 +18,7 @@ from tqdm import tqdm
 # 使用自定义jieba_helper模块
 from app.utils.jieba_helper import jieba, pseg
 from app.config import settings
+from app.services.ingestion import SourceManifest, atomic_write_json
 
 # 配置日志
 logging.basicConfig(
@@ -105,10 +106,18 @@ class StructuredCompetitionKB:
             logger.info(f"从 {self.kb_file} 加载结构化知识库成功")
         except Exception as e:
             logger.error(f"加载结构化知识库失败: {e}")
-            self._build_kb()  # 加载失败则重建
+            self._build_kb(full=True)  # 加载失败则重建
     
-    def _build_kb(self):
-        """构建结构化知识库"""
+    def _build_kb(self, full: bool = False):
+        """
+        构建结构化知识库
+        
+        每个文件的提取结果记录在源文件清单中；已有清单时只重新解析新增或变更的文件，
+        再按文件顺序合并所有提取结果，已删除文件的信息随之移除
+        
+        Args:
+            full: 是否强制重新解析所有文件
+        """
         logger.info("开始构建结构化知识库...")
         
         # 确保kb目录存在
@@ -121,18 +130,54 @@ class StructuredCompetitionKB:
                 if file.endswith(".txt"):
                     txt_files.append(os.path.join(root, file))
         
-        # 解析每个文件提取结构化知识
-        for txt_file in tqdm(txt_files, desc="处理竞赛文档"):
-            self._process_file(txt_file)
+        manifest = SourceManifest(str(self.kb_file.with_name("structured_manifest.json")))
+        if not full and os.path.exists(self.kb_file) and manifest.load():
+            diff = manifest.diff(txt_files)
+            logger.info(f"增量构建结构化知识库: {diff.summary()}")
+            for path in diff.removed:
+                manifest.forget(path)
+            pending_files = diff.to_process
+        else:
+            manifest.reset()
+            pending_files = txt_files
+        
+        # 解析新增或变更的文件提取结构化知识
+        for txt_file in tqdm(pending_files, desc="处理竞赛文档"):
+            extracted = self._process_file(txt_file)
+            if extracted is not None:
+                manifest.record(txt_file, **extracted)
         
-        # 保存知识库
-        with open(self.kb_file, 'w', encoding='utf-8') as f:
-            json.dump(self.kb, f, ensure_ascii=False, indent=2)
+        # 按文件顺序合并所有文件的提取结果
+        kb = {}
+        for txt_file in txt_files:
+            entry = manifest.get(txt_file)
+            if not entry or not entry.get("competition"):
+                continue
+            if entry["competition"] not in kb:
+                kb[entry["competition"]] = {}
+            kb[entry["competition"]].update(entry["info"])
+        
+        # 保存知识库，合并完成后再整体替换，查询方不会看到构建中的知识库
+        atomic_write_json(str(self.kb_file), kb, ensure_ascii=False, indent=2)
+        manifest.save()
+        self.kb = kb
+        self.competition_types = set(kb.keys())
         
         logger.info(f"结构化知识库构建完成，保存至 {self.kb_file}")
     
-    def _process_file(self, file_path: str):
-        """处理单个文件，提取结构化信息"""
+    def refresh(self, full: bool = False):
+        """重新构建知识库（默认增量），用于知识库目录变化后的热更新"""
+        self._build_kb(full=full)
+        self._load_competition_keywords()
+    
+    def _process_file(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        处理单个文件，提取结构化信息
+        
+        Returns:
+            {"competition": 竞赛类型, "info": 结构化信息}；无法识别竞赛类型时competition为None，
+            读取或解析失败时返回None（下次构建会重试）
+        """
         try:
             # 从文件名中提取竞赛类型
             file_name = os.path.basename(file_path)
@@ -140,23 +185,18 @@ class StructuredCompetitionKB:
             
             if not competition_type:
                 logger.warning(f"无法识别文件 {file_name} 的竞赛类型，跳过")
-                return
+                return {"competition": None, "info": {}}
             
             # 读取文件内容
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
             
             # 提取结构化信息
-            info_dict = self._extract_structured_info(content)
-            
-            # 更新知识库
-            if competition_type not in self.kb:
-                self.kb[competition_type] = {}
-            
-            self.kb[competition_type].update(info_dict)
+            return {"competition": competition_type, "info": self._extract_structured_info(content)}
             
         except Exception as e:
             logger.error(f"处理文件 {file_path} 失败: {e}")
+            return None
     
     def _extract_competition_type(self, file_name: str) -> Optional[str]:
         """从文件名中提取竞赛类型"""
@@ -205,12 +245,13 @@ class StructuredCompetitionKB:
     
     def _load_competition_keywords(self):
         """加载竞赛关键词匹配表"""
-        self.competition_keywords = {}
+        competition_keywords = {}
         for comp_type in self.kb:
             # 提取竞赛名称中的关键词
             words = list(jieba.cut(comp_type))
             significant_words = [w for w in words if len(w) > 1]  # 只保留多字符词
-            self.competition_keywords[comp_type] = significant_words
+            competition_keywords[comp_type] = significant_words
+        self.competition_keywords = competition_keywords
     
     def get_competition_type(self, question: str) -> Optional[str]:
         """从问题中识别竞赛类型"""
@@ -298,4 +339,4 @@ class StructuredCompetitionKB:
         for comp_type, info in self.kb.items():
             result["competition_details"][comp_type] = list(info.keys())
         
-        return result 
\ No newline at end of file
+        return result 
\ No newline at end of file
@@ -1,7 +1,20 @@
 """
 数据服务模块初始化文件
+服务按需导入（PEP 562 模块 __getattr__）
 """
-from .data.data_service import DataService
-from .knowledge.knowledge_service import KnowledgeService
+import importlib
 
-__all__ = ['DataService', 'KnowledgeService']
\ No newline at end of file
+_EXPORTS = {
+    'DataService': '.data.data_service',
+    'KnowledgeService': '.knowledge.knowledge_service',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -6,12 +6,33 @@ import os
 import logging
 import re
 import json
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from pathlib import Path
 
+from app.services.ingestion import IngestionPipeline, IngestionTask, StageTimer
+from app.services.ingestion.ocr import OCRStage, OCRCache, ocr_image_bytes, tesseract_available
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
+
+def _process_pdf_task(task: IngestionTask, options: Dict[str, Any]):
+    """
+    并行摄取工作函数：在工作进程中处理单个PDF
+    
+    Args:
+        task: 摄取任务（整份PDF）
+        options: 包含 storage_path 的参数
+        
+    Returns:
+        ([PDF处理结果], 各阶段耗时)
+    """
+    timer = StageTimer()
+    with timer.stage("extract"):
+        # 文件之间已经并行，文件内的OCR串行执行，避免嵌套进程池
+        info = DataService(options["storage_path"]).extract_pdf(task.path, keep_pages=options.get("keep_pages", True), ocr_workers=1)
+    return [info], timer.totals
+
 class DataService:
     """数据服务：负责处理各种格式的文档和数据提取"""
     
@@ -37,25 +58,76 @@ class DataService:
             self.logger.warning("未安装PyMuPDF库，PDF处理功能将受限")
             self.pdf_support = False
             
-        # 尝试导入图像处理库
-        try:
-            import cv2
-            import pytesseract
-            self.ocr_support = True
-        except ImportError:
-            self.logger.warning("未安装OpenCV或pytesseract库，OCR功能将不可用")
-            self.ocr_support = False
+        # OCR使用本地tesseract可执行文件（OpenCV可选，仅用于预处理）
+        self.ocr_support = tesseract_available()
+        if not self.ocr_support:
+            self.logger.warning("未找到tesseract可执行文件，OCR功能将不可用")
+        self.ocr_cache = OCRCache()
     
-    def process_pdf(self, pdf_path: str) -> Dict[str, Any]:
+    def process_pdf(self, pdf_path: str, keep_pages: bool = True) -> Dict[str, Any]:
         """
         处理PDF文件，提取文本和元数据
         
         Args:
             pdf_path: PDF文件路径
+            keep_pages: 返回结果中是否保留各页内容；为False时内存占用不随页数增长
             
         Returns:
             包含PDF内容的字典
         """
+        return self.extract_pdf(pdf_path, keep_pages=keep_pages)
+    
+    def iter_pdf_pages(self, doc, ocr_pages: Optional[Dict[int, str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        逐页产出页面信息（生成器），任一时刻只持有当前页
+        
+        Args:
+            doc: 已打开的PyMuPDF文档
+            ocr_pages: 纯图像页面的OCR文本 {页码(从0开始): 文本}
+            
+        Yields:
+            {"page_num", "text", "images"}，图像只记录元数据；OCR得到的页面带 "ocr": True
+        """
+        ocr_pages = ocr_pages or {}
+        for page_num, page in enumerate(doc):
+            page_info = {
+                "page_num": page_num + 1,
+                "text": ocr_pages[page_num] if page_num in ocr_pages else page.get_text(),
+                "images": self._image_metadata(page)
+            }
+            if page_num in ocr_pages:
+                page_info["ocr"] = True
+            yield page_info
+    
+    @staticmethod
+    def _image_metadata(page) -> List[Dict[str, Any]]:
+        """
+        读取页面图像的尺寸元数据
+        
+        get_images(full=True) 返回的元组 (xref, smask, width, height, ...) 直接来自图像xref字典，
+        无需像 extract_image 那样解码整张图像
+        """
+        return [
+            {"index": img_index, "width": img[2], "height": img[3]}
+            for img_index, img in enumerate(page.get_images(full=True))
+        ]
+    
+    def extract_pdf(self, pdf_path: str, text_output_dir: Optional[str] = None,
+                    keep_pages: bool = False, ocr_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        流式处理PDF：逐页提取，边提取边写入JSON结果，可同时写出每页和整份文档的TXT
+        
+        纯图像页面（扫描件）先经过OCR阶段，结果按图像哈希缓存
+        
+        Args:
+            pdf_path: PDF文件路径
+            text_output_dir: TXT输出目录，为None时不写TXT
+            keep_pages: 返回结果中是否保留各页内容
+            ocr_workers: OCR进程池大小，默认使用配置值
+            
+        Returns:
+            包含PDF元数据的字典；写了TXT时 text_files 为创建的文件列表（整份文档在前）
+        """
         if not os.path.exists(pdf_path):
             self.logger.error(f"PDF文件不存在: {pdf_path}")
             return {"error": "文件不存在"}
@@ -67,46 +139,64 @@ class DataService:
         try:
             import fitz  # PyMuPDF
             
-            # 打开PDF文件
-            doc = fitz.open(pdf_path)
+            ocr_pages = OCRStage(max_workers=ocr_workers).run([pdf_path]).get(pdf_path, {})
             
-            # 提取基本信息
-            info = {
-                "filename": os.path.basename(pdf_path),
-                "path": pdf_path,
-                "page_count": len(doc),
-                "title": doc.metadata.get("title", os.path.basename(pdf_path)),
-                "author": doc.metadata.get("author", "未知"),
-                "creation_date": doc.metadata.get("creationDate", "未知"),
-                "pages": []
-            }
+            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+            output_path = self.storage_path / f"{base_name}.json"
+            tmp_path = output_path.with_name(output_path.name + ".tmp")
+            full_text_file = None
+            text_files = []
             
-            # 逐页提取文本
-            for page_num, page in enumerate(doc):
-                page_info = {
-                    "page_num": page_num + 1,
-                    "text": page.get_text(),
-                    "images": []
+            with fitz.open(pdf_path) as doc:
+                # 提取基本信息
+                info = {
+                    "filename": os.path.basename(pdf_path),
+                    "path": pdf_path,
+                    "page_count": len(doc),
+                    "title": doc.metadata.get("title", os.path.basename(pdf_path)),
+                    "author": doc.metadata.get("author", "未知"),
+                    "creation_date": doc.metadata.get("creationDate", "未知"),
+                    "pages": []
                 }
                 
-                # 提取图像信息（不保存图像数据，只记录元数据）
-                for img_index, img in enumerate(page.get_images(full=True)):
-                    xref = img[0]
-                    base_image = doc.extract_image(xref)
-                    if base_image:
-                        img_info = {
-                            "index": img_index,
-                            "width": base_image["width"],
-                            "height": base_image["height"]
-                        }
-                        page_info["images"].append(img_info)
+                if text_output_dir:
+                    os.makedirs(text_output_dir, exist_ok=True)
+                    full_path = os.path.join(text_output_dir, f"{base_name}_full.txt")
+                    full_text_file = open(full_path, 'w', encoding='utf-8')
+                    text_files.append(full_path)
                 
-                info["pages"].append(page_info)
+                try:
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        # 先写元数据，再逐页追加到pages数组
+                        header = json.dumps({k: v for k, v in info.items() if k != "pages"}, ensure_ascii=False, indent=2)
+                        f.write(header[:-2] + ',\n  "pages": [')
+                        
+                        for page_info in self.iter_pdf_pages(doc, ocr_pages):
+                            if page_info["page_num"] > 1:
+                                f.write(",")
+                            page_json = json.dumps(page_info, ensure_ascii=False, indent=2)
+                            f.write("\n" + "\n".join("    " + line for line in page_json.splitlines()))
+                            
+                            if full_text_file is not None:
+                                full_text_file.write(page_info["text"] + "\n\n")
+                                page_path = os.path.join(text_output_dir, f"{base_name}_page{page_info['page_num']}.txt")
+                                with open(page_path, 'w', encoding='utf-8') as page_file:
+                                    page_file.write(page_info["text"])
+                                text_files.append(page_path)
+                            
+                            if keep_pages:
+                                info["pages"].append(page_info)
+                        
+                        f.write("\n  ]\n}")
+                    os.replace(tmp_path, output_path)
+                finally:
+                    if full_text_file is not None:
+                        full_text_file.close()
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
             
-            # 保存处理结果
-            output_path = self.storage_path / f"{os.path.splitext(os.path.basename(pdf_path))[0]}.json"
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(info, f, ensure_ascii=False, indent=2)
+            if text_output_dir:
+                info["text_files"] = text_files
             
             self.logger.info(f"PDF处理完成: {pdf_path}")
             return info
@@ -115,6 +205,29 @@ class DataService:
             self.logger.error(f"处理PDF时出错: {e}")
             return {"error": str(e)}
     
+    def process_pdfs(self, pdf_paths: List[str], max_workers: Optional[int] = None,
+                     keep_pages: bool = True) -> List[Dict[str, Any]]:
+        """
+        使用进程池并行处理多个PDF文件
+        
+        Args:
+            pdf_paths: PDF文件路径列表
+            max_workers: 进程池大小，默认使用配置值
+            keep_pages: 返回结果中是否保留各页内容（为False时工作进程不回传页面文本）
+            
+        Returns:
+            与输入顺序一致的PDF处理结果列表（失败的文件返回包含error的字典）
+        """
+        pipeline = IngestionPipeline(max_workers=max_workers)
+        results = pipeline.run(pdf_paths, _process_pdf_task, {"storage_path": str(self.storage_path), "keep_pages": keep_pages}, split_pages=False)
+        
+        infos_by_path = {result.task.path: result.records[0] for result in results}
+        for failed in pipeline.failed:
+            infos_by_path[failed.task.path] = {"error": failed.error}
+        
+        self.logger.info(f"批量PDF处理完成: {len(pdf_paths)} 个文件, 各阶段耗时: {pipeline.report()['stages']}")
+        return [infos_by_path.get(path, {"error": "未处理"}) for path in pdf_paths]
+    
     def extract_text_from_image(self, image_path: str) -> str:
         """
         使用OCR从图像中提取文本
@@ -134,21 +247,13 @@ class DataService:
             return ""
             
         try:
-            import cv2
-            import pytesseract
+            with open(image_path, 'rb') as f:
+                image_bytes = f.read()
             
-            # 读取图像
-            img = cv2.imread(image_path)
+            # 按图像内容哈希缓存，同一图像只识别一次
+            text, cached = ocr_image_bytes(image_bytes, self.ocr_cache)
             
-            # 图像预处理
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            # 自适应阈值处理，提高OCR准确率
-            thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-            
-            # 使用pytesseract进行OCR
-            text = pytesseract.image_to_string(thresh, lang='chi_sim+eng')
-            
-            self.logger.info(f"图像OCR处理完成: {image_path}")
+            self.logger.info(f"图像OCR处理完成{'(缓存)' if cached else ''}: {image_path}")
             return text
             
         except Exception as e:
@@ -236,41 +341,15 @@ class DataService:
             self.logger.error("缺少PDF处理支持")
             return []
             
-        os.makedirs(output_dir, exist_ok=True)
-        
-        try:
-            # 处理PDF
-            pdf_info = self.process_pdf(pdf_path)
-            if "error" in pdf_info:
-                return []
-                
-            file_paths = []
-            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-            
-            # 整份文档的文本
-            full_text = ""
-            for page in pdf_info["pages"]:
-                full_text += page["text"] + "\n\n"
-                
-            # 保存整份文档
-            full_path = os.path.join(output_dir, f"{base_name}_full.txt")
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(full_text)
-            file_paths.append(full_path)
-            
-            # 按页保存
-            for page in pdf_info["pages"]:
-                page_path = os.path.join(output_dir, f"{base_name}_page{page['page_num']}.txt")
-                with open(page_path, 'w', encoding='utf-8') as f:
-                    f.write(page["text"])
-                file_paths.append(page_path)
-            
-            self.logger.info(f"已从PDF创建{len(file_paths)}个文本文件: {pdf_path}")
-            return file_paths
-            
-        except Exception as e:
-            self.logger.error(f"创建文本文件时出错: {e}")
+        # 单次流式遍历同时写出JSON、整份文档和每页的TXT
+        pdf_info = self.extract_pdf(pdf_path, text_output_dir=output_dir)
+        if "error" in pdf_info:
+            self.logger.error(f"创建文本文件时出错: {pdf_info['error']}")
             return []
+        
+        file_paths = pdf_info["text_files"]
+        self.logger.info(f"已从PDF创建{len(file_paths)}个文本文件: {pdf_path}")
+        return file_paths
     
     def get_statistics(self, knowledge_dir: str = "data/knowledge") -> Dict[str, Any]:
         """
@@ -313,4 +392,4 @@ class DataService:
             
         except Exception as e:
             self.logger.error(f"获取统计信息时出错: {e}")
-            return stats 
\ No newline at end of file
+            return stats 
@@ -0,0 +1,24 @@
+"""
+文档摄取子模块初始化文件
+"""
+from .ingestion_service import IngestionPipeline, IngestionTask, IngestionResult, StageTimer, extract_pages
+from .manifest import SourceManifest, ManifestDiff, file_digest
+from .generation import GenerationSlot, GenerationStore, BackgroundRebuilder, atomic_write_json
+from .ocr import OCRStage, OCRCache, ocr_image_bytes, tesseract_available, ocr_params
+from .token_cache import TokenCache, split_by_whitespace
+from .dedup import (
+    NearDuplicateIndex, MinHasher, DedupStats, duplicate_sources_to_reingest, without_stale_duplicates,
+    merged_competitions
+)
+from .watcher import FolderWatcher, snapshot_folder, diff_snapshots
+
+__all__ = [
+    'IngestionPipeline', 'IngestionTask', 'IngestionResult', 'StageTimer', 'extract_pages',
+    'SourceManifest', 'ManifestDiff', 'file_digest',
+    'GenerationSlot', 'GenerationStore', 'BackgroundRebuilder', 'atomic_write_json',
+    'OCRStage', 'OCRCache', 'ocr_image_bytes', 'tesseract_available', 'ocr_params',
+    'TokenCache', 'split_by_whitespace',
+    'NearDuplicateIndex', 'MinHasher', 'DedupStats', 'duplicate_sources_to_reingest', 'without_stale_duplicates',
+    'merged_competitions',
+    'FolderWatcher', 'snapshot_folder', 'diff_snapshots'
+]
@@ -0,0 +1,168 @@
+"""
+竞赛智能客服系统 - 近重复文本块消除
+对文本块的字符shingle计算MinHash签名，通过LSH分桶找出候选，
+估计Jaccard相似度达到阈值的文本块合并为一个规范文本块，其余来源记为引用
+"""
+import re
+import zlib
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WHITESPACE = re.compile(r"\s+")
+
+
+def shingle_hashes(text: str, size: int) -> np.ndarray:
+    """去除空白后的字符k-gram哈希集合（32位），文本短于k时整体作为一个shingle"""
+    normalized = _WHITESPACE.sub("", text).lower()
+    if len(normalized) <= size:
+        grams = {normalized}
+    else:
+        grams = {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """num_perm 个形如 (a*x + b) mod p 的哈希置换，签名为每个置换下的最小值"""
+
+    def __init__(self, num_perm: int, shingle_size: int, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # a < 2^29 且 x < 2^32，a*x + b 不会溢出uint64
+        self.a = rng.integers(1, 1 << 29, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingle_hashes(text, self.shingle_size)
+        if hashes.size == 0:
+            return np.full(self.num_perm, _MERSENNE_PRIME, dtype=np.uint64)
+        return ((self.a * hashes[np.newaxis, :] + self.b) % _MERSENNE_PRIME).min(axis=1)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH 近重复索引
+
+    签名分为 bands 段，任意一段完全相同即成为候选；候选再用签名估计的Jaccard相似度确认，
+    只有达到阈值才判为重复。先加入的文本块为规范文本块
+    """
+
+    def __init__(self, threshold: Optional[float] = None, num_perm: Optional[int] = None,
+                 bands: Optional[int] = None, shingle_size: Optional[int] = None):
+        self.threshold = settings.DEDUP_THRESHOLD if threshold is None else threshold
+        num_perm = num_perm or settings.DEDUP_NUM_PERM
+        self.bands = bands or settings.DEDUP_BANDS
+        if num_perm % self.bands:
+            raise ValueError(f"MinHash置换数({num_perm})必须是分段数({self.bands})的整数倍")
+        self.rows = num_perm // self.bands
+        self.hasher = MinHasher(num_perm, shingle_size or settings.DEDUP_SHINGLE_SIZE)
+        self._buckets: List[Dict[bytes, List[Hashable]]] = [defaultdict(list) for _ in range(self.bands)]
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+        self.candidates_checked = 0
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _band_keys(self, signature: np.ndarray) -> Iterable[bytes]:
+        for band in range(self.bands):
+            yield signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find(self, signature: np.ndarray) -> Optional[Hashable]:
+        """返回与签名最相似且达到阈值的已有文本块，没有则返回None"""
+        seen: Set[Hashable] = set()
+        best_key, best_similarity = None, self.threshold
+        for band, band_key in enumerate(self._band_keys(signature)):
+            for key in self._buckets[band].get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                self.candidates_checked += 1
+                similarity = float(np.mean(self._signatures[key] == signature))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+        return best_key
+
+    def add(self, key: Hashable, signature: np.ndarray):
+        self._signatures[key] = signature
+        for band, band_key in enumerate(self._band_keys(signature)):
+            self._buckets[band][band_key].append(key)
+
+    def check_and_add(self, key: Hashable, text: str) -> Optional[Hashable]:
+        """
+        检查文本块是否与已有文本块近重复；不重复时以 key 加入索引
+
+        Returns:
+            重复时返回规范文本块的key，否则返回None
+        """
+        signature = self.hasher.signature(text)
+        canonical = self.find(signature)
+        if canonical is None:
+            self.add(key, signature)
+        return canonical
+
+
+def duplicate_sources_to_reingest(docs: Iterable[Dict[str, Any]], stale_sources: Set[str]) -> Set[str]:
+    """
+    增量重建时，规范文本块所在文件被移除会连带丢失指向它的重复来源，
+    返回这些需要重新摄取的来源文件名（不含本就过期的文件）
+    """
+    sources: Set[str] = set()
+    for doc in docs:
+        if doc.get("source") in stale_sources:
+            sources.update(ref["source"] for ref in doc.get("duplicates", ()))
+    return sources - stale_sources
+
+
+def without_stale_duplicates(doc: Dict[str, Any], stale_sources: Set[str]) -> Dict[str, Any]:
+    """返回去掉了过期来源引用的文本块（无需修改时返回原对象，需要修改时返回副本）"""
+    duplicates = doc.get("duplicates")
+    if not duplicates or not any(ref["source"] in stale_sources for ref in duplicates):
+        return doc
+    doc = dict(doc)
+    kept = [ref for ref in duplicates if ref["source"] not in stale_sources]
+    if kept:
+        doc["duplicates"] = kept
+    else:
+        del doc["duplicates"]
+    return doc
+
+
+def merged_competitions(doc: Dict[str, Any], competition_key: str = "competition") -> Set[str]:
+    """
+    文本块自身及合并到它上面的重复来源所属的竞赛类型；
+    规范文本块需出现在其中每个竞赛类型的文档列表中，按竞赛过滤检索时才能找到跨竞赛的重复内容
+    """
+    competitions = {ref.get("competition") for ref in doc.get("duplicates", ())}
+    competitions.add(doc.get(competition_key))
+    competitions.discard(None)
+    return competitions
+
+
+class DedupStats:
+    """去重统计：合并掉的文本块数与因此少写入的倒排项数"""
+
+    def __init__(self, index: NearDuplicateIndex):
+        self.index = index
+        self.chunks_removed = 0
+        self.postings_removed = 0
+
+    def record(self, keyword_count: int):
+        self.chunks_removed += 1
+        self.postings_removed += keyword_count
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "threshold": self.index.threshold,
+            "canonical_chunks": len(self.index),
+            "chunks_removed": self.chunks_removed,
+            "postings_removed": self.postings_removed,
+            "candidates_checked": self.index.candidates_checked,
+        }
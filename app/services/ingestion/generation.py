@@ -0,0 +1,183 @@
+"""
+竞赛智能客服系统 - 索引代际管理
+每次构建产出一代不可变的索引数据，检索时一次性取得当前代的引用；
+新一代构建并落盘后原子替换引用，同时保留上一代用于即时回滚
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write_json(path: str, data: Any, **dump_kwargs: Any):
+    """
+    原子写入JSON文件：先写同目录临时文件并fsync，再用os.replace替换目标文件，
+    读取方要么看到旧文件要么看到完整的新文件
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class GenerationStore:
+    """
+    一代索引的磁盘存储
+
+    每代的全部文件（含源文件清单）写入独立目录 <root>/<name>_generations/<目录>/，
+    写完后再原子替换指针文件 <root>/<name>_current.json；读取方只经指针定位目录，
+    因此要么看到完整的旧一代，要么看到完整的新一代。只保留当前代和上一代的目录
+    """
+
+    def __init__(self, root: str, name: str):
+        self.root = root
+        self.generations_dir = os.path.join(root, f"{name}_generations")
+        self.pointer_path = os.path.join(root, f"{name}_current.json")
+
+    def current_dir(self) -> str:
+        """
+        当前代所在目录
+
+        尚无指针文件时返回 root（兼容旧版直接平铺在索引目录下的文件）；
+        指针损坏或指向的目录缺少文件时返回不含索引文件的目录，加载失败后由调用方全量重建
+        """
+        if not os.path.exists(self.pointer_path):
+            return self.root
+        try:
+            with open(self.pointer_path, "r", encoding="utf-8") as f:
+                pointer = json.load(f)
+            directory = os.path.join(self.generations_dir, pointer["directory"])
+        except Exception as e:
+            logger.error(f"读取索引代指针失败 {self.pointer_path}: {e}")
+            return self.generations_dir
+        missing = [name for name in pointer.get("files", []) if not os.path.exists(os.path.join(directory, name))]
+        if missing:
+            logger.error(f"索引代目录不完整 {directory}，缺少: {missing}")
+            return self.generations_dir
+        return directory
+
+    @contextmanager
+    def new_generation(self, generation_id: int) -> Iterator[str]:
+        """
+        为新一代创建独立目录，with块内把该代的全部文件写入该目录；
+        正常退出时原子替换指针并清理更早的代，异常时删除该目录，指针保持不变
+        """
+        os.makedirs(self.generations_dir, exist_ok=True)
+        directory = tempfile.mkdtemp(prefix=f"{generation_id}_", dir=self.generations_dir)
+        try:
+            yield directory
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        previous = self.current_dir()
+        atomic_write_json(self.pointer_path, {
+            "generation_id": generation_id,
+            "directory": os.path.basename(directory),
+            "files": sorted(os.listdir(directory))
+        })
+        for name in os.listdir(self.generations_dir):
+            path = os.path.join(self.generations_dir, name)
+            if path not in (directory, previous):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+class GenerationSlot:
+    """
+    当前代/上一代索引的引用槽
+
+    发布和回滚都只是一次引用赋值，检索方读取 current 无需加锁；
+    各代数据发布后不再修改，因此正在执行的检索始终看到一份完整的索引
+    """
+
+    def __init__(self, initial: Any = None):
+        self._lock = threading.Lock()
+        self.current = initial
+        self.previous = None
+
+    def next_generation_id(self) -> int:
+        current_id = getattr(self.current, "generation_id", 0)
+        previous_id = getattr(self.previous, "generation_id", 0)
+        return max(current_id, previous_id) + 1
+
+    def publish(self, generation: Any):
+        """发布新一代索引，原当前代成为上一代"""
+        with self._lock:
+            self.previous, self.current = self.current, generation
+
+    def rollback(self) -> bool:
+        """与上一代互换；再次调用即可恢复到回滚前的一代"""
+        with self._lock:
+            if self.previous is None:
+                return False
+            self.previous, self.current = self.current, self.previous
+            return True
+
+    def info(self) -> Dict[str, Any]:
+        def describe(generation):
+            return generation.summary() if generation is not None else None
+        return {"current": describe(self.current), "previous": describe(self.previous)}
+
+
+class BackgroundRebuilder:
+    """在后台线程中执行索引重建，同一时间只允许一个重建任务，并记录最近一次的状态"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.status: Dict[str, Any] = {"state": "idle", "started_at": None, "finished_at": None,
+                                       "error": None, "report": None}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, build: Callable[..., Any], *args: Any, **kwargs: Any) -> bool:
+        """
+        启动后台重建
+
+        Returns:
+            已有重建任务在运行时返回False
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self.status = {"state": "running", "started_at": time.time(), "finished_at": None,
+                           "error": None, "report": None}
+            self._thread = threading.Thread(target=self._run, args=(build, args, kwargs),
+                                            name=f"rebuild-{self.name}", daemon=True)
+            self._thread.start()
+        logger.info(f"后台索引重建已启动: {self.name}")
+        return True
+
+    def _run(self, build: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]):
+        try:
+            report = build(*args, **kwargs)
+            self.status.update(state="succeeded", report=report)
+            logger.info(f"后台索引重建完成: {self.name}")
+        except Exception as e:
+            self.status.update(state="failed", error=str(e))
+            logger.error(f"后台索引重建失败 {self.name}: {e}", exc_info=True)
+        finally:
+            self.status["finished_at"] = time.time()
+
+    def join(self, timeout: Optional[float] = None):
+        """等待当前重建任务结束（主要用于脚本和关闭流程）"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
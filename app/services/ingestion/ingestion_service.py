@@ -0,0 +1,215 @@
+"""
+竞赛智能客服系统 - 并行文档摄取管道
+将PDF按文件和页段分发到进程池，在工作进程中完成文本提取、分块和分词，
+由父进程按原始顺序合并各工作进程返回的部分结果
+"""
+import os
+import time
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IngestionTask:
+    """单个摄取任务：一个文件中的一段连续页面 [start_page, end_page)，end_page为None表示到文件末尾"""
+    path: str
+    start_page: int = 0
+    end_page: Optional[int] = None
+    order: int = 0  # 文件在本次摄取中的顺序，用于父进程按原始顺序合并
+
+
+@dataclass
+class IngestionResult:
+    """工作进程返回的部分结果"""
+    task: IngestionTask
+    records: List[Any] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class StageTimer:
+    """按阶段累计耗时（秒）"""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def merge(self, timings: Dict[str, float]):
+        for name, seconds in timings.items():
+            self.add(name, seconds)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(seconds, 3) for name, seconds in self.totals.items()}
+
+
+def extract_pages(task: IngestionTask, ocr_pages: Optional[Dict[int, str]] = None) -> Iterator[Tuple[int, str]]:
+    """
+    在工作进程中提取任务范围内的页面文本
+
+    Args:
+        task: 摄取任务
+        ocr_pages: OCR阶段得到的纯图像页面文本 {页码: 文本}，这些页面用OCR文本代替文本层
+
+    Yields:
+        (页码(从0开始), 页面文本)
+    """
+    if task.path.lower().endswith(".pdf"):
+        import fitz  # PyMuPDF
+
+        ocr_pages = ocr_pages or {}
+        with fitz.open(task.path) as doc:
+            end_page = len(doc) if task.end_page is None else min(task.end_page, len(doc))
+            for page_num in range(task.start_page, end_page):
+                if page_num in ocr_pages:
+                    yield page_num, ocr_pages[page_num]
+                else:
+                    yield page_num, doc[page_num].get_text()
+    else:
+        with open(task.path, "r", encoding="utf-8") as f:
+            yield 0, f.read()
+
+
+def _run_task(worker: Callable, task: IngestionTask, options: Dict[str, Any]) -> IngestionResult:
+    """在工作进程中执行单个任务，异常作为结果返回而不是中断整个管道"""
+    try:
+        records, timings = worker(task, options)
+        return IngestionResult(task=task, records=records, timings=timings)
+    except Exception as e:
+        return IngestionResult(task=task, error=f"{type(e).__name__}: {e}")
+
+
+class IngestionPipeline:
+    """
+    并行摄取管道
+
+    worker 必须是模块级函数（可被pickle），签名为
+    worker(task: IngestionTask, options: dict) -> (records: list, timings: dict)
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, pages_per_task: Optional[int] = None):
+        """
+        Args:
+            max_workers: 进程池大小，默认取 settings.MAX_WORKERS 与CPU核数的较小值
+            pages_per_task: 每个任务包含的PDF页数，默认取 settings.INGEST_PAGES_PER_TASK
+        """
+        cpu_count = os.cpu_count() or 1
+        self.max_workers = max(1, max_workers or min(settings.MAX_WORKERS, cpu_count))
+        self.pages_per_task = max(1, pages_per_task or settings.INGEST_PAGES_PER_TASK)
+        self.timer = StageTimer()
+        self.failed: List[IngestionResult] = []
+        self.ocr_report: Optional[Dict[str, Any]] = None
+
+    def plan(self, paths: List[str], split_pages: bool = True) -> List[IngestionTask]:
+        """
+        将文件列表拆分为任务列表
+
+        Args:
+            paths: 文件路径列表
+            split_pages: 是否将PDF按页段继续拆分；为False时每个文件一个任务
+        """
+        tasks = []
+        for order, path in enumerate(paths):
+            if not split_pages or not path.lower().endswith(".pdf"):
+                tasks.append(IngestionTask(path=path, order=order))
+                continue
+            try:
+                import fitz  # PyMuPDF
+
+                with fitz.open(path) as doc:
+                    page_count = len(doc)
+            except Exception as e:
+                logger.error(f"读取PDF页数失败 {path}: {e}")
+                continue
+            for start in range(0, page_count, self.pages_per_task):
+                tasks.append(IngestionTask(path=path, start_page=start,
+                                           end_page=min(start + self.pages_per_task, page_count), order=order))
+        return tasks
+
+    def run(self, paths: List[str], worker: Callable, options: Optional[Dict[str, Any]] = None,
+            split_pages: bool = True, ocr: bool = False) -> List[IngestionResult]:
+        """
+        执行摄取，返回按 (文件顺序, 起始页) 排序的成功结果
+
+        Args:
+            paths: 文件路径列表
+            worker: 模块级工作函数
+            options: 传递给工作函数的参数（需可pickle）
+            split_pages: 是否按页段拆分PDF
+            ocr: 是否先对PDF中的纯图像页面执行OCR，结果以 options["ocr_pages"] = {路径: {页码: 文本}} 传给工作函数；
+                 识别失败的页面以单页任务的形式记入 failed，调用方不应把所在文件登记为已索引
+        """
+        options = options or {}
+        ocr_failed: List[IngestionResult] = []
+        if ocr:
+            from app.services.ingestion.ocr import OCRStage
+
+            stage = OCRStage()
+            options = dict(options, ocr_pages=stage.run(paths))
+            self.timer.merge(stage.timer.totals)
+            self.ocr_report = stage.report()
+            order = {path: i for i, path in enumerate(paths)}
+            ocr_failed = [
+                IngestionResult(task=IngestionTask(path=path, start_page=page_num, end_page=page_num + 1,
+                                                   order=order[path]),
+                                error=f"OCR失败: {error}")
+                for path, page_num, error in stage.failed_pages
+            ]
+        with self.timer.stage("plan"):
+            tasks = self.plan(paths, split_pages=split_pages)
+
+        start = time.perf_counter()
+        results: List[IngestionResult] = []
+        if self.max_workers == 1 or len(tasks) <= 1:
+            results = [_run_task(worker, task, options) for task in tasks]
+        else:
+            try:
+                with ProcessPoolExecutor(max_workers=min(self.max_workers, len(tasks))) as pool:
+                    futures = [pool.submit(_run_task, worker, task, options) for task in tasks]
+                    for future in as_completed(futures):
+                        results.append(future.result())
+            except Exception as e:
+                # 进程池不可用（如受限环境）时退化为串行执行
+                logger.warning(f"进程池执行失败，退化为串行摄取: {e}")
+                results = [_run_task(worker, task, options) for task in tasks]
+        self.timer.add("workers_wall", time.perf_counter() - start)
+
+        results.sort(key=lambda r: (r.task.order, r.task.start_page))
+        self.failed = sorted([r for r in results if r.error] + ocr_failed,
+                             key=lambda r: (r.task.order, r.task.start_page))
+        for failed in self.failed:
+            logger.error(f"摄取任务失败 {failed.task.path} [{failed.task.start_page}:{failed.task.end_page}]: {failed.error}")
+
+        succeeded = [r for r in results if not r.error]
+        for result in succeeded:
+            self.timer.merge(result.timings)
+
+        logger.info(f"摄取完成: {len(paths)} 个文件, {len(tasks)} 个任务, "
+                    f"{self.max_workers} 个工作进程, 失败 {len(self.failed)} 个")
+        return succeeded
+
+    def report(self) -> Dict[str, Any]:
+        """返回各阶段耗时报告；工作进程阶段为所有任务耗时之和（CPU时间视角）"""
+        return {
+            "workers": self.max_workers,
+            "pages_per_task": self.pages_per_task,
+            "failed_tasks": len(self.failed),
+            "ocr": self.ocr_report,
+            "stages": self.timer.as_dict(),
+        }
@@ -0,0 +1,152 @@
+"""
+竞赛智能客服系统 - 源文件清单
+记录每个已索引源文件的路径、大小、修改时间和内容哈希，
+用于增量重建时只处理新增或变更的文件，并定位已删除的文件
+"""
+import os
+import json
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件内容的SHA-256哈希"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class ManifestDiff:
+    """当前文件集合与清单之间的差异"""
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    @property
+    def to_process(self) -> List[str]:
+        """需要重新摄取的文件（新增+变更）"""
+        return self.added + self.changed
+
+    @property
+    def to_remove(self) -> List[str]:
+        """需要从索引中移除旧内容的文件（变更+删除）"""
+        return self.changed + self.removed
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "added": len(self.added),
+            "changed": len(self.changed),
+            "removed": len(self.removed),
+            "unchanged": len(self.unchanged),
+        }
+
+
+class SourceManifest:
+    """源文件清单：path -> {size, mtime, sha256, ...附加元数据}"""
+
+    def __init__(self, manifest_path: str, params: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            manifest_path: 清单文件路径
+            params: 影响索引内容的构建参数；参数变化时清单失效，需要全量重建
+        """
+        self.manifest_path = manifest_path
+        self.params = params or {}
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._digests: Dict[str, str] = {}  # diff过程中计算过的哈希，供record复用
+
+    def load(self) -> bool:
+        """
+        加载清单
+
+        Returns:
+            清单存在、版本和构建参数均匹配时返回True；否则清空条目并返回False
+        """
+        self.entries = {}
+        if not os.path.exists(self.manifest_path):
+            return False
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"加载源文件清单失败 {self.manifest_path}: {e}")
+            return False
+
+        if data.get("version") != MANIFEST_VERSION or data.get("params") != self.params:
+            logger.info(f"源文件清单版本或构建参数已变化，需要全量重建: {self.manifest_path}")
+            return False
+
+        self.entries = data.get("files", {})
+        return True
+
+    def save(self):
+        """写入清单（先写临时文件再替换，避免中途失败留下损坏的清单）"""
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "params": self.params, "files": self.entries},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def reset(self):
+        """清空所有条目（全量重建前调用）"""
+        self.entries = {}
+        self._digests = {}
+
+    def diff(self, paths: List[str]) -> ManifestDiff:
+        """
+        比较当前文件集合与清单
+
+        大小和修改时间都未变化的文件直接视为未变化；否则计算内容哈希确认，
+        仅被touch过而内容相同的文件不会触发重新摄取
+        """
+        result = ManifestDiff()
+        current = set(paths)
+        for path in paths:
+            entry = self.entries.get(path)
+            if entry is None:
+                result.added.append(path)
+                continue
+            stat = os.stat(path)
+            if stat.st_size == entry.get("size") and stat.st_mtime == entry.get("mtime"):
+                result.unchanged.append(path)
+                continue
+            digest = file_digest(path)
+            self._digests[path] = digest
+            if digest == entry.get("sha256"):
+                entry["mtime"] = stat.st_mtime
+                result.unchanged.append(path)
+            else:
+                result.changed.append(path)
+        result.removed = [path for path in self.entries if path not in current]
+        return result
+
+    def record(self, path: str, **metadata: Any):
+        """登记（或更新）一个已成功摄取的文件"""
+        stat = os.stat(path)
+        digest = self._digests.pop(path, None) or file_digest(path)
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": digest}
+        entry.update(metadata)
+        self.entries[path] = entry
+
+    def forget(self, path: str):
+        """移除一个文件的条目"""
+        self.entries.pop(path, None)
+        self._digests.pop(path, None)
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(path)
@@ -0,0 +1,243 @@
+"""
+竞赛智能客服系统 - OCR摄取阶段
+识别扫描版PDF中的纯图像页面，在有界进程池中渲染并调用本地tesseract识别，
+识别结果按渲染图像的内容哈希缓存到磁盘，重建索引时同一页面图像只识别一次
+"""
+import os
+import shutil
+import hashlib
+import logging
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.ingestion.ingestion_service import StageTimer
+
+logger = logging.getLogger(__name__)
+
+
+class OCRCache:
+    """OCR结果磁盘缓存：<cache_dir>/<哈希前两位>/<哈希>.txt"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or settings.OCR_CACHE_PATH
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def put(self, key: str, text: str):
+        """写入缓存（临时文件+rename，多个工作进程并发写同一键也安全）"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def image_cache_key(image_bytes: bytes, lang: str) -> str:
+    """缓存键：图像内容哈希（同一图像用不同语言识别的结果分开缓存）"""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f"{digest}_{lang.replace('+', '-')}"
+
+
+def tesseract_available(cmd: Optional[str] = None) -> bool:
+    return shutil.which(cmd or settings.TESSERACT_CMD) is not None
+
+
+def ocr_params() -> Optional[Dict[str, Any]]:
+    """影响OCR文本的构建参数，写入源文件清单；OCR未启用或tesseract不可用时为None"""
+    if not (settings.OCR_ENABLED and tesseract_available()):
+        return None
+    return {"lang": settings.OCR_LANG, "dpi": settings.OCR_DPI, "min_text_chars": settings.OCR_MIN_TEXT_CHARS}
+
+
+def _preprocess(image_bytes: bytes) -> bytes:
+    """灰度+自适应阈值预处理以提高识别率；未安装OpenCV时原样返回"""
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        return image_bytes
+
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return image_bytes
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+    ok, encoded = cv2.imencode(".png", thresh)
+    return encoded.tobytes() if ok else image_bytes
+
+
+def run_tesseract(image_bytes: bytes, lang: Optional[str] = None, cmd: Optional[str] = None,
+                  timeout: Optional[int] = None) -> str:
+    """通过标准输入把图像交给本地tesseract识别，返回识别文本"""
+    completed = subprocess.run(
+        [cmd or settings.TESSERACT_CMD, "stdin", "stdout", "-l", lang or settings.OCR_LANG],
+        input=_preprocess(image_bytes),
+        capture_output=True,
+        timeout=timeout or settings.OCR_TIMEOUT,
+        check=True,
+    )
+    return completed.stdout.decode("utf-8", errors="ignore")
+
+
+def ocr_image_bytes(image_bytes: bytes, cache: OCRCache, lang: Optional[str] = None) -> Tuple[str, bool]:
+    """
+    识别一张图像，优先使用缓存
+
+    Returns:
+        (识别文本, 是否命中缓存)
+    """
+    lang = lang or settings.OCR_LANG
+    key = image_cache_key(image_bytes, lang)
+    text = cache.get(key)
+    if text is not None:
+        return text, True
+    text = run_tesseract(image_bytes, lang)
+    cache.put(key, text)
+    return text, False
+
+
+def find_image_only_pages(doc, min_chars: Optional[int] = None) -> List[int]:
+    """找出文本层几乎为空但包含图像的页面（从0开始的页码）"""
+    min_chars = settings.OCR_MIN_TEXT_CHARS if min_chars is None else min_chars
+    pages = []
+    for page_num, page in enumerate(doc):
+        if len(page.get_text().strip()) < min_chars and page.get_images():
+            pages.append(page_num)
+    return pages
+
+
+def _ocr_page(path: str, page_num: int, options: Dict[str, Any]) -> Tuple[str, bool, Dict[str, float]]:
+    """OCR工作函数：在工作进程中渲染单页并识别"""
+    import fitz  # PyMuPDF
+
+    timer = StageTimer()
+    with timer.stage("ocr_render"):
+        with fitz.open(path) as doc:
+            image_bytes = doc[page_num].get_pixmap(dpi=options["dpi"]).tobytes("png")
+    with timer.stage("ocr_recognize"):
+        text, cached = ocr_image_bytes(image_bytes, OCRCache(options["cache_dir"]), options["lang"])
+    return text, cached, timer.totals
+
+
+class OCRStage:
+    """
+    摄取管道中的OCR阶段
+
+    父进程只扫描文本层找出纯图像页面，渲染和识别都在有界进程池中进行，
+    同时在途的任务数不超过进程数的两倍，内存不随扫描页数增长
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, cache_dir: Optional[str] = None,
+                 lang: Optional[str] = None, dpi: Optional[int] = None):
+        cpu_count = os.cpu_count() or 1
+        self.max_workers = max(1, max_workers or min(settings.OCR_MAX_WORKERS, cpu_count))
+        self.options = {
+            "cache_dir": cache_dir or settings.OCR_CACHE_PATH,
+            "lang": lang or settings.OCR_LANG,
+            "dpi": dpi or settings.OCR_DPI,
+        }
+        self.timer = StageTimer()
+        self.stats = {"pages": 0, "cache_hits": 0, "recognized": 0, "failed": 0}
+        self.failed_pages: List[Tuple[str, int, str]] = []  # (路径, 页码, 错误信息)
+
+    @property
+    def enabled(self) -> bool:
+        return settings.OCR_ENABLED and tesseract_available()
+
+    def scan(self, pdf_paths: List[str]) -> List[Tuple[str, int]]:
+        """扫描PDF，返回需要OCR的 (路径, 页码) 列表"""
+        import fitz  # PyMuPDF
+
+        jobs = []
+        for path in pdf_paths:
+            try:
+                with fitz.open(path) as doc:
+                    jobs.extend((path, page_num) for page_num in find_image_only_pages(doc))
+            except Exception as e:
+                logger.error(f"扫描PDF图像页面失败 {path}: {e}")
+        return jobs
+
+    def run(self, pdf_paths: List[str]) -> Dict[str, Dict[int, str]]:
+        """
+        对所有纯图像页面执行OCR
+
+        Returns:
+            {PDF路径: {页码(从0开始): 识别文本}}
+        """
+        results: Dict[str, Dict[int, str]] = {}
+        pdf_paths = [path for path in pdf_paths if path.lower().endswith(".pdf")]
+        if not pdf_paths:
+            return results
+        if not self.enabled:
+            if settings.OCR_ENABLED:
+                logger.warning(f"未找到tesseract可执行文件({settings.TESSERACT_CMD})，跳过OCR阶段")
+            return results
+
+        with self.timer.stage("ocr_scan"):
+            jobs = self.scan(pdf_paths)
+        self.stats["pages"] = len(jobs)
+        if not jobs:
+            return results
+        logger.info(f"发现 {len(jobs)} 个纯图像页面，使用 {self.max_workers} 个进程进行OCR")
+
+        def collect(job, outcome):
+            path, page_num = job
+            text, cached, timings = outcome
+            results.setdefault(path, {})[page_num] = text
+            self.stats["cache_hits" if cached else "recognized"] += 1
+            self.timer.merge(timings)
+
+        with self.timer.stage("ocr_wall"):
+            if self.max_workers == 1 or len(jobs) == 1:
+                for job in jobs:
+                    try:
+                        collect(job, _ocr_page(job[0], job[1], self.options))
+                    except Exception as e:
+                        self._fail(job, e)
+            else:
+                self._run_pool(jobs, collect)
+
+        logger.info(f"OCR完成: {self.stats}")
+        return results
+
+    def _run_pool(self, jobs: List[Tuple[str, int]], collect):
+        """滑动窗口提交任务，限制在途任务数"""
+        pending = {}
+        queue = iter(jobs)
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                while len(pending) < self.max_workers * 2:
+                    job = next(queue, None)
+                    if job is None:
+                        break
+                    pending[executor.submit(_ocr_page, job[0], job[1], self.options)] = job
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = pending.pop(future)
+                    try:
+                        collect(job, future.result())
+                    except Exception as e:
+                        self._fail(job, e)
+
+    def _fail(self, job: Tuple[str, int], error: Exception):
+        """记录识别失败的页面，摄取管道据此把所在文件标记为失败，下次重建时重试"""
+        path, page_num = job
+        self.stats["failed"] += 1
+        self.failed_pages.append((path, page_num, str(error)))
+        logger.error(f"OCR失败 {path} 第{page_num + 1}页: {error}")
+
+    def report(self) -> Dict[str, Any]:
+        return {"workers": self.max_workers, **self.stats, "stages": self.timer.as_dict()}
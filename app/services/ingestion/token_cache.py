@@ -0,0 +1,141 @@
+"""
+竞赛智能客服系统 - 分词结果缓存
+按页面文本哈希和jieba词典版本（jieba_helper.dictionary_version）缓存词性标注结果 (word, flag)，
+调整分块、关键词数量或停用词后重建索引时直接复用，不再重新运行pseg
+"""
+import os
+import zlib
+import hashlib
+import logging
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+Token = Tuple[str, str]
+
+TOKEN_CACHE_FORMAT = 1
+
+
+def encode_tokens(tokens: List[Token]) -> bytes:
+    """
+    紧凑编码：由于 ''.join(words) == text，只需保存每个词的长度和词性编号，
+    词本身在读取时从原文切出
+    """
+    flags: List[str] = []
+    flag_ids: Dict[str, int] = {}
+    lengths = array("I")
+    ids = array("H")
+    for word, flag in tokens:
+        if flag not in flag_ids:
+            flag_ids[flag] = len(flags)
+            flags.append(flag)
+        lengths.append(len(word))
+        ids.append(flag_ids[flag])
+    header = "\t".join(flags).encode("utf-8")
+    payload = (len(header).to_bytes(4, "little") + header
+               + len(tokens).to_bytes(4, "little") + lengths.tobytes() + ids.tobytes())
+    return zlib.compress(payload)
+
+
+def decode_tokens(data: bytes, text: str) -> List[Token]:
+    """按长度从原文切出各词，恢复 (word, flag) 列表"""
+    payload = zlib.decompress(data)
+    header_len = int.from_bytes(payload[:4], "little")
+    flags = payload[4:4 + header_len].decode("utf-8").split("\t")
+    offset = 4 + header_len
+    count = int.from_bytes(payload[offset:offset + 4], "little")
+    offset += 4
+    lengths = array("I")
+    lengths.frombytes(payload[offset:offset + count * lengths.itemsize])
+    offset += count * lengths.itemsize
+    ids = array("H")
+    ids.frombytes(payload[offset:offset + count * ids.itemsize])
+
+    tokens = []
+    position = 0
+    for length, flag_id in zip(lengths, ids):
+        tokens.append((text[position:position + length], flags[flag_id]))
+        position += length
+    if position != len(text):
+        raise ValueError("分词缓存与原文长度不一致")
+    return tokens
+
+
+class TokenCache:
+    """
+    分词结果磁盘缓存：<cache_dir>/<词典版本>.<编码格式>/<哈希前两位>/<文本哈希>.tok
+
+    词典变化后分词结果不同，换用新目录，旧缓存自然失效
+    """
+
+    def __init__(self, version: str, cache_dir: Optional[str] = None):
+        self.cache_dir = os.path.join(cache_dir or settings.TOKEN_CACHE_PATH, f"{version}.{TOKEN_CACHE_FORMAT}")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.tok")
+
+    def get(self, text: str) -> Optional[List[Token]]:
+        path = self._path(self.text_key(text))
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                return decode_tokens(f.read(), text)
+        except Exception as e:
+            logger.warning(f"读取分词缓存失败 {path}: {e}")
+            return None
+
+    def put(self, text: str, tokens: List[Token]):
+        """写入缓存（临时文件+rename，多个工作进程并发写同一键也安全）"""
+        path = self._path(self.text_key(text))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(encode_tokens(tokens))
+        os.replace(tmp_path, path)
+
+    def tokenize(self, text: str, segment) -> List[Token]:
+        """
+        取得文本的分词结果，未命中时调用 segment(text) 并写入缓存
+
+        Args:
+            segment: 分词函数，如 pseg.lcut
+        """
+        tokens = self.get(text)
+        if tokens is not None:
+            self.hits += 1
+            return tokens
+        self.misses += 1
+        tokens = [(word, flag) for word, flag in segment(text)]
+        self.put(text, tokens)
+        return tokens
+
+
+def split_by_whitespace(tokens: List[Token]) -> Dict[str, List[Token]]:
+    """
+    把整页分词结果按空白符切成片段：片段原文 -> 片段内的词
+
+    jieba以空白符为分块边界，因此任意由空白分隔的片段单独分词的结果与整页分词中对应部分一致，
+    分块后的文本块可以通过 chunk.split() 查表拼出自己的分词结果
+    """
+    pieces: Dict[str, List[Token]] = {}
+    current: List[Token] = []
+    for word, flag in tokens:
+        if word.isspace():
+            if current:
+                pieces["".join(w for w, _ in current)] = current
+                current = []
+        else:
+            current.append((word, flag))
+    if current:
+        pieces["".join(w for w, _ in current)] = current
+    return pieces
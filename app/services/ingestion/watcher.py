@@ -0,0 +1,191 @@
+"""
+竞赛智能客服系统 - 知识库目录监听
+后台线程监听知识库目录中文档的新增、变更和删除，变化稳定（防抖）后触发增量摄取和索引热替换；
+安装了watchdog时使用inotify等系统通知及时唤醒，否则按固定间隔轮询
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+def snapshot_folder(root: str, extensions: Tuple[str, ...]) -> Snapshot:
+    """目录下所有目标文件的 (大小, 修改时间ns)"""
+    snapshot: Snapshot = {}
+    for dirpath, _, files in os.walk(root):
+        for file in files:
+            if not file.lower().endswith(extensions):
+                continue
+            path = os.path.join(dirpath, file)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # 扫描期间被删除
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def diff_snapshots(old: Snapshot, new: Snapshot) -> Dict[str, List[str]]:
+    return {
+        "added": sorted(path for path in new if path not in old),
+        "changed": sorted(path for path in new if path in old and new[path] != old[path]),
+        "removed": sorted(path for path in old if path not in new),
+    }
+
+
+class FolderWatcher:
+    """
+    目录监听器
+
+    每次扫描得到目录快照，与上次已处理的快照不同即为待处理变化；
+    快照在 debounce 秒内不再变化（文件拷贝完成）后调用 on_change(changes)。
+    on_change 返回False或抛出异常时保留变化，下一轮继续尝试
+    """
+
+    def __init__(self, root: str, on_change: Callable[[Dict[str, List[str]]], Any],
+                 interval: Optional[float] = None, debounce: Optional[float] = None,
+                 extensions: Tuple[str, ...] = (".pdf", ".txt")):
+        self.root = root
+        self.on_change = on_change
+        self.interval = interval or settings.WATCH_INTERVAL
+        self.debounce = settings.WATCH_DEBOUNCE if debounce is None else debounce
+        self.extensions = extensions
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+        self._committed: Snapshot = {}
+        self._observed: Snapshot = {}
+        self._observed_at = 0.0
+        self.mode = "polling"
+        self.stats: Dict[str, Any] = {"scans": 0, "triggers": 0, "last_scan": None, "last_trigger": None,
+                                      "last_changes": None, "pending": None, "last_error": None}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """以当前目录内容为基线开始监听（启动时已有的文件由启动流程自行加载）"""
+        if self.running:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        self._committed = snapshot_folder(self.root, self.extensions)
+        self._observed = self._committed
+        self._stop.clear()
+        self._start_observer()
+        self._thread = threading.Thread(target=self._loop, name="knowledge-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"知识库目录监听已启动({self.mode}): {self.root}, 间隔 {self.interval}s, 防抖 {self.debounce}s")
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout)
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout)
+        logger.info("知识库目录监听已停止")
+
+    def _start_observer(self):
+        """可用时注册文件系统通知，事件只负责唤醒扫描，变化仍以快照比较为准"""
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            self.mode = "polling"
+            return
+
+        wake = self._wake
+
+        class _WakeHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+
+        try:
+            observer = Observer()
+            observer.schedule(_WakeHandler(), self.root, recursive=True)
+            observer.start()
+        except Exception as e:
+            logger.warning(f"文件系统通知不可用，改为轮询: {e}")
+            self.mode = "polling"
+            return
+        self._observer = observer
+        self.mode = "notify"
+
+    def _loop(self):
+        while not self._stop.is_set():
+            # 有待处理变化时按间隔检查防抖是否结束；否则通知模式下可以等待更久
+            pending = self._observed != self._committed
+            timeout = self.interval if (pending or self.mode == "polling") else max(self.interval, 30.0)
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.scan_once()
+            except Exception as e:
+                self.stats["last_error"] = f"{type(e).__name__}: {e}"
+                logger.error(f"知识库目录扫描失败: {e}", exc_info=True)
+
+    def scan_once(self, now: Optional[float] = None) -> bool:
+        """
+        扫描一次目录
+
+        Returns:
+            本次是否触发了 on_change 且处理成功
+        """
+        now = time.time() if now is None else now
+        snapshot = snapshot_folder(self.root, self.extensions)
+        self.stats["scans"] += 1
+        self.stats["last_scan"] = now
+
+        if snapshot != self._observed:
+            # 仍在变化（例如大文件拷贝中），重新开始防抖计时
+            self._observed = snapshot
+            self._observed_at = now
+        if snapshot == self._committed:
+            self.stats["pending"] = None
+            return False
+
+        changes = diff_snapshots(self._committed, snapshot)
+        self.stats["pending"] = {kind: len(paths) for kind, paths in changes.items()}
+        if now - self._observed_at < self.debounce:
+            return False
+
+        logger.info(f"检测到知识库变化: 新增 {len(changes['added'])}, 变更 {len(changes['changed'])}, "
+                    f"删除 {len(changes['removed'])}")
+        try:
+            accepted = self.on_change(changes)
+        except Exception as e:
+            self.stats["last_error"] = f"{type(e).__name__}: {e}"
+            logger.error(f"处理知识库变化失败，稍后重试: {e}", exc_info=True)
+            return False
+        if accepted is False:
+            logger.info("索引正在重建，知识库变化稍后重试")
+            return False
+
+        self._committed = snapshot
+        self.stats.update(triggers=self.stats["triggers"] + 1, last_trigger=now, pending=None,
+                          last_changes=changes, last_error=None)
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "root": self.root,
+            "mode": self.mode,
+            "running": self.running,
+            "interval": self.interval,
+            "debounce": self.debounce,
+            "files": len(self._committed),
+            **self.stats,
+        }
@@ -10,29 +10,97 @@ from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import math
 import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+
+from app.services.ingestion import (
+    IngestionTask, IngestionPipeline, StageTimer, SourceManifest, ocr_params,
+    GenerationSlot, GenerationStore, BackgroundRebuilder, atomic_write_json
+)
+from app.utils.jieba_helper import dictionary_version
+from app.utils.tracing import set_attributes
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 短于此长度的段落不建索引
+MIN_PARAGRAPH_LENGTH = 10
+# 分词时移除的停用词
+STOP_WORDS = frozenset({'的', '了', '和', '是', '在', '有', '与', '及', '或', '等', '中', '为', '以', '对', '将'})
+
+
+def _ingest_document(task: IngestionTask, options: Dict[str, Any]) -> Tuple[List[Tuple[str, List[str]]], Dict[str, float]]:
+    """
+    并行摄取工作函数：读取单个文档，分段并对每个段落分词
+    
+    Args:
+        task: 摄取任务（整份文档）
+        options: 摄取管道传入的参数（ocr_pages 为OCR阶段得到的纯图像页面文本）
+        
+    Returns:
+        ([(段落文本, 分词结果)], 各阶段耗时)
+    """
+    service = KnowledgeService.__new__(KnowledgeService)
+    service.logger = logger
+    timer = StageTimer()
+    
+    with timer.stage("extract"):
+        content = service._read_document(Path(task.path), options.get("ocr_pages", {}).get(task.path))
+    if not content:
+        return [], timer.totals
+    
+    with timer.stage("chunk"):
+        paragraphs = [p for p in service._split_paragraphs(content) if len(p.strip()) >= MIN_PARAGRAPH_LENGTH]  # 忽略太短的段落
+    
+    with timer.stage("segment"):
+        records = [(para_text, service._tokenize(para_text)) for para_text in paragraphs]
+    
+    return records, timer.totals
+
+@dataclass(frozen=True)
+class KnowledgeGeneration:
+    """一代不可变的知识库索引：发布后不再修改，增量更新在副本上进行"""
+    generation_id: int
+    documents: Dict[str, Dict[str, Any]]  # 文档内容
+    paragraphs: Dict[str, Dict[str, Any]]  # 段落内容
+    index: Dict[str, List[Any]]  # 倒排索引
+    idf_values: Dict[str, float]  # 词频-逆文档频率值
+    sources: Dict[str, Dict[str, Any]]  # 源文件清单条目
+    created_at: float = field(default_factory=time.time)
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "generation_id": self.generation_id,
+            "created_at": self.created_at,
+            "documents": len(self.documents),
+            "paragraphs": len(self.paragraphs),
+            "terms": len(self.index)
+        }
+
 class KnowledgeService:
     """知识服务：管理各类竞赛文档的索引和检索"""
     
-    def __init__(self, knowledge_base_path: str = "data/knowledge/docs/附件1"):
+    def __init__(self, knowledge_base_path: str = "data/knowledge/docs/附件1", index_dir: str = "data/knowledge"):
         """
         初始化知识服务
         
         Args:
             knowledge_base_path: 知识库路径
+            index_dir: 索引目录，每代的 index/documents/paragraphs/idf_values.json 和源文件清单写在其下的独立代目录中
         """
         self.knowledge_base_path = Path(knowledge_base_path)
+        self.index_dir = Path(index_dir)
         self.logger = logging.getLogger(__name__)
         self.logger.info(f"知识服务初始化，知识库路径: {self.knowledge_base_path}")
         
-        # 存储结构
-        self.documents = {}  # 文档内容
-        self.paragraphs = {}  # 段落内容
-        self.index = {}  # 倒排索引
-        self.idf_values = {}  # 词频-逆文档频率值
+        # 存储结构：当前代/上一代索引，更新在后台生成新一代后原子替换
+        self._generations = GenerationSlot(KnowledgeGeneration(0, {}, {}, {}, {}, {}))
+        self._store = GenerationStore(str(self.index_dir), "knowledge")  # 每代索引落在独立目录，经指针原子切换
+        self._rebuilder = BackgroundRebuilder("knowledge")
+        self._build_lock = threading.Lock()  # 同一时间只允许一个构建
+        self._publish_lock = threading.Lock()  # 落盘与发布/回滚互斥
+        self.last_build_report: Dict[str, Any] = {}  # 最近一次索引构建的各阶段耗时
         
         # 加载或创建索引
         self._load_or_create_index()
@@ -67,27 +135,68 @@ class KnowledgeService:
             "展示", "答辩", "PPT", "视频", "海报"
         }
         
+    @property
+    def documents(self) -> Dict[str, Dict[str, Any]]:
+        return self._generations.current.documents
+    
+    @property
+    def paragraphs(self) -> Dict[str, Dict[str, Any]]:
+        return self._generations.current.paragraphs
+    
+    @property
+    def index(self) -> Dict[str, List[Any]]:
+        return self._generations.current.index
+    
+    @property
+    def idf_values(self) -> Dict[str, float]:
+        return self._generations.current.idf_values
+    
+    def _source_manifest(self, directory: Optional[str] = None) -> SourceManifest:
+        """
+        已索引源文件清单，用于增量更新；分段、停用词、jieba词典或OCR启用状态变化时清单失效
+        
+        Args:
+            directory: 清单所在的代目录，默认为当前代
+        """
+        return SourceManifest(
+            os.path.join(directory or self._store.current_dir(), "manifest.json"),
+            params={
+                "min_paragraph_length": MIN_PARAGRAPH_LENGTH,
+                "stopwords": sorted(STOP_WORDS),
+                "dictionary": dictionary_version(),
+                "ocr": ocr_params()
+            }
+        )
+    
     def _load_or_create_index(self):
         """加载或创建知识库索引"""
-        index_file = Path("data/knowledge/index.json")
-        documents_file = Path("data/knowledge/documents.json")
-        paragraphs_file = Path("data/knowledge/paragraphs.json")
+        directory = self._store.current_dir()
+        index_file = Path(directory) / "index.json"
+        documents_file = Path(directory) / "documents.json"
+        paragraphs_file = Path(directory) / "paragraphs.json"
         
         if index_file.exists() and documents_file.exists() and paragraphs_file.exists():
             try:
                 # 加载现有索引
                 with open(index_file, 'r', encoding='utf-8') as f:
-                    self.index = json.load(f)
+                    index = json.load(f)
                 with open(documents_file, 'r', encoding='utf-8') as f:
-                    self.documents = json.load(f)
+                    documents = json.load(f)
                 with open(paragraphs_file, 'r', encoding='utf-8') as f:
-                    self.paragraphs = json.load(f)
+                    paragraphs = json.load(f)
                 
                 # 加载IDF值
-                idf_file = Path("data/knowledge/idf_values.json")
+                idf_values = {}
+                idf_file = Path(directory) / "idf_values.json"
                 if idf_file.exists():
                     with open(idf_file, 'r', encoding='utf-8') as f:
-                        self.idf_values = json.load(f)
+                        idf_values = json.load(f)
+                
+                manifest = self._source_manifest(directory)
+                manifest.load()
+                self._generations.publish(KnowledgeGeneration(
+                    self._generations.next_generation_id(), documents, paragraphs, index, idf_values, manifest.entries
+                ))
                 
                 self.logger.info(f"已加载知识库索引，包含{len(self.documents)}个文档和{len(self.paragraphs)}个段落")
                 return
@@ -96,91 +205,181 @@ class KnowledgeService:
         
         # 创建新索引
         self.logger.info("正在创建新的知识库索引...")
-        self._create_index()
-        self._save_index()
+        self._create_index(full=True)
         self.logger.info("知识库索引创建完成")
     
-    def _create_index(self):
-        """创建知识库索引"""
-        if not self.knowledge_base_path.exists():
-            self.logger.error(f"知识库路径不存在: {self.knowledge_base_path}")
-            return
-        
-        # 读取所有文档
-        doc_id = 0
-        paragraph_id = 0
-        term_document_count = {}  # 记录每个词出现在几个文档中
+    def _create_index(self, full: bool = False) -> Dict[str, Any]:
+        """
+        创建新一代知识库索引，原子落盘后替换当前代
         
-        # 遍历所有文档
-        for file_path in self.knowledge_base_path.glob("**/*.*"):
-            if file_path.is_file() and file_path.suffix.lower() in ['.txt', '.pdf', '.docx', '.md']:
-                try:
+        当前代带有源文件清单时做增量更新：在当前代的副本上只重新摄取新增或变更的文档，
+        并移除已删除/变更文档的段落和倒排项；否则全量重建。构建期间检索继续使用当前代
+        
+        Args:
+            full: 是否强制全量重建
+            
+        Returns:
+            构建报告
+        """
+        with self._build_lock:
+            if not self.knowledge_base_path.exists():
+                self.logger.error(f"知识库路径不存在: {self.knowledge_base_path}")
+                return self.last_build_report
+            
+            file_paths = [str(file_path) for file_path in sorted(self.knowledge_base_path.glob("**/*.*"))
+                          if file_path.is_file() and file_path.suffix.lower() in ['.txt', '.pdf', '.docx', '.md']]
+            
+            base = self._generations.current
+            manifest = self._source_manifest()
+            # 磁盘上的清单记录了当前代的构建参数，参数变化时 load() 返回False，改为全量重建
+            incremental = not full and bool(base.documents) and bool(base.sources) and manifest.load()
+            diff = None
+            if incremental:
+                manifest.entries = {path: dict(entry) for path, entry in base.sources.items()}
+                diff = manifest.diff(file_paths)
+                self.logger.info(f"增量更新知识库索引: {diff.summary()}")
+                if not diff.has_changes:
+                    self.last_build_report = {"mode": "incremental", "manifest": diff.summary()}
+                    return self.last_build_report
+                
+                # 在当前代的副本上移除变更和已删除文档的旧段落（新增文档也清理一次，覆盖上次失败残留的内容）
+                documents = {key: dict(doc) for key, doc in base.documents.items()}
+                paragraphs = dict(base.paragraphs)
+                index = {term: list(postings) for term, postings in base.index.items()}
+                removed = self._remove_documents(documents, paragraphs, index, set(diff.to_process + diff.removed))
+                for path in diff.removed:
+                    manifest.forget(path)
+                self.logger.info(f"已移除 {removed} 个过期段落")
+                file_paths = diff.to_process
+            else:
+                documents = {}
+                paragraphs = {}
+                index = {}
+                manifest.reset()
+            
+            # 新文档和段落的ID接在现有最大ID之后
+            doc_id = max((int(key.split("_")[1]) for key in documents), default=0)
+            paragraph_id = max((int(key.split("_")[1]) for key in paragraphs), default=0)
+            
+            # 并行读取、分段和分词，父进程按原始顺序合并为倒排索引
+            pipeline = IngestionPipeline()
+            results = pipeline.run(file_paths, _ingest_document, {}, split_pages=False, ocr=True)
+            # 有页面OCR失败的文档照常合并已提取的内容，但不登记到清单，下次更新时重新摄取
+            failed_paths = {failed.task.path for failed in pipeline.failed}
+            
+            with pipeline.timer.stage("merge"):
+                for result in results:
+                    file_path = Path(result.task.path)
                     doc_id += 1
                     doc_key = f"doc_{doc_id}"
-                    self.documents[doc_key] = {
+                    documents[doc_key] = {
                         "path": str(file_path),
                         "title": file_path.stem,
                         "paragraphs": []
                     }
                     
-                    # 读取文档内容
-                    content = self._read_document(file_path)
-                    if not content:
-                        continue
-                    
-                    # 分段处理
-                    paragraphs = self._split_paragraphs(content)
-                    
-                    # 文档使用的所有术语
-                    doc_terms = set()
-                    
-                    for para_text in paragraphs:
-                        if len(para_text.strip()) < 10:  # 忽略太短的段落
-                            continue
-                            
+                    for para_text, terms in result.records:
                         paragraph_id += 1
                         para_key = f"para_{paragraph_id}"
                         
-                        # 保存段落
-                        self.paragraphs[para_key] = {
-                            "doc_id": doc_key,
-                            "text": para_text,
-                            "terms": {}  # 词频统计
-                        }
-                        self.documents[doc_key]["paragraphs"].append(para_key)
-                        
-                        # 分词和索引
-                        terms = self._tokenize(para_text)
                         term_freq = {}  # 词频统计
-                        
                         for term in terms:
                             term_freq[term] = term_freq.get(term, 0) + 1
-                            doc_terms.add(term)
                             
-                            # 更新倒排索引
-                            if term not in self.index:
-                                self.index[term] = []
-                            if para_key not in [item[0] for item in self.index[term]]:
-                                self.index[term].append((para_key, term_freq.get(term, 1)))
+                            # 更新倒排索引（每个段落只在词首次出现时登记一次）
+                            if term_freq[term] == 1:
+                                index.setdefault(term, []).append((para_key, 1))
                         
-                        # 保存段落中的词频
-                        self.paragraphs[para_key]["terms"] = term_freq
-                    
-                    # 更新文档频率统计
-                    for term in doc_terms:
-                        term_document_count[term] = term_document_count.get(term, 0) + 1
+                        # 保存段落及段落中的词频
+                        paragraphs[para_key] = {
+                            "doc_id": doc_key,
+                            "text": para_text,
+                            "terms": term_freq
+                        }
+                        documents[doc_key]["paragraphs"].append(para_key)
                     
-                except Exception as e:
-                    self.logger.error(f"处理文档时出错 {file_path}: {e}")
+                    if result.task.path in failed_paths:
+                        manifest.forget(result.task.path)
+                    else:
+                        manifest.record(result.task.path)
+            
+            # 计算IDF值（文档数变化会影响所有词的IDF，基于已保存的段落词频重新统计，无需重新分词）
+            generation = KnowledgeGeneration(
+                generation_id=self._generations.next_generation_id(),
+                documents=documents,
+                paragraphs=paragraphs,
+                index=index,
+                idf_values=self._compute_idf(documents, paragraphs),
+                sources=manifest.entries
+            )
+            
+            with pipeline.timer.stage("save"):
+                self._publish(generation)
+            
+            self.last_build_report = pipeline.report()
+            self.last_build_report["mode"] = "incremental" if incremental else "full"
+            self.last_build_report["generation_id"] = generation.generation_id
+            if diff is not None:
+                self.last_build_report["manifest"] = diff.summary()
+            self.logger.info(f"索引构建各阶段耗时: {self.last_build_report['stages']}")
+            return self.last_build_report
+    
+    @staticmethod
+    def _remove_documents(documents: Dict[str, Dict[str, Any]], paragraphs: Dict[str, Dict[str, Any]],
+                          index: Dict[str, List[Any]], paths: set) -> int:
+        """
+        从（尚未发布的）索引结构中移除指定路径文档的段落及其倒排项
+        
+        Args:
+            paths: 文档路径集合
+            
+        Returns:
+            移除的段落数
+        """
+        stale_docs = [key for key, doc in documents.items() if doc["path"] in paths]
+        stale_paras = set()
+        for doc_key in stale_docs:
+            stale_paras.update(documents.pop(doc_key)["paragraphs"])
+        if not stale_paras:
+            return 0
+        
+        for para_key in stale_paras:
+            paragraphs.pop(para_key, None)
+        
+        for term in list(index):
+            postings = [entry for entry in index[term] if entry[0] not in stale_paras]
+            if postings:
+                index[term] = postings
+            else:
+                del index[term]
         
-        # 计算IDF值
-        total_docs = max(len(self.documents), 1)
-        self.idf_values = {}
+        return len(stale_paras)
+    
+    @staticmethod
+    def _compute_idf(documents: Dict[str, Dict[str, Any]], paragraphs: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+        """根据各文档包含的词计算IDF值"""
+        term_document_count = {}  # 记录每个词出现在几个文档中
+        for doc in documents.values():
+            doc_terms = set()
+            for para_key in doc["paragraphs"]:
+                doc_terms.update(paragraphs[para_key]["terms"])
+            for term in doc_terms:
+                term_document_count[term] = term_document_count.get(term, 0) + 1
+        
+        total_docs = max(len(documents), 1)
+        idf_values = {}
         for term, doc_count in term_document_count.items():
-            self.idf_values[term] = math.log(total_docs / (1 + doc_count))
+            idf_values[term] = math.log(total_docs / (1 + doc_count))
+        return idf_values
     
-    def _read_document(self, file_path: Path) -> str:
-        """读取文档内容"""
+    def _read_document(self, file_path: Path, ocr_pages: Optional[Dict[int, str]] = None) -> str:
+        """
+        读取文档内容
+        
+        Args:
+            file_path: 文档路径
+            ocr_pages: PDF纯图像页面的OCR文本 {页码: 文本}，这些页面用OCR文本代替文本层
+        """
         try:
             # 根据文件类型不同，使用不同的读取方法
             if file_path.suffix.lower() == '.txt':
@@ -194,9 +393,10 @@ class KnowledgeService:
                     doc = fitz.open(file_path)
                     
                     # 提取所有页面的文本
+                    ocr_pages = ocr_pages or {}
                     content = ""
-                    for page in doc:
-                        content += page.get_text()
+                    for page_num, page in enumerate(doc):
+                        content += ocr_pages[page_num] if page_num in ocr_pages else page.get_text()
                     
                     return content
                 except ImportError:
@@ -225,8 +425,7 @@ class KnowledgeService:
         words = text.split()
         
         # 移除停用词和过短的词
-        stop_words = {'的', '了', '和', '是', '在', '有', '与', '及', '或', '等', '中', '为', '以', '对', '将'}
-        words = [w for w in words if w not in stop_words and len(w) > 1]
+        words = [w for w in words if w not in STOP_WORDS and len(w) > 1]
         
         return words
     
@@ -264,31 +463,23 @@ class KnowledgeService:
         
         return cleaned_paragraphs
     
-    def _save_index(self):
-        """保存索引到文件"""
-        try:
-            # 确保目录存在
-            os.makedirs("data/knowledge", exist_ok=True)
-            
-            # 保存索引
-            with open("data/knowledge/index.json", 'w', encoding='utf-8') as f:
-                json.dump(self.index, f, ensure_ascii=False, indent=2)
-            
-            # 保存文档信息
-            with open("data/knowledge/documents.json", 'w', encoding='utf-8') as f:
-                json.dump(self.documents, f, ensure_ascii=False, indent=2)
-            
-            # 保存段落信息
-            with open("data/knowledge/paragraphs.json", 'w', encoding='utf-8') as f:
-                json.dump(self.paragraphs, f, ensure_ascii=False, indent=2)
-            
-            # 保存IDF值
-            with open("data/knowledge/idf_values.json", 'w', encoding='utf-8') as f:
-                json.dump(self.idf_values, f, ensure_ascii=False, indent=2)
-            
-            self.logger.info("索引保存成功")
-        except Exception as e:
-            self.logger.error(f"保存索引失败: {e}")
+    def _publish(self, generation: KnowledgeGeneration):
+        """将新一代索引落盘并原子切换磁盘上的当前代，然后替换内存中的当前代；原当前代保留为上一代"""
+        with self._publish_lock:
+            self._save_generation(generation)
+            self._generations.publish(generation)
+    
+    def _save_generation(self, generation: KnowledgeGeneration):
+        """保存一代索引：索引文件和源文件清单全部写入新的代目录后，再原子切换当前代指针"""
+        with self._store.new_generation(generation.generation_id) as directory:
+            atomic_write_json(os.path.join(directory, "index.json"), generation.index, ensure_ascii=False, indent=2)
+            atomic_write_json(os.path.join(directory, "documents.json"), generation.documents, ensure_ascii=False, indent=2)
+            atomic_write_json(os.path.join(directory, "paragraphs.json"), generation.paragraphs, ensure_ascii=False, indent=2)
+            atomic_write_json(os.path.join(directory, "idf_values.json"), generation.idf_values, ensure_ascii=False, indent=2)
+            manifest = self._source_manifest(directory)
+            manifest.entries = generation.sources
+            manifest.save()
+        self.logger.info(f"索引保存成功: {directory}")
     
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """
@@ -301,25 +492,29 @@ class KnowledgeService:
         Returns:
             相关段落列表
         """
+        # 整个检索过程使用同一代索引，不受后台更新替换的影响
+        generation = self._generations.current
+        
         # 分词
         query_terms = self._tokenize(query)
         
         # 计算每个段落的得分
         scores = {}
         for term in query_terms:
-            if term in self.index:
-                idf = self.idf_values.get(term, 0.1)
-                for para_key, term_freq in self.index[term]:
+            if term in generation.index:
+                idf = generation.idf_values.get(term, 0.1)
+                for para_key, term_freq in generation.index[term]:
                     if para_key not in scores:
                         scores[para_key] = 0
                     # TF-IDF得分
                     scores[para_key] += term_freq * idf
+        set_attributes(keywords=len(query_terms), candidates=len(scores))
         
         # 排序并返回结果
         results = []
         for para_key, score in sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]:
-            para_info = self.paragraphs[para_key]
-            doc_info = self.documents[para_info["doc_id"]]
+            para_info = generation.paragraphs[para_key]
+            doc_info = generation.documents[para_info["doc_id"]]
             
             results.append({
                 "text": para_info["text"],
@@ -427,42 +622,89 @@ class KnowledgeService:
                     text = page.get_text()
                     f.write(text)
             
-            # 更新索引
+            # 增量更新索引
             self._create_index()
-            self._save_index()
             
             self.logger.info(f"PDF处理完成: {pdf_path}")
             
         except Exception as e:
             self.logger.error(f"处理PDF时出错: {e}")
     
-    def update_knowledge_base(self, new_docs_path: str):
+    def update_knowledge_base(self, new_docs_path: str, full: bool = False) -> Optional[Dict[str, Any]]:
         """
         更新知识库
         
+        构建期间检索继续使用当前代索引，需要不阻塞调用方时使用 start_background_rebuild
+        
         Args:
             new_docs_path: 新文档路径
+            full: 是否强制全量重建
+            
+        Returns:
+            构建报告，失败时返回None
         """
         try:
-            # 备份当前知识库
-            backup_path = Path("data/knowledge/backup")
-            os.makedirs(backup_path, exist_ok=True)
-            
-            # 复制现有文件到备份目录
-            for file in Path("data/knowledge").glob("*.json"):
-                shutil.copy2(file, backup_path)
-            
-            # 更新知识库路径
-            self.knowledge_base_path = Path(new_docs_path)
-            
-            # 重新创建索引
-            self._create_index()
-            self._save_index()
-            
-            self.logger.info(f"知识库更新完成: {new_docs_path}")
-            
+            return self._update_knowledge_base(new_docs_path, full)
         except Exception as e:
             self.logger.error(f"更新知识库时出错: {e}")
+            return None
+    
+    def _update_knowledge_base(self, new_docs_path: str, full: bool = False) -> Dict[str, Any]:
+        """更新知识库，失败时恢复备份文件和知识库路径并抛出异常（当前代索引保持不变）"""
+        # 备份当前知识库
+        backup_path = self.index_dir / "backup"
+        os.makedirs(backup_path, exist_ok=True)
+        
+        # 复制现有文件到备份目录
+        for file in self.index_dir.glob("*.json"):
+            shutil.copy2(file, backup_path)
+        
+        # 更新知识库路径
+        previous_path = self.knowledge_base_path
+        self.knowledge_base_path = Path(new_docs_path)
+        
+        try:
+            # 增量构建新一代索引，落盘后原子替换（路径变化时旧路径下的文档会被移除）
+            report = self._create_index(full=full)
+        except Exception:
+            self.knowledge_base_path = previous_path
             # 恢复备份
             for file in backup_path.glob("*.json"):
-                shutil.copy2(file, "data/knowledge") 
\ No newline at end of file
+                shutil.copy2(file, self.index_dir)
+            raise
+        
+        self.logger.info(f"知识库更新完成: {new_docs_path}")
+        return report
+    
+    def start_background_rebuild(self, new_docs_path: Optional[str] = None, full: bool = False) -> bool:
+        """
+        在后台线程中更新知识库索引，完成后原子替换当前代
+        
+        Args:
+            new_docs_path: 新文档路径，默认沿用当前知识库路径
+            full: 是否强制全量重建
+            
+        Returns:
+            已有更新任务在运行时返回False
+        """
+        return self._rebuilder.start(self._update_knowledge_base, new_docs_path or str(self.knowledge_base_path), full=full)
+    
+    def rollback_index(self) -> bool:
+        """
+        回滚到上一代索引：内存中的引用即时切换，并将该代重新落盘
+        
+        Returns:
+            没有上一代可回滚时返回False
+        """
+        with self._publish_lock:
+            if not self._generations.rollback():
+                return False
+            self._save_generation(self._generations.current)
+        self.logger.info(f"知识库索引已回滚到第 {self._generations.current.generation_id} 代")
+        return True
+    
+    def index_status(self) -> Dict[str, Any]:
+        """当前代/上一代索引及后台更新状态"""
+        status = self._generations.info()
+        status["rebuild"] = dict(self._rebuilder.status)
+        return status
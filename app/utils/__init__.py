@@ -1,15 +1,28 @@
 """
 竞赛智能客服系统 - 工具包
 提供各种辅助功能
+
+组件按需导入（PEP 562 模块 __getattr__），导入某个工具子模块时不会连带加载 fastapi 中间件等
 """
+import importlib
 
-from app.utils.question_enhancer import enhance_question, is_low_quality_answer, generate_backup_answer
-from app.utils.middleware import EnhancedRequestMiddleware
+# 可导出组件 -> 所在模块
+_EXPORTS = {
+    'enhance_question': 'app.utils.question_enhancer',
+    'analyze_question': 'app.utils.question_enhancer',
+    'QueryAnalysis': 'app.utils.query_analysis',
+    'is_low_quality_answer': 'app.utils.question_enhancer',
+    'generate_backup_answer': 'app.utils.question_enhancer',
+    'EnhancedRequestMiddleware': 'app.utils.middleware',
+}
 
 # 设置可导出组件
-__all__ = [
-    'enhance_question',
-    'is_low_quality_answer', 
-    'generate_backup_answer',
-    'EnhancedRequestMiddleware'
-] 
\ No newline at end of file
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
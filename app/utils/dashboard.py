@@ -0,0 +1,172 @@
+"""
+竞赛智能客服系统 - 运行看板数据
+每秒对指标注册表做一次快照，保留最近一个窗口的历史，用相邻快照的差值计算滑动窗口内的
+QPS、各阶段耗时分位数、缓存命中率、LLM排队数、活跃会话数和各引擎承接比例，
+由 /ws/dashboard 以1Hz推送给看板页面
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from app.config import settings
+from app.utils.metrics import (
+    ACTIVE_SESSIONS, ANSWERS_TOTAL, LLM_CALLS_TOTAL, LLM_INFLIGHT, REQUEST_SECONDS,
+    RETRIEVAL_SECONDS, ROUTE_TOTAL, STAGE_ERRORS_TOTAL, STAGE_SECONDS,
+)
+from app.utils.tokenizer import tokenizer_cache_stats
+
+logger = logging.getLogger(__name__)
+
+_HISTOGRAMS = {"request": REQUEST_SECONDS, "stages": STAGE_SECONDS, "retrieval": RETRIEVAL_SECONDS}
+_COUNTERS = {"routes": ROUTE_TOTAL, "llm_calls": LLM_CALLS_TOTAL, "answers": ANSWERS_TOTAL,
+             "stage_errors": STAGE_ERRORS_TOTAL}
+
+
+class _State:
+    """某一时刻的指标原始值"""
+
+    __slots__ = ("timestamp", "histograms", "counters", "caches")
+
+    def __init__(self):
+        self.timestamp = time.time()
+        self.histograms = {name: metric.raw() for name, metric in _HISTOGRAMS.items()}
+        self.counters = {name: metric.raw() for name, metric in _COUNTERS.items()}
+        self.caches = {mode: (stats["hits"], stats["misses"]) for mode, stats in tokenizer_cache_stats().items()}
+
+
+def _counter_delta(current: Dict[Tuple[str, ...], float], previous: Dict[Tuple[str, ...], float]) -> Dict[str, int]:
+    """窗口内各标签组合的新增次数"""
+    return {",".join(key): int(value - previous.get(key, 0.0)) for key, value in current.items()}
+
+
+def _rate(hits: int, misses: int) -> Optional[float]:
+    total = hits + misses
+    return round(hits / total, 4) if total else None
+
+
+class DashboardCollector:
+    """
+    看板数据采集器
+
+    start() 后在事件循环中每 interval 秒采样一次；订阅方通过 next_snapshot() 等待下一次采样结果
+    """
+
+    def __init__(self, window: int = 60, interval: float = 1.0):
+        self.window = window
+        self.interval = interval
+        self.started_at = time.time()
+        self._history: Deque[_State] = deque(maxlen=int(window / interval) + 1)
+        self._latest: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._tick: Optional[asyncio.Event] = None
+        self.subscribers = 0
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._tick = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"运行看板采集已启动: 窗口 {self.window}秒, 间隔 {self.interval}秒")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"运行看板采样失败: {e}", exc_info=True)
+            tick, self._tick = self._tick, asyncio.Event()
+            tick.set()
+            await asyncio.sleep(self.interval)
+
+    def sample(self) -> Dict[str, Any]:
+        """采样一次并计算快照"""
+        self._history.append(_State())
+        self._latest = self._build()
+        return self._latest
+
+    def latest(self) -> Dict[str, Any]:
+        """最近一次快照；尚未采样过时立即采样"""
+        return self._latest if self._latest is not None else self.sample()
+
+    async def next_snapshot(self) -> Dict[str, Any]:
+        """等待下一次采样完成后返回快照；采集未启动时直接返回当前快照"""
+        if self._tick is None or self._task is None or self._task.done():
+            return self.sample()
+        await self._tick.wait()
+        return self.latest()
+
+    def _since(self, seconds: float) -> _State:
+        """窗口起点：不早于 seconds 秒前的最早一次采样"""
+        now = self._history[-1].timestamp
+        for state in self._history:
+            if now - state.timestamp <= seconds + self.interval / 2:
+                return state
+        return self._history[-1]
+
+    def _build(self) -> Dict[str, Any]:
+        current = self._history[-1]
+        start = self._since(self.window)
+        recent = self._since(10)
+
+        def qps(since: _State) -> float:
+            elapsed = current.timestamp - since.timestamp
+            completed = sum(_counter_delta(
+                {k: v.count for k, v in current.histograms["request"].items()},
+                {k: v.count for k, v in since.histograms["request"].items()}).values())
+            return round(completed / elapsed, 3) if elapsed > 0 else 0.0
+
+        latency = {name: metric.delta_summaries(current.histograms[name], start.histograms[name])
+                   for name, metric in _HISTOGRAMS.items()}
+        counters = {name: _counter_delta(current.counters[name], start.counters[name]) for name in _COUNTERS}
+
+        routes = counters["routes"]
+        routed = sum(routes.values())
+        answers = counters["answers"]
+        answered = sum(answers.values())
+        llm_calls = counters["llm_calls"]
+        llm_total = sum(llm_calls.values())
+
+        caches = {}
+        for mode, (hits, misses) in current.caches.items():
+            start_hits, start_misses = start.caches.get(mode, (0, 0))
+            caches[mode] = {"hit_rate": _rate(hits, misses),
+                            "window_hit_rate": _rate(hits - start_hits, misses - start_misses),
+                            "window_lookups": (hits - start_hits) + (misses - start_misses)}
+
+        return {
+            "timestamp": current.timestamp,
+            "uptime_seconds": round(current.timestamp - self.started_at, 1),
+            "window_seconds": round(current.timestamp - start.timestamp, 1),
+            "qps": {"window": qps(start), "10s": qps(recent)},
+            "requests": {outcome: summary["count"] for outcome, summary in latency["request"].items()},
+            "latency": latency,
+            "stage_errors": {stage: count for stage, count in counters["stage_errors"].items() if count},
+            "caches": caches,
+            "llm": {
+                "inflight": LLM_INFLIGHT.value(),
+                "calls": llm_calls,
+                "error_rate": round(llm_calls.get("error", 0) / llm_total, 4) if llm_total else None,
+            },
+            "sessions": {"active": int(ACTIVE_SESSIONS.value()), "dashboard_subscribers": self.subscribers},
+            "engines": {route: {"count": count, "share": round(count / routed, 4) if routed else None}
+                        for route, count in routes.items()},
+            "answers": {
+                "count": answered,
+                "confident_rate": round(answers.get("yes", 0) / answered, 4) if answered else None,
+                "confidence_threshold": settings.MCP_CONFIDENCE_THRESHOLD,
+            },
+        }
+
+
+dashboard_collector = DashboardCollector(settings.DASHBOARD_WINDOW_SECONDS)
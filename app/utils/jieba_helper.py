@@ -2,95 +2,379 @@
 # -*- coding: utf-8 -*-
 """
 竞赛智能客服系统 - jieba分词帮助工具
-解决jieba词典路径问题
+解决jieba词典路径问题；导入时只准备词典文件（未变化时仅比较文件状态），
+前缀词典在首次分词或后台预热时从带版本号的缓存加载，导入本模块不会被阻塞
 """
 
 import os
+import time
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import jieba
-import importlib.resources
 from pathlib import Path
-import shutil
 
-logger = logging.getLogger(__name__)
+from app.config import settings, normalize_path
+from app.utils.tracing import incr_attribute
 
-# 预初始化pseg，稍后会更新此变量
-try:
-    import jieba.posseg
-    pseg = jieba.posseg
-except Exception as e:
-    logger.error(f"导入jieba.posseg失败: {str(e)}")
-    # 创建一个模拟的pseg模块，防止导入错误
-    class DummyPseg:
-        @staticmethod
-        def lcut(text, *args, **kwargs):
-            # 返回简单的分词结果，每个字作为一个词
-            return [(char, 'x') for char in text if char.strip()]
-    pseg = DummyPseg()
+logger = logging.getLogger(__name__)
 
 # 导出jieba对象，使其他模块可以通过jieba_helper导入
-__all__ = ['jieba', 'pseg']
+__all__ = ['jieba', 'pseg', 'lcut_query', 'add_user_word', 'load_user_dict',
+           'segmentation_cache_stats', 'clear_segmentation_cache',
+           'init_jieba', 'ensure_jieba', 'warm_up_jieba', 'jieba_status', 'dictionary_version']
+
+# 词典目录位于项目根目录下的 data/dict
+DICT_DIR = os.path.join(Path(os.path.dirname(os.path.abspath(__file__))).parent.parent, "data", "dict")
+CUSTOM_DICT_PATH = os.path.join(DICT_DIR, "jieba_dict.txt")
+DICT_VERSION_PATH = os.path.join(DICT_DIR, "jieba_dict.version")
+DICT_FORMAT = 1
+
+# 领域词条的默认词频，足以让竞赛全称整体切出
+DOMAIN_WORD_FREQ = 1000
+
+# 找不到jieba原始词典时使用的最小词典
+FALLBACK_DICT_LINES = [
+    "智能客服 1000 n", "竞赛 1000 n", "泰迪杯 1000 n", "数据挖掘 1000 n", "评分标准 1000 n",
+    "报名时间 1000 n", "参赛要求 1000 n", "获奖条件 1000 n", "专项赛 1000 n", "人工智能 1000 n",
+]
+
+
+class DummyPseg:
+    """jieba.posseg 不可用时的替代品，防止导入错误"""
+
+    @staticmethod
+    def lcut(text, *args, **kwargs):
+        # 返回简单的分词结果，每个字作为一个词
+        return [(char, 'x') for char in text if char.strip()]
+
+
+class _LazyPosseg:
+    """
+    jieba.posseg 的延迟代理
+
+    导入jieba.posseg会读取整张词性表，加载前缀词典也需要一两秒；
+    首次访问属性（如 pseg.lcut）时才完成这些工作
+    """
+
+    def __getattr__(self, name):
+        return getattr(ensure_jieba(), name)
+
+
+pseg = _LazyPosseg()
+
+Token = Tuple[str, str]
+
+
+def _dictionary_fingerprint() -> Tuple[Any, ...]:
+    """
+    词典状态指纹：主词典路径、总词频和词条数；
+    set_dictionary、add_word、load_userdict 都会改变其中至少一项
+    """
+    dt = getattr(jieba, "dt", None)
+    if dt is None:
+        return ()
+    return (getattr(dt, "dictionary", None), getattr(dt, "total", 0), len(getattr(dt, "FREQ", ())))
+
+
+class SegmentationCache:
+    """
+    查询侧分词结果的有界LRU缓存
+
+    用户问题重复度高，同一问题及其增强文本反复经过pseg；缓存以文本为键保存 (词, 词性) 元组，
+    词典指纹变化时整体失效。超过 max_text_length 的文本（如文档块）不进入缓存；
+    segment 为分词函数，默认 pseg.lcut
+    """
+
+    def __init__(self, maxsize: int, max_text_length: int = 512,
+                 segment: Optional[Callable[[str], List[Any]]] = None):
+        self.maxsize = maxsize
+        self.segment = segment
+        self.max_text_length = max_text_length
+        self._entries: "OrderedDict[str, Tuple[Token, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint: Tuple[Any, ...] = _dictionary_fingerprint()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_dictionary(self):
+        """调用方需持有锁"""
+        fingerprint = _dictionary_fingerprint()
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                self.invalidations += 1
+                logger.info(f"jieba词典已变化，清空查询分词缓存({len(self._entries)}条)")
+            self._entries.clear()
+            self._fingerprint = fingerprint
+
+    def lcut(self, text: str) -> List[Token]:
+        segment = self.segment or pseg.lcut
+        if self.maxsize <= 0 or len(text) > self.max_text_length:
+            return [(word, flag) for word, flag in segment(text)]
+        with self._lock:
+            self._check_dictionary()
+            tokens = self._entries.get(text)
+            if tokens is not None:
+                self._entries.move_to_end(text)
+                self.hits += 1
+                incr_attribute("seg_cache_hits")
+                return list(tokens)
+            self.misses += 1
+        incr_attribute("seg_cache_misses")
+        # 分词在锁外进行，并发的相同未命中最多重复计算一次
+        tokens = tuple((word, flag) for word, flag in segment(text))
+        with self._lock:
+            self._entries[text] = tokens
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return list(tokens)
+
+    def clear(self):
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._fingerprint = _dictionary_fingerprint()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+query_segmentation_cache = SegmentationCache(settings.QUERY_SEG_CACHE_SIZE)
+
+
+def lcut_query(text: str) -> List[Token]:
+    """查询侧词性标注（带LRU缓存），返回 (词, 词性) 列表"""
+    ensure_jieba()
+    return query_segmentation_cache.lcut(text)
+
+
+def segmentation_cache_stats() -> Dict[str, Any]:
+    return query_segmentation_cache.stats()
+
+
+def clear_segmentation_cache():
+    query_segmentation_cache.clear()
+
+
+# 运行时经 add_user_word/load_user_dict 添加的词条，计入 dictionary_version
+_runtime_entries: List[str] = []
+
+
+def add_user_word(word: str, freq: Optional[int] = None, tag: Optional[str] = None):
+    """向jieba词典添加词条并使查询分词缓存失效"""
+    jieba.add_word(word, freq, tag)
+    _runtime_entries.append(f"{word} {freq} {tag}")
+    clear_segmentation_cache()
+
+
+def load_user_dict(path: str):
+    """加载用户词典并使查询分词缓存失效"""
+    jieba.load_userdict(path)
+    _runtime_entries.extend(f"{word} {freq} {tag}" for word, (freq, tag) in sorted(user_dictionary_entries(path).items()))
+    clear_segmentation_cache()
+
+
+def generated_domain_entries() -> Dict[str, Tuple[int, str]]:
+    """由配置中的竞赛名称和竞赛关键词生成领域词条：词 -> (词频, 词性)"""
+    entries = {}
+    for term in list(settings.COMPETITION_TYPES) + list(settings.COMPETITION_KEYWORDS):
+        term = term.strip()
+        if term and not any(ch.isspace() for ch in term):
+            entries[term] = (DOMAIN_WORD_FREQ, "nz")
+    return entries
+
+
+def user_dictionary_entries(path: Optional[str] = None) -> Dict[str, Tuple[int, str]]:
+    """读取 JIEBA_USER_DICT 指定的用户词典（每行：词 [词频] [词性]），其词条优先于原始词典"""
+    path = settings.JIEBA_USER_DICT if path is None else path
+    entries = {}
+    if not path or not os.path.exists(normalize_path(path)):
+        return entries
+    with open(normalize_path(path), "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            freq = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else DOMAIN_WORD_FREQ
+            tag = parts[-1] if len(parts) > 1 and not parts[-1].isdigit() else "nz"
+            entries[parts[0]] = (freq, tag)
+    return entries
+
+
+def dictionary_build_version(source: str, generated: Dict[str, Tuple[int, str]],
+                             user_entries: Dict[str, Tuple[int, str]]) -> str:
+    """合并词典版本：jieba版本+原始词典文件状态+领域词条，任一变化都会重新生成词典和前缀词典缓存"""
+    digest = hashlib.sha256(f"{DICT_FORMAT}:{jieba.__version__}:{source}".encode("utf-8"))
+    if os.path.exists(source):
+        stat = os.stat(source)
+        digest.update(f":{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    for label, entries in (("generated", generated), ("user", user_entries)):
+        digest.update(f"\n[{label}]".encode("utf-8"))
+        for word in sorted(entries):
+            freq, tag = entries[word]
+            digest.update(f"\n{word} {freq} {tag}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def prefix_cache_name(version: str) -> str:
+    return f"jieba.{version}.cache"
+
+
+def _atomic_write_text(path: str, text: str):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def prepare_dictionary() -> Tuple[str, str]:
+    """
+    准备合并了领域词条的主词典
+
+    版本与上次一致时不读写词典文件；否则以原始词典为底，追加原始词典中没有的生成词条
+    和全部用户词条（重复词条以后出现者为准），并删除旧版本的前缀词典缓存
+
+    Returns:
+        (词典路径, 版本)
+    """
+    os.makedirs(DICT_DIR, exist_ok=True)
+    source = os.path.join(os.path.dirname(jieba.__file__), "dict.txt")
+    generated = generated_domain_entries()
+    user_entries = user_dictionary_entries()
+    version = dictionary_build_version(source, generated, user_entries)
+
+    if os.path.exists(CUSTOM_DICT_PATH) and os.path.exists(DICT_VERSION_PATH):
+        with open(DICT_VERSION_PATH, "r", encoding="utf-8") as f:
+            if f.read().strip() == version:
+                return CUSTOM_DICT_PATH, version
+
+    if os.path.exists(source):
+        logger.info(f"生成jieba词典(版本 {version}): {CUSTOM_DICT_PATH}")
+        with open(source, "r", encoding="utf-8") as f:
+            base = f.read()
+    else:
+        logger.info(f"未找到原始jieba词典，使用内置最小词典: {CUSTOM_DICT_PATH}")
+        base = "\n".join(FALLBACK_DICT_LINES)
+    if base and not base.endswith("\n"):
+        base += "\n"
+
+    known = {line.split(" ", 1)[0] for line in base.splitlines() if line}
+    extra = [f"{word} {freq} {tag}" for word, (freq, tag) in sorted(generated.items())
+             if word not in known and word not in user_entries]
+    extra += [f"{word} {freq} {tag}" for word, (freq, tag) in sorted(user_entries.items())]
+    _atomic_write_text(CUSTOM_DICT_PATH, base + "".join(f"{line}\n" for line in extra))
+    _atomic_write_text(DICT_VERSION_PATH, version)
+
+    current_cache = prefix_cache_name(version)
+    for name in os.listdir(DICT_DIR):
+        if name.startswith("jieba.") and name.endswith(".cache") and name != current_cache:
+            try:
+                os.remove(os.path.join(DICT_DIR, name))
+            except OSError:
+                pass
+    logger.info(f"jieba词典已合并 {len(extra)} 个领域词条")
+    return CUSTOM_DICT_PATH, version
+
+
+_init_lock = threading.Lock()
+_posseg = None
+_status: Dict[str, Any] = {"dictionary": None, "version": None, "ready": False, "init_seconds": None}
+
 
 def init_jieba():
     """
-    初始化jieba分词器，确保词典文件存在
+    设置jieba词典（导入时调用）
+
+    只准备词典文件并设置路径，前缀词典由 ensure_jieba 在首次使用时加载
     """
     try:
         # 设置jieba日志级别
         jieba.setLogLevel(logging.INFO)
-        
-        # 获取项目根目录
-        current_directory = os.path.dirname(os.path.abspath(__file__))
-        project_root = Path(current_directory).parent.parent
-        
-        # 创建自定义词典目录
-        dict_dir = os.path.join(project_root, "data", "dict")
-        os.makedirs(dict_dir, exist_ok=True)
-        
-        # 自定义词典文件路径
-        custom_dict_path = os.path.join(dict_dir, "jieba_dict.txt")
-        
-        # 查找jieba原始词典文件
-        jieba_module_dir = os.path.dirname(jieba.__file__)
-        original_dict_path = os.path.join(jieba_module_dir, "dict.txt")
-        
-        # 如果原始词典文件存在，复制到自定义目录
-        if os.path.exists(original_dict_path):
-            logger.info(f"发现原始jieba词典，复制到自定义位置: {custom_dict_path}")
-            shutil.copy(original_dict_path, custom_dict_path)
-        else:
-            # 如果自定义词典不存在，创建一个简单的词典文件
-            if not os.path.exists(custom_dict_path):
-                logger.info(f"创建简单的jieba词典文件: {custom_dict_path}")
-                with open(custom_dict_path, "w", encoding="utf-8") as f:
-                    f.write("智能客服 1000 n\n")
-                    f.write("竞赛 1000 n\n")
-                    f.write("泰迪杯 1000 n\n")
-                    f.write("数据挖掘 1000 n\n")
-                    f.write("评分标准 1000 n\n")
-                    f.write("报名时间 1000 n\n")
-                    f.write("参赛要求 1000 n\n")
-                    f.write("获奖条件 1000 n\n")
-                    f.write("专项赛 1000 n\n")
-                    f.write("人工智能 1000 n\n")
-            else:
-                logger.info(f"使用已存在的自定义词典: {custom_dict_path}")
-        
-        # 强制重置jieba词典
-        if os.path.exists(custom_dict_path):
-            logger.info(f"加载自定义词典: {custom_dict_path}")
-            jieba.set_dictionary(custom_dict_path)
-            jieba.initialize()
-            logger.info("jieba初始化成功")
-            return True
-        else:
-            logger.error("无法找到或创建jieba词典文件")
-            return False
+        path, version = prepare_dictionary()
+        jieba.set_dictionary(path)
+        # 前缀词典缓存放在词典目录且文件名带版本号，不受临时目录清理影响，词典变化后自动换用新缓存
+        jieba.dt.tmp_dir = DICT_DIR
+        jieba.dt.cache_file = prefix_cache_name(version)
+        _status.update(dictionary=path, version=version)
+        return True
     except Exception as e:
         logger.error(f"jieba初始化失败: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
         return False
 
-# 初始化jieba
-init_jieba() 
\ No newline at end of file
+
+def ensure_jieba():
+    """
+    完成jieba初始化（导入jieba.posseg并加载前缀词典），多线程并发调用时只执行一次
+
+    Returns:
+        jieba.posseg 模块，导入失败时为 DummyPseg
+    """
+    global _posseg
+    if _posseg is not None:
+        return _posseg
+    with _init_lock:
+        if _posseg is None:
+            start = time.time()
+            try:
+                # posseg在导入时从当前主词典读取词性表，领域词条的词性随之生效
+                import jieba.posseg
+                module = jieba.posseg
+                jieba.initialize()
+            except Exception as e:
+                logger.error(f"导入jieba.posseg失败: {str(e)}")
+                module = DummyPseg()
+            _status.update(ready=True, init_seconds=round(time.time() - start, 3))
+            _posseg = module
+            logger.info(f"jieba初始化完成，耗时 {_status['init_seconds']}s")
+    return _posseg
+
+
+def warm_up_jieba(background: bool = True) -> Optional[threading.Thread]:
+    """预热jieba，background为True时在后台线程中进行，返回该线程"""
+    if _posseg is not None:
+        return None
+    if not background:
+        ensure_jieba()
+        return None
+    thread = threading.Thread(target=ensure_jieba, name="jieba-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def jieba_status() -> Dict[str, Any]:
+    return dict(_status)
+
+
+def dictionary_version() -> str:
+    """
+    当前分词词典的版本：合并词典的构建版本（见 prepare_dictionary）加上运行时添加的词条
+
+    索引源文件清单、FTS索引元数据和页面分词缓存都用它判断分词结果是否仍然有效，三者同时失效
+    """
+    base = _status["version"] or f"default:{jieba.__version__}"
+    if not _runtime_entries:
+        return base
+    digest = hashlib.sha256(base.encode("utf-8"))
+    for entry in _runtime_entries:
+        digest.update(f"\n{entry}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+# 设置jieba词典
+init_jieba()
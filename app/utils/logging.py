@@ -4,10 +4,15 @@
 
 import os
 import sys
+import queue
+import random
+import atexit
 import logging
 import platform
 from logging import StreamHandler
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime
+from typing import Optional
 
 # 日志级别映射
 LOG_LEVELS = {
@@ -186,6 +191,82 @@ def get_logger(name=None, level="info", log_file=None):
     
     return logger
 
+_queue_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+def setup_queue_logging(level="INFO", log_file: Optional[str] = None,
+                        fmt: str = '%(asctime)s - %(name)s - %(levelname)s - %(message)s') -> QueueListener:
+    """
+    配置异步日志：根日志器只挂一个QueueHandler，调用线程把日志记录放入队列后立即返回，
+    文件和控制台的写入由QueueListener后台线程完成，请求处理不再被磁盘/终端I/O阻塞
+    
+    Args:
+        level: 日志级别（名称或数值），一般取 settings.LOG_LEVEL
+        log_file: 可选的日志文件路径
+        fmt: 日志格式
+        
+    Returns:
+        已启动的QueueListener（进程退出时自动停止并刷新剩余日志）
+    """
+    global _queue_listener, _queue_handler
+    stop_queue_logging()
+    
+    log_level = LOG_LEVELS.get(level.lower(), logging.INFO) if isinstance(level, str) else level
+    formatter = logging.Formatter(fmt)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        log_dir = os.path.dirname(log_file)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+        handler.close()
+    _queue_handler = QueueHandler(log_queue)
+    # 入队前在请求所在的上下文里取trace_id，日志格式可以用 %(trace_id)s 关联同一问题的日志
+    from app.utils.tracing import TraceIdFilter
+    _queue_handler.addFilter(TraceIdFilter())
+    root_logger.addHandler(_queue_handler)
+    root_logger.setLevel(log_level)
+    
+    _queue_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _queue_listener.start()
+    return _queue_listener
+
+
+def stop_queue_logging():
+    """停止异步日志后台线程，写完队列中剩余的日志；之后的日志不再入队"""
+    global _queue_listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        for handler in _queue_listener.handlers:
+            handler.close()
+        _queue_listener = None
+
+
+atexit.register(stop_queue_logging)
+
+
+def trace_enabled(logger: logging.Logger, sample_rate: float = 1.0) -> bool:
+    """
+    是否记录逐文档的调试轨迹：日志器启用了DEBUG且命中采样
+    
+    调用方据此决定是否构造得分明细等调试字符串，未启用时不产生任何格式化开销
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    return sample_rate >= 1.0 or random.random() < sample_rate
+
+
 def configure_for_tests():
     """配置用于测试的日志"""
     # 创建测试日志目录
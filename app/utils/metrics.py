@@ -0,0 +1,397 @@
+"""
+竞赛智能客服系统 - 运行指标
+进程内的计数器与直方图，记录问答链路各阶段的耗时，
+可导出为Prometheus文本格式（/metrics）或JSON快照；
+每个指标的标签组合数有上限，超出的标签值归入 "other"，避免基数无限增长
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.utils.tracing import span
+
+# 耗时直方图的桶上界（秒），覆盖从分词的毫秒级到LLM调用的十几秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0)
+
+OVERFLOW_LABEL = "other"
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    """指标基类：管理标签与标签组合数上限"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), max_series: int = 50):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._lock = threading.Lock()
+        self._series: Dict[LabelValues, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        """调用方需持有锁；组合数达到上限后新出现的组合归入 other（other 本身不受上限限制）"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        if key not in self._series and len(self._series) >= self.max_series:
+            key = tuple(OVERFLOW_LABEL for _ in self.labelnames)
+        return key
+
+    def _new_series(self) -> Any:
+        raise NotImplementedError
+
+    def _get_series(self, labels: Dict[str, Any]) -> Any:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = self._new_series()
+        return series
+
+    def _items(self) -> List[Tuple[LabelValues, Any]]:
+        with self._lock:
+            return [(key, self._copy(series)) for key, series in self._series.items()]
+
+    @staticmethod
+    def _copy(series: Any) -> Any:
+        return series
+
+    def raw(self) -> Dict[LabelValues, Any]:
+        """各标签组合当前值的副本（计数器为数值，直方图为桶计数），用于计算滑动窗口内的增量"""
+        return dict(self._items())
+
+    def _label_dict(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def _format_labels(self, key: LabelValues, extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type_name = "counter"
+
+    def _new_series(self) -> List[float]:
+        return [0.0]
+
+    @staticmethod
+    def _copy(series: List[float]) -> float:
+        return series[0]
+
+    def inc(self, amount: float = 1.0, **labels):
+        with self._lock:
+            self._get_series(labels)[0] += amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+            return series[0] if series else 0.0
+
+    def prometheus_lines(self) -> List[str]:
+        return [f"{self.name}{self._format_labels(key)} {_format_number(value)}" for key, value in self._items()]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [{"labels": self._label_dict(key), "value": value} for key, value in self._items()]
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值；无标签的gauge可以用 set_function 在读取时计算"""
+
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function = None
+
+    def _new_series(self) -> List[float]:
+        return [0.0]
+
+    @staticmethod
+    def _copy(series: List[float]) -> float:
+        return series[0]
+
+    def inc(self, amount: float = 1.0, **labels):
+        with self._lock:
+            self._get_series(labels)[0] += amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._get_series(labels)[0] = value
+
+    def set_function(self, function):
+        """读取时调用 function() 取值，例如活跃连接数"""
+        if self.labelnames:
+            raise ValueError(f"指标 {self.name} 带标签，不能使用 set_function")
+        self._function = function
+
+    def _items(self) -> List[Tuple[LabelValues, Any]]:
+        if self._function is not None:
+            return [((), float(self._function()))]
+        return super()._items()
+
+    def value(self, **labels) -> float:
+        items = dict(self._items())
+        return items.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def prometheus_lines(self) -> List[str]:
+        return [f"{self.name}{self._format_labels(key)} {_format_number(value)}" for key, value in self._items()]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [{"labels": self._label_dict(key), "value": value} for key, value in self._items()]
+
+
+class _HistogramSeries:
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size  # 每个桶（含+Inf）内的观测数，非累计
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    """固定桶直方图，分位数由桶内线性插值估计"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: int = 50):
+        super().__init__(name, documentation, labelnames, max_series)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_series(self) -> _HistogramSeries:
+        return _HistogramSeries(len(self.bounds) + 1)
+
+    @staticmethod
+    def _copy(series: _HistogramSeries) -> _HistogramSeries:
+        copied = _HistogramSeries(len(series.buckets))
+        copied.buckets = list(series.buckets)
+        copied.count = series.count
+        copied.sum = series.sum
+        return copied
+
+    def observe(self, value: float, **labels):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            series = self._get_series(labels)
+            series.buckets[index] += 1
+            series.count += 1
+            series.sum += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """计时上下文，异常退出时同样记录耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def total_count(self) -> int:
+        """所有标签组合的观测总数"""
+        with self._lock:
+            return sum(series.count for series in self._series.values())
+
+    def _quantile(self, series: _HistogramSeries, q: float) -> Optional[float]:
+        if series.count == 0:
+            return None
+        rank = q * series.count
+        cumulative = 0
+        for index, count in enumerate(series.buckets):
+            if cumulative + count >= rank and count:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                if index >= len(self.bounds):
+                    return lower  # 落在+Inf桶，只能给出下界
+                upper = self.bounds[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.bounds[-1]
+
+    def summary(self, **labels) -> Dict[str, Any]:
+        """某个标签组合（不指定标签时为全部合并）的统计摘要"""
+        merged = self._new_series()
+        wanted = {name: str(value) for name, value in labels.items()}
+        for key, series in self._items():
+            label_dict = self._label_dict(key)
+            if any(label_dict.get(name) != value for name, value in wanted.items()):
+                continue
+            merged.count += series.count
+            merged.sum += series.sum
+            merged.buckets = [a + b for a, b in zip(merged.buckets, series.buckets)]
+        return self._summarize(merged)
+
+    def delta_summaries(self, current: Dict[LabelValues, _HistogramSeries],
+                        previous: Dict[LabelValues, _HistogramSeries]) -> Dict[str, Dict[str, Any]]:
+        """
+        两次 raw() 之间新增观测的统计摘要（滑动窗口内的分位数），
+        键为标签值（多个标签用逗号连接），窗口内没有新观测的组合不返回
+        """
+        summaries = {}
+        for key, series in current.items():
+            before = previous.get(key)
+            delta = self._copy(series)
+            if before is not None:
+                delta.count -= before.count
+                delta.sum -= before.sum
+                delta.buckets = [a - b for a, b in zip(series.buckets, before.buckets)]
+            if delta.count > 0:
+                summaries[",".join(key)] = self._summarize(delta)
+        return summaries
+
+    def _summarize(self, series: _HistogramSeries) -> Dict[str, Any]:
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value, 6)
+
+        return {
+            "count": series.count,
+            "sum": round(series.sum, 6),
+            "avg": rounded(series.sum / series.count) if series.count else None,
+            "p50": rounded(self._quantile(series, 0.5)),
+            "p95": rounded(self._quantile(series, 0.95)),
+            "p99": rounded(self._quantile(series, 0.99)),
+        }
+
+    def prometheus_lines(self) -> List[str]:
+        lines = []
+        for key, series in self._items():
+            cumulative = 0
+            for bound, count in zip(self.bounds, series.buckets):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': _format_number(bound)})} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': '+Inf'})} {series.count}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_number(series.sum)}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {series.count}")
+        return lines
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [{"labels": self._label_dict(key), **self._summarize(series)} for key, series in self._items()]
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value: float) -> str:
+    if value == int(value):
+        return str(int(value)) if abs(value) < 1e15 else repr(float(value))
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    """指标注册表：同名指标只创建一次"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已注册为 {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Counter:
+        return self._register(Counter, name, documentation, labelnames, **kwargs)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, **kwargs)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames, **kwargs)
+
+    def render_prometheus(self) -> str:
+        """Prometheus文本格式（0.0.4）"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.prometheus_lines())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            name: {"type": metric.type_name, "help": metric.documentation, "series": metric.snapshot()}
+            for name, metric in list(self._metrics.items())
+        }
+
+    def reset(self):
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+
+registry = MetricsRegistry()
+
+# 问答链路各阶段：enhance_question、structured_kb、context_build、llm_call、format、ws_send
+STAGE_SECONDS = registry.histogram(
+    "qa_stage_duration_seconds", "问答链路各阶段耗时（秒）", ["stage"])
+# 各检索引擎的检索耗时：simple_rag、enhanced_rag
+RETRIEVAL_SECONDS = registry.histogram(
+    "qa_retrieval_duration_seconds", "检索引擎检索耗时（秒）", ["engine"])
+# 单个问题端到端耗时（从收到问题到答案发出），outcome: answered、timeout、error
+REQUEST_SECONDS = registry.histogram(
+    "qa_request_duration_seconds", "问题端到端处理耗时（秒）", ["outcome"])
+ROUTE_TOTAL = registry.counter(
+    "qa_route_total", "问题路由次数", ["route"])
+LLM_CALLS_TOTAL = registry.counter(
+    "qa_llm_calls_total", "LLM调用次数", ["outcome"])
+STAGE_ERRORS_TOTAL = registry.counter(
+    "qa_stage_errors_total", "各阶段出错次数", ["stage"])
+# 已答复问题按置信度是否达到 MCP_CONFIDENCE_THRESHOLD 计数，confident: yes、no
+ANSWERS_TOTAL = registry.counter(
+    "qa_answers_total", "已答复问题数", ["confident"])
+# 已提交（排队或执行中）的LLM调用数
+LLM_INFLIGHT = registry.gauge(
+    "qa_llm_inflight", "进行中的LLM调用数")
+# 当前WebSocket问答连接数（由 main.active_sessions 提供）
+ACTIVE_SESSIONS = registry.gauge(
+    "qa_active_sessions", "活跃WebSocket会话数")
+
+
+@contextmanager
+def stage_timer(stage: str, **attributes) -> Iterator[None]:
+    """
+    记录一个处理阶段的耗时；阶段内抛出的异常计入出错次数后继续抛出。
+    当前请求有trace时同时记录同名span，attributes 作为span属性
+    """
+    start = time.perf_counter()
+    with span(stage, **attributes):
+        try:
+            yield
+        except Exception:
+            STAGE_ERRORS_TOTAL.inc(stage=stage)
+            raise
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+@contextmanager
+def retrieval_timer(engine: str) -> Iterator[None]:
+    """记录检索引擎耗时，并记录为 retrieval span"""
+    with span("retrieval", engine=engine), RETRIEVAL_SECONDS.time(engine=engine):
+        yield
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    return registry.snapshot()
+
+
+def render_metrics() -> str:
+    return registry.render_prometheus()
@@ -0,0 +1,315 @@
+"""
+竞赛智能客服系统 - 按需性能剖析
+在运行中的进程里临时开启剖析，定位CPU热点，不必在本地复现负载：
+- sample：后台线程定时抓取所有线程的调用栈（sys._current_frames），聚合为折叠栈，
+  覆盖事件循环和 to_thread 工作线程，开销与采样间隔成正比
+- cprofile：在事件循环线程上启用 cProfile，得到精确的调用次数和耗时（不含工作线程）
+剖析在指定秒数后或处理完指定数量的问题后自动停止；未开启时没有任何额外开销。
+结果可导出为折叠栈文本（flamegraph.pl）或 speedscope JSON（https://www.speedscope.app）
+"""
+import io
+import os
+import sys
+import time
+import pstats
+import asyncio
+import cProfile
+import logging
+import threading
+from collections import Counter as TallyCounter
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.utils.metrics import REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SAMPLE = "sample"
+CPROFILE = "cprofile"
+PROFILER_MODES = (SAMPLE, CPROFILE)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 叶子帧为这些函数时线程处于空闲等待（事件循环select、队列/条件变量等待），默认不计入
+IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("handlers.py", "dequeue"),
+    ("thread.py", "_worker"),
+}
+
+
+def _frame_label(code) -> str:
+    """帧名：函数限定名 (相对项目根目录的文件名:首行号)"""
+    filename = code.co_filename
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({filename}:{code.co_firstlineno})"
+
+
+def _completed_requests() -> int:
+    return REQUEST_SECONDS.total_count()
+
+
+class SamplingProfiler:
+    """
+    栈采样剖析器，也可以作为上下文管理器在脚本中使用：
+
+        with SamplingProfiler() as profiler:
+            ...
+        print(profiler.collapsed())
+    """
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: TallyCounter = TallyCounter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._should_stop = None
+
+    def start(self, should_stop=None):
+        """should_stop：可选的无参回调，每轮采样后调用，返回True时停止"""
+        self._should_stop = should_stop
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        try:
+            while not self._stop.wait(self.interval):
+                self._sample(own_id)
+                if self._should_stop is not None and self._should_stop():
+                    break
+        finally:
+            self.stopped_at = time.time()
+
+    def _sample(self, own_id: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            leaf = frame.f_code
+            if not self.include_idle and (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_LEAVES:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, f"thread-{thread_id}"))
+            self.stacks[";".join(reversed(labels))] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        """折叠栈文本：每行 "线程;帧;...;帧 采样数" """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def speedscope(self, name: str = "game_robot") -> Dict[str, Any]:
+        """speedscope 文件格式（sampled 类型，权重单位为秒）"""
+        frames: List[Dict[str, str]] = []
+        frame_index: Dict[str, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.most_common():
+            indexes = []
+            for label in stack.split(";"):
+                if label not in frame_index:
+                    frame_index[label] = len(frames)
+                    frames.append({"name": label})
+                indexes.append(frame_index[label])
+            samples.append(indexes)
+            weights.append(round(count * self.interval, 6))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "game_robot.profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 6),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+class ProfileSession:
+    """一次剖析：模式、停止条件和结果"""
+
+    def __init__(self, mode: str, seconds: float, requests: int, interval: float, include_idle: bool):
+        self.mode = mode
+        self.seconds = seconds
+        self.requests = requests
+        self.interval = interval
+        self.started_at = time.time()
+        self.stopped_at: Optional[float] = None
+        self.stop_reason: Optional[str] = None
+        self._deadline = time.monotonic() + seconds
+        self._request_base = _completed_requests()
+        self._sampler: Optional[SamplingProfiler] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._done = threading.Event()
+        if mode == SAMPLE:
+            self._sampler = SamplingProfiler(interval, include_idle)
+
+    @property
+    def running(self) -> bool:
+        return self.stopped_at is None
+
+    def requests_done(self) -> int:
+        return _completed_requests() - self._request_base
+
+    def _limit_reached(self) -> Optional[str]:
+        if time.monotonic() >= self._deadline:
+            return "seconds"
+        if self.requests and self.requests_done() >= self.requests:
+            return "requests"
+        return None
+
+    def start(self):
+        if self._sampler is not None:
+            self._sampler.start(should_stop=lambda: self._limit_reached() is not None)
+            self._watchdog = threading.Thread(target=self._wait_sampler, name="profiler-watchdog", daemon=True)
+        else:
+            # cProfile 只对启用它的线程生效，必须在事件循环线程上启用和停用
+            self._loop = asyncio.get_running_loop()
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+            self._watchdog = threading.Thread(target=self._watch_cprofile, name="profiler-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def _wait_sampler(self):
+        self._sampler.join()
+        self._finish(self._limit_reached() or "stopped")
+
+    def _watch_cprofile(self):
+        while not self._done.wait(0.1):
+            reason = self._limit_reached()
+            if reason:
+                self._loop.call_soon_threadsafe(self._finish, reason)
+                return
+
+    def stop(self, reason: str = "stopped"):
+        """手动停止（需在事件循环线程中调用）"""
+        if self._sampler is not None:
+            self._sampler.stop()
+        self._finish(reason)
+
+    def _finish(self, reason: str):
+        if self.stopped_at is not None:
+            return
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self.stopped_at = time.time()
+        self.stop_reason = reason
+        self._done.set()
+        logger.info(f"性能剖析结束({self.mode})：原因 {reason}，持续 {self.stopped_at - self.started_at:.1f}秒，"
+                    f"期间处理问题 {self.requests_done()} 个")
+
+    def status(self) -> Dict[str, Any]:
+        status = {
+            "mode": self.mode,
+            "running": self.running,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+            "stop_reason": self.stop_reason,
+            "seconds": self.seconds,
+            "requests": self.requests,
+            "requests_done": self.requests_done(),
+        }
+        if self._sampler is not None:
+            status.update(interval=self.interval, samples=self._sampler.samples, stacks=len(self._sampler.stacks))
+        return status
+
+    def collapsed(self) -> str:
+        if self._sampler is None:
+            raise ValueError("cprofile 模式没有调用栈样本，请使用 pstats 格式")
+        return self._sampler.collapsed()
+
+    def speedscope(self) -> Dict[str, Any]:
+        if self._sampler is None:
+            raise ValueError("cprofile 模式没有调用栈样本，请使用 pstats 格式")
+        return self._sampler.speedscope(name=f"game_robot {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at))}")
+
+    def pstats_text(self, sort: str = "cumulative", limit: int = 60) -> str:
+        if self._cprofile is None:
+            raise ValueError("sample 模式没有cProfile统计，请使用 collapsed 或 speedscope 格式")
+        if self.running:
+            raise ValueError("cprofile 剖析仍在进行，请先停止")
+        output = io.StringIO()
+        pstats.Stats(self._cprofile, stream=output).sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+_session: Optional[ProfileSession] = None
+_session_lock = threading.Lock()
+
+
+def start_profiling(mode: str = SAMPLE, seconds: Optional[float] = None, requests: int = 0,
+                    interval: Optional[float] = None, include_idle: bool = False) -> ProfileSession:
+    """
+    开始一次剖析（每个进程同时只能有一个），需在事件循环中调用
+
+    Args:
+        mode: sample 或 cprofile
+        seconds: 最长持续秒数，不超过 PROFILER_MAX_SECONDS
+        requests: 处理完这么多问题后停止，0表示只按时间停止
+        interval: 采样间隔（秒），仅 sample 模式
+        include_idle: 是否计入空闲等待中的线程
+    """
+    global _session
+    if mode not in PROFILER_MODES:
+        raise ValueError(f"未知的剖析模式: {mode}，可选 {', '.join(PROFILER_MODES)}")
+    seconds = min(seconds or settings.PROFILER_MAX_SECONDS, settings.PROFILER_MAX_SECONDS)
+    interval = max(interval or settings.PROFILER_SAMPLE_INTERVAL, 0.001)
+    with _session_lock:
+        if _session is not None and _session.running:
+            raise RuntimeError("已有剖析正在进行")
+        _session = ProfileSession(mode, seconds, max(requests, 0), interval, include_idle)
+        _session.start()
+    logger.info(f"性能剖析开始({mode})：最长 {seconds}秒" + (f"，或 {requests} 个问题" if requests else ""))
+    return _session
+
+
+def stop_profiling() -> Optional[ProfileSession]:
+    if _session is not None and _session.running:
+        _session.stop()
+    return _session
+
+
+def current_session() -> Optional[ProfileSession]:
+    return _session
@@ -0,0 +1,46 @@
+"""
+竞赛智能客服系统 - 查询分析结果
+每个请求只做一次分词和竞赛/意图识别，结果以不可变对象沿调用链传给各引擎
+"""
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+Token = Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class QueryAnalysis:
+    """
+    单个问题的分析结果
+
+    tokens 对应 text（检索用文本）的 (词, 词性) 分词结果；引擎收到的问题文本与 text 一致时
+    直接使用 tokens，否则（例如调用方改写了问题）自行分词
+    """
+    question: str                                   # 用户原始问题（已去除首尾空白）
+    text: str                                       # 检索用文本：原始问题+问题类型标记+同义词扩展
+    tokens: Tuple[Token, ...]                       # text 的分词结果
+    keywords: Tuple[str, ...] = ()                  # 核心术语
+    expansions: Tuple[str, ...] = ()                # 同义词扩展
+    question_types: Tuple[Tuple[str, float], ...] = ()  # 问题类型及匹配度
+    competition_type: Optional[str] = None          # 识别到的竞赛类型
+    competition_confidence: float = 0.0
+    intent: Optional[str] = None                    # 问题意图（信息类型，如报名要求、评分标准）
+    intent_confidence: float = 0.0
+    kb_competition_type: Optional[str] = None       # 结构化知识库识别的竞赛类型
+    kb_info_type: Optional[str] = None              # 结构化知识库识别的信息类型
+    tokenizer_mode: str = "exact"                   # tokens 的分词模式（exact/fast）
+    detected: bool = field(default=False, compare=False)  # 是否已完成竞赛/意图识别
+
+    def tokens_for(self, text: str, mode: Optional[str] = None) -> Optional[List[Token]]:
+        """text 与分析时的检索文本一致（且指定了 mode 时分词模式也一致）时返回分词结果，否则返回None"""
+        if text == self.text and (mode is None or mode == self.tokenizer_mode):
+            return list(self.tokens)
+        return None
+
+    @property
+    def question_type_scores(self) -> Dict[str, float]:
+        return dict(self.question_types)
+
+    def with_detection(self, **detection) -> "QueryAnalysis":
+        """返回补充了识别结果的新对象"""
+        return replace(self, detected=True, **detection)
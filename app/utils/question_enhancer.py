@@ -6,8 +6,10 @@
 import re
 import logging
 # 使用自定义jieba_helper模块
-from app.utils.jieba_helper import jieba, pseg
-from typing import List, Set, Dict, Any
+from app.utils.jieba_helper import jieba
+from app.utils.tokenizer import resolve_mode, tokenize_query
+from app.utils.query_analysis import QueryAnalysis
+from typing import List, Set, Dict, Any, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -42,19 +44,23 @@ QUESTION_TYPE_KEYWORDS = {
 # 停用词列表
 STOPWORDS = {"的", "了", "是", "在", "我", "有", "和", "就", "不", "人", "都", "一", "一个", "上", "也", "很", "到", "说"}
 
-def extract_core_terms(question: str) -> List[str]:
+def extract_core_terms(question: str, words: Optional[List[Tuple[str, str]]] = None,
+                       tokenizer_mode: Optional[str] = None) -> List[str]:
     """
     提取问题中的核心术语
     
     Args:
         question: 用户问题
+        words: 问题已有的 (词, 词性) 分词结果，为None时现场分词
+        tokenizer_mode: 现场分词的模式（exact/fast），默认 QUERY_TOKENIZER_MODE
     
     Returns:
         核心术语列表
     """
     try:
         # 使用jieba词性标注
-        words = pseg.lcut(question)
+        if words is None:
+            words = tokenize_query(question, tokenizer_mode)
         
         # 提取名词、动词等实义词
         core_terms = []
@@ -135,21 +141,31 @@ def identify_question_type(question: str) -> Dict[str, float]:
     logger.info(f"问题类型分析: {type_scores}")
     return type_scores
 
-def enhance_question(question: str) -> str:
+def analyze_question(question: str, tokenizer_mode: Optional[str] = None) -> QueryAnalysis:
     """
-    增强问题文本，提高检索质量
+    分析并增强问题：问题只分词一次，同时得到增强后的检索文本及其分词结果
+    
+    jieba以空白符为分块边界，增强文本 "问题 后缀" 的分词结果等于问题与后缀分词结果的拼接，
+    因此只需再对很短的后缀分词
     
     Args:
         question: 用户问题
+        tokenizer_mode: 分词模式（exact/fast），默认 QUERY_TOKENIZER_MODE
     
     Returns:
-        增强后的问题
+        查询分析结果（尚未包含竞赛类型和意图识别，由QueryRouter补充）
     """
     # 清理问题文本
     question = question.strip()
+    tokenizer_mode = resolve_mode(tokenizer_mode)
     
-    # 1. 提取核心术语
-    core_terms = extract_core_terms(question)
+    # 1. 分词并提取核心术语
+    try:
+        question_tokens = tokenize_query(question, tokenizer_mode)
+    except Exception as e:
+        logger.error(f"问题分词失败: {str(e)}")
+        question_tokens = None
+    core_terms = extract_core_terms(question, question_tokens, tokenizer_mode)
     
     # 2. 添加同义词扩展
     expanded_terms = add_synonyms(core_terms)
@@ -161,25 +177,62 @@ def enhance_question(question: str) -> str:
         if score > 0.5:  # 只使用匹配度较高的类型
             type_terms.append(q_type)
     
-    # 4. 构建增强的问题文本
-    enhanced_parts = []
-    
-    # 添加原始问题
-    enhanced_parts.append(question)
-    
-    # 添加问题类型标记
+    # 4. 构建增强的问题文本：原始问题 + 问题类型标记 + 扩展词
+    suffix_parts = []
     if type_terms:
-        enhanced_parts.append("问题类型:" + " ".join(type_terms))
-    
-    # 添加扩展词
+        suffix_parts.append("问题类型:" + " ".join(type_terms))
     if expanded_terms:
-        enhanced_parts.append("关键词:" + " ".join(expanded_terms))
+        suffix_parts.append("关键词:" + " ".join(expanded_terms))
+    enhanced_question = " ".join([question] + suffix_parts)
     
-    # 组合为增强问题
-    enhanced_question = " ".join(enhanced_parts)
+    tokens: List[Tuple[str, str]] = []
+    if question_tokens is not None:
+        tokens = list(question_tokens)
+        if suffix_parts:
+            suffix = " ".join(suffix_parts)
+            tokens += [(" ", "x")] + tokenize_query(suffix, tokenizer_mode)
     
     logger.info(f"问题增强: 原始问题=[{question}], 增强后=[{enhanced_question}]")
-    return enhanced_question
+    return QueryAnalysis(
+        question=question,
+        text=enhanced_question,
+        tokens=tuple(tokens),
+        keywords=tuple(core_terms),
+        expansions=tuple(expanded_terms),
+        question_types=tuple(question_types.items()),
+        tokenizer_mode=tokenizer_mode
+    )
+
+def analyze_text(text: str, tokenizer_mode: Optional[str] = None) -> QueryAnalysis:
+    """
+    对已增强（或无需增强）的检索文本只做一次分词，构建分析结果
+    
+    Args:
+        text: 检索用文本
+        tokenizer_mode: 分词模式（exact/fast），默认 QUERY_TOKENIZER_MODE
+    
+    Returns:
+        查询分析结果
+    """
+    tokenizer_mode = resolve_mode(tokenizer_mode)
+    try:
+        tokens = tuple(tokenize_query(text, tokenizer_mode))
+    except Exception as e:
+        logger.error(f"问题分词失败: {str(e)}")
+        tokens = ()
+    return QueryAnalysis(question=text, text=text, tokens=tokens, tokenizer_mode=tokenizer_mode)
+
+def enhance_question(question: str) -> str:
+    """
+    增强问题文本，提高检索质量
+    
+    Args:
+        question: 用户问题
+    
+    Returns:
+        增强后的问题
+    """
+    return analyze_question(question).text
 
 def is_low_quality_answer(answer: str) -> bool:
     """
@@ -0,0 +1,119 @@
+"""
+竞赛智能客服系统 - 慢查询日志
+每个问题在处理过程中随手记下检索的"执行计划"（识别结果、关键词、各检索路径的候选数、
+上下文长度、LLM耗时等廉价字段），问题结束时只有耗时超过 SLOW_QUERY_THRESHOLD_MS 的
+才写入单独的滚动文件；逐因子的得分明细登记为延迟计算，只在确定是慢查询后才重新计算
+"""
+import time
+import atexit
+import logging
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from app.config import settings
+from app.utils.tracing import JsonlWriter, current_trace_id
+
+logger = logging.getLogger(__name__)
+
+
+class QueryExplain:
+    """一个问题的执行计划记录"""
+
+    __slots__ = ("question", "session_id", "started", "fields", "lazy", "token")
+
+    def __init__(self, question: str, session_id: Optional[str] = None):
+        self.question = question
+        self.session_id = session_id
+        self.started = time.time()
+        self.fields: Dict[str, Any] = {}
+        self.lazy: Dict[str, Callable[[], Any]] = {}
+        self.token = None
+
+    def section(self, name: str) -> Dict[str, Any]:
+        return self.fields.setdefault(name, {})
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {
+            "timestamp": round(self.started, 3),
+            "question": self.question,
+            "session_id": self.session_id,
+            **self.fields,
+        }
+        for name, compute in self.lazy.items():
+            section, _, key = name.rpartition(".")
+            target = record.setdefault(section, {}) if section else record
+            try:
+                target[key] = compute()
+            except Exception as e:
+                target[key] = f"计算失败: {type(e).__name__}: {e}"
+        return record
+
+
+_current_explain: ContextVar[Optional[QueryExplain]] = ContextVar("current_explain", default=None)
+
+writer = JsonlWriter(settings.SLOW_QUERY_FILE, settings.SLOW_QUERY_MAX_BYTES, settings.SLOW_QUERY_BACKUP_COUNT)
+atexit.register(writer.shutdown)
+
+
+def begin_explain(question: str, session_id: Optional[str] = None) -> Optional[QueryExplain]:
+    """开始记录一个问题的执行计划，未启用慢查询日志时返回None"""
+    if not settings.SLOW_QUERY_LOG_ENABLED:
+        return None
+    explain = QueryExplain(question, session_id)
+    explain.token = _current_explain.set(explain)
+    return explain
+
+
+def explain(**fields):
+    """记录顶层字段（当前没有执行计划时为空操作）"""
+    current = _current_explain.get()
+    if current is not None:
+        current.fields.update(fields)
+
+
+def explain_section(name: str, **fields):
+    """记录某个部分（如 simple_rag、enhanced_rag、llm）的字段"""
+    current = _current_explain.get()
+    if current is not None:
+        current.section(name).update(fields)
+
+
+def explain_lazy(name: str, compute: Callable[[], Any]):
+    """
+    登记只在慢查询时才计算的字段，name 可用 "部分.字段" 的形式；
+    compute 闭包会持有检索时的引用，直到问题结束
+    """
+    current = _current_explain.get()
+    if current is not None:
+        current.lazy[name] = compute
+
+
+def finish_explain(current: Optional[QueryExplain], duration: float, outcome: str, **fields) -> bool:
+    """
+    结束记录；耗时超过阈值时写入慢查询日志
+
+    Returns:
+        是否记为慢查询
+    """
+    if current is None:
+        return False
+    if current.token is not None:
+        try:
+            _current_explain.reset(current.token)
+        except ValueError:
+            _current_explain.set(None)
+        current.token = None
+    duration_ms = duration * 1000
+    if duration_ms < settings.SLOW_QUERY_THRESHOLD_MS:
+        return False
+    current.fields.update(fields)
+    record = current.to_dict()
+    record.update(duration_ms=round(duration_ms, 1), outcome=outcome, trace_id=current_trace_id())
+    try:
+        writer.write(record)
+    except Exception as e:
+        logger.warning(f"写入慢查询日志失败: {e}")
+        return True
+    logger.warning(f"慢查询({duration_ms:.0f}ms > {settings.SLOW_QUERY_THRESHOLD_MS}ms): '{current.question[:50]}'，"
+                   f"执行计划已写入 {settings.SLOW_QUERY_FILE}")
+    return True
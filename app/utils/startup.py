@@ -0,0 +1,159 @@
+"""
+竞赛智能客服系统 - 启动过程
+记录 app.main 的模块导入耗时和各组件的初始化耗时，并提供就绪状态：
+组件（索引、结构化知识库、大模型客户端）在后台线程中并行初始化，服务在初始化完成前就能接受连接；
+starting（没有可用引擎）-> serving（部分引擎可用，先用已加载的引擎回答）-> ready（全部加载成功）；
+有组件初始化失败时为 degraded：已加载的引擎继续回答问题，但不报告就绪
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+STARTING = "starting"
+SERVING = "serving"
+READY = "ready"
+DEGRADED = "degraded"
+FAILED = "failed"
+
+
+class StartupState:
+    """启动各阶段耗时和就绪状态"""
+
+    def __init__(self):
+        self.created = time.perf_counter()
+        self.status = STARTING
+        self.error: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+        self.components: Dict[str, Dict[str, Any]] = {}
+        self.parallel: Optional[bool] = None
+        self.serving_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    @property
+    def serving(self) -> bool:
+        """是否已有引擎可以回答问题"""
+        return self.status in (SERVING, READY, DEGRADED)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.created
+
+    def record_phase(self, name: str, seconds: Optional[float] = None):
+        """记录一个阶段；未给出耗时时记为从本模块导入起到现在的时间"""
+        self.phases[name] = round(seconds if seconds is not None else self.elapsed(), 3)
+
+    async def initialize_components(self, factories: Dict[str, Callable[[], Any]], parallel: bool = True,
+                                    on_component: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """
+        初始化各组件，返回 组件名 -> 实例（失败时为None）
+
+        Args:
+            factories: 组件名 -> 无参构造函数，各组件之间不能相互依赖
+            parallel: 是否在线程池中并行初始化（False 时在线程中依次初始化，便于对比）
+            on_component: 每个组件初始化完成（或失败，实例为None）后在事件循环中立即回调，
+                          用于先启用已加载的组件，不必等待全部完成
+        """
+        self.parallel = parallel
+        for name in factories:
+            self.components[name] = {"seconds": None, "status": "pending"}
+
+        async def build(name: str, factory: Callable[[], Any]) -> Any:
+            start = time.perf_counter()
+            try:
+                instance = await asyncio.to_thread(factory)
+                self.components[name] = {"seconds": round(time.perf_counter() - start, 3), "status": "ok"}
+                if instance is None:
+                    self.components[name].update(status="error", error="组件构造函数返回了None")
+            except Exception as e:
+                logger.error(f"组件 {name} 初始化失败: {e}", exc_info=True)
+                self.components[name] = {"seconds": round(time.perf_counter() - start, 3), "status": "error",
+                                         "error": str(e)}
+                instance = None
+            if on_component is not None:
+                try:
+                    on_component(name, instance)
+                except Exception as e:
+                    logger.error(f"启用组件 {name} 失败: {e}", exc_info=True)
+                    self.components[name].update(status="error", error=str(e))
+            return instance
+
+        start = time.perf_counter()
+        if parallel:
+            instances = await asyncio.gather(*(build(name, factory) for name, factory in factories.items()))
+        else:
+            instances = [await build(name, factory) for name, factory in factories.items()]
+        self.record_phase("components", time.perf_counter() - start)
+        return dict(zip(factories, instances))
+
+    def mark_serving(self):
+        """第一个可回答问题的引擎已启用"""
+        if self.status == STARTING:
+            self.status = SERVING
+            self.serving_seconds = round(self.elapsed(), 3)
+            logger.info(f"已有引擎可用，开始回答问题（用时 {self.serving_seconds:.2f}秒），其余引擎继续加载")
+
+    def failed_components(self, instances: Dict[str, Any]) -> List[str]:
+        """初始化失败的组件：状态不是ok，或没有得到实例"""
+        return [name for name, info in self.components.items()
+                if info["status"] != "ok" or instances.get(name) is None]
+
+    def mark_initialized(self, instances: Dict[str, Any]):
+        """全部组件初始化完成：每个组件都成功时标记就绪，否则标记为降级"""
+        failed = self.failed_components(instances)
+        if failed:
+            self.mark_degraded(f"组件初始化失败: {', '.join(failed)}")
+        else:
+            self.mark_ready()
+
+    def mark_ready(self):
+        self.status = READY
+        self.ready_seconds = round(self.elapsed(), 3)
+        self.log_summary()
+
+    def mark_degraded(self, error: str):
+        """部分组件不可用：已启用的引擎继续回答问题，就绪探针返回503"""
+        self.status = DEGRADED
+        self.error = error
+        logger.warning(f"启动完成但处于降级状态，{error}")
+        self.log_summary()
+
+    def mark_failed(self, error: str):
+        self.status = FAILED
+        self.error = error
+        self.log_summary()
+
+    def report(self) -> Dict[str, Any]:
+        accepting = self.phases.get("accepting_connections")
+        return {
+            "status": self.status,
+            "error": self.error,
+            "phases": dict(self.phases),
+            "components": {name: dict(info) for name, info in self.components.items()},
+            "parallel": self.parallel,
+            "serving_seconds": self.serving_seconds,
+            "ready_seconds": self.ready_seconds,
+            "budget_seconds": settings.STARTUP_BUDGET_SECONDS,
+            "within_budget": accepting <= settings.STARTUP_BUDGET_SECONDS if accepting is not None else None,
+        }
+
+    def log_summary(self):
+        components = "，".join(f"{name} {info['seconds'] or 0:.2f}秒" + ("" if info["status"] == "ok" else f"({info['status']})")
+                               for name, info in sorted(self.components.items(),
+                                                        key=lambda item: -(item[1]["seconds"] or 0)))
+        phases = "，".join(f"{name} {seconds:.2f}秒" for name, seconds in self.phases.items())
+        logger.info(f"启动耗时: {phases}；组件({'并行' if self.parallel else '串行'}): {components or '-'}；"
+                    f"状态 {self.status}" + (f"，就绪用时 {self.ready_seconds:.2f}秒" if self.ready_seconds else ""))
+        accepting = self.phases.get("accepting_connections")
+        if accepting is not None and accepting > settings.STARTUP_BUDGET_SECONDS:
+            logger.warning(f"开始接受连接用时 {accepting:.2f}秒，超出启动预算 {settings.STARTUP_BUDGET_SECONDS}秒")
+
+
+startup_state = StartupState()
@@ -0,0 +1,94 @@
+"""
+竞赛智能客服系统 - 查询分词器
+提供两种分词模式，可在各调用处分别选择：
+- exact：jieba.posseg 词性标注，未登录词的词性由HMM推断（与此前行为一致）
+- fast：jieba.lcut 分词后查词典词性表，未登录词按字符类别推断词性；
+  关键词提取只用词性做名词/动词/形容词的粗筛，这种精度已经足够
+"""
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.jieba_helper import (
+    SegmentationCache, ensure_jieba, jieba, lcut_query, pseg, segmentation_cache_stats,
+)
+
+logger = logging.getLogger(__name__)
+
+Token = Tuple[str, str]
+
+EXACT = "exact"
+FAST = "fast"
+TOKENIZER_MODES = (EXACT, FAST)
+
+_NUMBER = re.compile(r"^[0-9.%]+$")
+_ALNUM = re.compile(r"^[a-zA-Z0-9]+$")
+_CJK = re.compile(r"[\u4e00-\u9fa5]")
+
+
+def resolve_mode(mode: Optional[str] = None) -> str:
+    """调用方未指定时使用 QUERY_TOKENIZER_MODE"""
+    mode = (mode or settings.QUERY_TOKENIZER_MODE).lower()
+    if mode not in TOKENIZER_MODES:
+        raise ValueError(f"未知的分词模式: {mode}，可选 {', '.join(TOKENIZER_MODES)}")
+    return mode
+
+
+def guess_pos(word: str) -> str:
+    """
+    词性表中没有的词：数字为m，英文/字母数字为eng，多字中文新词按名词处理，
+    其余（标点、空白、单个未登录字）为x，与pseg对这些词的标注基本一致
+    """
+    if _NUMBER.match(word):
+        return "m"
+    if _ALNUM.match(word):
+        return "eng"
+    if len(word) > 1 and _CJK.search(word):
+        return "n"
+    return "x"
+
+
+def pos_table() -> Dict[str, str]:
+    """
+    词 -> 词性 查找表
+
+    即 jieba.posseg 从主词典（含合并的领域词条，见 jieba_helper.prepare_dictionary）加载的词性表，
+    运行时通过 add_word 添加的带词性词条也会并入
+    """
+    module = ensure_jieba()
+    dt = getattr(module, "dt", None)
+    if dt is None:
+        return {}
+    dt.makesure_userdict_loaded()
+    return dt.word_tag_tab
+
+
+def fast_lcut(text: str) -> List[Token]:
+    """快速模式分词：jieba.lcut + 词性查表"""
+    table = pos_table()
+    return [(word, table.get(word) or guess_pos(word)) for word in jieba.lcut(text)]
+
+
+def segment(text: str, mode: Optional[str] = None) -> List[Token]:
+    """不经缓存的分词（基准测试等场景）"""
+    if resolve_mode(mode) == FAST:
+        return fast_lcut(text)
+    ensure_jieba()
+    return [(word, flag) for word, flag in pseg.lcut(text)]
+
+
+# 精确模式沿用 jieba_helper 的查询分词缓存，快速模式单独缓存
+_fast_cache = SegmentationCache(settings.QUERY_SEG_CACHE_SIZE, segment=fast_lcut)
+
+
+def tokenize_query(text: str, mode: Optional[str] = None) -> List[Token]:
+    """查询侧分词（带LRU缓存），返回 (词, 词性) 列表"""
+    if resolve_mode(mode) == FAST:
+        ensure_jieba()
+        return _fast_cache.lcut(text)
+    return lcut_query(text)
+
+
+def tokenizer_cache_stats() -> Dict[str, Any]:
+    return {EXACT: segmentation_cache_stats(), FAST: _fast_cache.stats()}
@@ -0,0 +1,243 @@
+"""
+竞赛智能客服系统 - 请求追踪
+每个问题生成一个trace id，经contextvars沿调用链（含asyncio任务和to_thread线程）传递；
+各处理阶段记录为span（带候选数、token数、缓存命中等属性），问题结束后整条trace
+以一行JSON写入本地滚动文件，由 summarize_traces.py 汇总成火焰图式的耗时分解。
+当前上下文没有trace时所有接口直接返回，开销只有一次ContextVar读取
+"""
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """一个处理阶段"""
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attributes", "status")
+
+    def __init__(self, name: str, parent_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def incr(self, key: str, amount: float = 1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """一个问题的完整处理过程，root 为根span"""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.timestamp = time.time()
+        self.root = Span(name, attributes=attributes)
+        self.spans: List[Span] = []
+        self._tokens = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        origin = self.root.start
+        return {
+            "trace_id": self.trace_id,
+            "timestamp": round(self.timestamp, 3),
+            "name": self.root.name,
+            "duration_ms": round(self.root.duration * 1000, 3),
+            "status": self.root.status,
+            "attributes": self.root.attributes,
+            "spans": [self.root.to_dict(origin)] + [span.to_dict(origin) for span in self.spans],
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _JsonFormatter(logging.Formatter):
+    """在写文件的后台线程里序列化，请求线程只负责入队"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.payload, ensure_ascii=False, default=str)
+
+
+class JsonlWriter:
+    """把记录（字典）逐行写入JSONL文件，按大小滚动；写入由后台线程完成，首次写入时才创建文件"""
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._listener: Optional[QueueListener] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is not None:
+                return
+            handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backup_count,
+                                          encoding="utf-8", delay=True)
+            handler.setFormatter(_JsonFormatter())
+            self._listener = QueueListener(self._queue, handler)
+            self._listener.start()
+
+    def write(self, record: Dict[str, Any]):
+        self._ensure_started()
+        self._queue.put(logging.makeLogRecord({"payload": record, "levelno": logging.INFO}))
+
+    def shutdown(self):
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()
+                for handler in self._listener.handlers:
+                    handler.close()
+                self._listener = None
+
+
+exporter = JsonlWriter(settings.TRACE_FILE, settings.TRACE_MAX_BYTES, settings.TRACE_BACKUP_COUNT)
+atexit.register(exporter.shutdown)
+
+
+def begin_trace(name: str, **attributes) -> Optional[Trace]:
+    """
+    开始一条trace并设为当前上下文的trace
+
+    未启用追踪或未命中采样时返回None，此时后续的span调用均为空操作
+    """
+    if not settings.TRACING_ENABLED:
+        return None
+    if settings.TRACE_SAMPLE_RATE < 1.0 and random.random() >= settings.TRACE_SAMPLE_RATE:
+        return None
+    trace = Trace(name, attributes)
+    trace._tokens = (_current_trace.set(trace), _current_span.set(None))
+    return trace
+
+
+def end_trace(trace: Optional[Trace], status: str = "ok", **attributes):
+    """结束trace、恢复上下文并导出"""
+    if trace is None or trace.root.end is not None:
+        return
+    trace.root.end = time.perf_counter()
+    trace.root.status = status
+    trace.root.attributes.update(attributes)
+    if trace._tokens is not None:
+        trace_token, span_token = trace._tokens
+        trace._tokens = None
+        try:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+        except ValueError:
+            # 在其他上下文中结束（例如由另一个任务收尾），只需清除当前上下文
+            _current_trace.set(None)
+            _current_span.set(None)
+    try:
+        exporter.write(trace.to_dict())
+    except Exception as e:
+        logger.warning(f"导出trace失败: {e}")
+
+
+@contextmanager
+def capture_trace(name: str, **attributes) -> Iterator[Trace]:
+    """
+    不受开关和采样控制、也不导出的临时trace，供基准测试等脚本读取检索过程中记录的属性
+    （如候选数、分词缓存命中数）
+    """
+    trace = Trace(name, attributes)
+    tokens = (_current_trace.set(trace), _current_span.set(None))
+    try:
+        yield trace
+    finally:
+        trace.root.end = time.perf_counter()
+        _current_span.reset(tokens[1])
+        _current_trace.reset(tokens[0])
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """记录一个阶段；当前上下文没有trace时不做任何事，产出None"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get() or trace.root
+    current = Span(name, parent.span_id, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        trace.spans.append(current)
+
+
+def _active_span() -> Optional[Span]:
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    return _current_span.get() or trace.root
+
+
+def set_attributes(**attributes):
+    """给当前span（不在任何span内时为trace根节点）设置属性"""
+    current = _active_span()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def incr_attribute(key: str, amount: float = 1):
+    """给当前span的计数属性累加，例如缓存命中次数"""
+    current = _active_span()
+    if current is not None:
+        current.incr(key, amount)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+class TraceIdFilter(logging.Filter):
+    """给日志记录附加 trace_id 字段（无trace时为 "-"），用于在日志中关联同一问题的各行"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id() or "-"
+        return True
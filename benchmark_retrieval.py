@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+"""
+竞赛智能客服系统 - 检索基准测试
+不经过LLM，直接对各检索引擎（SimpleRAG、EnhancedRAG、KnowledgeService、结构化知识库、SQLite FTS5）
+逐条执行问题集，统计每条查询的耗时分布、内存分配峰值和候选文档数，结果保存为JSON，
+并可与保存的基线比较，标出变慢或内存占用变大的引擎
+
+用法:
+    python benchmark_retrieval.py [--engines simple,enhanced,knowledge,structured,fts] [--corpus test,generated]
+                                  [--questions 问题文件] [--repeat 5] [--no-alloc] [--output 结果.json]
+                                  [--baseline 基线.json] [--save-baseline 基线.json] [--tolerance 0.2]
+
+指定 --baseline 且发现退化时以状态码1退出，可直接用于CI
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 确保工作目录是项目根目录
+project_root = Path(__file__).parent
+os.chdir(project_root)
+sys.path.insert(0, str(project_root))
+
+ENGINES = ("simple", "enhanced", "knowledge", "structured", "fts")
+CORPORA = ("test", "generated")
+
+# 判定退化/改进时忽略的绝对差值，避免亚毫秒级的抖动被当成退化
+LATENCY_FLOOR_MS = 0.05
+ALLOC_FLOOR_KB = 16.0
+
+# 参与基线比较的指标：(分组, 指标)
+COMPARED_METRICS = [
+    ("latency_ms", "p50"), ("latency_ms", "p95"), ("latency_ms", "mean"), ("alloc_kb", "p95"),
+]
+
+
+def load_corpus(name: str, questions_file: Optional[str] = None) -> List[str]:
+    """test：批量测试的预设问题；generated：竞赛名称×问题模板生成的较大问题集（或 --questions 指定的文件）"""
+    if name == "test":
+        from test_all_questions import TEST_QUESTIONS
+        return list(TEST_QUESTIONS)
+    from benchmark_tokenizer import load_questions
+    return load_questions(questions_file)
+
+
+def build_engines(names: List[str]) -> Dict[str, Callable[[str], Any]]:
+    """加载各检索引擎，返回 引擎名 -> 单条查询函数"""
+    from app.config import settings
+
+    engines: Dict[str, Callable[[str], Any]] = {}
+    for name in names:
+        start = time.perf_counter()
+        if name == "simple":
+            from app.models.SimpleRAG import SimpleRAG
+            simple_rag = SimpleRAG()
+            engines[name] = lambda question: simple_rag.search(question)
+        elif name == "enhanced":
+            from app.models.enhanced_rag import EnhancedRAG
+            enhanced_rag = EnhancedRAG()
+            loop = asyncio.new_event_loop()
+            engines[name] = lambda question: loop.run_until_complete(enhanced_rag.search(question))
+        elif name == "knowledge":
+            from app.services.knowledge.knowledge_service import KnowledgeService
+            knowledge_service = KnowledgeService(settings.KNOWLEDGE_BASE_PATH)
+            engines[name] = lambda question: knowledge_service.search(question, top_k=5)
+        elif name == "structured":
+            from app.models.structured_kb import StructuredCompetitionKB
+            structured_kb = StructuredCompetitionKB(settings.KNOWLEDGE_BASE_PATH)
+
+            def structured_lookup(question: str, kb=structured_kb):
+                result = kb.query(kb.get_competition_type(question), kb.get_info_type(question))
+                return [result] if result else []
+            engines[name] = structured_lookup
+        elif name == "fts":
+            from app.models.fts_rag import FtsRAG
+            fts_rag = FtsRAG()
+            engines[name] = lambda question: fts_rag.search(question)
+        else:
+            raise ValueError(f"未知的检索引擎: {name}，可选 {', '.join(ENGINES)}")
+        print(f"  {name:<10} 加载耗时 {time.perf_counter() - start:.2f}秒")
+    return engines
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def distribution(values: List[float], digits: int = 3) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "mean": round(statistics.mean(values), digits),
+        "p50": round(percentile(values, 0.50), digits),
+        "p90": round(percentile(values, 0.90), digits),
+        "p95": round(percentile(values, 0.95), digits),
+        "p99": round(percentile(values, 0.99), digits),
+        "max": round(max(values), digits),
+    }
+
+
+def run_query(search: Callable[[str], Any], question: str) -> Tuple[int, Optional[int], Dict[str, Any]]:
+    """执行一次查询并读取检索过程记录的属性，返回 (结果数, 候选数, 属性)"""
+    from app.utils.tracing import capture_trace
+
+    with capture_trace("benchmark") as trace:
+        results = search(question)
+    attributes = trace.root.attributes
+    return len(results or []), attributes.get("candidates"), attributes
+
+
+def measure_allocation(search: Callable[[str], Any], question: str) -> float:
+    """单条查询期间的内存分配峰值（KB，相对查询开始时）"""
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.clear_traces()  # Python 3.8 没有 reset_peak，清空记录同时会重置峰值
+    before, _ = tracemalloc.get_traced_memory()
+    search(question)
+    _, peak = tracemalloc.get_traced_memory()
+    return max(peak - before, 0) / 1024
+
+
+def benchmark_engine(search: Callable[[str], Any], questions: List[str], repeat: int,
+                     allocations: bool) -> Dict[str, Any]:
+    """
+    对一个引擎跑完整个问题集：
+    每条问题先执行一次（预热，同时记录结果数和候选数），再计时 repeat 次；
+    内存分配在单独一轮中用 tracemalloc 统计，不影响计时
+    """
+    queries = []
+    latencies: List[float] = []
+    for question in questions:
+        result_count, candidates, attributes = run_query(search, question)
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            search(question)
+            samples.append((time.perf_counter() - start) * 1000)
+        latencies.extend(samples)
+        queries.append({
+            "question": question,
+            "p50_ms": round(statistics.median(samples), 3),
+            "max_ms": round(max(samples), 3),
+            "results": result_count,
+            "candidates": candidates,
+            "seg_cache_misses": attributes.get("seg_cache_misses", 0),
+        })
+
+    if allocations:
+        tracemalloc.start()
+        try:
+            for query in queries:
+                query["alloc_kb"] = round(measure_allocation(search, query["question"]), 1)
+        finally:
+            tracemalloc.stop()
+
+    candidates = [q["candidates"] for q in queries if q["candidates"] is not None]
+    results = [q["results"] for q in queries]
+    return {
+        "questions": len(questions),
+        "repeat": repeat,
+        "latency_ms": distribution(latencies),
+        "alloc_kb": distribution([q["alloc_kb"] for q in queries], 1) if allocations else {},
+        "candidates": distribution(candidates, 1),
+        "results": {"mean": round(statistics.mean(results), 2),
+                    "empty_ratio": round(sum(1 for r in results if r == 0) / len(results), 4)},
+        "queries": queries,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """与基线逐项比较，返回变化超过容差的指标（regression=True 表示退化）"""
+    changes = []
+    for engine, corpora in current["results"].items():
+        for corpus, stats in corpora.items():
+            base_stats = baseline.get("results", {}).get(engine, {}).get(corpus)
+            if not base_stats:
+                continue
+            for group, metric in COMPARED_METRICS:
+                new, old = stats.get(group, {}).get(metric), base_stats.get(group, {}).get(metric)
+                if new is None or not old:
+                    continue
+                floor = LATENCY_FLOOR_MS if group == "latency_ms" else ALLOC_FLOOR_KB
+                ratio = new / old
+                if abs(new - old) < floor or abs(ratio - 1) <= tolerance:
+                    continue
+                changes.append({"engine": engine, "corpus": corpus, "metric": f"{group}.{metric}",
+                                "baseline": old, "current": new, "ratio": round(ratio, 3),
+                                "regression": ratio > 1})
+            # 候选数变化说明检索行为变了，单独提示，不计为退化
+            new_candidates = stats.get("candidates", {}).get("mean")
+            old_candidates = base_stats.get("candidates", {}).get("mean")
+            if new_candidates is not None and old_candidates is not None and new_candidates != old_candidates:
+                changes.append({"engine": engine, "corpus": corpus, "metric": "candidates.mean",
+                                "baseline": old_candidates, "current": new_candidates,
+                                "ratio": round(new_candidates / old_candidates, 3) if old_candidates else None,
+                                "regression": False})
+    return changes
+
+
+def print_results(results: Dict[str, Dict[str, Any]]):
+    print(f"\n{'引擎':<11}{'问题集':<11}{'问题数':>6}{'P50ms':>9}{'P95ms':>9}{'P99ms':>9}{'最大ms':>9}"
+          f"{'分配P95KB':>11}{'平均候选':>9}{'平均结果':>9}{'无结果':>8}")
+    for engine, corpora in results.items():
+        for corpus, stats in corpora.items():
+            latency, alloc = stats["latency_ms"], stats["alloc_kb"]
+            candidates = stats["candidates"].get("mean", "-")
+            print(f"{engine:<11}{corpus:<11}{stats['questions']:>6}{latency['p50']:>9.2f}{latency['p95']:>9.2f}"
+                  f"{latency['p99']:>9.2f}{latency['max']:>9.2f}{alloc.get('p95', '-'):>11}{candidates:>9}"
+                  f"{stats['results']['mean']:>9}{stats['results']['empty_ratio']:>8.0%}")
+
+
+def print_changes(changes: List[Dict[str, Any]], baseline_path: str, tolerance: float):
+    print(f"\n与基线 {baseline_path} 比较（容差 {tolerance:.0%}）")
+    if not changes:
+        print("  无显著变化")
+        return
+    for change in sorted(changes, key=lambda c: (not c["regression"], c["engine"], c["corpus"])):
+        if change["metric"] == "candidates.mean":
+            label = "候选数变化"
+        else:
+            label = "退化" if change["regression"] else "改进"
+        ratio = f"{change['ratio']:.2f}x" if change["ratio"] is not None else "-"
+        print(f"  [{label}] {change['engine']:<10} {change['corpus']:<10} {change['metric']:<16}"
+              f" {change['baseline']} -> {change['current']} ({ratio})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索基准测试")
+    parser.add_argument("--engines", default=",".join(ENGINES), help=f"逗号分隔的引擎，可选 {', '.join(ENGINES)}")
+    parser.add_argument("--corpus", default=",".join(CORPORA), help=f"逗号分隔的问题集，可选 {', '.join(CORPORA)}")
+    parser.add_argument("--questions", help="generated 问题集改为读取该文件，每行一个问题")
+    parser.add_argument("--repeat", type=int, default=5, help="每条问题计时的重复次数")
+    parser.add_argument("--no-alloc", action="store_true", help="不统计内存分配（跳过 tracemalloc 一轮）")
+    parser.add_argument("--output", help="结果输出JSON文件")
+    parser.add_argument("--baseline", help="与该基线结果比较，有退化时以状态码1退出")
+    parser.add_argument("--save-baseline", help="把本次结果另存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="比较基线时允许的相对变化")
+    args = parser.parse_args()
+
+    engine_names = [name.strip() for name in args.engines.split(",") if name.strip()]
+    corpus_names = [name.strip() for name in args.corpus.split(",") if name.strip()]
+    for name in corpus_names:
+        if name not in CORPORA:
+            parser.error(f"未知的问题集: {name}，可选 {', '.join(CORPORA)}")
+
+    from app.config import settings
+    from app.utils.jieba_helper import ensure_jieba
+
+    ensure_jieba()
+    corpora = {name: load_corpus(name, args.questions) for name in corpus_names}
+    print("加载检索引擎")
+    engines = build_engines(engine_names)
+    print(f"问题集: {', '.join(f'{name}({len(questions)})' for name, questions in corpora.items())}，"
+          f"每条重复 {args.repeat} 次")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for engine, search in engines.items():
+        results[engine] = {}
+        for corpus, questions in corpora.items():
+            start = time.perf_counter()
+            results[engine][corpus] = benchmark_engine(search, questions, args.repeat, not args.no_alloc)
+            print(f"  {engine:<10} {corpus:<10} 完成，耗时 {time.perf_counter() - start:.1f}秒")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "query_tokenizer_mode": settings.QUERY_TOKENIZER_MODE,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    print_results(results)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        changes = compare(report, baseline, args.tolerance)
+        report["comparison"] = {"baseline": args.baseline, "baseline_meta": baseline.get("meta"),
+                                "tolerance": args.tolerance, "changes": changes}
+        print_changes(changes, args.baseline, args.tolerance)
+        regressions = [change for change in changes if change["regression"]]
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"\n结果已保存到: {path}")
+
+    if regressions:
+        print(f"\n发现 {len(regressions)} 项退化")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+竞赛智能客服系统 - 查询分词模式基准测试
+比较 exact(posseg) 与 fast(jieba.lcut+词性查表) 两种分词模式的耗时，
+以及各关键词提取调用处在两种模式下提取结果的重合度
+
+用法:
+    python benchmark_tokenizer.py [--questions 问题文件] [--repeat 5] [--engines] [--output 结果.json]
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import statistics
+from pathlib import Path
+from typing import Callable, Dict, List
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 确保工作目录是项目根目录
+project_root = Path(__file__).parent
+os.chdir(project_root)
+sys.path.insert(0, str(project_root))
+
+QUESTION_TEMPLATES = [
+    "{}的报名时间是什么时候？", "{}的参赛要求是什么？", "{}的评分标准有哪些？",
+    "参加{}需要提交哪些材料？", "{}作品提交的截止日期", "{}获奖证书如何颁发？",
+]
+
+GENERAL_QUESTIONS = [
+    "所有竞赛的报名方式是什么？", "参赛团队可以跨学校组队吗？", "若竞赛过程中遇到技术问题如何寻求帮助？",
+    "比赛前是否有相关培训？", "如何确保我的竞赛作品不被剽窃？", "泰迪杯数据挖掘挑战赛是什么比赛？",
+]
+
+
+def load_questions(path: str = None) -> List[str]:
+    """问题文件每行一个问题；未指定时由竞赛名称和问题模板生成"""
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    from app.config import settings
+    return [template.format(name) for name in settings.COMPETITION_TYPES
+            for template in QUESTION_TEMPLATES] + GENERAL_QUESTIONS
+
+
+def time_per_text(segment: Callable[[str], List], texts: List[str], repeat: int) -> Dict[str, float]:
+    """每条文本的平均分词耗时(微秒)"""
+    samples = []
+    for text in texts:
+        segment(text)  # 预热
+        start = time.perf_counter()
+        for _ in range(repeat):
+            segment(text)
+        samples.append((time.perf_counter() - start) / repeat * 1e6)
+    return {"mean_us": round(statistics.mean(samples), 1), "p50_us": round(statistics.median(samples), 1),
+            "max_us": round(max(samples), 1)}
+
+
+def keyword_overlap(extract: Callable[[str, str], List[str]], texts: List[str]) -> Dict[str, float]:
+    """两种模式提取的关键词集合的平均Jaccard相似度和完全一致比例"""
+    from app.utils.tokenizer import EXACT, FAST
+
+    similarities = []
+    identical = 0
+    for text in texts:
+        exact, fast = set(extract(text, EXACT)), set(extract(text, FAST))
+        union = exact | fast
+        similarities.append(len(exact & fast) / len(union) if union else 1.0)
+        identical += exact == fast
+    return {"mean_jaccard": round(statistics.mean(similarities), 4),
+            "identical_ratio": round(identical / len(texts), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询分词模式基准测试")
+    parser.add_argument("--questions", help="问题文件，每行一个问题")
+    parser.add_argument("--repeat", type=int, default=5, help="每条文本重复分词次数")
+    parser.add_argument("--engines", action="store_true", help="同时加载SimpleRAG和EnhancedRAG比较其关键词提取（需要已有索引）")
+    parser.add_argument("--output", help="结果输出JSON文件")
+    args = parser.parse_args()
+
+    from app.utils.jieba_helper import ensure_jieba
+    from app.utils.question_enhancer import analyze_question, extract_core_terms
+    from app.utils.tokenizer import TOKENIZER_MODES, EXACT, segment
+
+    ensure_jieba()
+    questions = load_questions(args.questions)
+    enhanced = [analyze_question(question, EXACT).text for question in questions]
+    print(f"问题数: {len(questions)}，每条重复 {args.repeat} 次")
+
+    results: Dict[str, Dict] = {"latency": {}, "overlap": {}}
+    for mode in TOKENIZER_MODES:
+        results["latency"][mode] = {
+            "question": time_per_text(lambda text: segment(text, mode), questions, args.repeat),
+            "enhanced": time_per_text(lambda text: segment(text, mode), enhanced, args.repeat),
+        }
+
+    call_sites: Dict[str, tuple] = {
+        "question_enhancer.extract_core_terms": (
+            lambda text, mode: extract_core_terms(text, tokenizer_mode=mode), questions),
+    }
+    if args.engines:
+        from app.models.SimpleRAG import SimpleRAG
+        from app.models.enhanced_rag import EnhancedRAG
+        simple_rag, enhanced_rag = SimpleRAG(), EnhancedRAG()
+        call_sites["SimpleRAG._extract_keywords"] = (
+            lambda text, mode: simple_rag._extract_keywords(text, for_query=True, tokenizer_mode=mode), enhanced)
+        call_sites["EnhancedRAG._extract_keywords"] = (
+            lambda text, mode: enhanced_rag._extract_keywords(text, for_query=True, tokenizer_mode=mode), enhanced)
+    for name, (extract, texts) in call_sites.items():
+        results["overlap"][name] = keyword_overlap(extract, texts)
+
+    print("\n分词耗时（微秒/条）")
+    for mode, latency in results["latency"].items():
+        for kind, stats in latency.items():
+            print(f"  {mode:<6} {kind:<9} 平均 {stats['mean_us']:>8}  中位数 {stats['p50_us']:>8}  最大 {stats['max_us']:>8}")
+    for kind in ("question", "enhanced"):
+        exact_mean = results["latency"]["exact"][kind]["mean_us"]
+        fast_mean = results["latency"]["fast"][kind]["mean_us"]
+        print(f"  {kind} 加速比: {exact_mean / fast_mean:.2f}x")
+    print("\n关键词重合度（exact vs fast）")
+    for name, overlap in results["overlap"].items():
+        print(f"  {name:<40} 平均Jaccard {overlap['mean_jaccard']:.4f}  完全一致 {overlap['identical_ratio']:.2%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -40,9 +40,12 @@ def main():
         sys.path.insert(0, str(project_root))
         from app.models.SimpleRAG import SimpleRAG
         
-        # 实例化并强制重建索引
-        logger.info("正在实例化SimpleRAG并重建索引...")
-        rag_engine = SimpleRAG(rebuild_index=True)
+        # 实例化并重建索引（默认按源文件清单增量重建，--full 强制全量重建）
+        full = "--full" in sys.argv[1:]
+        logger.info(f"正在实例化SimpleRAG并{'全量' if full else '增量'}重建索引...")
+        rag_engine = SimpleRAG(rebuild_index=not full)
+        if full:
+            rag_engine.rebuild_index(full=True)
         
         # 诊断索引状态
         logger.info("检查索引状态...")
@@ -56,6 +59,15 @@ def main():
         
         elapsed_time = time.time() - start_time
         logger.info(f"索引重建完成! 耗时: {elapsed_time:.2f}秒")
+
+        # 输出并行摄取各阶段耗时（工作进程阶段为各任务耗时之和）
+        build_report = rag_engine.last_build_report
+        if build_report.get("manifest"):
+            logger.info(f"源文件变化: {build_report['manifest']}")
+        if build_report.get("stages"):
+            logger.info(f"并行摄取: {build_report['workers']} 个工作进程, 每任务 {build_report['pages_per_task']} 页, 失败任务 {build_report['failed_tasks']} 个")
+            for stage, seconds in build_report['stages'].items():
+                logger.info(f"  - {stage}: {seconds:.2f}秒")
         logger.info(f"配置: chunk_size={rag_engine.chunk_size}, score_threshold={rag_engine.score_threshold}")
         
         return True
@@ -68,4 +80,4 @@ def main():
 
 if __name__ == "__main__":
     success = main()
-    sys.exit(0 if success else 1) 
\ No newline at end of file
+    sys.exit(0 if success else 1) 
\ No newline at end of file
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+"""
+竞赛智能客服系统 - WebSocket 并发压测
+同时打开 N 个 /ws 会话，每个会话按思考时间间隔连续提问，统计：
+- 确认耗时：发出问题到收到 processing 消息
+- 首包耗时：发出问题到收到第一条内容消息（chunk 或 answer；当前服务端不分片推送，与回答耗时相同）
+- 回答耗时：发出问题到收到 answer 消息
+以及吞吐、错误率和超时率（服务端15秒超时返回的降级回答、客户端等待超时分别统计）
+
+容量评估时服务端使用模拟大模型，不消耗token：
+    LLM_BACKEND=stub LLM_STUB_LATENCY_MS=800 python run.py
+
+用法:
+    python load_test_ws.py [--url ws://localhost:53085/ws] [--sessions 20] [--duration 60] [--requests 0]
+                           [--think-time 1.0] [--ramp-up 5] [--corpus test|generated] [--questions 问题文件]
+                           [--replay 日志文件] [--timeout 30] [--output 结果.json]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import statistics
+from pathlib import Path
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 确保工作目录是项目根目录
+project_root = Path(__file__).parent
+os.chdir(project_root)
+sys.path.insert(0, str(project_root))
+
+# 应用日志中的提问记录，例如：[WebSocket问答] 📝 收到问题: '...' (会话: ws_xxx)
+LOG_QUESTION_PATTERN = re.compile(r"收到问题: '(.*)' \(会话")
+
+OK = "ok"
+SERVER_TIMEOUT = "server_timeout"
+CLIENT_TIMEOUT = "client_timeout"
+ERROR = "error"
+DISCONNECTED = "disconnected"
+
+
+def load_replay(path: str) -> List[str]:
+    """
+    从历史记录回放问题：
+    - .jsonl：追踪文件（attributes.question）或慢查询日志（question）
+    - 其他：应用日志中 "收到问题" 的行
+    """
+    questions = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if path.endswith(".jsonl"):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                question = record.get("question") or record.get("attributes", {}).get("question")
+            else:
+                match = LOG_QUESTION_PATTERN.search(line)
+                question = match.group(1) if match else None
+            if question:
+                questions.append(question)
+    return questions
+
+
+def load_questions(args) -> List[str]:
+    if args.replay:
+        return load_replay(args.replay)
+    if args.corpus == "test":
+        from test_all_questions import TEST_QUESTIONS
+        return list(TEST_QUESTIONS)
+    from benchmark_tokenizer import load_questions as load_generated
+    return load_generated(args.questions)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def distribution(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "count": len(values),
+        "mean": round(statistics.mean(values), 1),
+        "p50": round(percentile(values, 0.50), 1),
+        "p90": round(percentile(values, 0.90), 1),
+        "p95": round(percentile(values, 0.95), 1),
+        "p99": round(percentile(values, 0.99), 1),
+        "max": round(max(values), 1),
+    }
+
+
+class LoadTest:
+    """压测运行状态：各会话共享的停止条件和逐问题记录"""
+
+    def __init__(self, args, questions: List[str]):
+        self.args = args
+        self.questions = questions
+        self.records: List[Dict[str, Any]] = []
+        self.connect_errors = 0
+        self.deadline: Optional[float] = None
+        self.started_at = 0.0
+        self.finished_at = 0.0
+
+    def should_continue(self, asked: int) -> bool:
+        if self.args.requests and asked >= self.args.requests:
+            return False
+        return self.deadline is None or time.monotonic() < self.deadline
+
+    async def ask(self, websocket, question: str) -> Dict[str, Any]:
+        """发出一个问题并等待回答，返回该问题的记录"""
+        record: Dict[str, Any] = {"question": question, "ack_ms": None, "first_chunk_ms": None, "answer_ms": None}
+        start = time.perf_counter()
+        await websocket.send(json.dumps({"text": question}, ensure_ascii=False))
+        try:
+            await asyncio.wait_for(self._receive_answer(websocket, record, start), self.args.timeout)
+        except asyncio.TimeoutError:
+            record["outcome"] = CLIENT_TIMEOUT
+        return record
+
+    @staticmethod
+    async def _receive_answer(websocket, record: Dict[str, Any], start: float):
+        while True:
+            message = json.loads(await websocket.recv())
+            elapsed = (time.perf_counter() - start) * 1000
+            kind = message.get("type")
+            if kind == "processing":
+                record["ack_ms"] = elapsed
+            elif kind in ("chunk", "answer") and record["first_chunk_ms"] is None:
+                record["first_chunk_ms"] = elapsed
+            if kind == "answer":
+                record["answer_ms"] = elapsed
+                record["outcome"] = SERVER_TIMEOUT if message.get("source") == "timeout" else OK
+                record["confidence"] = message.get("confidence")
+                return
+            if kind == "error":
+                record["outcome"] = ERROR
+                record["error"] = message.get("message")
+                return
+
+    async def session(self, index: int):
+        rng = random.Random(self.args.seed + index)
+        await asyncio.sleep(self.args.ramp_up * index / max(self.args.sessions, 1))
+        asked = 0
+        while self.should_continue(asked):
+            try:
+                asked = await self._converse(index, rng, asked)
+            except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake) as e:
+                self.connect_errors += 1
+                logger.warning(f"会话 {index} 连接失败: {e}")
+                return
+
+    async def _converse(self, index: int, rng: random.Random, asked: int) -> int:
+        """
+        在一个连接上连续提问，返回累计提问数；
+        客户端等待超时或连接断开时返回，由调用方换新连接（否则迟到的回答会被下一个问题误收）
+        """
+        async with websockets.connect(self.args.url, max_size=None, open_timeout=self.args.timeout) as websocket:
+            await websocket.recv()  # connection_established
+            while self.should_continue(asked):
+                question = rng.choice(self.questions)
+                try:
+                    record = await self.ask(websocket, question)
+                except websockets.ConnectionClosed as e:
+                    record = {"question": question, "outcome": DISCONNECTED, "error": str(e)}
+                record["session"] = index
+                self.records.append(record)
+                asked += 1
+                if record["outcome"] in (CLIENT_TIMEOUT, DISCONNECTED):
+                    break
+                if self.args.think_time > 0:
+                    await asyncio.sleep(rng.expovariate(1 / self.args.think_time))
+        return asked
+
+    async def run(self):
+        self.started_at = time.monotonic()
+        if self.args.duration:
+            self.deadline = self.started_at + self.args.duration + self.args.ramp_up
+        await asyncio.gather(*(self.session(index) for index in range(self.args.sessions)))
+        self.finished_at = time.monotonic()
+
+    def summary(self) -> Dict[str, Any]:
+        outcomes = Counter(record["outcome"] for record in self.records)
+        total = len(self.records)
+        answered = [record for record in self.records if record["outcome"] == OK]
+        elapsed = self.finished_at - self.started_at
+        return {
+            "sessions": self.args.sessions,
+            "elapsed_seconds": round(elapsed, 1),
+            "questions": total,
+            "throughput_qps": round(len(answered) / elapsed, 2) if elapsed > 0 else 0.0,
+            "outcomes": dict(outcomes),
+            "error_rate": round((outcomes[ERROR] + outcomes[DISCONNECTED]) / total, 4) if total else None,
+            "timeout_rate": round((outcomes[SERVER_TIMEOUT] + outcomes[CLIENT_TIMEOUT]) / total, 4) if total else None,
+            "connect_errors": self.connect_errors,
+            "ack_ms": distribution([r["ack_ms"] for r in self.records if r.get("ack_ms") is not None]),
+            "first_chunk_ms": distribution([r["first_chunk_ms"] for r in answered]),
+            "answer_ms": distribution([r["answer_ms"] for r in answered]),
+        }
+
+
+def print_summary(summary: Dict[str, Any]):
+    print(f"\n会话数 {summary['sessions']}，持续 {summary['elapsed_seconds']}秒，"
+          f"提问 {summary['questions']} 次，吞吐 {summary['throughput_qps']} 问/秒")
+    outcomes = "，".join(f"{outcome} {count}" for outcome, count in summary["outcomes"].items())
+    print(f"结果: {outcomes or '-'}；连接失败 {summary['connect_errors']}")
+    if summary["error_rate"] is not None:
+        print(f"错误率 {summary['error_rate']:.2%}，超时率 {summary['timeout_rate']:.2%}")
+    print(f"\n{'耗时(ms)':<12}{'次数':>7}{'平均':>9}{'P50':>9}{'P90':>9}{'P95':>9}{'P99':>9}{'最大':>9}")
+    for name, label in (("ack_ms", "确认"), ("first_chunk_ms", "首包"), ("answer_ms", "回答")):
+        stats = summary[name]
+        if not stats:
+            print(f"{label:<12}{'-':>7}")
+            continue
+        print(f"{label:<12}{stats['count']:>7}{stats['mean']:>9}{stats['p50']:>9}{stats['p90']:>9}"
+              f"{stats['p95']:>9}{stats['p99']:>9}{stats['max']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket 并发压测")
+    parser.add_argument("--url", default="ws://localhost:53085/ws", help="WebSocket 地址")
+    parser.add_argument("--sessions", type=int, default=20, help="并发会话数")
+    parser.add_argument("--duration", type=float, default=60, help="压测持续秒数（不含爬坡），0表示只按 --requests 停止")
+    parser.add_argument("--requests", type=int, default=0, help="每个会话最多提问次数，0表示不限")
+    parser.add_argument("--think-time", type=float, default=1.0, help="两次提问之间的平均思考时间（秒，指数分布）")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="在多少秒内逐个打开全部会话")
+    parser.add_argument("--corpus", choices=("test", "generated"), default="test", help="问题集")
+    parser.add_argument("--questions", help="generated 问题集改为读取该文件，每行一个问题")
+    parser.add_argument("--replay", help="从应用日志、追踪文件或慢查询日志回放问题")
+    parser.add_argument("--timeout", type=float, default=30.0, help="客户端等待单个回答的超时（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="问题选择和思考时间的随机种子")
+    parser.add_argument("--output", help="汇总和逐问题记录输出JSON文件")
+    args = parser.parse_args()
+
+    if not args.duration and not args.requests:
+        parser.error("--duration 和 --requests 至少需要指定一个")
+    questions = load_questions(args)
+    if not questions:
+        parser.error("没有可用的问题")
+    print(f"压测 {args.url}：{args.sessions} 个会话，问题 {len(questions)} 条，"
+          f"思考时间 {args.think_time}秒，爬坡 {args.ramp_up}秒")
+
+    load_test = LoadTest(args, questions)
+    try:
+        asyncio.run(load_test.run())
+    except KeyboardInterrupt:
+        print("\n压测被中断，输出已完成部分的结果")
+        load_test.finished_at = time.monotonic()
+    summary = load_test.summary()
+    print_summary(summary)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "records": load_test.records}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
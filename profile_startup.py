@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+竞赛智能客服系统 - 启动耗时分析
+在子进程中以 python -X importtime 导入 app.main 并完整执行一次启动（含后台引擎初始化），统计：
+- 各模块的导入耗时（自身/累计，同 -X importtime），以及按顶层包汇总的导入耗时
+- 启动各阶段耗时：导入、开始接受连接、引擎模块导入、组件初始化，以及就绪用时
+- 各组件（标准引擎、增强引擎、结构化知识库、大模型客户端）的初始化耗时
+
+用法:
+    python profile_startup.py [--serial] [--top 20] [--output 结果.json]
+
+--serial 以 STARTUP_PARALLEL_INIT=false 依次初始化组件，便于与默认的并行初始化对比
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+from collections import defaultdict
+from typing import Any, Dict, List
+
+# 确保工作目录是项目根目录
+project_root = Path(__file__).parent
+os.chdir(project_root)
+sys.path.insert(0, str(project_root))
+
+# 子进程执行的启动过程：导入 app.main，运行启动事件并等待后台引擎初始化完成，最后一行输出启动报告
+CHILD_SCRIPT = """
+import time, json, asyncio
+start = time.perf_counter()
+import app.main as main
+import_seconds = time.perf_counter() - start
+
+async def run():
+    await main.startup_event()
+    await main.app.state.engine_init_task
+    await main.shutdown_event()
+
+asyncio.run(run())
+report = main.startup_state.report()
+report["import_seconds"] = round(import_seconds, 3)
+print("\\n" + json.dumps(report, ensure_ascii=False), flush=True)
+"""
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """解析 -X importtime 的输出行：import time: 自身(us) | 累计(us) | 模块名（缩进表示嵌套深度）"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            modules.append({
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            })
+        except ValueError:
+            continue
+    return modules
+
+
+def by_package(modules: List[Dict[str, Any]]) -> Dict[str, float]:
+    """按顶层包汇总自身导入耗时（毫秒）"""
+    totals: Dict[str, float] = defaultdict(float)
+    for module in modules:
+        totals[module["module"].split(".")[0]] += module["self_ms"]
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def run_child(serial: bool) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env["STARTUP_PARALLEL_INIT"] = "false" if serial else "true"
+    env["PYTHONPATH"] = str(project_root) + os.pathsep + env.get("PYTHONPATH", "")
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT],
+                               capture_output=True, text=True, encoding="utf-8", errors="replace", env=env)
+    report = None
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith("{"):
+            try:
+                report = json.loads(line)
+                break
+            except json.JSONDecodeError:
+                continue
+    if completed.returncode != 0 or report is None:
+        tail = "\n".join(line for line in completed.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"启动子进程失败(状态码 {completed.returncode}):\n{tail[-2000:]}")
+    modules = parse_importtime(completed.stderr)
+    return {"startup": report, "imports": modules, "packages": by_package(modules)}
+
+
+def print_report(result: Dict[str, Any], top: int):
+    startup = result["startup"]
+    modules = result["imports"]
+
+    print(f"\n导入 app.main: {startup['import_seconds']:.3f}秒（共 {len(modules)} 个模块）")
+    print(f"\n累计导入耗时最多的模块（前{top}）:")
+    print(f"{'累计(ms)':>10}{'自身(ms)':>10}  模块")
+    for module in sorted(modules, key=lambda m: -m["cumulative_ms"])[:top]:
+        print(f"{module['cumulative_ms']:>10.1f}{module['self_ms']:>10.1f}  {'  ' * module['depth']}{module['module']}")
+
+    print(f"\n自身导入耗时最多的模块（前{top}）:")
+    for module in sorted(modules, key=lambda m: -m["self_ms"])[:top]:
+        print(f"{module['self_ms']:>10.1f}  {module['module']}")
+
+    print(f"\n按顶层包汇总（前{top}）:")
+    for package, total in list(result["packages"].items())[:top]:
+        print(f"{total:>10.1f}  {package}")
+
+    print(f"\n启动阶段（{'并行' if startup['parallel'] else '串行'}初始化组件）:")
+    for name, seconds in startup["phases"].items():
+        print(f"{seconds:>10.3f}秒  {name}")
+    print(f"\n{'组件':<20}{'耗时(秒)':>10}  状态")
+    for name, info in sorted(startup["components"].items(), key=lambda item: -item[1]["seconds"]):
+        print(f"{name:<20}{info['seconds']:>10.3f}  {info['status']}" + (f" ({info['error']})" if info.get("error") else ""))
+
+    print(f"\n状态: {startup['status']}，开始回答问题: {startup['serving_seconds']}秒，就绪用时: {startup['ready_seconds']}秒")
+    if startup["within_budget"] is not None:
+        verdict = "符合" if startup["within_budget"] else "超出"
+        print(f"开始接受连接 {startup['phases'].get('accepting_connections')}秒，{verdict}启动预算 {startup['budget_seconds']}秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时分析（模块导入 + 组件初始化）")
+    parser.add_argument("--serial", action="store_true", help="依次初始化组件（STARTUP_PARALLEL_INIT=false）")
+    parser.add_argument("--top", type=int, default=20, help="各列表显示的条数")
+    parser.add_argument("--output", help="完整结果输出JSON文件")
+    args = parser.parse_args()
+
+    result = run_child(args.serial)
+    print_report(result, args.top)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+"""
+竞赛智能客服系统 - 语料规模压测
+现有语料只有十几份竞赛通知，掩盖了索引构建和检索随语料增长的问题。本脚本：
+- generate：以 data/knowledge/txt 中的文本为素材，重新组合各章节并替换竞赛名称，
+  合成 ×N 倍规模的语料（TXT，可选同时生成PDF供 SimpleRAG/EnhancedRAG 使用）
+- measure：对每个规模在独立子进程中用隔离的索引目录全量构建索引，统计构建耗时、
+  加载耗时、索引内存占用和磁盘大小，并测量检索耗时分布
+
+用法:
+    python scale_corpus.py generate --scales 1,10,100 [--output data/scaled] [--pdf] [--mix 0.3] [--seed 0]
+    python scale_corpus.py measure --scales 1,10,100 [--output data/scaled] [--engines knowledge,simple,enhanced]
+                                   [--repeat 3] [--report 结果.json]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import subprocess
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 确保工作目录是项目根目录
+project_root = Path(__file__).parent
+os.chdir(project_root)
+sys.path.insert(0, str(project_root))
+
+# 一级标题，如 "一、赛事简介"
+SECTION_PATTERN = re.compile(r"^[一二三四五六七八九十]+、")
+# 合成竞赛名称的前缀，超出后再加期数区分
+NAME_PREFIXES = ["华东", "华南", "华北", "西部", "东北", "华中", "智慧", "未来", "青少年", "创客",
+                 "星火", "启航", "探索", "数字", "绿色", "海洋", "航天", "城市", "乡村", "国际"]
+ENGINES = ("knowledge", "simple", "enhanced")
+# PDF 中每页的行数和版式
+PDF_LINES_PER_PAGE = 50
+PDF_FONT_SIZE = 10
+
+
+class SourceDocument:
+    """素材文档：竞赛名称、标题前的导言和按一级标题切分的章节"""
+
+    def __init__(self, path: Path):
+        # 文件名如 "03_2024年（第12届）“泰迪杯”数据挖掘挑战赛竞赛通知"，正文中的写法为 "“泰迪杯”数据挖掘挑战赛"
+        self.quoted_name = re.sub(r"^\d+_(\d{4}年（第\d+届）)?|竞赛通知$", "", path.stem)
+        self.name = self.quoted_name.replace("“", "").replace("”", "")
+        lines = path.read_text(encoding="utf-8").splitlines()
+        self.preamble: List[str] = []
+        self.sections: List[List[str]] = []
+        for line in lines:
+            if SECTION_PATTERN.match(line.strip()):
+                self.sections.append([line])
+            elif self.sections:
+                self.sections[-1].append(line)
+            else:
+                self.preamble.append(line)
+
+    def rename(self, lines: List[str], name: str) -> List[str]:
+        return [line.replace(self.quoted_name, name).replace(self.name, name) for line in lines]
+
+
+def synthetic_name(source: SourceDocument, variant: int) -> str:
+    prefix = NAME_PREFIXES[(variant - 1) % len(NAME_PREFIXES)]
+    edition = (variant - 1) // len(NAME_PREFIXES)
+    return f"{prefix}{source.name}" + (f"（第{edition + 1}期）" if edition else "")
+
+
+def synthesize(sources: List[SourceDocument], index: int, mix: float, rng: random.Random) -> Tuple[str, str]:
+    """
+    合成第 index 份文档，返回 (竞赛名称, 正文)
+    前 len(sources) 份为原文；之后每份以某篇素材为骨架换名，每个章节按 mix 的概率换成另一篇素材的同序号章节
+    """
+    source = sources[index % len(sources)]
+    variant = index // len(sources)
+    if variant == 0:
+        return source.name, "\n".join(source.preamble + [line for section in source.sections for line in section])
+    name = synthetic_name(source, variant)
+    lines = source.rename(source.preamble, name)
+    for position, section in enumerate(source.sections):
+        donors = [other for other in sources if other is not source and len(other.sections) > position]
+        if donors and rng.random() < mix:
+            donor = rng.choice(donors)
+            lines += donor.rename(donor.sections[position], name)
+        else:
+            lines += source.rename(section, name)
+    return name, "\n".join(lines)
+
+
+def write_pdf(path: Path, text: str):
+    """把文本逐页写入PDF（内置中文字体），供按PDF建索引的引擎使用"""
+    import fitz  # PyMuPDF
+
+    document = fitz.open()
+    lines = text.splitlines()
+    for start in range(0, max(len(lines), 1), PDF_LINES_PER_PAGE):
+        page = document.new_page()
+        page.insert_text((50, 60), "\n".join(lines[start:start + PDF_LINES_PER_PAGE]),
+                         fontname="china-s", fontsize=PDF_FONT_SIZE)
+    document.save(str(path))
+    document.close()
+
+
+def scale_dir(output: Path, scale: int) -> Path:
+    return output / f"x{scale}"
+
+
+def generate(args):
+    from app.config import settings
+
+    sources = [SourceDocument(path) for path in sorted(Path(settings.TXT_PATH).glob("*.txt"))]
+    if not sources:
+        sys.exit(f"素材目录中没有TXT文件: {settings.TXT_PATH}")
+    print(f"素材: {len(sources)} 篇，平均 {sum(len(s.sections) for s in sources) / len(sources):.1f} 个章节")
+
+    for scale in args.scales:
+        rng = random.Random(args.seed + scale)
+        target = scale_dir(args.output, scale)
+        shutil.rmtree(target, ignore_errors=True)
+        (target / "txt").mkdir(parents=True)
+        if args.pdf:
+            (target / "docs").mkdir(parents=True)
+        start = time.perf_counter()
+        total_chars = 0
+        for index in range(len(sources) * scale):
+            name, text = synthesize(sources, index, args.mix, rng)
+            stem = f"{index + 1:04d}_{name}"
+            (target / "txt" / f"{stem}.txt").write_text(text, encoding="utf-8")
+            if args.pdf:
+                write_pdf(target / "docs" / f"{stem}.pdf", text)
+            total_chars += len(text)
+        print(f"  x{scale:<5} {len(sources) * scale:>6} 篇，{total_chars / 1e6:.2f}M 字符，"
+              f"耗时 {time.perf_counter() - start:.1f}秒 -> {target}")
+
+
+def directory_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def create_engine(name: str):
+    """按当前（子进程）配置创建引擎；索引不存在时构造过程中会全量构建"""
+    from app.config import settings
+
+    if name == "knowledge":
+        from app.services.knowledge.knowledge_service import KnowledgeService
+        return KnowledgeService(settings.KNOWLEDGE_BASE_PATH, index_dir=settings.INDEX_PATH)
+    if name == "simple":
+        from app.models.SimpleRAG import SimpleRAG
+        return SimpleRAG()
+    if name == "enhanced":
+        from app.models.enhanced_rag import EnhancedRAG
+        return EnhancedRAG()
+    raise ValueError(f"未知的检索引擎: {name}，可选 {', '.join(ENGINES)}")
+
+
+def search_function(name: str, engine):
+    if name == "knowledge":
+        return lambda question: engine.search(question, top_k=5)
+    if name == "enhanced":
+        import asyncio
+        loop = asyncio.new_event_loop()
+        return lambda question: loop.run_until_complete(engine.search(question))
+    return lambda question: engine.search(question)
+
+
+def measure_engine(name: str, repeat: int) -> Dict[str, Any]:
+    """
+    子进程中执行：构建（索引目录为空，构造即全量构建）-> 重新加载（统计耗时和常驻内存）-> 检索
+    """
+    from app.config import settings
+    from benchmark_retrieval import benchmark_engine
+    from benchmark_tokenizer import load_questions
+
+    start = time.perf_counter()
+    engine = create_engine(name)
+    build_seconds = time.perf_counter() - start
+    build_report = getattr(engine, "last_build_report", {}) or {}
+    del engine
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    engine = create_engine(name)
+    load_seconds = time.perf_counter() - start
+    index_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = benchmark_engine(search_function(name, engine), load_questions(), repeat, allocations=False)
+    stats.pop("queries")
+    return {
+        "build_seconds": round(build_seconds, 2),
+        "build_stages": build_report.get("stages"),
+        "load_seconds": round(load_seconds, 3),
+        "index_memory_mb": round(index_memory / 1024 / 1024, 1),
+        "index_disk_mb": round(directory_size(Path(settings.INDEX_PATH)) / 1024 / 1024, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "search": stats,
+    }
+
+
+def child_environment(directory: Path, engine: str) -> Dict[str, str]:
+    """每个规模、每个引擎使用独立的索引和缓存目录，保证都是冷启动全量构建"""
+    work = directory / "work" / engine
+    shutil.rmtree(work, ignore_errors=True)
+    env = dict(os.environ)
+    env.update({
+        "KNOWLEDGE_BASE_PATH": str((directory / ("txt" if engine == "knowledge" else "docs")).resolve()),
+        "TXT_PATH": str((directory / "txt").resolve()),
+        "INDEX_PATH": str((work / "index").resolve()),
+        "TOKEN_CACHE_PATH": str((work / "token_cache").resolve()),
+        "OCR_CACHE_PATH": str((work / "ocr_cache").resolve()),
+        "TRACING_ENABLED": "false",
+        "SLOW_QUERY_LOG_ENABLED": "false",
+    })
+    return env
+
+
+def measure(args):
+    report: Dict[str, Any] = {"timestamp": time.strftime("%Y-%m-%d %H:%M:%S"), "scales": {}}
+    for scale in args.scales:
+        directory = scale_dir(args.output, scale)
+        if not (directory / "txt").exists():
+            sys.exit(f"规模 x{scale} 的语料不存在，请先运行 generate: {directory}")
+        documents = len(list((directory / "txt").glob("*.txt")))
+        report["scales"][scale] = {"documents": documents, "engines": {}}
+        for engine in args.engines:
+            if engine != "knowledge" and not (directory / "docs").exists():
+                print(f"  x{scale:<5} {engine:<9} 跳过：没有PDF（generate 时加 --pdf）")
+                continue
+            result = subprocess.run(
+                [sys.executable, __file__, "_measure_one", engine, "--repeat", str(args.repeat)],
+                env=child_environment(directory, engine), capture_output=True, text=True, encoding="utf-8")
+            if result.returncode != 0:
+                print(f"  x{scale:<5} {engine:<9} 失败:\n{result.stderr[-2000:]}")
+                continue
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            report["scales"][scale]["engines"][engine] = stats
+            latency = stats["search"]["latency_ms"]
+            print(f"  x{scale:<5} {engine:<9} 文档 {documents:>6}  构建 {stats['build_seconds']:>8.1f}s  "
+                  f"加载 {stats['load_seconds']:>7.2f}s  内存 {stats['index_memory_mb']:>7.1f}MB  "
+                  f"磁盘 {stats['index_disk_mb']:>7.1f}MB  检索P50 {latency['p50']:>7.2f}ms  P95 {latency['p95']:>7.2f}ms")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语料规模压测")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def scales(value: str) -> List[int]:
+        return [int(item) for item in value.split(",") if item.strip()]
+
+    generate_parser = subparsers.add_parser("generate", help="合成各规模的语料")
+    generate_parser.add_argument("--scales", type=scales, default=[1, 10, 100], help="逗号分隔的倍数")
+    generate_parser.add_argument("--output", type=Path, default=Path("data/scaled"), help="输出目录")
+    generate_parser.add_argument("--pdf", action="store_true", help="同时生成PDF（SimpleRAG/EnhancedRAG 按PDF建索引）")
+    generate_parser.add_argument("--mix", type=float, default=0.3, help="每个章节换成其他素材同序号章节的概率")
+    generate_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+
+    measure_parser = subparsers.add_parser("measure", help="逐个规模构建索引并测量")
+    measure_parser.add_argument("--scales", type=scales, default=[1, 10, 100], help="逗号分隔的倍数")
+    measure_parser.add_argument("--output", type=Path, default=Path("data/scaled"), help="语料目录（generate 的输出）")
+    measure_parser.add_argument("--engines", type=lambda v: [e for e in v.split(",") if e], default=list(ENGINES),
+                                help=f"逗号分隔的引擎，可选 {', '.join(ENGINES)}")
+    measure_parser.add_argument("--repeat", type=int, default=3, help="每条问题计时的重复次数")
+    measure_parser.add_argument("--report", help="结果输出JSON文件")
+
+    # 内部使用：在已设置好环境变量的子进程中测量单个引擎，结果以JSON输出到最后一行
+    one_parser = subparsers.add_parser("_measure_one")
+    one_parser.add_argument("engine", choices=ENGINES)
+    one_parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        generate(args)
+    elif args.command == "measure":
+        measure(args)
+    else:
+        print(json.dumps(measure_engine(args.engine, args.repeat), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+"""
+竞赛智能客服系统 - 请求追踪汇总
+读取 app/utils/tracing.py 导出的 traces.jsonl（追踪默认关闭，需设置 TRACING_ENABLED=true，
+完整追踪另需 TRACE_SAMPLE_RATE=1.0），输出：
+- 各阶段（按调用路径聚合）的次数、平均/P95耗时、自身耗时和占总耗时的比例，以火焰图式的缩进树展示
+- 最慢的若干个问题及其各阶段耗时
+- 可选输出折叠栈格式（flamegraph.pl / speedscope 可直接读取）
+
+用法:
+    python summarize_traces.py [追踪文件 ...] [--all] [--last 500] [--status ok] [--slowest 10] [--collapsed 输出.txt]
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+from pathlib import Path
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+# 确保工作目录是项目根目录
+project_root = Path(__file__).parent
+os.chdir(project_root)
+sys.path.insert(0, str(project_root))
+
+BAR_WIDTH = 30
+
+
+def trace_files(paths: List[str], include_rotated: bool) -> List[str]:
+    """未指定文件时读取配置的追踪文件；--all 时按时间顺序加上滚动出的历史文件(.N ... .1)"""
+    if not paths:
+        from app.config import settings
+        paths = [settings.TRACE_FILE]
+    files = []
+    for path in paths:
+        if include_rotated:
+            rotated = sorted((p for p in Path(path).parent.glob(Path(path).name + ".*") if p.suffix[1:].isdigit()),
+                             key=lambda p: int(p.suffix[1:]), reverse=True)
+            files.extend(str(p) for p in rotated)
+        files.append(path)
+    return [f for f in files if os.path.exists(f)]
+
+
+def load_traces(files: Iterable[str]) -> List[Dict[str, Any]]:
+    traces = []
+    for file in files:
+        with open(file, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    traces.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"跳过无法解析的行: {file}:{line_no}", file=sys.stderr)
+    return traces
+
+
+def span_paths(trace: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """为每个span补充调用路径(path)和自身耗时(self_ms = 耗时 - 直接子span耗时)"""
+    spans = trace.get("spans", [])
+    by_id = {span["span_id"]: span for span in spans}
+    child_ms: Dict[str, float] = defaultdict(float)
+    for span in spans:
+        if span.get("parent_id") in by_id:
+            child_ms[span["parent_id"]] += span["duration_ms"]
+
+    def path_of(span: Dict[str, Any]) -> str:
+        names, seen = [], set()
+        while span is not None and span["span_id"] not in seen:
+            seen.add(span["span_id"])
+            names.append(span["name"])
+            span = by_id.get(span.get("parent_id"))
+        return ";".join(reversed(names))
+
+    return [{**span, "path": path_of(span), "self_ms": max(0.0, span["duration_ms"] - child_ms[span["span_id"]])}
+            for span in spans]
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def aggregate(traces: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """按调用路径聚合各span"""
+    durations: Dict[str, List[float]] = defaultdict(list)
+    self_ms: Dict[str, float] = defaultdict(float)
+    errors: Dict[str, int] = defaultdict(int)
+    for trace in traces:
+        for span in span_paths(trace):
+            durations[span["path"]].append(span["duration_ms"])
+            self_ms[span["path"]] += span["self_ms"]
+            errors[span["path"]] += span.get("status") != "ok"
+    return {
+        path: {
+            "count": len(values),
+            "total_ms": sum(values),
+            "self_ms": self_ms[path],
+            "avg_ms": statistics.mean(values),
+            "p95_ms": percentile(values, 0.95),
+            "errors": errors[path],
+        }
+        for path, values in durations.items()
+    }
+
+
+def print_flame(stages: Dict[str, Dict[str, Any]]):
+    """缩进树，条形长度为该路径总耗时占全部请求耗时的比例"""
+    grand_total = sum(stats["total_ms"] for path, stats in stages.items() if ";" not in path) or 1.0
+    print(f"\n{'阶段':<44}{'次数':>7}{'平均ms':>10}{'P95ms':>10}{'自身ms':>12}{'占比':>8}  分布")
+    for path in sorted(stages):
+        stats = stages[path]
+        depth = path.count(";")
+        name = "  " * depth + path.rsplit(";", 1)[-1]
+        share = stats["total_ms"] / grand_total
+        bar = "█" * max(1, int(round(share * BAR_WIDTH))) if share > 0 else ""
+        errors = f"  错误 {stats['errors']}" if stats["errors"] else ""
+        print(f"{name:<44}{stats['count']:>7}{stats['avg_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['self_ms']:>12.1f}{share:>8.1%}  {bar}{errors}")
+
+
+def print_slowest(traces: List[Dict[str, Any]], count: int):
+    print(f"\n最慢的 {min(count, len(traces))} 个问题")
+    for trace in sorted(traces, key=lambda t: t.get("duration_ms", 0), reverse=True)[:count]:
+        attributes = trace.get("attributes", {})
+        question = str(attributes.get("question", ""))[:30]
+        print(f"  {trace['trace_id']}  {trace['duration_ms']:>9.1f}ms  {trace.get('status', ''):<12}"
+              f"route={attributes.get('route', '-'):<13} {question}")
+        children = [span for span in span_paths(trace) if span.get("parent_id")]
+        for span in sorted(children, key=lambda s: s["start_ms"]):
+            depth = span["path"].count(";")
+            span_attributes = {k: v for k, v in span.get("attributes", {}).items() if k != "error"}
+            extra = " ".join(f"{k}={v}" for k, v in span_attributes.items())
+            status = "" if span.get("status") == "ok" else f" [{span.get('status')}]"
+            print(f"      {'  ' * (depth - 1)}{span['name']:<20} {span['duration_ms']:>9.1f}ms{status}  {extra}")
+
+
+def write_collapsed(traces: List[Dict[str, Any]], output: str):
+    """折叠栈格式：每行 "路径 自身耗时(微秒)" """
+    weights: Dict[str, float] = defaultdict(float)
+    for trace in traces:
+        for span in span_paths(trace):
+            weights[span["path"]] += span["self_ms"] * 1000
+    with open(output, "w", encoding="utf-8") as f:
+        for path, weight in sorted(weights.items()):
+            if weight >= 1:
+                f.write(f"{path} {int(weight)}\n")
+    print(f"\n折叠栈已保存到: {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="请求追踪汇总")
+    parser.add_argument("files", nargs="*", help="追踪文件，默认为配置的 TRACE_FILE")
+    parser.add_argument("--all", action="store_true", help="同时读取滚动出的历史追踪文件")
+    parser.add_argument("--last", type=int, help="只统计最近N条trace")
+    parser.add_argument("--status", help="只统计指定状态的trace（ok/timeout/error/disconnected）")
+    parser.add_argument("--route", help="只统计指定路由的trace（structured_kb/enhanced/standard）")
+    parser.add_argument("--slowest", type=int, default=10, help="列出最慢的N个问题")
+    parser.add_argument("--collapsed", help="把折叠栈写入文件")
+    args = parser.parse_args()
+
+    files = trace_files(args.files, args.all)
+    if not files:
+        print("没有找到追踪文件")
+        return
+    traces = load_traces(files)
+    if args.status:
+        traces = [t for t in traces if t.get("status") == args.status]
+    if args.route:
+        traces = [t for t in traces if t.get("attributes", {}).get("route") == args.route]
+    if args.last:
+        traces = traces[-args.last:]
+    if not traces:
+        print("没有符合条件的trace")
+        return
+
+    durations = [t.get("duration_ms", 0) for t in traces]
+    status_count: Dict[str, int] = defaultdict(int)
+    for trace in traces:
+        status_count[trace.get("status", "unknown")] += 1
+    print(f"trace数: {len(traces)}（文件: {', '.join(files)}）")
+    print("状态: " + ", ".join(f"{status}={count}" for status, count in sorted(status_count.items())))
+    print(f"端到端耗时: 平均 {statistics.mean(durations):.1f}ms, P50 {percentile(durations, 0.5):.1f}ms, "
+          f"P95 {percentile(durations, 0.95):.1f}ms, P99 {percentile(durations, 0.99):.1f}ms")
+
+    print_flame(aggregate(traces))
+    if args.slowest > 0:
+        print_slowest(traces, args.slowest)
+    if args.collapsed:
+        write_collapsed(traces, args.collapsed)
+
+
+if __name__ == "__main__":
+    main()
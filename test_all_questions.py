@@ -2,7 +2,12 @@
 # -*- coding: utf-8 -*-
 """
 竞赛智能客服系统 - 批量测试工具
-测试系统对一组预设问题的回答质量
+测试系统对一组预设问题的回答质量：以有限并发跑完所有问题，记录每个问题的耗时、置信度、
+承接引擎和回答哈希，并可与以前的结果比较，列出耗时退化和回答变化
+
+用法:
+    python test_all_questions.py [--engine router|simple|enhanced] [--concurrency 4] [--questions 问题文件]
+                                 [--baseline latest|test_results/xxx.json] [--latency-tolerance 0.5]
 """
 
 import os
@@ -10,8 +15,11 @@ import sys
 import logging
 import time
 import json
+import glob
 import asyncio
-from typing import List, Dict, Any
+import hashlib
+import argparse
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 # 配置日志
 logging.basicConfig(
@@ -58,29 +66,73 @@ TEST_QUESTIONS = [
     "世界上最高的山峰是什么？"
 ]
 
-async def test_single_question(engine, question: str) -> Dict[str, Any]:
+ENGINES = ("router", "simple", "enhanced")
+
+# 判定耗时退化时忽略的绝对差值（秒），避免LLM调用的正常波动被当成退化
+LATENCY_FLOOR_SECONDS = 0.5
+
+
+def answer_hash(answer: str) -> str:
+    """回答文本的短哈希，用于比较两次运行的回答是否变化"""
+    return hashlib.sha1(" ".join(str(answer).split()).encode("utf-8")).hexdigest()[:12]
+
+
+def create_engine(name: str) -> Callable[[str], Awaitable[Dict[str, Any]]]:
+    """
+    创建被测引擎，返回单个问题的调用函数
+    
+    Args:
+        name: router(QueryRouter，与线上一致)、simple(SimpleMCPWithRAG) 或 enhanced(EnhancedMCP)
+    """
+    if name == "router":
+        from app.models.query_router import QueryRouter
+        logger.info("初始化QueryRouter...")
+        router = QueryRouter()
+        return lambda question: router.route_query(question=question)
+    if name == "simple":
+        from app.models.SimpleMCPWithRAG import SimpleMCPWithRAG
+        logger.info("初始化SimpleMCPWithRAG引擎...")
+        simple_engine = SimpleMCPWithRAG()
+        return lambda question: simple_engine.query(question=question)
+    if name == "enhanced":
+        from app.models.enhanced_mcp import EnhancedMCP
+        logger.info("初始化EnhancedMCP引擎...")
+        enhanced_engine = EnhancedMCP(rebuild_index=False)
+        return lambda question: enhanced_engine.query(question=question)
+    raise ValueError(f"未知的引擎: {name}，可选 {', '.join(ENGINES)}")
+
+async def test_single_question(ask: Callable[[str], Awaitable[Dict[str, Any]]], question: str,
+                               engine_name: str) -> Dict[str, Any]:
     """测试单个问题"""
+    from app.utils.tracing import capture_trace
+    
     try:
         logger.info(f"测试问题: {question}")
         start_time = time.time()
         
-        # 调用引擎处理问题
-        result = await engine.query(question=question)
+        # 调用引擎处理问题（QueryRouter 选择的引擎从检索过程记录的属性中读取）
+        with capture_trace("test_question") as trace:
+            result = await ask(question)
         
         elapsed_time = time.time() - start_time
+        answer = result.get("answer", "")
         
         # 记录结果
         test_result = {
             "question": question,
-            "answer": result.get("answer", ""),
+            "answer": answer,
+            "answer_hash": answer_hash(answer),
             "confidence": result.get("confidence", 0),
+            "engine": trace.root.attributes.get("route", engine_name),
             "sources_count": len(result.get("sources", [])),
             "competition_type": result.get("competition_type"),
             "processing_time": elapsed_time
         }
+        if result.get("error"):
+            test_result["error"] = result["error"]
         
         # 记录简要信息
-        logger.info(f"问题处理完成，置信度: {test_result['confidence']:.2f}, 耗时: {elapsed_time:.2f}秒")
+        logger.info(f"问题处理完成，引擎: {test_result['engine']}, 置信度: {test_result['confidence']:.2f}, 耗时: {elapsed_time:.2f}秒")
         
         return test_result
     
@@ -92,24 +144,23 @@ async def test_single_question(engine, question: str) -> Dict[str, Any]:
             "success": False
         }
 
-async def run_tests() -> List[Dict[str, Any]]:
-    """运行所有测试问题"""
+async def run_tests(engine_name: str = "router", concurrency: int = 4,
+                    questions: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    并发运行所有测试问题，同时进行中的问题数不超过 concurrency，结果按问题顺序返回
+    """
+    questions = questions or TEST_QUESTIONS
     try:
-        # 导入SimpleMCPWithRAG引擎
-        from app.models.SimpleMCPWithRAG import SimpleMCPWithRAG
-        
-        logger.info("初始化SimpleMCPWithRAG引擎...")
-        engine = SimpleMCPWithRAG()  # 使用简化版引擎
-        
-        logger.info(f"开始测试 {len(TEST_QUESTIONS)} 个问题...")
-        results = []
+        ask = create_engine(engine_name)
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
         
-        for i, question in enumerate(TEST_QUESTIONS, 1):
-            logger.info(f"[{i}/{len(TEST_QUESTIONS)}] 测试: {question}")
-            result = await test_single_question(engine, question)
-            results.append(result)
+        async def run_one(i: int, question: str) -> Dict[str, Any]:
+            async with semaphore:
+                logger.info(f"[{i}/{len(questions)}] 测试: {question}")
+                return await test_single_question(ask, question, engine_name)
         
-        return results
+        logger.info(f"开始测试 {len(questions)} 个问题（引擎: {engine_name}，并发: {concurrency}）...")
+        return list(await asyncio.gather(*(run_one(i, question) for i, question in enumerate(questions, 1))))
     
     except Exception as e:
         logger.error(f"测试过程中发生错误: {str(e)}")
@@ -117,7 +168,7 @@ async def run_tests() -> List[Dict[str, Any]]:
         logger.error(traceback.format_exc())
         return []
 
-def save_results(results: List[Dict[str, Any]]) -> str:
+def save_results(results: List[Dict[str, Any]], meta: Optional[Dict[str, Any]] = None) -> str:
     """保存测试结果到文件"""
     try:
         # 创建输出目录
@@ -129,7 +180,7 @@ def save_results(results: List[Dict[str, Any]]) -> str:
         
         # 保存结果
         with open(filename, "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+            json.dump({"meta": meta or {}, "results": results}, f, ensure_ascii=False, indent=2)
         
         logger.info(f"测试结果已保存至: {filename}")
         return filename
@@ -138,6 +189,27 @@ def save_results(results: List[Dict[str, Any]]) -> str:
         logger.error(f"保存测试结果时出错: {str(e)}")
         return ""
 
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """读取以前的测试结果（兼容早期直接保存为列表的格式）"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    results = data.get("results", []) if isinstance(data, dict) else data
+    for result in results:
+        if "answer" in result and "answer_hash" not in result:
+            result["answer_hash"] = answer_hash(result["answer"])
+    return results
+
+def latest_results_file(exclude: Optional[str] = None) -> Optional[str]:
+    """test_results 目录下最近一次批量测试的结果文件"""
+    files = sorted(path for path in glob.glob("test_results/test_results_*.json")
+                   if not exclude or os.path.abspath(path) != os.path.abspath(exclude))
+    return files[-1] if files else None
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
 def analyze_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
     """分析测试结果"""
     if not results:
@@ -161,25 +233,108 @@ def analyze_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
         "极低 (<0.2)": sum(1 for c in confidence_values if c < 0.2)
     }
     
+    engines: Dict[str, int] = {}
+    for r in results:
+        if "engine" in r:
+            engines[r["engine"]] = engines.get(r["engine"], 0) + 1
+    
     return {
         "total_questions": total,
         "success_count": success_count,
         "success_rate": success_count / total if total > 0 else 0,
         "average_confidence": avg_confidence,
         "average_processing_time": avg_processing_time,
-        "confidence_distribution": confidence_bins
+        "p50_processing_time": percentile(processing_times, 0.5) if processing_times else 0,
+        "p95_processing_time": percentile(processing_times, 0.95) if processing_times else 0,
+        "confidence_distribution": confidence_bins,
+        "engine_distribution": engines
+    }
+
+def diff_results(current: List[Dict[str, Any]], previous: List[Dict[str, Any]],
+                 latency_tolerance: float = 0.5) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    按问题与以前的结果比较
+    
+    Args:
+        latency_tolerance: 允许的耗时相对增长，超过且绝对增长超过 LATENCY_FLOOR_SECONDS 时记为退化
+        
+    Returns:
+        latency_regressions / answer_changes / engine_changes / new_errors / missing 各类变化
+    """
+    previous_by_question = {r["question"]: r for r in previous}
+    diff: Dict[str, List[Dict[str, Any]]] = {
+        "latency_regressions": [], "answer_changes": [], "engine_changes": [], "new_errors": [], "missing": []
     }
+    for result in current:
+        old = previous_by_question.get(result["question"])
+        if old is None:
+            diff["missing"].append({"question": result["question"]})
+            continue
+        if "error" in result and "error" not in old:
+            diff["new_errors"].append({"question": result["question"], "error": result["error"]})
+            continue
+        new_time, old_time = result.get("processing_time"), old.get("processing_time")
+        if new_time is not None and old_time:
+            if new_time > old_time * (1 + latency_tolerance) and new_time - old_time > LATENCY_FLOOR_SECONDS:
+                diff["latency_regressions"].append({"question": result["question"], "previous": round(old_time, 2),
+                                                    "current": round(new_time, 2),
+                                                    "ratio": round(new_time / old_time, 2)})
+        if result.get("answer_hash") and old.get("answer_hash") and result["answer_hash"] != old["answer_hash"]:
+            diff["answer_changes"].append({"question": result["question"],
+                                           "previous_confidence": old.get("confidence"),
+                                           "current_confidence": result.get("confidence"),
+                                           "previous_answer": " ".join(str(old.get("answer", "")).split())[:80],
+                                           "current_answer": " ".join(str(result.get("answer", "")).split())[:80]})
+        if old.get("engine") and result.get("engine") and old["engine"] != result["engine"]:
+            diff["engine_changes"].append({"question": result["question"], "previous": old["engine"],
+                                           "current": result["engine"]})
+    return diff
+
+def report_diff(diff: Dict[str, List[Dict[str, Any]]], baseline: str):
+    logger.info(f"\n====== 与 {baseline} 的差异 ======")
+    logger.info(f"耗时退化: {len(diff['latency_regressions'])}，回答变化: {len(diff['answer_changes'])}，"
+                f"引擎变化: {len(diff['engine_changes'])}，新增错误: {len(diff['new_errors'])}，"
+                f"基线中没有的问题: {len(diff['missing'])}")
+    for item in diff["latency_regressions"]:
+        logger.info(f"  [耗时退化] {item['question']}: {item['previous']}秒 -> {item['current']}秒 ({item['ratio']}x)")
+    for item in diff["answer_changes"]:
+        logger.info(f"  [回答变化] {item['question']} (置信度 {item['previous_confidence']} -> {item['current_confidence']})")
+        logger.info(f"      旧: {item['previous_answer']}")
+        logger.info(f"      新: {item['current_answer']}")
+    for item in diff["engine_changes"]:
+        logger.info(f"  [引擎变化] {item['question']}: {item['previous']} -> {item['current']}")
+    for item in diff["new_errors"]:
+        logger.info(f"  [新增错误] {item['question']}: {item['error']}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="批量测试工具")
+    parser.add_argument("--engine", choices=ENGINES, default="router", help="被测引擎")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时处理的问题数")
+    parser.add_argument("--questions", help="问题文件，每行一个问题（默认使用内置测试问题）")
+    parser.add_argument("--baseline", help="与以前的结果文件比较；指定 latest 时使用 test_results 下最近一次的结果")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5, help="允许的耗时相对增长")
+    return parser.parse_args()
 
 async def main():
     """主函数"""
+    args = parse_args()
     try:
         logger.info("开始批量测试...")
         
+        questions = None
+        if args.questions:
+            with open(args.questions, "r", encoding="utf-8") as f:
+                questions = [line.strip() for line in f if line.strip()]
+        
         # 运行测试
-        results = await run_tests()
+        start_time = time.time()
+        results = await run_tests(args.engine, args.concurrency, questions)
+        wall_time = time.time() - start_time
         
         # 保存结果
-        save_results(results)
+        filename = save_results(results, {"engine": args.engine, "concurrency": args.concurrency,
+                                          "wall_time": round(wall_time, 2),
+                                          "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")})
         
         # 分析结果
         analysis = analyze_results(results)
@@ -190,13 +345,26 @@ async def main():
         logger.info(f"成功处理数: {analysis['success_count']}")
         logger.info(f"成功率: {analysis['success_rate']*100:.1f}%")
         logger.info(f"平均置信度: {analysis['average_confidence']:.2f}")
-        logger.info(f"平均处理时间: {analysis['average_processing_time']:.2f}秒")
+        logger.info(f"平均处理时间: {analysis['average_processing_time']:.2f}秒 "
+                    f"(P50 {analysis['p50_processing_time']:.2f}秒, P95 {analysis['p95_processing_time']:.2f}秒)")
+        logger.info(f"总耗时: {wall_time:.2f}秒（并发 {args.concurrency}）")
         
         logger.info("\n置信度分布:")
         for level, count in analysis['confidence_distribution'].items():
             percentage = count / analysis['total_questions'] * 100
             logger.info(f"  {level}: {count} 个问题 ({percentage:.1f}%)")
         
+        logger.info("\n引擎分布:")
+        for engine, count in analysis['engine_distribution'].items():
+            logger.info(f"  {engine}: {count} 个问题")
+        
+        # 与以前的结果比较
+        baseline = latest_results_file(exclude=filename) if args.baseline == "latest" else args.baseline
+        if args.baseline and not baseline:
+            logger.warning("没有可比较的历史测试结果")
+        elif baseline:
+            report_diff(diff_results(results, load_results(baseline), args.latency_tolerance), baseline)
+        
         logger.info("\n测试完成！")
         
     except Exception as e:
@@ -209,4 +377,4 @@ if __name__ == "__main__":
     os.makedirs("logs", exist_ok=True)
     
     # 运行测试
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
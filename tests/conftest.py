@@ -0,0 +1,52 @@
+"""
+竞赛智能客服系统 - 测试公共夹具
+索引、知识库、分词缓存等路径全部指向临时目录，摄取串行执行，不读写项目数据目录
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# 确保可以导入 app 包
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.config import settings
+
+
+@pytest.fixture
+def isolated_settings(tmp_path, monkeypatch):
+    """将知识库、索引和各类缓存路径改到临时目录，关闭OCR并串行摄取"""
+    paths = {
+        "KNOWLEDGE_BASE_PATH": tmp_path / "knowledge",
+        "INDEX_PATH": tmp_path / "index",
+        "TXT_PATH": tmp_path / "txt",
+        "TOKEN_CACHE_PATH": tmp_path / "token_cache",
+        "OCR_CACHE_PATH": tmp_path / "ocr_cache",
+    }
+    for name, path in paths.items():
+        path.mkdir()
+        monkeypatch.setattr(settings, name, str(path))
+    monkeypatch.setattr(settings, "FTS_DB_PATH", str(tmp_path / "fts" / "chunks.db"))
+    monkeypatch.setattr(settings, "OCR_ENABLED", False)
+    monkeypatch.setattr(settings, "MAX_WORKERS", 1)
+    return settings
+
+
+@pytest.fixture
+def knowledge_base(isolated_settings) -> Path:
+    """临时知识库目录（PDF文件放在这里）"""
+    return Path(isolated_settings.KNOWLEDGE_BASE_PATH)
+
+
+def write_pdf(path: Path, *pages: str) -> Path:
+    """生成每页一段中文文本的PDF文件"""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontname="china-s", fontsize=11)
+    doc.save(str(path))
+    doc.close()
+    return path
@@ -0,0 +1,50 @@
+"""
+运行看板滑动窗口统计测试
+"""
+from app.utils.dashboard import DashboardCollector, _counter_delta
+from app.utils.metrics import ANSWERS_TOTAL, Histogram, REQUEST_SECONDS, ROUTE_TOTAL
+
+
+def test_counter_delta_counts_new_label_values_from_zero():
+    current = {("rag",): 5.0, ("kb",): 2.0}
+    previous = {("rag",): 3.0}
+    assert _counter_delta(current, previous) == {"rag": 2, "kb": 2}
+
+
+def test_histogram_delta_summaries_cover_only_new_observations():
+    """两次 raw() 之间的增量摘要只包含窗口内的观测，没有新观测的标签组合不返回"""
+    histogram = Histogram("stage_seconds", "阶段耗时", ["stage"], buckets=(0.1, 1.0, 10.0))
+    histogram.observe(5.0, stage="llm_call")
+    histogram.observe(5.0, stage="tokenize")
+    before = histogram.raw()
+
+    histogram.observe(0.05, stage="llm_call")
+    histogram.observe(0.05, stage="llm_call")
+    summaries = histogram.delta_summaries(histogram.raw(), before)
+
+    assert list(summaries) == ["llm_call"]
+    assert summaries["llm_call"]["count"] == 2
+    assert summaries["llm_call"]["sum"] == 0.1
+    assert summaries["llm_call"]["p99"] <= 0.1
+
+
+def test_snapshot_reports_window_deltas_of_live_metrics():
+    """看板快照按相邻采样的差值统计窗口内的请求数、引擎承接比例和置信回答比例"""
+    collector = DashboardCollector(window=60, interval=1.0)
+    collector.sample()
+
+    for route in ("enhanced", "enhanced", "enhanced", "structured_kb"):
+        ROUTE_TOTAL.inc(route=route)
+    for confident in ("yes", "yes", "no"):
+        ANSWERS_TOTAL.inc(confident=confident)
+    REQUEST_SECONDS.observe(0.3, outcome="answered")
+    REQUEST_SECONDS.observe(0.6, outcome="answered")
+    REQUEST_SECONDS.observe(30.0, outcome="timeout")
+    snapshot = collector.sample()
+
+    assert snapshot["requests"] == {"answered": 2, "timeout": 1}
+    assert snapshot["engines"]["enhanced"] == {"count": 3, "share": 0.75}
+    assert snapshot["engines"]["structured_kb"] == {"count": 1, "share": 0.25}
+    assert snapshot["answers"]["count"] == 3
+    assert snapshot["answers"]["confident_rate"] == round(2 / 3, 4)
+    assert snapshot["latency"]["request"]["answered"]["sum"] == 0.9
@@ -0,0 +1,106 @@
+"""
+近重复文本块去重测试
+"""
+import pytest
+
+from conftest import write_pdf
+from app.services.ingestion import NearDuplicateIndex
+
+SHARED_TEXT = ("参赛作品须在截止日期前通过官方平台提交，提交材料包括设计报告、源代码和演示视频，"
+               "逾期提交的作品不予受理。每支队伍只能提交一份作品，提交后不得修改。") * 3
+
+EDITED_TEXT = SHARED_TEXT.replace("演示视频", "演示动画", 1)
+OTHER_TEXT = ("大赛设一等奖、二等奖和三等奖，获奖队伍颁发证书，一等奖队伍推荐参加全国总决赛，"
+              "评审专家从创新性、完整性和实用性三个方面打分。") * 3
+
+
+def _signature_similarity(index, a, b):
+    return float((index.hasher.signature(a) == index.hasher.signature(b)).mean())
+
+
+def test_near_duplicate_above_threshold_is_merged_into_canonical():
+    """与已有文本块相似度达到阈值的文本块判为重复，返回先加入的规范文本块"""
+    index = NearDuplicateIndex(threshold=0.8, num_perm=64, bands=16, shingle_size=5)
+    assert _signature_similarity(index, SHARED_TEXT, EDITED_TEXT) >= 0.8
+
+    assert index.check_and_add("doc_1", SHARED_TEXT) is None
+    assert index.check_and_add("doc_2", EDITED_TEXT) == "doc_1"
+    assert index.check_and_add("doc_3", OTHER_TEXT) is None
+    assert len(index) == 2
+
+
+def test_similarity_below_threshold_is_kept_separately():
+    """相似度低于阈值的文本块即使成为LSH候选也不合并"""
+    index = NearDuplicateIndex(threshold=1.0, num_perm=64, bands=16, shingle_size=5)
+    assert _signature_similarity(index, SHARED_TEXT, EDITED_TEXT) < 1.0
+
+    assert index.check_and_add("doc_1", SHARED_TEXT) is None
+    assert index.check_and_add("doc_2", EDITED_TEXT) is None
+    assert index.check_and_add("doc_3", SHARED_TEXT) == "doc_1"
+    assert index.candidates_checked >= 2
+
+
+def test_whitespace_and_case_do_not_affect_duplicates():
+    """计算shingle前去除空白并转小写，仅排版不同的文本块视为重复"""
+    index = NearDuplicateIndex(threshold=0.95, num_perm=64, bands=16, shingle_size=5)
+    index.check_and_add("doc_1", "OpenHarmony 机器人专项赛" + SHARED_TEXT)
+    assert index.check_and_add("doc_2", "openharmony机器人\n专项赛 " + SHARED_TEXT) == "doc_1"
+
+
+def test_num_perm_must_be_divisible_by_bands():
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(num_perm=64, bands=10)
+
+
+def test_cross_competition_duplicate_is_searchable_under_both_competitions(knowledge_base):
+    """跨竞赛的重复文本块合并后，按任一竞赛过滤都能检索到规范文本块"""
+    from app.models.SimpleRAG import SimpleRAG
+
+    write_pdf(knowledge_base / "01_机器人工程挑战赛_规程.pdf", SHARED_TEXT)
+    write_pdf(knowledge_base / "02_竞技机器人专项赛_规程.pdf", SHARED_TEXT)
+    rag = SimpleRAG(rebuild_index=True)
+
+    assert rag.last_build_report["dedup"]["chunks_removed"] == 1
+    (canonical_key, canonical), = rag.documents.items()
+    (duplicate,) = canonical["duplicates"]
+    assert {canonical["competition"], duplicate["competition"]} == {"机器人工程挑战赛", "竞技机器人专项赛"}
+    assert canonical_key in rag.competition_docs["机器人工程挑战赛"]
+    assert canonical_key in rag.competition_docs["竞技机器人专项赛"]
+
+    for competition in ("机器人工程挑战赛", "竞技机器人专项赛"):
+        results = rag.search_with_filter("作品提交材料", filter_by_comp_type=competition)
+        assert [result["id"] for result in results] == [canonical_key]
+
+
+def test_removed_duplicate_source_leaves_its_competition(knowledge_base):
+    """增量重建移除重复来源文件后，规范文本块退出只由该文件带来的竞赛类型"""
+    from app.models.SimpleRAG import SimpleRAG
+
+    write_pdf(knowledge_base / "01_机器人工程挑战赛_规程.pdf", SHARED_TEXT)
+    write_pdf(knowledge_base / "02_竞技机器人专项赛_规程.pdf", SHARED_TEXT)
+    rag = SimpleRAG(rebuild_index=True)
+    (canonical_key, canonical), = rag.documents.items()
+    (duplicate,) = canonical["duplicates"]
+
+    (knowledge_base / duplicate["source"]).unlink()
+    rag.rebuild_index()
+
+    assert rag.last_build_report["mode"] == "incremental"
+    assert rag.documents[canonical_key] == {key: value for key, value in canonical.items() if key != "duplicates"}
+    assert rag.competition_docs == {canonical["competition"]: [canonical_key]}
+
+
+def test_enhanced_rag_cross_competition_duplicate(isolated_settings, knowledge_base):
+    """增强型RAG同样把跨竞赛的重复文本块登记到两个竞赛类型下"""
+    from pathlib import Path
+    from app.models.enhanced_rag import EnhancedRAG
+
+    txt_path = Path(isolated_settings.TXT_PATH)
+    for name in ("01_机器人工程_规程", "02_竞技机器人_规程"):
+        write_pdf(knowledge_base / f"{name}.pdf", SHARED_TEXT)
+        (txt_path / f"{name}.txt").write_text(SHARED_TEXT, encoding="utf-8")
+    rag = EnhancedRAG(rebuild_index=True)
+
+    assert len(rag.docs) == 1
+    assert rag.competition_docs["机器人工程设计专项赛"] == [0]
+    assert rag.competition_docs["竞技机器人专项赛"] == [0]
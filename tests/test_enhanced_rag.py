@@ -0,0 +1,89 @@
+"""
+增强型RAG索引构建测试
+"""
+import copy
+from pathlib import Path
+
+from conftest import write_pdf
+
+RULES_TEXT = "参赛队伍由三名学生和一名指导教师组成，每名学生只能参加一支队伍，报名时须提交学籍证明。"
+SUBMIT_TEXT = "作品提交截止时间为五月三十一日，提交材料包括设计报告、源代码和三分钟演示视频。"
+AWARD_TEXT = "大赛设一等奖、二等奖和三等奖，获奖队伍颁发证书，一等奖队伍推荐参加全国总决赛。"
+
+
+def _add_source(settings, name: str, text: str):
+    write_pdf(Path(settings.KNOWLEDGE_BASE_PATH) / f"{name}.pdf", text)
+    (Path(settings.TXT_PATH) / f"{name}.txt").write_text(text, encoding="utf-8")
+
+
+def test_incremental_rebuild_publishes_new_generation_without_touching_current(isolated_settings):
+    """增量重建在副本上进行：重建前取得的一代索引保持不变，新一代一次性替换"""
+    from app.models.enhanced_rag import EnhancedRAG
+
+    _add_source(isolated_settings, "01_机器人工程_规程", RULES_TEXT)
+    _add_source(isolated_settings, "02_竞技机器人_规程", SUBMIT_TEXT)
+    rag = EnhancedRAG(rebuild_index=True)
+    before = rag._generations.current
+    snapshot = copy.deepcopy((before.docs, before.inverted_index, before.competition_docs))
+
+    (Path(isolated_settings.KNOWLEDGE_BASE_PATH) / "01_机器人工程_规程.pdf").unlink()
+    _add_source(isolated_settings, "03_极地勘探_规程", AWARD_TEXT)
+    report = rag._build_index()
+
+    assert report["mode"] == "incremental"
+    assert (before.docs, before.inverted_index, before.competition_docs) == snapshot
+    after = rag._generations.current
+    assert after.generation_id == before.generation_id + 1
+    assert [doc["source"] for doc in after.docs] == ["02_竞技机器人_规程.pdf", "03_极地勘探_规程.pdf"]
+    assert [doc["id"] for doc in after.docs] == [0, 1]
+    assert set(after.competition_docs) == {"竞技机器人专项赛", "极地资源勘探专项赛"}
+
+    reloaded = EnhancedRAG()
+    assert reloaded.docs == after.docs
+    assert reloaded.competition_docs == after.competition_docs
+
+
+def test_refresh_extracts_txt_for_new_pdf_and_swaps_in_new_generation(isolated_settings, monkeypatch):
+    """知识库新增PDF后刷新已注册索引：增强型索引从PDF提取TXT并在后台构建新一代；预先整理的TXT保持不变"""
+    from app.controllers import admin_router
+    from app.models.enhanced_rag import EnhancedRAG
+
+    _add_source(isolated_settings, "01_机器人工程_规程", RULES_TEXT)
+    curated = Path(isolated_settings.TXT_PATH) / "01_机器人工程_规程.txt"
+    curated.write_text(RULES_TEXT + "\n（整理稿）", encoding="utf-8")
+    rag = EnhancedRAG(rebuild_index=True)
+    monkeypatch.setattr(admin_router, "index_registry", {})
+    admin_router.register_index("enhanced_rag", rag)
+
+    new_pdf = write_pdf(Path(isolated_settings.KNOWLEDGE_BASE_PATH) / "02_竞技机器人_规程.pdf", SUBMIT_TEXT)
+    assert admin_router.refresh_indexes()
+    rag._rebuilder.join(timeout=30)
+
+    status = rag.index_status()
+    assert status["rebuild"]["state"] == "succeeded"
+    assert status["rebuild"]["report"]["mode"] == "incremental"
+    extracted = Path(isolated_settings.TXT_PATH) / "02_竞技机器人_规程.txt"
+    assert "演示视频" in extracted.read_text(encoding="utf-8")
+    assert curated.read_text(encoding="utf-8").endswith("（整理稿）")
+    assert set(rag.competition_docs) == {"机器人工程设计专项赛", "竞技机器人专项赛"}
+
+    new_pdf.unlink()
+    rag._build_index()
+    assert not extracted.exists()
+    assert set(rag.competition_docs) == {"机器人工程设计专项赛"}
+
+    assert rag.rollback_index()
+    assert set(rag.competition_docs) == {"机器人工程设计专项赛", "竞技机器人专项赛"}
+
+
+def test_txt_extraction_can_be_disabled(isolated_settings, monkeypatch):
+    """关闭 ENHANCED_TXT_EXTRACT 后只使用已有TXT，不向 TXT_PATH 写入文件"""
+    from app.models.enhanced_rag import EnhancedRAG
+
+    monkeypatch.setattr(isolated_settings, "ENHANCED_TXT_EXTRACT", False)
+    _add_source(isolated_settings, "01_机器人工程_规程", RULES_TEXT)
+    write_pdf(Path(isolated_settings.KNOWLEDGE_BASE_PATH) / "02_竞技机器人_规程.pdf", SUBMIT_TEXT)
+    rag = EnhancedRAG(rebuild_index=True)
+
+    assert sorted(path.name for path in Path(isolated_settings.TXT_PATH).iterdir()) == ["01_机器人工程_规程.txt"]
+    assert set(rag.competition_docs) == {"机器人工程设计专项赛"}
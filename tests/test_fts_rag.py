@@ -0,0 +1,51 @@
+"""
+SQLite FTS5 检索后端测试
+"""
+from conftest import write_pdf
+
+RULES_TEXT = "参赛队伍由三名学生和一名指导教师组成，报名时须提交学籍证明，作品提交截止时间为五月三十一日。"
+SUBMIT_TEXT = "作品提交截止时间为六月十五日，提交材料包括设计报告、源代码和三分钟演示视频。"
+AWARD_TEXT = "大赛设一等奖、二等奖和三等奖，获奖队伍颁发证书。"
+
+
+def _build(knowledge_base):
+    from app.models.fts_rag import FtsRAG
+
+    write_pdf(knowledge_base / "01_机器人工程挑战赛_规程.pdf", RULES_TEXT)
+    write_pdf(knowledge_base / "02_竞技机器人专项赛_规程.pdf", SUBMIT_TEXT)
+    write_pdf(knowledge_base / "03_开源鸿蒙专项赛_规程.pdf", AWARD_TEXT)
+    return FtsRAG(rebuild_index=True)
+
+
+def test_build_indexes_chunks_with_competition(knowledge_base):
+    """构建后每个文本块带有来源文件识别出的竞赛类型"""
+    rag = _build(knowledge_base)
+    assert rag.index_status()["chunks"] == 3
+    assert rag.last_build_report["mode"] == "full"
+
+    results = rag.search("作品提交截止时间", top_n=5)
+    assert {doc["competition"] for doc in results} == {"机器人工程挑战赛", "竞技机器人专项赛"}
+    assert all(0 < doc["score"] < 1 for doc in results)
+
+
+def test_search_with_filter_returns_only_that_competition(knowledge_base):
+    """按竞赛类型过滤时只返回该竞赛的文本块；该竞赛没有匹配时退回全部文本块"""
+    rag = _build(knowledge_base)
+
+    results = rag.search_with_filter("作品提交截止时间", filter_by_comp_type="竞技机器人专项赛")
+    assert [doc["source"] for doc in results] == ["02_竞技机器人专项赛_规程.pdf"]
+    assert "六月十五日" in results[0]["content"]
+
+    fallback = rag.search_with_filter("作品提交截止时间", filter_by_comp_type="开源鸿蒙专项赛")
+    assert {doc["competition"] for doc in fallback} == {"机器人工程挑战赛", "竞技机器人专项赛"}
+
+
+def test_rebuild_replaces_all_chunks(knowledge_base):
+    """重建在一个事务中替换全部文本块，已删除文件的内容不再被检索到"""
+    rag = _build(knowledge_base)
+    (knowledge_base / "02_竞技机器人专项赛_规程.pdf").unlink()
+
+    assert rag.rebuild_index()
+    assert rag.index_status()["chunks"] == 2
+    results = rag.search("作品提交截止时间", top_n=5)
+    assert [doc["source"] for doc in results] == ["01_机器人工程挑战赛_规程.pdf"]
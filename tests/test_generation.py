@@ -0,0 +1,110 @@
+"""
+索引代际替换、回滚与后台重建测试
+"""
+import os
+import json
+import threading
+from dataclasses import dataclass
+
+import pytest
+
+from app.services.ingestion import GenerationSlot, GenerationStore, BackgroundRebuilder, atomic_write_json
+
+
+@dataclass(frozen=True)
+class _Generation:
+    generation_id: int
+
+    def summary(self):
+        return {"generation_id": self.generation_id}
+
+
+def test_publish_keeps_previous_generation_and_rollback_swaps():
+    """发布新一代后原当前代成为上一代；回滚与上一代互换，再次回滚恢复"""
+    slot = GenerationSlot(_Generation(0))
+    assert not slot.rollback()
+
+    first = _Generation(slot.next_generation_id())
+    slot.publish(first)
+    second = _Generation(slot.next_generation_id())
+    slot.publish(second)
+    assert (first.generation_id, second.generation_id) == (1, 2)
+    assert slot.info() == {"current": {"generation_id": 2}, "previous": {"generation_id": 1}}
+
+    assert slot.rollback()
+    assert slot.current is first and slot.previous is second
+    assert slot.next_generation_id() == 3
+    assert slot.rollback()
+    assert slot.current is second
+
+
+def test_atomic_write_json_replaces_file_without_leftovers(tmp_path):
+    """原子写入后目标文件为完整的新内容，目录中不留临时文件"""
+    path = str(tmp_path / "nested" / "index.json")
+    atomic_write_json(path, {"version": 1})
+    atomic_write_json(path, {"version": 2, "词": ["doc_1"]}, ensure_ascii=False)
+
+    with open(path, "r", encoding="utf-8") as f:
+        assert json.load(f) == {"version": 2, "词": ["doc_1"]}
+    assert os.listdir(tmp_path / "nested") == ["index.json"]
+
+
+def test_background_rebuilder_runs_one_build_at_a_time():
+    """同一时间只运行一个重建任务，完成后记录报告；失败时记录错误"""
+    release = threading.Event()
+    rebuilder = BackgroundRebuilder("test")
+
+    def build(full=False):
+        release.wait(5)
+        return {"mode": "full" if full else "incremental"}
+
+    assert rebuilder.start(build, full=True)
+    assert not rebuilder.start(build)
+    assert rebuilder.status["state"] == "running"
+    release.set()
+    rebuilder.join(5)
+    assert rebuilder.status["state"] == "succeeded"
+    assert rebuilder.status["report"] == {"mode": "full"}
+
+    def broken():
+        raise RuntimeError("磁盘已满")
+
+    assert rebuilder.start(broken)
+    rebuilder.join(5)
+    assert rebuilder.status["state"] == "failed"
+    assert rebuilder.status["error"] == "磁盘已满"
+
+
+def test_generation_store_switches_whole_generation(tmp_path):
+    """每代写入独立目录，with块正常结束才切换指针；中途失败时当前代不变，只保留最近两代目录"""
+    store = GenerationStore(str(tmp_path), "simple")
+    assert store.current_dir() == str(tmp_path)
+
+    with store.new_generation(1) as first:
+        atomic_write_json(os.path.join(first, "index.json"), {"generation": 1})
+        atomic_write_json(os.path.join(first, "manifest.json"), {"generation": 1})
+    assert store.current_dir() == first
+
+    with pytest.raises(RuntimeError):
+        with store.new_generation(2) as failed:
+            atomic_write_json(os.path.join(failed, "index.json"), {"generation": 2})
+            raise RuntimeError("disk full")
+    assert store.current_dir() == first
+    assert not os.path.exists(failed)
+
+    for generation_id in (3, 4):
+        with store.new_generation(generation_id) as latest:
+            atomic_write_json(os.path.join(latest, "index.json"), {"generation": generation_id})
+    assert store.current_dir() == latest
+    assert len(os.listdir(store.generations_dir)) == 2
+
+
+def test_generation_store_rejects_incomplete_generation(tmp_path):
+    """指针记录了代目录的文件列表，文件缺失时不返回该目录，调用方加载失败后全量重建"""
+    store = GenerationStore(str(tmp_path), "knowledge")
+    with store.new_generation(1) as directory:
+        atomic_write_json(os.path.join(directory, "index.json"), {})
+        atomic_write_json(os.path.join(directory, "manifest.json"), {})
+    os.remove(os.path.join(directory, "manifest.json"))
+
+    assert not os.path.exists(os.path.join(store.current_dir(), "index.json"))
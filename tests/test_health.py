@@ -0,0 +1,73 @@
+"""
+存活/就绪探针测试
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.controllers import health_router
+from app.utils.startup import StartupState
+
+
+@pytest.fixture
+def state(monkeypatch):
+    state = StartupState()
+    monkeypatch.setattr(health_router, "startup_state", state)
+    return state
+
+
+@pytest.fixture
+def client(state):
+    app = FastAPI()
+    app.include_router(health_router.router)
+    return TestClient(app)
+
+
+def _raise():
+    raise RuntimeError("知识库目录不存在")
+
+
+def test_starting_is_alive_but_not_ready(client, state):
+    assert client.get("/healthz").json()["startup"] == "starting"
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/readyz").status_code == 503
+
+
+def test_all_components_ok_is_ready(client, state):
+    instances = asyncio.run(state.initialize_components({"standard_engine": object, "llm_client": lambda: "stub"}))
+    state.mark_initialized(instances)
+
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+    assert client.get("/healthz").json()["startup"] == "ready"
+
+
+def test_failed_or_missing_component_is_degraded(client, state):
+    """组件抛出异常或返回None时不报告就绪：状态为degraded，/readyz 保持503，已加载的引擎仍可回答问题"""
+    instances = asyncio.run(state.initialize_components(
+        {"standard_engine": object, "enhanced_engine": _raise, "structured_kb": lambda: None}
+    ))
+    state.mark_initialized(instances)
+
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    report = response.json()
+    assert report["status"] == "degraded"
+    assert "enhanced_engine" in report["error"] and "structured_kb" in report["error"]
+    assert report["components"]["standard_engine"]["status"] == "ok"
+    assert report["components"]["enhanced_engine"]["status"] == "error"
+    assert report["components"]["structured_kb"]["status"] == "error"
+    assert state.serving
+    assert client.get("/healthz").status_code == 200
+
+
+def test_structured_kb_failure_is_reported(monkeypatch):
+    """结构化知识库加载失败时抛出异常，启动过程把该组件记为失败"""
+    from app.models import query_router
+
+    monkeypatch.setattr(query_router, "StructuredCompetitionKB", lambda path: _raise())
+    with pytest.raises(RuntimeError):
+        query_router.QueryRouter._load_structured_kb()
@@ -0,0 +1,33 @@
+"""
+知识服务增量索引测试
+"""
+RULES_TEXT = "参赛队伍由三名学生和一名指导教师组成 每名学生只能参加一支队伍 报名时须提交学籍证明"
+SUBMIT_TEXT = "作品提交截止时间为五月三十一日 提交材料包括设计报告 源代码和三分钟演示视频"
+
+
+def _service(isolated_settings):
+    from pathlib import Path
+    from app.services.knowledge.knowledge_service import KnowledgeService
+
+    return KnowledgeService(isolated_settings.KNOWLEDGE_BASE_PATH, str(Path(isolated_settings.INDEX_PATH)))
+
+
+def test_dictionary_change_forces_full_rebuild(isolated_settings, knowledge_base, monkeypatch):
+    """源文件清单带有构建参数：词典版本不变时增量更新，变化后清单失效并全量重建"""
+    from app.services.knowledge import knowledge_service
+
+    (knowledge_base / "01_规程.txt").write_text(RULES_TEXT, encoding="utf-8")
+    service = _service(isolated_settings)
+    assert len(service.paragraphs) == 1
+
+    (knowledge_base / "02_提交.txt").write_text(SUBMIT_TEXT, encoding="utf-8")
+    report = service._create_index()
+    assert report["mode"] == "incremental"
+    assert report["manifest"]["added"] == 1
+
+    monkeypatch.setattr(knowledge_service, "dictionary_version", lambda: "changed")
+    assert service._create_index()["mode"] == "full"
+    assert len(service.paragraphs) == 2
+
+    # 重新加载时按新参数读取清单，后续更新继续增量进行
+    assert _service(isolated_settings)._create_index()["mode"] == "incremental"
@@ -0,0 +1,69 @@
+"""
+源文件清单变化检测测试
+"""
+import os
+
+from app.services.ingestion import SourceManifest
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_diff_detects_added_changed_removed_and_unchanged(tmp_path):
+    """清单与当前文件集合比较，区分新增、变更、删除和未变化的文件"""
+    kept = _write(tmp_path / "kept.txt", "不变的内容")
+    edited = _write(tmp_path / "edited.txt", "修改前")
+    deleted = _write(tmp_path / "deleted.txt", "将被删除")
+    manifest = SourceManifest(str(tmp_path / "manifest.json"))
+    for path in (kept, edited, deleted):
+        manifest.record(path, source=os.path.basename(path))
+    manifest.save()
+
+    _write(tmp_path / "edited.txt", "修改后的内容")
+    os.remove(deleted)
+    added = _write(tmp_path / "added.txt", "新增文件")
+
+    reloaded = SourceManifest(str(tmp_path / "manifest.json"))
+    assert reloaded.load()
+    diff = reloaded.diff([kept, edited, added])
+    assert diff.added == [added]
+    assert diff.changed == [edited]
+    assert diff.removed == [deleted]
+    assert diff.unchanged == [kept]
+    assert diff.to_process == [added, edited]
+    assert diff.has_changes
+    assert reloaded.get(deleted)["source"] == "deleted.txt"
+
+
+def test_touched_file_with_same_content_is_unchanged(tmp_path):
+    """只修改了时间戳而内容相同的文件按内容哈希判为未变化，并更新清单中的修改时间"""
+    path = _write(tmp_path / "doc.txt", "内容")
+    manifest = SourceManifest(str(tmp_path / "manifest.json"))
+    manifest.record(path)
+
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    diff = manifest.diff([path])
+
+    assert not diff.has_changes
+    assert diff.unchanged == [path]
+    assert manifest.get(path)["mtime"] == stat.st_mtime + 10
+
+
+def test_changed_build_params_invalidate_manifest(tmp_path):
+    """构建参数变化后清单失效（load返回False且条目清空），需要全量重建"""
+    path = _write(tmp_path / "doc.txt", "内容")
+    manifest = SourceManifest(str(tmp_path / "manifest.json"), params={"chunk_size": 500})
+    manifest.record(path)
+    manifest.save()
+
+    same = SourceManifest(str(tmp_path / "manifest.json"), params={"chunk_size": 500})
+    assert same.load()
+    assert list(same.entries) == [path]
+
+    changed = SourceManifest(str(tmp_path / "manifest.json"), params={"chunk_size": 800})
+    assert not changed.load()
+    assert changed.entries == {}
+    assert changed.diff([path]).added == [path]
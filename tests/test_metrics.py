@@ -0,0 +1,66 @@
+"""
+运行指标（计数器、直方图、Prometheus导出）测试
+"""
+import pytest
+
+from app.utils.metrics import MetricsRegistry, Histogram, OVERFLOW_LABEL
+
+
+def test_quantile_interpolates_within_bucket():
+    """分位数在所在桶内线性插值；落在+Inf桶时返回最后一个上界；没有观测时为None"""
+    histogram = Histogram("latency_seconds", "耗时", buckets=(0.1, 0.2, 0.5))
+    assert histogram._quantile(histogram._new_series(), 0.5) is None
+
+    for value in (0.05, 0.05, 0.15, 0.15):
+        histogram.observe(value)
+    (_, series), = histogram._items()
+    assert histogram._quantile(series, 0.5) == pytest.approx(0.1)
+    assert histogram._quantile(series, 0.75) == pytest.approx(0.15)
+
+    histogram.observe(3.0)
+    summary = histogram.summary()
+    assert summary["count"] == 5
+    assert summary["p99"] == 0.5
+    assert summary["avg"] == pytest.approx(3.4 / 5)
+
+
+def test_series_over_limit_fold_into_other():
+    """标签组合数达到 max_series 后，新出现的标签值计入 other"""
+    registry = MetricsRegistry()
+    counter = registry.counter("route_total", "路由次数", ["route"], max_series=2)
+    for route in ("kb", "rag", "llm", "fallback", "rag"):
+        counter.inc(route=route)
+
+    assert counter.value(route="rag") == 2
+    assert counter.value(route=OVERFLOW_LABEL) == 2
+    assert counter.value(route="llm") == 0
+    assert {item["labels"]["route"] for item in counter.snapshot()} == {"kb", "rag", OVERFLOW_LABEL}
+
+    with pytest.raises(ValueError):
+        counter.inc(stage="kb")
+
+
+def test_render_prometheus_text_format():
+    """导出 HELP/TYPE 行、累计桶计数、_sum/_count，并转义标签值"""
+    registry = MetricsRegistry()
+    registry.counter("calls_total", "调用次数", ["outcome"]).inc(outcome='say "ok"')
+    histogram = registry.histogram("stage_seconds", "阶段耗时", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="llm")
+    histogram.observe(0.5, stage="llm")
+    histogram.observe(2.0, stage="llm")
+
+    lines = registry.render_prometheus().splitlines()
+    assert lines[:3] == [
+        "# HELP calls_total 调用次数",
+        "# TYPE calls_total counter",
+        'calls_total{outcome="say \\"ok\\""} 1',
+    ]
+    assert lines[3:] == [
+        "# HELP stage_seconds 阶段耗时",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="llm",le="0.1"} 1',
+        'stage_seconds_bucket{stage="llm",le="1"} 2',
+        'stage_seconds_bucket{stage="llm",le="+Inf"} 3',
+        'stage_seconds_sum{stage="llm"} 2.55',
+        'stage_seconds_count{stage="llm"} 3',
+    ]
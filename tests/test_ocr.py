@@ -0,0 +1,85 @@
+"""
+OCR摄取阶段测试
+"""
+import pytest
+
+from conftest import write_pdf
+from app.services.ingestion import ocr
+
+
+def write_image_pdf(path):
+    """生成只有一张图像、没有文本层的单页PDF"""
+    import fitz  # PyMuPDF
+
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 32, 32), False)
+    pixmap.clear_with(200)
+    doc = fitz.open()
+    doc.new_page().insert_image(fitz.Rect(50, 50, 300, 300), stream=pixmap.tobytes("png"))
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+@pytest.fixture
+def ocr_enabled(isolated_settings, monkeypatch):
+    """启用OCR并假定tesseract可用，识别在父进程中串行执行"""
+    monkeypatch.setattr(isolated_settings, "OCR_ENABLED", True)
+    monkeypatch.setattr(isolated_settings, "OCR_MAX_WORKERS", 1)
+    monkeypatch.setattr(ocr, "tesseract_available", lambda cmd=None: True)
+    return isolated_settings
+
+
+def _failing_ocr_page(path, page_num, options):
+    raise RuntimeError("tesseract crashed")
+
+
+def _noop_worker(task, options):
+    return [], {}
+
+
+def _sources(rag):
+    return rag._generations.current.sources
+
+
+def test_failed_ocr_page_is_reported_by_pipeline(knowledge_base, ocr_enabled, monkeypatch):
+    """识别失败的页面以单页失败任务的形式出现在 pipeline.failed 中"""
+    from app.services.ingestion import IngestionPipeline
+
+    monkeypatch.setattr(ocr, "_ocr_page", _failing_ocr_page)
+    scanned = str(write_image_pdf(knowledge_base / "01_扫描版_规程.pdf"))
+    pipeline = IngestionPipeline()
+    pipeline.run([scanned], _noop_worker, ocr=True)
+
+    (failed,) = pipeline.failed
+    assert (failed.task.path, failed.task.start_page, failed.task.end_page) == (scanned, 0, 1)
+    assert "tesseract crashed" in failed.error
+    assert pipeline.report()["ocr"]["failed"] == 1
+
+
+def test_file_with_failed_ocr_page_is_retried(knowledge_base, ocr_enabled, monkeypatch):
+    """有页面OCR失败的文件不登记到清单，下次增量重建时重新摄取"""
+    from app.models.SimpleRAG import SimpleRAG
+
+    write_pdf(knowledge_base / "01_机器人工程挑战赛_规程.pdf", "参赛队伍须在截止日期前提交作品。")
+    scanned = str(write_image_pdf(knowledge_base / "02_扫描版_规程.pdf"))
+    monkeypatch.setattr(ocr, "_ocr_page", _failing_ocr_page)
+    rag = SimpleRAG(rebuild_index=True)
+    assert scanned not in _sources(rag)
+
+    monkeypatch.setattr(ocr, "_ocr_page", lambda path, page_num, options: ("扫描页面的识别文本", False, {}))
+    report = rag._build_index()
+    assert report["mode"] == "incremental"
+    assert report["manifest"]["added"] == 1
+    assert scanned in _sources(rag)
+
+
+def test_enabling_ocr_forces_full_rebuild(knowledge_base, isolated_settings, monkeypatch):
+    """OCR启用状态写入清单参数，开启OCR后扫描页面不会因清单未变而被跳过"""
+    from app.models.SimpleRAG import SimpleRAG
+
+    write_pdf(knowledge_base / "01_机器人工程挑战赛_规程.pdf", "参赛队伍须在截止日期前提交作品。")
+    rag = SimpleRAG(rebuild_index=True)
+
+    monkeypatch.setattr(isolated_settings, "OCR_ENABLED", True)
+    monkeypatch.setattr(ocr, "tesseract_available", lambda cmd=None: True)
+    assert rag._build_index()["mode"] == "full"
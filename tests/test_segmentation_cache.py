@@ -0,0 +1,71 @@
+"""
+查询侧分词LRU缓存测试
+"""
+from app.utils import jieba_helper
+from app.utils.jieba_helper import SegmentationCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    """超过容量时淘汰最久未使用的文本，命中会刷新使用顺序"""
+    cache = SegmentationCache(maxsize=2)
+    cache.lcut("报名截止时间")
+    cache.lcut("作品提交要求")
+    cache.lcut("报名截止时间")
+    cache.lcut("评分标准")
+
+    assert list(cache._entries) == ["报名截止时间", "评分标准"]
+    cache.lcut("作品提交要求")
+    assert cache.stats()["misses"] == 4
+    assert cache.stats()["hits"] == 1
+
+
+def test_long_text_bypasses_cache():
+    """超过 max_text_length 的文本直接分词，不计入命中统计也不占用缓存"""
+    cache = SegmentationCache(maxsize=8)
+    text = "参赛队伍" * 129
+    assert len(text) > cache.max_text_length == 512
+
+    assert cache.lcut(text) == cache.lcut(text)
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (0, 0, 0)
+
+
+def test_dictionary_change_invalidates_entries(monkeypatch):
+    """词典指纹变化后整体清空缓存，下一次查询重新分词"""
+    cache = SegmentationCache(maxsize=8)
+    cache.lcut("报名截止时间")
+    cache.lcut("报名截止时间")
+
+    monkeypatch.setattr(jieba_helper, "_dictionary_fingerprint", lambda: ("dict.txt", 1, 1))
+    cache.lcut("报名截止时间")
+
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["invalidations"]) == (1, 1, 2, 1)
+
+
+def test_stats_count_hits_and_misses_of_query_cache():
+    """lcut_query 使用全局查询缓存，命中/未命中计入 segmentation_cache_stats"""
+    jieba_helper.clear_segmentation_cache()
+    before = jieba_helper.segmentation_cache_stats()
+
+    tokens = jieba_helper.lcut_query("机器人专项赛的决赛在哪里举行")
+    assert jieba_helper.lcut_query("机器人专项赛的决赛在哪里举行") == tokens
+
+    after = jieba_helper.segmentation_cache_stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+    assert after["hit_rate"] > 0
+
+
+def test_tokenizer_cache_stats_count_each_mode_separately():
+    """两种分词模式各自缓存，tokenizer_cache_stats 分别统计命中/未命中"""
+    from app.utils.tokenizer import EXACT, FAST, tokenize_query, tokenizer_cache_stats
+
+    before = tokenizer_cache_stats()
+    tokens = tokenize_query("智能车竞赛的报名费是多少", mode=FAST)
+    assert tokenize_query("智能车竞赛的报名费是多少", mode=FAST) == tokens
+
+    after = tokenizer_cache_stats()
+    assert after[FAST]["misses"] - before[FAST]["misses"] == 1
+    assert after[FAST]["hits"] - before[FAST]["hits"] == 1
+    assert (after[EXACT]["hits"], after[EXACT]["misses"]) == (before[EXACT]["hits"], before[EXACT]["misses"])
@@ -0,0 +1,109 @@
+"""
+SimpleRAG 增量/全量重建与索引回滚测试
+"""
+import pytest
+
+from conftest import write_pdf
+
+RULES_TEXT = "参赛队伍由三名学生和一名指导教师组成，每名学生只能参加一支队伍，报名时须提交学籍证明。"
+SUBMIT_TEXT = "作品提交截止时间为五月三十一日，提交材料包括设计报告、源代码和三分钟演示视频。"
+AWARD_TEXT = "大赛设一等奖、二等奖和三等奖，获奖队伍颁发证书，一等奖队伍推荐参加全国总决赛。"
+
+
+def _sources(rag):
+    return sorted(doc["source"] for doc in rag.documents.values())
+
+
+def test_incremental_rebuild_only_ingests_changed_sources(knowledge_base):
+    """增量重建只摄取新增和变更的文件，移除已删除文件的文档片段；未变化时沿用当前代"""
+    from app.models.SimpleRAG import SimpleRAG
+
+    rules = write_pdf(knowledge_base / "01_机器人工程挑战赛_规程.pdf", RULES_TEXT)
+    write_pdf(knowledge_base / "02_竞技机器人专项赛_规程.pdf", SUBMIT_TEXT)
+    rag = SimpleRAG(rebuild_index=True)
+    assert rag.last_build_report["mode"] == "full"
+    generation_id = rag.index_status()["current"]["generation_id"]
+
+    report = rag._build_index()
+    assert report == {"mode": "incremental",
+                      "manifest": {"added": 0, "changed": 0, "removed": 0, "unchanged": 2}}
+    assert rag.index_status()["current"]["generation_id"] == generation_id
+
+    rules.unlink()
+    write_pdf(knowledge_base / "02_竞技机器人专项赛_规程.pdf", AWARD_TEXT)
+    write_pdf(knowledge_base / "03_开源鸿蒙专项赛_规程.pdf", RULES_TEXT)
+    assert rag.rebuild_index()
+    report = rag.last_build_report
+
+    assert report["mode"] == "incremental"
+    assert report["manifest"] == {"added": 1, "changed": 1, "removed": 1, "unchanged": 0}
+    assert _sources(rag) == ["02_竞技机器人专项赛_规程.pdf", "03_开源鸿蒙专项赛_规程.pdf"]
+    contents = {doc["source"]: doc["content"] for doc in rag.documents.values()}
+    assert "一等奖" in contents["02_竞技机器人专项赛_规程.pdf"]
+    assert set(rag.competition_docs) == {"竞技机器人专项赛", "开源鸿蒙专项赛"}
+    assert all(key in rag.documents for keys in rag.index.values() for key in keys)
+
+
+def test_full_rebuild_matches_incremental_result(knowledge_base):
+    """强制全量重建与增量重建得到相同的文档集合和倒排索引词表"""
+    from app.models.SimpleRAG import SimpleRAG
+
+    write_pdf(knowledge_base / "01_机器人工程挑战赛_规程.pdf", RULES_TEXT)
+    rag = SimpleRAG(rebuild_index=True)
+    write_pdf(knowledge_base / "02_竞技机器人专项赛_规程.pdf", SUBMIT_TEXT)
+    assert rag.rebuild_index()
+    incremental_contents = sorted(doc["content"] for doc in rag.documents.values())
+    incremental_terms = set(rag.index)
+
+    assert rag.rebuild_index(full=True)
+    assert rag.last_build_report["mode"] == "full"
+    assert sorted(doc["content"] for doc in rag.documents.values()) == incremental_contents
+    assert set(rag.index) == incremental_terms
+
+
+def test_rollback_restores_previous_generation_in_memory_and_on_disk(knowledge_base):
+    """回滚即时切换到上一代，并重新落盘：重新加载后仍是回滚后的索引"""
+    from app.models.SimpleRAG import SimpleRAG
+
+    write_pdf(knowledge_base / "01_机器人工程挑战赛_规程.pdf", RULES_TEXT)
+    rag = SimpleRAG(rebuild_index=True)
+    before = rag.index_status()["current"]["generation_id"]
+    write_pdf(knowledge_base / "02_竞技机器人专项赛_规程.pdf", SUBMIT_TEXT)
+    rag._build_index()
+    assert len(_sources(rag)) == 2
+
+    assert rag.rollback_index()
+    assert rag.index_status()["current"]["generation_id"] == before
+    assert _sources(rag) == ["01_机器人工程挑战赛_规程.pdf"]
+    assert _sources(SimpleRAG()) == ["01_机器人工程挑战赛_规程.pdf"]
+
+    # 回滚后再次增量重建，按回滚代的源文件清单重新摄取新增文件
+    assert rag._build_index()["manifest"]["added"] == 1
+    assert len(_sources(rag)) == 2
+
+
+def test_failed_save_keeps_previous_generation_on_disk(knowledge_base, monkeypatch):
+    """落盘中途失败时磁盘上仍是完整的上一代：重新加载得到的索引与源文件清单一致"""
+    from app.models import SimpleRAG as simple_rag_module
+    from app.models.SimpleRAG import SimpleRAG
+
+    write_pdf(knowledge_base / "01_机器人工程挑战赛_规程.pdf", RULES_TEXT)
+    rag = SimpleRAG(rebuild_index=True)
+    write_pdf(knowledge_base / "02_竞技机器人专项赛_规程.pdf", SUBMIT_TEXT)
+
+    write_json = simple_rag_module.atomic_write_json
+
+    def fail_on_competition_docs(path, data, **kwargs):
+        if path.endswith("competition_docs.json"):
+            raise OSError("disk full")
+        write_json(path, data, **kwargs)
+
+    monkeypatch.setattr(simple_rag_module, "atomic_write_json", fail_on_competition_docs)
+    with pytest.raises(OSError):
+        rag._build_index()
+    monkeypatch.setattr(simple_rag_module, "atomic_write_json", write_json)
+
+    reloaded = SimpleRAG()
+    assert _sources(reloaded) == ["01_机器人工程挑战赛_规程.pdf"]
+    assert list(reloaded._generations.current.sources) == [str(knowledge_base / "01_机器人工程挑战赛_规程.pdf")]
+    assert reloaded._build_index()["manifest"]["added"] == 1
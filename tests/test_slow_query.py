@@ -0,0 +1,71 @@
+"""
+慢查询日志测试
+"""
+import pytest
+
+from app.config import settings
+from app.utils import slow_query
+
+
+class _RecordingWriter:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """开启慢查询日志、阈值100ms，写入的记录保存在列表中而不写文件"""
+    monkeypatch.setattr(settings, "SLOW_QUERY_LOG_ENABLED", True)
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 100.0)
+    writer = _RecordingWriter()
+    monkeypatch.setattr(slow_query, "writer", writer)
+    return writer.records
+
+
+def test_slow_question_writes_explain_plan_with_lazy_fields(written):
+    """超过阈值的问题写入执行计划；延迟字段在写入时才计算，计算失败只记录错误"""
+    calls = []
+    current = slow_query.begin_explain("机器人专项赛的报名截止时间", session_id="s1")
+    slow_query.explain(route="enhanced")
+    slow_query.explain_section("enhanced_rag", candidates=12)
+    slow_query.explain_section("enhanced_rag", keywords=["报名", "截止"])
+    slow_query.explain_lazy("enhanced_rag.top_scores", lambda: calls.append(1) or [{"id": 3, "score": 0.8}])
+    slow_query.explain_lazy("broken", lambda: 1 / 0)
+    assert calls == []
+
+    assert slow_query.finish_explain(current, 0.25, "answered", confidence=0.9)
+    (record,) = written
+    assert calls == [1]
+    assert record["question"] == "机器人专项赛的报名截止时间"
+    assert record["session_id"] == "s1"
+    assert (record["route"], record["outcome"], record["confidence"]) == ("enhanced", "answered", 0.9)
+    assert record["duration_ms"] == 250.0
+    assert record["enhanced_rag"] == {"candidates": 12, "keywords": ["报名", "截止"],
+                                      "top_scores": [{"id": 3, "score": 0.8}]}
+    assert record["broken"].startswith("计算失败: ZeroDivisionError")
+
+
+def test_fast_question_is_not_written_and_lazy_fields_are_skipped(written):
+    calls = []
+    current = slow_query.begin_explain("评分标准是什么")
+    slow_query.explain_lazy("simple_rag.top_scores", lambda: calls.append(1))
+
+    assert not slow_query.finish_explain(current, 0.05, "answered")
+    assert written == []
+    assert calls == []
+
+    # 结束后恢复上下文，后续记录为空操作
+    slow_query.explain(route="standard")
+    assert "route" not in current.fields
+
+
+def test_disabled_slow_query_log_is_a_no_op(written, monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_LOG_ENABLED", False)
+    current = slow_query.begin_explain("评分标准是什么")
+    assert current is None
+    slow_query.explain_section("llm", seconds=9.0)
+    assert not slow_query.finish_explain(current, 9.0, "answered")
+    assert written == []
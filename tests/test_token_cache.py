@@ -0,0 +1,81 @@
+"""
+分词结果缓存测试
+"""
+from app.services.ingestion import TokenCache, split_by_whitespace
+from app.services.ingestion.token_cache import encode_tokens, decode_tokens
+
+TEXT = "竞技机器人专项赛 报名截止时间为五月三十一日\n提交材料包括设计报告"
+
+
+def _segment(text):
+    from app.utils.jieba_helper import pseg
+    return pseg.lcut(text)
+
+
+def test_encode_decode_round_trip():
+    """紧凑编码只保存词长和词性，解码时从原文切出各词，结果与原分词一致"""
+    tokens = [(word, flag) for word, flag in _segment(TEXT)]
+    assert decode_tokens(encode_tokens(tokens), TEXT) == tokens
+
+
+def test_tokenize_hits_cache_on_second_call(tmp_path):
+    """第二次分词命中磁盘缓存，不再调用分词函数；新实例（如另一个工作进程）同样命中"""
+    calls = []
+
+    def segment(text):
+        calls.append(text)
+        return _segment(text)
+
+    cache = TokenCache("v1", str(tmp_path))
+    first = cache.tokenize(TEXT, segment)
+    second = cache.tokenize(TEXT, segment)
+    assert second == first
+    assert calls == [TEXT]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    assert TokenCache("v1", str(tmp_path)).get(TEXT) == first
+
+
+def test_dictionary_version_change_misses_and_corrupt_entry_is_ignored(tmp_path):
+    """词典版本不同的缓存互不可见；损坏的缓存文件当作未命中"""
+    cache = TokenCache("v1", str(tmp_path))
+    cache.tokenize(TEXT, _segment)
+    assert TokenCache("v2", str(tmp_path)).get(TEXT) is None
+
+    path = cache._path(cache.text_key(TEXT))
+    with open(path, "wb") as f:
+        f.write(b"not zlib")
+    assert cache.get(TEXT) is None
+
+
+def test_split_by_whitespace_matches_segmenting_each_piece():
+    """整页分词按空白切成的片段，与单独对该片段分词的结果一致"""
+    pieces = split_by_whitespace([(word, flag) for word, flag in _segment(TEXT)])
+    for piece in TEXT.split():
+        assert pieces[piece] == [(word, flag) for word, flag in _segment(piece)]
+
+
+def test_runtime_user_words_invalidate_manifest_and_token_cache(knowledge_base, monkeypatch):
+    """运行时添加的词条改变词典版本：索引源文件清单失效（全量重建），分词缓存换用新版本目录"""
+    from conftest import write_pdf
+    from app.models.SimpleRAG import SimpleRAG
+    from app.utils import jieba_helper
+
+    monkeypatch.setattr(jieba_helper, "_runtime_entries", [])
+    monkeypatch.setattr(jieba_helper.jieba, "add_word", lambda *args, **kwargs: None)
+    monkeypatch.setattr(jieba_helper.jieba, "load_userdict", lambda *args, **kwargs: None)
+    write_pdf(knowledge_base / "01_机器人工程挑战赛_规程.pdf", TEXT)
+    rag = SimpleRAG(rebuild_index=True)
+    before = jieba_helper.dictionary_version()
+    assert rag._ingestion_options()["token_cache_version"] == before
+
+    jieba_helper.add_user_word("鸿蒙机器人", 100, "nz")
+    after_word = jieba_helper.dictionary_version()
+    assert after_word != before
+    assert rag._ingestion_options()["token_cache_version"] == after_word
+    assert rag._build_index()["mode"] == "full"
+
+    user_dict = knowledge_base.parent / "user_dict.txt"
+    user_dict.write_text("极地勘探 50 nz\n", encoding="utf-8")
+    jieba_helper.load_user_dict(str(user_dict))
+    assert jieba_helper.dictionary_version() not in (before, after_word)
@@ -0,0 +1,92 @@
+"""
+请求追踪测试
+"""
+import logging
+
+import pytest
+
+from app.config import settings
+from app.utils import tracing
+
+
+class _RecordingWriter:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    """开启追踪、全量采样，导出的trace记录在列表中而不写文件"""
+    monkeypatch.setattr(settings, "TRACING_ENABLED", True)
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 1.0)
+    writer = _RecordingWriter()
+    monkeypatch.setattr(tracing, "exporter", writer)
+    return writer.records
+
+
+def test_nested_spans_are_exported_with_parents_and_attributes(exported):
+    """span按嵌套关系记录父节点，属性和计数写在当前span上；结束后恢复上下文"""
+    trace = tracing.begin_trace("question", session_id="s1")
+    with tracing.span("retrieval", engine="simple_rag") as retrieval:
+        tracing.incr_attribute("cache_hits")
+        tracing.incr_attribute("cache_hits")
+        with tracing.span("tokenize") as tokenize:
+            tracing.set_attributes(tokens=7)
+    tracing.end_trace(trace, status="ok", route="rag")
+
+    assert tracing.current_trace_id() is None
+    (record,) = exported
+    assert record["trace_id"] == trace.trace_id
+    assert record["attributes"] == {"session_id": "s1", "route": "rag"}
+    spans = {item["name"]: item for item in record["spans"]}
+    assert spans["retrieval"]["parent_id"] == spans["question"]["span_id"]
+    assert spans["tokenize"]["parent_id"] == retrieval.span_id == spans["retrieval"]["span_id"]
+    assert spans["retrieval"]["attributes"] == {"engine": "simple_rag", "cache_hits": 2}
+    assert spans["tokenize"]["attributes"] == {"tokens": 7}
+    assert tokenize.end is not None
+
+
+def test_span_records_error_and_reraises(exported):
+    trace = tracing.begin_trace("question")
+    with pytest.raises(KeyError):
+        with tracing.span("llm_call"):
+            raise KeyError("missing")
+    tracing.end_trace(trace, status="error")
+
+    (record,) = exported
+    llm_call = next(item for item in record["spans"] if item["name"] == "llm_call")
+    assert llm_call["status"] == "error"
+    assert llm_call["attributes"]["error"] == "KeyError"
+    assert record["status"] == "error"
+
+
+def test_disabled_or_unsampled_tracing_is_a_no_op(exported, monkeypatch):
+    """未启用或未命中采样时不创建trace，span产出None，属性调用直接返回"""
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 0.0)
+    assert tracing.begin_trace("question") is None
+
+    monkeypatch.setattr(settings, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "TRACING_ENABLED", False)
+    trace = tracing.begin_trace("question")
+    assert trace is None
+    with tracing.span("retrieval") as current:
+        tracing.set_attributes(tokens=1)
+        assert current is None
+    tracing.end_trace(trace)
+    assert exported == []
+
+
+def test_log_records_carry_current_trace_id(exported):
+    record = logging.makeLogRecord({"msg": "检索完成"})
+    trace_filter = tracing.TraceIdFilter()
+
+    trace = tracing.begin_trace("question")
+    trace_filter.filter(record)
+    assert record.trace_id == trace.trace_id
+    tracing.end_trace(trace)
+
+    trace_filter.filter(record)
+    assert record.trace_id == "-"